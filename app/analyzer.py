@@ -2,8 +2,9 @@ from collections import defaultdict, Counter
 from datetime import datetime, timedelta
 from typing import Dict, List, Set
 from .models import LogEntry
-from .storage import get_logs_by_api, get_all_logs
-import ipaddress
+from .storage import get_logs_by_api
+from .ip_profiles import ip_profile_store, is_sensitive_path
+from .ip_index import get_special_purpose_flags, parse_ip
 
 def basic_stats(apiId: str):
     logs: List[LogEntry] = get_logs_by_api(apiId)
@@ -56,63 +57,39 @@ def error_rate_by_minute(apiId: str) -> Dict[str, Dict[str, int]]:
 def detect_ip_anomalies(apiId: str = None, hours_back: int = 24) -> Dict:
     """
     Detecta anomalias baseadas em IPs suspeitos de forma simplificada
+    
+    Usa os perfis de IP por cliente mantidos na ingestão (ip_profiles), então
+    o custo depende do número de clientes ativos no período e não do
+    histórico total de logs. A atividade é somada por hora cheia.
     """
     try:
-        # Obter logs (todos ou por API específica)
-        if apiId:
-            logs = get_logs_by_api(apiId)
-        else:
-            logs = get_all_logs()
-        
-        if not logs:
-            return {
-                "new_ips": {},
-                "suspicious_activity": {},
-                "multiple_ips": {},
-                "summary": {
-                    "total_clients_analyzed": 0,
-                    "clients_with_new_ips": 0,
-                    "clients_with_suspicious_activity": 0,
-                    "total_anomalies": 0
-                }
-            }
-        
-        # Filtrar logs das últimas N horas
         cutoff_time = datetime.now() - timedelta(hours=hours_back)
-        recent_logs = [log for log in logs if log.timestamp >= cutoff_time]
-        
-        # Agrupar por cliente
-        client_ips = defaultdict(set)
-        client_recent_ips = defaultdict(set)
-        client_recent_activity = defaultdict(list)
         
-        # Processar todos os logs
-        for log in logs:
-            client_ips[log.clientId].add(log.ip)
-            if log.timestamp >= cutoff_time:
-                client_recent_ips[log.clientId].add(log.ip)
-                client_recent_activity[log.clientId].append(log)
+        # Perfis dos clientes ativos no período e atividade horária
+        client_profiles = ip_profile_store.get_active_profiles(cutoff_time, apiId)
+        client_activity = ip_profile_store.get_recent_activity(cutoff_time, apiId)
         
         anomalies = {
             "new_ips": {},
             "suspicious_activity": {},
             "multiple_ips": {},
             "summary": {
-                "total_clients_analyzed": len(client_ips),
+                "total_clients_analyzed": ip_profile_store.count_clients(apiId) if client_profiles else 0,
                 "clients_with_new_ips": 0,
                 "clients_with_suspicious_activity": 0,
                 "total_anomalies": 0
             }
         }
         
-        for client_id, recent_ips in client_recent_ips.items():
-            all_known_ips = client_ips[client_id]
-            recent_activity = client_recent_activity[client_id]
+        for client_id, known_ips in client_profiles.items():
+            recent_ips = {ip for ip, stats in known_ips.items() if stats["last_seen"] >= cutoff_time}
+            if not recent_ips:
+                continue
             
-            # Detectar IPs novos (se o cliente tem histórico)
-            if len(all_known_ips) > len(recent_ips):
-                historical_ips = all_known_ips - recent_ips
-                new_ips = recent_ips - historical_ips
+            # Detectar IPs novos (vistos pela primeira vez no período, se o cliente tem histórico)
+            historical_ips = {ip for ip, stats in known_ips.items() if stats["first_seen"] < cutoff_time}
+            if historical_ips:
+                new_ips = {ip for ip in recent_ips if known_ips[ip]["first_seen"] >= cutoff_time}
                 if new_ips:
                     anomalies["new_ips"][client_id] = {
                         "new_ips": list(new_ips),
@@ -130,8 +107,9 @@ def detect_ip_anomalies(apiId: str = None, hours_back: int = 24) -> Dict:
                 }
             
             # Detectar atividade suspeita
-            if len(recent_activity) >= 3:  # Pelo menos 3 requests para análise
-                suspicious_patterns = detect_suspicious_patterns_simple(client_id, recent_activity)
+            activity = client_activity.get(client_id)
+            if activity and activity["requests"] >= 3:  # Pelo menos 3 requests para análise
+                suspicious_patterns = detect_suspicious_patterns_from_activity(activity, hours_back)
                 if suspicious_patterns:
                     anomalies["suspicious_activity"][client_id] = suspicious_patterns
                     anomalies["summary"]["clients_with_suspicious_activity"] += 1
@@ -160,6 +138,38 @@ def detect_ip_anomalies(apiId: str = None, hours_back: int = 24) -> Dict:
             }
         }
 
+def detect_suspicious_patterns_from_activity(activity: Dict, hours_back: int = 24) -> Dict:
+    """Detecta padrões suspeitos a partir dos contadores agregados de um cliente"""
+    if activity["requests"] < 3:
+        return None
+    
+    patterns = {}
+    
+    # Verificar taxa de erro
+    error_rate = activity["errors"] / activity["requests"]
+    if error_rate > 0.2:  # Mais de 20% de erros
+        patterns["high_error_rate"] = {
+            "error_rate": error_rate,
+            "total_requests": activity["requests"],
+            "errors": activity["errors"]
+        }
+    
+    # Verificar volume de requests
+    if activity["requests"] > 20:  # Muitas requisições
+        patterns["high_request_volume"] = {
+            "requests_count": activity["requests"],
+            "time_span_hours": hours_back
+        }
+    
+    # Verificar paths sensíveis
+    if activity["sensitive"]:
+        patterns["sensitive_path_access"] = {
+            "attempts": activity["sensitive"],
+            "paths": sorted(activity["sensitive_paths"])
+        }
+    
+    return patterns if patterns else None
+
 def detect_suspicious_patterns_simple(client_id: str, logs: List[LogEntry]) -> Dict:
     """Versão simplificada para detectar padrões suspeitos"""
     if len(logs) < 3:
@@ -186,8 +196,7 @@ def detect_suspicious_patterns_simple(client_id: str, logs: List[LogEntry]) -> D
         }
     
     # Verificar paths sensíveis
-    sensitive_paths = ["/admin", "/login", "/auth", "/config", "/debug", "/test"]
-    sensitive_attempts = [log for log in logs if any(path in log.path.lower() for path in sensitive_paths)]
+    sensitive_attempts = [log for log in logs if is_sensitive_path(log.path)]
     
     if sensitive_attempts:
         patterns["sensitive_path_access"] = {
@@ -200,14 +209,17 @@ def detect_suspicious_patterns_simple(client_id: str, logs: List[LogEntry]) -> D
 def get_ip_risk_score(ip: str) -> Dict:
     """Calcula um score de risco para um IP"""
     try:
-        ip_obj = ipaddress.ip_address(ip)
+        if parse_ip(ip) is None:
+            raise ValueError(f"IP inválido: {ip}")
         
+        # União das propriedades de todos os ranges especiais que contêm o IP
+        flags = get_special_purpose_flags(ip)
         risk_factors = {
-            "is_private": ip_obj.is_private,
-            "is_loopback": ip_obj.is_loopback,
-            "is_multicast": ip_obj.is_multicast,
-            "is_reserved": ip_obj.is_reserved,
-            "is_unspecified": ip_obj.is_unspecified
+            "is_private": "is_private" in flags,
+            "is_loopback": "is_loopback" in flags,
+            "is_multicast": "is_multicast" in flags,
+            "is_reserved": "is_reserved" in flags,
+            "is_unspecified": "is_unspecified" in flags
         }
         
         score = 0
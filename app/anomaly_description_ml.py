@@ -6,7 +6,7 @@ Usa técnicas de NLP e análise de padrões para criar descrições mais intelig
 
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 from datetime import datetime, timedelta
 import json
 from collections import Counter, defaultdict
@@ -17,6 +17,66 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 import joblib
 import os
+import threading
+import time
+
+from .ip_index import private_index
+from .ip_parsing import ip_to_numeric, ips_to_numeric
+
+# Campos com tabela de frequência no contexto
+FREQUENCY_FIELDS = {
+    'ip': 'ip_frequency',
+    'clientId': 'client_frequency',
+    'apiId': 'api_frequency',
+    'method': 'method_frequency'
+}
+
+# Indicadores exibidos no início de cada descrição
+SEVERITY_INDICATORS = {
+    "critical": "🚨 CRÍTICO",
+    "high": "⚠️ ALTO",
+    "medium": "⚡ MÉDIO",
+    "low": "ℹ️ BAIXO"
+}
+
+class FrequencyContext:
+    """
+    Tabelas de frequência (Counter por campo) dos logs de contexto
+    
+    Construídas uma única vez em O(N); cada consulta de frequência é O(1),
+    substituindo as varreduras da lista de logs por log analisado.
+    """
+    
+    def __init__(self, logs: List[Dict] = ()):
+        self.total = 0
+        self.counters: Dict[str, Counter] = {field: Counter() for field in FREQUENCY_FIELDS}
+        # Preenchidos nos snapshots construídos a partir do banco
+        self.window_hours: Optional[float] = None
+        self.built_at: Optional[datetime] = None
+        self.update(logs)
+    
+    @classmethod
+    def from_counts(cls, total: int, counts: Dict[str, Dict], window_hours: Optional[float] = None) -> "FrequencyContext":
+        """Constrói o contexto a partir de contagens já agregadas (ex: storage.get_field_counts)"""
+        context = cls()
+        context.total = total
+        for field in FREQUENCY_FIELDS:
+            context.counters[field].update(counts.get(field, {}))
+        context.window_hours = window_hours
+        context.built_at = datetime.now()
+        return context
+    
+    def update(self, logs: List[Dict]):
+        """Acrescenta logs às tabelas"""
+        for field, counter in self.counters.items():
+            counter.update(log.get(field) for log in logs)
+        self.total += len(logs)
+    
+    def frequency(self, field: str, value) -> float:
+        """Fração dos logs de contexto com o valor no campo"""
+        if not self.total:
+            return 0
+        return self.counters[field].get(value, 0) / self.total
 
 class AnomalyDescriptionML:
     """
@@ -33,6 +93,13 @@ class AnomalyDescriptionML:
         self.models_dir = "models"
         os.makedirs(self.models_dir, exist_ok=True)
         
+        # Snapshot de frequências usado para descrever logs individuais
+        self._context_snapshot: Optional[FrequencyContext] = None
+        self._snapshot_built_monotonic = 0.0
+        self._snapshot_refreshing = False
+        self._snapshot_lock = threading.Lock()
+        self._models_load_attempted = False
+        
     def _load_pattern_templates(self) -> Dict[str, List[str]]:
         """Carrega templates de padrões para diferentes tipos de anomalias"""
         return {
@@ -71,8 +138,93 @@ class AnomalyDescriptionML:
             "low": 0.2
         }
     
-    def extract_contextual_features(self, log_data: Dict, all_logs: List[Dict]) -> Dict:
-        """Extrai features contextuais para análise ML"""
+    def _get_snapshot_config(self) -> Tuple[float, float]:
+        """Janela (horas) e intervalo de atualização (segundos) do snapshot de contexto"""
+        try:
+            from .config_manager import config_manager
+            config = config_manager.get_config("descriptions")
+        except Exception as e:
+            print(f"⚠️ Erro ao obter configurações de descrições: {e}")
+            config = {}
+        return config.get("context_window_hours", 24), config.get("context_refresh_seconds", 300)
+    
+    def refresh_context_snapshot(self, window_hours: Optional[float] = None) -> FrequencyContext:
+        """
+        Reconstrói o snapshot de frequências com agregações no banco
+        
+        Args:
+            window_hours: Janela em horas (padrão: configuração 'descriptions')
+        """
+        from .storage import get_field_counts
+        
+        if window_hours is None:
+            window_hours, _ = self._get_snapshot_config()
+        
+        try:
+            cutoff_time = datetime.now() - timedelta(hours=window_hours)
+            field_counts = get_field_counts(list(FREQUENCY_FIELDS), cutoff_time=cutoff_time)
+            snapshot = FrequencyContext.from_counts(field_counts["total"], field_counts["counts"], window_hours)
+            
+            with self._snapshot_lock:
+                self._context_snapshot = snapshot
+                self._snapshot_built_monotonic = time.monotonic()
+            print(f"🔄 Snapshot de contexto atualizado: {snapshot.total} logs nas últimas {window_hours}h")
+            return snapshot
+        finally:
+            with self._snapshot_lock:
+                self._snapshot_refreshing = False
+    
+    def get_context_snapshot(self) -> FrequencyContext:
+        """
+        Snapshot de frequências da janela configurada (cache em memória)
+        
+        O primeiro acesso (ou uma mudança de janela) constrói o snapshot na hora.
+        Depois disso, um snapshot vencido continua sendo usado enquanto a
+        atualização roda em segundo plano, então as requisições não esperam
+        pelas agregações.
+        """
+        window_hours, refresh_seconds = self._get_snapshot_config()
+        
+        with self._snapshot_lock:
+            snapshot = self._context_snapshot
+            needs_build = snapshot is None or snapshot.window_hours != window_hours
+            is_stale = time.monotonic() - self._snapshot_built_monotonic >= refresh_seconds
+            start_refresh = not needs_build and is_stale and not self._snapshot_refreshing
+            if start_refresh:
+                self._snapshot_refreshing = True
+        
+        if needs_build:
+            return self.refresh_context_snapshot(window_hours)
+        
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, args=(window_hours,), daemon=True).start()
+        
+        return snapshot
+    
+    def _refresh_in_background(self, window_hours: float):
+        """Atualiza o snapshot sem derrubar a thread em caso de erro (o anterior continua valendo)"""
+        try:
+            self.refresh_context_snapshot(window_hours)
+        except Exception as e:
+            print(f"⚠️ Erro ao atualizar snapshot de contexto: {e}")
+    
+    def build_context(self, all_logs: Union[List[Dict], FrequencyContext]) -> FrequencyContext:
+        """Retorna as tabelas de frequência dos logs (contextos prontos são reutilizados)"""
+        if isinstance(all_logs, FrequencyContext):
+            return all_logs
+        return FrequencyContext(all_logs)
+    
+    def extract_contextual_features(self, log_data: Dict,
+                                    all_logs: Union[List[Dict], FrequencyContext]) -> Dict:
+        """
+        Extrai features contextuais para análise ML
+        
+        Args:
+            log_data: Log analisado
+            all_logs: Logs de contexto ou FrequencyContext já construído
+                (use build_context para analisar vários logs com o mesmo contexto)
+        """
+        context = self.build_context(all_logs)
         features = {}
         
         # Features temporais
@@ -85,12 +237,12 @@ class AnomalyDescriptionML:
         # Features de rede
         features['ip_numeric'] = self._ip_to_numeric(log_data['ip'])
         features['is_private_ip'] = self._is_private_ip(log_data['ip'])
-        features['ip_frequency'] = self._calculate_ip_frequency(log_data['ip'], all_logs)
+        features['ip_frequency'] = self._calculate_ip_frequency(log_data['ip'], context)
         
         # Features de comportamento
-        features['client_frequency'] = self._calculate_client_frequency(log_data['clientId'], all_logs)
-        features['api_frequency'] = self._calculate_api_frequency(log_data['apiId'], all_logs)
-        features['method_frequency'] = self._calculate_method_frequency(log_data['method'], all_logs)
+        features['client_frequency'] = self._calculate_client_frequency(log_data['clientId'], context)
+        features['api_frequency'] = self._calculate_api_frequency(log_data['apiId'], context)
+        features['method_frequency'] = self._calculate_method_frequency(log_data['method'], context)
         
         # Features de status
         features['status_code'] = log_data['status']
@@ -108,42 +260,91 @@ class AnomalyDescriptionML:
         return features
     
     def _ip_to_numeric(self, ip: str) -> int:
-        """Converte IP para valor numérico"""
-        try:
-            parts = ip.split('.')
-            return sum(int(part) * (256 ** (3 - i)) for i, part in enumerate(parts))
-        except:
-            return 0
+        """Converte IP para valor numérico (IPv4 e IPv6, com cache)"""
+        return ip_to_numeric(ip)
     
     def _is_private_ip(self, ip: str) -> bool:
         """Verifica se é IP privado"""
-        try:
-            parts = [int(part) for part in ip.split('.')]
-            return (parts[0] == 10 or 
-                   (parts[0] == 172 and 16 <= parts[1] <= 31) or
-                   (parts[0] == 192 and parts[1] == 168))
-        except:
-            return False
+        return private_index.contains(ip)
     
-    def _calculate_ip_frequency(self, ip: str, all_logs: List[Dict]) -> float:
+    def _calculate_ip_frequency(self, ip: str, context: FrequencyContext) -> float:
         """Calcula frequência do IP nos logs"""
-        ip_count = sum(1 for log in all_logs if log['ip'] == ip)
-        return ip_count / len(all_logs) if all_logs else 0
+        return context.frequency('ip', ip)
     
-    def _calculate_client_frequency(self, client_id: str, all_logs: List[Dict]) -> float:
+    def _calculate_client_frequency(self, client_id: str, context: FrequencyContext) -> float:
         """Calcula frequência do cliente nos logs"""
-        client_count = sum(1 for log in all_logs if log['clientId'] == client_id)
-        return client_count / len(all_logs) if all_logs else 0
+        return context.frequency('clientId', client_id)
     
-    def _calculate_api_frequency(self, api_id: str, all_logs: List[Dict]) -> float:
+    def _calculate_api_frequency(self, api_id: str, context: FrequencyContext) -> float:
         """Calcula frequência da API nos logs"""
-        api_count = sum(1 for log in all_logs if log['apiId'] == api_id)
-        return api_count / len(all_logs) if all_logs else 0
+        return context.frequency('apiId', api_id)
     
-    def _calculate_method_frequency(self, method: str, all_logs: List[Dict]) -> float:
+    def _calculate_method_frequency(self, method: str, context: FrequencyContext) -> float:
         """Calcula frequência do método nos logs"""
-        method_count = sum(1 for log in all_logs if log['method'] == method)
-        return method_count / len(all_logs) if all_logs else 0
+        return context.frequency('method', method)
+    
+    def build_feature_frame(self, logs: Union[List[Dict], pd.DataFrame],
+                            context: Optional[FrequencyContext] = None) -> pd.DataFrame:
+        """
+        Versão em lote de extract_contextual_features
+        
+        Retorna um DataFrame com as mesmas colunas (na mesma ordem) e valores
+        que extract_contextual_features produziria para cada log.
+        
+        Args:
+            logs: Logs a transformar (lista de dicts ou DataFrame com as mesmas colunas)
+            context: Tabelas de frequência (padrão: frequências dos próprios logs)
+        """
+        logs_df = logs if isinstance(logs, pd.DataFrame) else pd.DataFrame(logs)
+        
+        # Features temporais (no fuso de cada timestamp)
+        timestamps_raw = logs_df['timestamp'].astype(str).str.replace('Z', '+00:00', regex=False)
+        try:
+            timestamps = pd.to_datetime(timestamps_raw, format='ISO8601')
+            hours = timestamps.dt.hour.to_numpy(dtype=np.int64)
+            days_of_week = timestamps.dt.weekday.to_numpy(dtype=np.int64)
+        except (ValueError, TypeError, AttributeError):
+            # Fusos horários misturados: converter um a um
+            parsed = [datetime.fromisoformat(t) for t in timestamps_raw]
+            hours = np.array([t.hour for t in parsed], dtype=np.int64)
+            days_of_week = np.array([t.weekday() for t in parsed], dtype=np.int64)
+        
+        ips = logs_df['ip'].tolist()
+        status_codes = logs_df['status'].to_numpy(dtype=np.int64)
+        paths = logs_df['path'].astype(str)
+        
+        features = {
+            'hour': hours,
+            'day_of_week': days_of_week,
+            'is_business_hours': (hours >= 8) & (hours <= 18),
+            'is_weekend': days_of_week >= 5,
+            'ip_numeric': ips_to_numeric(ips),
+            'is_private_ip': np.array(private_index.lookup_many(ips, False), dtype=bool),
+        }
+        
+        # Frequências: value_counts nos próprios logs ou consulta às tabelas do contexto
+        for field, feature_name in FREQUENCY_FIELDS.items():
+            values = logs_df[field]
+            if context is None:
+                frequencies = values.map(values.value_counts(normalize=True, dropna=False))
+            else:
+                uniques = values.unique()
+                frequencies = values.map({value: context.frequency(field, value) for value in uniques})
+            features[feature_name] = frequencies.to_numpy(dtype=np.float64)
+        
+        features.update({
+            'status_code': status_codes,
+            'is_error': (status_codes >= 400) & (status_codes < 600),
+            'is_server_error': (status_codes >= 500) & (status_codes < 600),
+            'is_client_error': (status_codes >= 400) & (status_codes < 500),
+            'path_length': paths.str.len().to_numpy(dtype=np.int64),
+            'path_depth': paths.str.count('/').to_numpy(dtype=np.int64),
+            'is_api_path': paths.str.contains('/api/', regex=False).to_numpy(dtype=bool),
+            'is_admin_path': paths.str.contains('/admin/', regex=False).to_numpy(dtype=bool),
+            'is_auth_path': paths.str.contains('/auth/', regex=False).to_numpy(dtype=bool),
+        })
+        
+        return pd.DataFrame(features, index=logs_df.index)
     
     def classify_anomaly_type(self, features: Dict, score: float) -> str:
         """Classifica o tipo de anomalia baseado nas features"""
@@ -167,6 +368,20 @@ class AnomalyDescriptionML:
         else:
             return "behavioral"
     
+    def classify_anomaly_types(self, features_df: pd.DataFrame) -> np.ndarray:
+        """Versão em lote de classify_anomaly_type (mesma ordem de regras)"""
+        conditions = [
+            features_df['is_server_error'],
+            features_df['is_client_error'],
+            features_df['ip_frequency'] < 0.01,
+            features_df['client_frequency'] < 0.01,
+            features_df['is_admin_path'],
+            features_df['is_auth_path'],
+            ~features_df['is_private_ip']
+        ]
+        choices = ["performance", "security", "security", "security", "security", "security", "network"]
+        return np.select([np.asarray(c, dtype=bool) for c in conditions], choices, default="behavioral")
+    
     def determine_severity(self, score: float, features: Dict) -> str:
         """Determina a severidade da anomalia"""
         # Ajusta severidade baseado em fatores contextuais
@@ -244,7 +459,8 @@ class AnomalyDescriptionML:
         
         return ", ".join(details) if details else "padrão anômalo detectado"
     
-    def generate_ml_description(self, log_data: Dict, score: float, all_logs: List[Dict]) -> str:
+    def generate_ml_description(self, log_data: Dict, score: float,
+                                all_logs: Union[List[Dict], FrequencyContext]) -> str:
         """Gera descrição usando ML e análise contextual"""
         # Extrai features contextuais
         features = self.extract_contextual_features(log_data, all_logs)
@@ -266,14 +482,7 @@ class AnomalyDescriptionML:
         description = template.format(details=details)
         
         # Adiciona informações de severidade
-        severity_indicators = {
-            "critical": "🚨 CRÍTICO",
-            "high": "⚠️ ALTO",
-            "medium": "⚡ MÉDIO", 
-            "low": "ℹ️ BAIXO"
-        }
-        
-        severity_indicator = severity_indicators.get(severity, "ℹ️")
+        severity_indicator = SEVERITY_INDICATORS.get(severity, "ℹ️")
         
         # Adiciona contexto temporal
         timestamp = datetime.fromisoformat(log_data['timestamp'].replace('Z', '+00:00'))
@@ -284,58 +493,307 @@ class AnomalyDescriptionML:
         
         return final_description
     
-    def analyze_patterns(self, anomalies: List[Dict]) -> Dict:
-        """Analisa padrões entre múltiplas anomalias"""
-        if not anomalies:
+    def determine_severities(self, scores: np.ndarray, features_df: pd.DataFrame) -> np.ndarray:
+        """Versão em lote de determine_severity (mesmos ajustes e limites)"""
+        adjusted_scores = (
+            np.asarray(scores, dtype=np.float64)
+            + 0.2 * features_df['is_server_error'].to_numpy(dtype=bool)
+            + 0.1 * ~features_df['is_private_ip'].to_numpy(dtype=bool)
+            + 0.05 * ~features_df['is_business_hours'].to_numpy(dtype=bool)
+            + 0.15 * features_df['is_admin_path'].to_numpy(dtype=bool)
+        )
+        return np.select(
+            [
+                adjusted_scores >= self.severity_classifier["critical"],
+                adjusted_scores >= self.severity_classifier["high"],
+                adjusted_scores >= self.severity_classifier["medium"]
+            ],
+            ["critical", "high", "medium"],
+            default="low"
+        )
+    
+    def _contextual_details_batch(self, logs_df: pd.DataFrame, features_df: pd.DataFrame,
+                                  anomaly_types: np.ndarray) -> List[str]:
+        """
+        Versão em lote de generate_contextual_details
+        
+        Cada regra vira uma coluna de texto (vazia quando não se aplica); as
+        colunas são unidas por linha na mesma ordem das regras originais.
+        """
+        def flag(name):
+            return features_df[name].to_numpy(dtype=bool)
+        
+        ip = logs_df['ip'].astype(str).to_numpy(dtype=object)
+        method = logs_df['method'].astype(str).to_numpy(dtype=object)
+        status = logs_df['status'].astype(str).to_numpy(dtype=object)
+        is_public = ~flag('is_private_ip')
+        off_hours = ~flag('is_business_hours')
+        rare_client = features_df['client_frequency'].to_numpy() < 0.01
+        
+        rules = {
+            "security": [
+                (flag('is_admin_path'), "acesso a área administrativa"),
+                (flag('is_auth_path'), "tentativa de autenticação"),
+                (is_public, "IP público (" + ip + ")"),
+                (rare_client, "cliente não reconhecido"),
+                (features_df['method_frequency'].to_numpy() < 0.05, "método HTTP incomum (" + method + ")")
+            ],
+            "network": [
+                (is_public, "origem externa (" + ip + ")"),
+                (features_df['ip_frequency'].to_numpy() < 0.01, "IP não reconhecido"),
+                (flag('is_weekend'), "atividade em fim de semana"),
+                (off_hours, "atividade fora do horário comercial")
+            ],
+            "performance": [
+                (flag('is_server_error'), "erro de servidor (" + status + ")"),
+                (features_df['api_frequency'].to_numpy() > 0.5, "alta frequência de requisições"),
+                (features_df['path_depth'].to_numpy() > 3, "path muito profundo")
+            ],
+            "behavioral": [
+                (off_hours, "horário atípico"),
+                (flag('is_weekend'), "atividade em fim de semana"),
+                (features_df['method_frequency'].to_numpy() < 0.1, "método raramente usado (" + method + ")"),
+                (rare_client, "cliente com padrão incomum")
+            ]
+        }
+        
+        columns = []
+        for anomaly_type, type_rules in rules.items():
+            is_type = anomaly_types == anomaly_type
+            for mask, text in type_rules:
+                columns.append(np.where(is_type & mask, text, ""))
+        
+        return [
+            ", ".join(part for part in parts if part) or "padrão anômalo detectado"
+            for parts in zip(*columns)
+        ]
+    
+    def _cluster_model_ready(self) -> bool:
+        """Verifica se o modelo de clustering está treinado (carrega os .pkl na primeira vez)"""
+        if hasattr(self.cluster_model, 'cluster_centers_'):
+            return True
+        if not self._models_load_attempted:
+            self._models_load_attempted = True
+            return self.load_models()
+        return False
+    
+    def assign_clusters(self, features_df: pd.DataFrame) -> Optional[np.ndarray]:
+        """
+        Cluster de cada anomalia pelo pipeline treinado (scaler -> PCA -> KMeans)
+        
+        Returns:
+            Array com o cluster de cada linha ou None se o modelo não estiver treinado
+        """
+        if not self._cluster_model_ready():
+            return None
+        reduced_features = self.pca.transform(self.scaler.transform(features_df))
+        return self.cluster_model.predict(reduced_features)
+    
+    def generate_ml_descriptions(self, anomalies: Union[List[Dict], pd.DataFrame],
+                                 context: Optional[FrequencyContext] = None) -> List[Dict]:
+        """
+        Gera descrições para várias anomalias de uma vez
+        
+        A matriz de features é construída em lote, tipo e severidade são
+        calculados por regras vetorizadas (as mesmas de classify_anomaly_type e
+        determine_severity) e, se o modelo de descrições estiver treinado, cada
+        anomalia recebe o cluster do KMeans.
+        
+        Args:
+            anomalies: Anomalias com os campos do log e o score em 'score' ou 'anomaly_score'
+            context: Tabelas de frequência (padrão: frequências entre as próprias anomalias)
+        
+        Returns:
+            Lista de dicts (na ordem de entrada) com requestId, description,
+            anomaly_type, severity e cluster
+        """
+        anomalies_df = anomalies if isinstance(anomalies, pd.DataFrame) else pd.DataFrame(anomalies)
+        if anomalies_df.empty:
+            return []
+        anomalies_df = anomalies_df.reset_index(drop=True)
+        
+        features_df = self.build_feature_frame(anomalies_df, context)
+        score_column = 'score' if 'score' in anomalies_df else 'anomaly_score'
+        scores = pd.to_numeric(anomalies_df[score_column], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        
+        anomaly_types = self.classify_anomaly_types(features_df)
+        severities = self.determine_severities(scores, features_df)
+        details = self._contextual_details_batch(anomalies_df, features_df, anomaly_types)
+        clusters = self.assign_clusters(features_df)
+        
+        # Contexto temporal (dd/mm/aaaa hh:mm) direto do texto ISO, no fuso do próprio timestamp
+        timestamps = anomalies_df['timestamp'].astype(str)
+        time_contexts = (timestamps.str[8:10] + "/" + timestamps.str[5:7] + "/" + timestamps.str[0:4]
+                         + " " + timestamps.str[11:16]).tolist()
+        
+        # Template sorteado por anomalia (como em generate_ml_description)
+        template_choices = np.random.randint(0, 4, size=len(anomalies_df))
+        
+        request_ids = anomalies_df['requestId'].tolist() if 'requestId' in anomalies_df else [None] * len(anomalies_df)
+        descriptions = []
+        for position, anomaly_type in enumerate(anomaly_types.tolist()):
+            templates = self.pattern_templates.get(anomaly_type, self.pattern_templates["behavioral"])
+            template = templates[template_choices[position] % len(templates)]
+            severity = severities[position]
+            description = template.format(details=details[position])
+            descriptions.append({
+                "requestId": request_ids[position],
+                "description": (f"{SEVERITY_INDICATORS.get(severity, 'ℹ️')} - {description} "
+                                f"(Score: {scores[position]:.3f}, {time_contexts[position]})"),
+                "anomaly_type": anomaly_type,
+                "severity": str(severity),
+                "cluster": int(clusters[position]) if clusters is not None else None
+            })
+        
+        return descriptions
+    
+    def analyze_patterns(self, anomalies: Union[List[Dict], pd.DataFrame]) -> Dict:
+        """
+        Analisa padrões entre múltiplas anomalias
+        
+        Monta uma tabela colunar (uma linha por anomalia), classifica todas as
+        anomalias de uma vez e agrega por tipo. O score é lido de 'anomaly_score'
+        ou, para detecções armazenadas, de 'score'.
+        """
+        anomalies_df = anomalies if isinstance(anomalies, pd.DataFrame) else pd.DataFrame(anomalies)
+        if anomalies_df.empty:
             return {}
         
-        # Agrupa anomalias por tipo
-        type_groups = defaultdict(list)
-        for anomaly in anomalies:
-            features = self.extract_contextual_features(anomaly, [a for a in anomalies])
-            anomaly_type = self.classify_anomaly_type(features, anomaly.get('anomaly_score', 0))
-            type_groups[anomaly_type].append(anomaly)
+        # Features e tipo de cada anomalia (frequências calculadas entre as próprias anomalias)
+        features_df = self.build_feature_frame(anomalies_df)
+        score_column = 'anomaly_score' if 'anomaly_score' in anomalies_df else 'score'
+        table = pd.DataFrame({
+            'type': self.classify_anomaly_types(features_df),
+            'score': pd.to_numeric(anomalies_df.get(score_column, 0), errors='coerce'),
+            'ip': anomalies_df['ip'],
+            'clientId': anomalies_df['clientId'],
+            'apiId': anomalies_df['apiId'],
+            'hour': features_df['hour']
+        }, index=anomalies_df.index).fillna({'score': 0})
+        
+        # Agregação por tipo (na ordem em que os tipos aparecem)
+        grouped = table.groupby('type', sort=False)
+        counts = grouped.size()
+        avg_scores = grouped['score'].mean()
+        common_ips = self._top_values(table, 'ip')
+        common_clients = self._top_values(table, 'clientId')
+        common_apis = self._top_values(table, 'apiId')
+        hour_counts = self._top_values(table, 'hour', limit=None)
         
-        # Analisa padrões por grupo
+        total = len(table)
         pattern_analysis = {}
-        for anomaly_type, group in type_groups.items():
+        for anomaly_type, count in counts.items():
+            hours = hour_counts[anomaly_type]
             pattern_analysis[anomaly_type] = {
-                'count': len(group),
-                'percentage': len(group) / len(anomalies) * 100,
-                'avg_score': np.mean([a.get('anomaly_score', 0) for a in group]),
-                'common_ips': Counter([a['ip'] for a in group]).most_common(3),
-                'common_clients': Counter([a['clientId'] for a in group]).most_common(3),
-                'common_apis': Counter([a['apiId'] for a in group]).most_common(3),
-                'time_distribution': self._analyze_time_distribution(group)
+                'count': int(count),
+                'percentage': int(count) / total * 100,
+                'avg_score': float(avg_scores[anomaly_type]),
+                'common_ips': common_ips[anomaly_type],
+                'common_clients': common_clients[anomaly_type],
+                'common_apis': common_apis[anomaly_type],
+                'time_distribution': {
+                    'peak_hours': hours[:3],
+                    'total_hours': len(hours),
+                    'hourly_distribution': dict(sorted(hours, key=lambda item: item[0]))
+                }
             }
         
         return pattern_analysis
     
-    def _analyze_time_distribution(self, anomalies: List[Dict]) -> Dict:
-        """Analisa distribuição temporal das anomalias"""
-        hours = []
-        for anomaly in anomalies:
-            timestamp = datetime.fromisoformat(anomaly['timestamp'].replace('Z', '+00:00'))
-            hours.append(timestamp.hour)
+    def _top_values(self, table: pd.DataFrame, column: str, limit: Optional[int] = 3) -> Dict[str, List[Tuple]]:
+        """
+        Valores mais comuns de uma coluna por tipo de anomalia
         
-        hour_counts = Counter(hours)
-        return {
-            'peak_hours': hour_counts.most_common(3),
-            'total_hours': len(set(hours)),
-            'hourly_distribution': dict(hour_counts)
-        }
+        Mesmo resultado de Counter.most_common: contagem decrescente e, em caso
+        de empate, ordem de primeira aparição.
+        """
+        counts = table.groupby(['type', column], sort=False, dropna=False).size()
+        top_values = {}
+        for anomaly_type, type_counts in counts.groupby(level=0, sort=False):
+            ordered = type_counts.sort_values(ascending=False, kind='stable')
+            if limit is not None:
+                ordered = ordered.head(limit)
+            top_values[anomaly_type] = [
+                (self._to_python(value), int(count))
+                for (_, value), count in ordered.items()
+            ]
+        return top_values
     
-    def train_description_model(self, training_data: List[Dict]) -> bool:
-        """Treina modelo de descrição com dados históricos"""
+    def _to_python(self, value):
+        """Converte valores do pandas/numpy para tipos serializáveis (NaN vira None)"""
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return None
+        return value.item() if isinstance(value, np.generic) else value
+    
+    def train_from_storage(self, max_samples: Optional[int] = None) -> Dict:
+        """
+        Treina o modelo de descrição com os logs armazenados
+        
+        As frequências vêm de agregações no banco (get_field_counts) e apenas a
+        amostra usada no ajuste é buscada ($sample), então o custo não cresce
+        com o total de logs.
+        
+        Args:
+            max_samples: Logs usados no ajuste (padrão: descriptions.training_max_samples)
+        
+        Returns:
+            Dict com logs_used (frequências) e samples_used, ou o erro
+        """
+        from .storage import get_field_counts, iter_logs, sample_logs
+        
+        if max_samples is None:
+            try:
+                from .config_manager import config_manager
+                max_samples = config_manager.get_config("descriptions").get("training_max_samples", 50000)
+            except Exception as e:
+                print(f"⚠️ Erro ao obter configurações de descrições: {e}")
+                max_samples = 50000
+        
+        field_counts = get_field_counts(list(FREQUENCY_FIELDS))
+        total = field_counts["total"]
+        if not total:
+            return {"error": "Nenhum log encontrado para treinamento"}
+        context = FrequencyContext.from_counts(total, field_counts["counts"])
+        
+        logs = iter_logs() if total <= max_samples else sample_logs(max_samples)
+        training_data = []
+        for log in logs:
+            log_data = log.dict()
+            log_data['timestamp'] = log.timestamp.isoformat()
+            training_data.append(log_data)
+        
+        if not self.train_description_model(training_data, context=context):
+            return {"error": "Erro ao treinar modelo de descrições"}
+        return {"logs_used": total, "samples_used": len(training_data)}
+    
+    def train_description_model(self, training_data: List[Dict], max_samples: Optional[int] = None,
+                                context: Optional[FrequencyContext] = None, save_models: bool = True) -> bool:
+        """
+        Treina modelo de descrição com dados históricos
+        
+        Args:
+            training_data: Logs de treino
+            max_samples: Limite de logs usados no ajuste (amostra aleatória);
+                as frequências continuam calculadas sobre todos os logs
+            context: Tabelas de frequência já calculadas (padrão: as dos logs de treino)
+            save_models: Se deve salvar os modelos treinados em models_dir
+        """
         try:
-            # Extrai features de todos os logs
-            all_features = []
-            for log in training_data:
-                features = self.extract_contextual_features(log, training_data)
-                all_features.append(features)
+            if not training_data:
+                return False
+            
+            # Tabelas de frequência de todos os logs (O(N))
+            if context is None:
+                context = self.build_context(training_data)
+            
+            # Amostra para o ajuste dos modelos
+            if max_samples and len(training_data) > max_samples:
+                rng = np.random.default_rng(42)
+                positions = np.sort(rng.choice(len(training_data), size=max_samples, replace=False))
+                training_data = [training_data[position] for position in positions]
             
-            # Converte para DataFrame
-            df = pd.DataFrame(all_features)
+            # Extrai features em lote
+            df = self.build_feature_frame(training_data, context)
             
             # Normaliza features
             scaled_features = self.scaler.fit_transform(df)
@@ -347,7 +805,8 @@ class AnomalyDescriptionML:
             self.cluster_model.fit(reduced_features)
             
             # Salva modelos treinados
-            self._save_models()
+            if save_models:
+                self._save_models()
             
             return True
             
@@ -0,0 +1,63 @@
+"""
+One-Class SVM aproximado para grandes volumes de treino
+O OCSVM do PyOD (libsvm) treina em tempo quadrático a cúbico no número de
+logs; aqui o kernel RBF é aproximado por Nystroem e o modelo de uma classe é
+linear (SGDOneClassSVM), com treino linear no número de logs e pontuação por
+uma multiplicação de matrizes sobre o kernel dos componentes
+"""
+
+import numpy as np
+from pyod.models.base import BaseDetector
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import SGDOneClassSVM
+from sklearn.metrics.pairwise import rbf_kernel
+from sklearn.utils import check_array
+from sklearn.utils.validation import check_is_fitted
+
+class ApproxOCSVM(BaseDetector):
+    """
+    One-Class SVM com kernel RBF aproximado (interface de detector do PyOD)
+    
+    Args:
+        n_components: Componentes do Nystroem (logs de treino usados como base do kernel)
+        gamma: Coeficiente do kernel RBF ('auto' = 1 / número de características, como no OCSVM)
+        nu: Limite superior da fração de erros de treino (padrão do OCSVM: 0.5)
+        contamination: Fração esperada de anomalias (define threshold_)
+        max_iter: Épocas do SGD
+        random_state: Semente do Nystroem e do SGD
+    """
+    
+    def __init__(self, n_components: int = 100, gamma='auto', nu: float = 0.5, contamination: float = 0.1,
+                 max_iter: int = 50, random_state: int = None):
+        super().__init__(contamination=contamination)
+        self.n_components = n_components
+        self.gamma = gamma
+        self.nu = nu
+        self.max_iter = max_iter
+        self.random_state = random_state
+    
+    def fit(self, X, y=None):
+        """Ajusta o Nystroem e o modelo linear de uma classe"""
+        X = check_array(X)
+        self._set_n_classes(y)
+        
+        self.gamma_ = 1.0 / X.shape[1] if self.gamma == 'auto' else float(self.gamma)
+        nystroem = Nystroem(kernel='rbf', gamma=self.gamma_, n_components=min(self.n_components, len(X)),
+                            random_state=self.random_state).fit(X)
+        linear = SGDOneClassSVM(nu=self.nu, max_iter=self.max_iter, tol=None,
+                                random_state=self.random_state).fit(nystroem.transform(X))
+        
+        # Normalização do Nystroem e pesos do modelo linear em um único vetor
+        self.components_ = nystroem.components_
+        self.weights_ = nystroem.normalization_.T @ linear.coef_
+        self.offset_ = float(np.ravel(linear.offset_)[0])
+        
+        self.decision_scores_ = self.decision_function(X)
+        self._process_decision_scores()
+        return self
+    
+    def decision_function(self, X):
+        """Score de anomalia (maior = mais anômalo), o oposto do decision_function do SGDOneClassSVM"""
+        check_is_fitted(self, ['components_', 'weights_'])
+        X = check_array(X)
+        return self.offset_ - rbf_kernel(X, self.components_, gamma=self.gamma_) @ self.weights_
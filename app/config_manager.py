@@ -3,24 +3,42 @@ Gerenciador de Configurações do Sistema
 Permite ajustar parâmetros como threshold de detecção de anomalias
 """
 
+import copy
 import json
 import os
+import threading
+import time
 from datetime import datetime
 from typing import Dict, Any, Optional
-from pymongo import MongoClient
+from pymongo import ReturnDocument
+from .connection_manager import connection_manager
+from .executors import run_blocking_io
+
+# Banco usado pelas configurações antes do pool compartilhado (migrado uma vez na inicialização)
+LEGACY_CONFIG_DB_NAME = os.getenv("LEGACY_CONFIG_DB_NAME", "api_logs")
 
 class ConfigManager:
-    def __init__(self):
-        self.client = MongoClient('mongodb://localhost:27017/')
-        self.db = self.client['api_logs']
+    def __init__(self, poll_interval_seconds: float = 5.0):
+        self.client = connection_manager.get_client("analytics")
+        self.db = connection_manager.get_database("analytics")
         self.config_collection = self.db.config
         
+        # Cache em memória das configurações
+        # A revisão é incrementada a cada escrita; outros processos detectam
+        # mudanças consultando apenas esse campo a cada poll_interval_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self._cache_lock = threading.Lock()
+        self._cached_config = None
+        self._cached_revision = None
+        self._last_poll = 0.0
+        
         # Configurações padrão
         self.default_config = {
             "ml_detection": {
                 "threshold": 0.12,
                 "contamination": 0.1,
-                "model_preference": "iforest"
+                "model_preference": "iforest",
+                "training_models": ["iforest", "lof", "knn", "ocsvm_approx", "cblof"]
             },
             "feedback": {
                 "auto_retrain": True,
@@ -36,6 +54,39 @@ class ConfigManager:
                 "theme": "light",
                 "language": "pt-BR",
                 "refresh_interval_seconds": 30
+            },
+            "descriptions": {
+                "context_window_hours": 24,
+                "context_refresh_seconds": 300,
+                "training_max_samples": 50000
+            },
+            "streaming": {
+                "enabled": False,
+                "model_name": "iforest",
+                "batch_size": 500,
+                "flush_interval_ms": 500,
+                "max_queue": 100000
+            },
+            "reference_sets": {
+                "max_size": 0,
+                "method": "stratified",
+                "models": ["knn"]
+            },
+            "training_sampling": {
+                "enabled": True,
+                "max_logs": 100000,
+                "max_per_stratum": 10000,
+                "strata": ["apiId", "clientId", "status_class"]
+            },
+            "incremental_training": {
+                "new_trees": 20,
+                "max_trees": 300,
+                "min_new_logs": 256,
+                "full_rebuild_every": 24,
+                "full_rebuild_hours": 168
+            },
+            "detection_store": {
+                "ingest_grace_minutes": 10
             }
         }
         
@@ -46,19 +97,134 @@ class ConfigManager:
         """Inicializa configurações padrão se não existirem"""
         try:
             existing_config = self.config_collection.find_one({"config_type": "system"})
+            if not existing_config and self._migrate_legacy_config():
+                return
             if not existing_config:
                 config_doc = {
                     "config_type": "system",
                     "config": self.default_config,
                     "created_at": datetime.now(),
                     "updated_at": datetime.now(),
-                    "version": "1.0"
+                    "version": "1.0",
+                    "revision": 1
                 }
                 self.config_collection.insert_one(config_doc)
                 print("✅ Configurações padrão inicializadas")
         except Exception as e:
             print(f"❌ Erro ao inicializar configurações: {e}")
     
+    def _migrate_legacy_config(self) -> bool:
+        """
+        Copia as configurações do banco antigo (LEGACY_CONFIG_DB_NAME) para o atual
+        
+        Instalações anteriores ao pool compartilhado guardavam as configurações
+        em outro banco; sem a cópia, os valores ajustados voltariam ao padrão.
+        O documento antigo é mantido.
+        
+        Returns:
+            True se as configurações foram copiadas
+        """
+        if LEGACY_CONFIG_DB_NAME == self.db.name:
+            return False
+        legacy_doc = self.client[LEGACY_CONFIG_DB_NAME].config.find_one({"config_type": "system"})
+        if not legacy_doc:
+            return False
+        
+        legacy_doc.pop("_id", None)
+        # Seções e chaves novas ainda não existiam no banco antigo
+        config = copy.deepcopy(self.default_config)
+        for section, values in legacy_doc.get("config", {}).items():
+            if isinstance(values, dict) and isinstance(config.get(section), dict):
+                config[section].update(values)
+            else:
+                config[section] = values
+        legacy_doc["config"] = config
+        legacy_doc["revision"] = legacy_doc.get("revision", 0) + 1
+        legacy_doc["migrated_from"] = LEGACY_CONFIG_DB_NAME
+        legacy_doc["updated_at"] = datetime.now()
+        self.config_collection.insert_one(legacy_doc)
+        print(f"✅ Configurações migradas do banco '{LEGACY_CONFIG_DB_NAME}' para '{self.db.name}'")
+        return True
+    
+    def _load_config_doc(self) -> Optional[Dict[str, Any]]:
+        """Lê o documento de configuração do banco e atualiza o cache"""
+        config_doc = self.config_collection.find_one({"config_type": "system"})
+        with self._cache_lock:
+            if config_doc:
+                self._cached_config = config_doc.get("config", self.default_config)
+                self._cached_revision = config_doc.get("revision", 0)
+            else:
+                self._cached_config = None
+                self._cached_revision = None
+            self._last_poll = time.monotonic()
+        return config_doc
+    
+    def _refresh_cache_if_stale(self):
+        """
+        Revalida o cache consultando apenas a revisão no banco
+        
+        A consulta é feita no máximo uma vez a cada poll_interval_seconds;
+        o documento completo só é relido quando a revisão mudou.
+        """
+        if self._cached_config is not None and time.monotonic() - self._last_poll < self.poll_interval_seconds:
+            return
+        
+        try:
+            revision_doc = self.config_collection.find_one({"config_type": "system"}, {"revision": 1})
+        except Exception as e:
+            if self._cached_config is None:
+                raise
+            # Banco indisponível: manter o cache atual até a próxima tentativa
+            print(f"⚠️ Erro ao verificar revisão das configurações, usando cache: {e}")
+            with self._cache_lock:
+                self._last_poll = time.monotonic()
+            return
+        
+        remote_revision = revision_doc.get("revision", 0) if revision_doc else None
+        
+        if self._cached_config is None or remote_revision != self._cached_revision:
+            self._load_config_doc()
+        else:
+            with self._cache_lock:
+                self._last_poll = time.monotonic()
+    
+    def _save_config(self, config: Dict[str, Any]):
+        """Persiste a configuração, incrementa a revisão e atualiza o cache local"""
+        updated_doc = self.config_collection.find_one_and_update(
+            {"config_type": "system"},
+            {
+                "$set": {
+                    "config": config,
+                    "updated_at": datetime.now()
+                },
+                "$inc": {"revision": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        with self._cache_lock:
+            self._cached_config = config
+            self._cached_revision = updated_doc.get("revision", 0) if updated_doc else None
+            self._last_poll = time.monotonic()
+    
+    def _build_default_doc(self, current_doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Monta o documento padrão usado no reset completo, com a próxima revisão"""
+        # replace_one não aceita $inc, então a próxima revisão é calculada aqui
+        revision = (current_doc.get("revision", 0) if current_doc else 0) + 1
+        return {
+            "config_type": "system",
+            "config": copy.deepcopy(self.default_config),
+            "updated_at": datetime.now(),
+            "version": "1.0",
+            "revision": revision
+        }
+    
+    def invalidate_cache(self):
+        """Descarta o cache local, forçando releitura na próxima consulta"""
+        with self._cache_lock:
+            self._cached_config = None
+            self._cached_revision = None
+            self._last_poll = 0.0
+    
     def get_config(self, section: str = None) -> Dict[str, Any]:
         """
         Obtém configurações do sistema
@@ -70,20 +236,19 @@ class ConfigManager:
             Dict com configurações
         """
         try:
-            config_doc = self.config_collection.find_one({"config_type": "system"})
-            if not config_doc:
-                return self.default_config
-            
-            config = config_doc.get("config", self.default_config)
+            self._refresh_cache_if_stale()
+            config = self._cached_config
+            if config is None:
+                return copy.deepcopy(self.default_config)
             
             if section:
-                return config.get(section, {})
+                return copy.deepcopy(config.get(section, {}))
             
-            return config
+            return copy.deepcopy(config)
             
         except Exception as e:
             print(f"❌ Erro ao obter configurações: {e}")
-            return self.default_config if not section else {}
+            return copy.deepcopy(self.default_config) if not section else {}
     
     def update_config(self, section: str, key: str, value: Any) -> Dict[str, Any]:
         """
@@ -111,16 +276,8 @@ class ConfigManager:
             
             config[section][key] = value
             
-            # Salvar no banco
-            self.config_collection.update_one(
-                {"config_type": "system"},
-                {
-                    "$set": {
-                        "config": config,
-                        "updated_at": datetime.now()
-                    }
-                }
-            )
+            # Salvar no banco (incrementa a revisão e atualiza o cache)
+            self._save_config(config)
             
             return {
                 "success": True,
@@ -153,16 +310,8 @@ class ConfigManager:
             # Atualizar seção
             config[section] = section_config
             
-            # Salvar no banco
-            self.config_collection.update_one(
-                {"config_type": "system"},
-                {
-                    "$set": {
-                        "config": config,
-                        "updated_at": datetime.now()
-                    }
-                }
-            )
+            # Salvar no banco (incrementa a revisão e atualiza o cache)
+            self._save_config(config)
             
             return {
                 "success": True,
@@ -192,17 +341,9 @@ class ConfigManager:
                 
                 config = config_doc.get("config", self.default_config)
                 if section in self.default_config:
-                    config[section] = self.default_config[section]
+                    config[section] = copy.deepcopy(self.default_config[section])
                 
-                self.config_collection.update_one(
-                    {"config_type": "system"},
-                    {
-                        "$set": {
-                            "config": config,
-                            "updated_at": datetime.now()
-                        }
-                    }
-                )
+                self._save_config(config)
                 
                 return {
                     "success": True,
@@ -211,17 +352,16 @@ class ConfigManager:
                 }
             else:
                 # Resetar todas as configurações
-                config_doc = {
-                    "config_type": "system",
-                    "config": self.default_config,
-                    "updated_at": datetime.now(),
-                    "version": "1.0"
-                }
+                # replace_one não aceita $inc, então a próxima revisão é calculada aqui
+                current_doc = self.config_collection.find_one({"config_type": "system"}, {"revision": 1})
+                config_doc = self._build_default_doc(current_doc)
                 
                 self.config_collection.replace_one(
                     {"config_type": "system"},
-                    config_doc
+                    config_doc,
+                    upsert=True
                 )
+                self.invalidate_cache()
                 
                 return {
                     "success": True,
@@ -254,6 +394,7 @@ class ConfigManager:
                 "history": [{
                     "timestamp": config_doc.get("updated_at", datetime.now()).isoformat(),
                     "version": config_doc.get("version", "1.0"),
+                    "revision": config_doc.get("revision", 0),
                     "config": config_doc.get("config", {})
                 }]
             }
@@ -261,5 +402,27 @@ class ConfigManager:
         except Exception as e:
             return {"error": f"Erro ao obter histórico: {str(e)}"}
 
+    # Versões assíncronas, usadas pelos endpoints async: o mesmo código síncrono no pool de threads de I/O
+    
+    async def get_config_async(self, section: str = None) -> Dict[str, Any]:
+        """Versão assíncrona de get_config"""
+        return await run_blocking_io(self.get_config, section)
+    
+    async def update_config_async(self, section: str, key: str, value: Any) -> Dict[str, Any]:
+        """Versão assíncrona de update_config"""
+        return await run_blocking_io(self.update_config, section, key, value)
+    
+    async def update_section_async(self, section: str, section_config: Dict[str, Any]) -> Dict[str, Any]:
+        """Versão assíncrona de update_section"""
+        return await run_blocking_io(self.update_section, section, section_config)
+    
+    async def reset_to_default_async(self, section: str = None) -> Dict[str, Any]:
+        """Versão assíncrona de reset_to_default"""
+        return await run_blocking_io(self.reset_to_default, section)
+    
+    async def get_config_history_async(self, limit: int = 10) -> Dict[str, Any]:
+        """Versão assíncrona de get_config_history"""
+        return await run_blocking_io(self.get_config_history, limit)
+
 # Instância global
 config_manager = ConfigManager() 
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Gerenciador centralizado de conexões com o MongoDB
+Mantém um pool de conexões compartilhado por perfil de carga (ingestão x análise)
+e expõe métricas de espera no checkout de conexões
+"""
+
+import os
+import threading
+from typing import Dict, Any, Optional
+from pymongo import MongoClient, monitoring
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "api_logs_db")
+
+# Perfis padrão por tipo de carga
+# - ingest: muitas escritas curtas (POST /logs), pool grande e timeouts curtos
+# - analytics: leituras longas (detecção, treinamento, feedback, configurações)
+DEFAULT_WORKLOAD_PROFILES = {
+    "ingest": {
+        "maxPoolSize": 100,
+        "minPoolSize": 10,
+        "maxIdleTimeMS": 60000,
+        "waitQueueTimeoutMS": 2000,
+        "connectTimeoutMS": 2000,
+        "socketTimeoutMS": 5000,
+        "serverSelectionTimeoutMS": 5000,
+        "compressors": "",
+        "w": 1,
+        "journal": False
+    },
+    "analytics": {
+        "maxPoolSize": 20,
+        "minPoolSize": 0,
+        "maxIdleTimeMS": 300000,
+        "waitQueueTimeoutMS": 30000,
+        "connectTimeoutMS": 5000,
+        "socketTimeoutMS": 120000,
+        "serverSelectionTimeoutMS": 10000,
+        "compressors": "zlib",
+        "w": "majority",
+        "journal": True
+    }
+}
+
+# Limites dos buckets do histograma de espera no checkout (em milissegundos)
+WAIT_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000]
+
+def _parse_env_value(raw: str, default: Any) -> Any:
+    """Converte o valor de uma variável de ambiente para o tipo do valor padrão"""
+    if isinstance(default, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int) or (default is not None and raw.strip().isdigit()):
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    return raw
+
+def _load_profile(workload: str) -> Dict[str, Any]:
+    """
+    Monta o perfil de um tipo de carga aplicando overrides de ambiente
+    
+    Ex: MONGO_INGEST_MAXPOOLSIZE=200, MONGO_ANALYTICS_W=1, MONGO_ANALYTICS_COMPRESSORS=zstd,zlib
+    """
+    profile = dict(DEFAULT_WORKLOAD_PROFILES.get(workload, DEFAULT_WORKLOAD_PROFILES["analytics"]))
+    prefix = f"MONGO_{workload.upper()}_"
+    for option, default in list(profile.items()):
+        raw = os.getenv(prefix + option.upper())
+        if raw is not None:
+            profile[option] = _parse_env_value(raw, default)
+    return profile
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Coleta métricas do pool de conexões (checkouts, falhas e tempo de espera)"""
+    
+    def __init__(self, workload: str):
+        self.workload = workload
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Zera as métricas acumuladas"""
+        with self._lock:
+            self.checkouts_started = 0
+            self.checkouts = 0
+            self.checkout_failures = {}
+            self.checked_in = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.pool_cleared = 0
+            self.wait_total_seconds = 0.0
+            self.wait_max_seconds = 0.0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+    
+    def _record_wait(self, duration: Optional[float]):
+        if duration is None:
+            return
+        self.wait_total_seconds += duration
+        self.wait_max_seconds = max(self.wait_max_seconds, duration)
+        duration_ms = duration * 1000
+        for i, limit in enumerate(WAIT_BUCKETS_MS):
+            if duration_ms <= limit:
+                self.wait_buckets[i] += 1
+                return
+        self.wait_buckets[-1] += 1
+    
+    # Eventos do pool
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_cleared += 1
+    
+    def pool_closed(self, event):
+        pass
+    
+    # Eventos de conexão
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+    
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.checkouts_started += 1
+    
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            reason = str(getattr(event, "reason", "unknown"))
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+            self._record_wait(getattr(event, "duration", None))
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self._record_wait(getattr(event, "duration", None))
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_in += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Retorna uma cópia das métricas atuais"""
+        with self._lock:
+            timed = sum(self.wait_buckets)
+            buckets = {f"le_{limit}ms": count for limit, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            buckets["gt_{}ms".format(WAIT_BUCKETS_MS[-1])] = self.wait_buckets[-1]
+            return {
+                "checkouts_started": self.checkouts_started,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "connections_in_use": self.checkouts - self.checked_in,
+                "connections_open": self.connections_created - self.connections_closed,
+                "connections_created": self.connections_created,
+                "pool_cleared": self.pool_cleared,
+                "wait_avg_ms": round(self.wait_total_seconds / timed * 1000, 3) if timed else 0.0,
+                "wait_max_ms": round(self.wait_max_seconds * 1000, 3),
+                "wait_histogram": buckets
+            }
+
+class ConnectionManager:
+    """Cria e compartilha clientes MongoDB por tipo de carga"""
+    
+    def __init__(self, uri: str = MONGO_URI, db_name: str = MONGO_DB_NAME):
+        self.uri = uri
+        self.db_name = db_name
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._clients: Dict[str, MongoClient] = {}
+        self._listeners: Dict[str, PoolMetricsListener] = {}
+    
+    def get_profile(self, workload: str) -> Dict[str, Any]:
+        """Retorna o perfil efetivo de um tipo de carga"""
+        if workload not in self._profiles:
+            self._profiles[workload] = _load_profile(workload)
+        return dict(self._profiles[workload])
+    
+    def configure_workload(self, workload: str, **options) -> Dict[str, Any]:
+        """
+        Ajusta o perfil de um tipo de carga
+        
+        Deve ser chamado antes do primeiro uso do cliente; se o cliente já
+        existir ele é fechado e recriado com as novas opções na próxima chamada.
+        """
+        with self._lock:
+            profile = self.get_profile(workload)
+            profile.update(options)
+            self._profiles[workload] = profile
+            client = self._clients.pop(workload, None)
+            if client is not None:
+                client.close()
+        return dict(profile)
+    
+    def _build_client_kwargs(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        kwargs = {key: value for key, value in profile.items()
+                  if key not in ("compressors", "journal") and value is not None}
+        max_pool_size = kwargs.get("maxPoolSize")
+        if max_pool_size and kwargs.get("minPoolSize", 0) > max_pool_size:
+            kwargs["minPoolSize"] = max_pool_size
+        if profile.get("compressors"):
+            kwargs["compressors"] = profile["compressors"]
+        if profile.get("journal") is not None and profile.get("w") != 0:
+            kwargs["journal"] = profile["journal"]
+        return kwargs
+    
+    def get_client(self, workload: str = "analytics") -> MongoClient:
+        """Retorna o cliente compartilhado (e seu pool) para o tipo de carga"""
+        client = self._clients.get(workload)
+        if client is not None:
+            return client
+        
+        with self._lock:
+            if workload not in self._clients:
+                profile = self.get_profile(workload)
+                listener = self._listeners.setdefault(workload, PoolMetricsListener(workload))
+                self._clients[workload] = MongoClient(
+                    self.uri,
+                    event_listeners=[listener],
+                    appname=f"api-log-analyzer-{workload}",
+                    **self._build_client_kwargs(profile)
+                )
+            return self._clients[workload]
+    
+    def get_database(self, workload: str = "analytics") -> Database:
+        """Retorna o banco da aplicação usando o pool do tipo de carga"""
+        return self.get_client(workload)[self.db_name]
+    
+    def get_collection(self, name: str, workload: str = "analytics") -> Collection:
+        """Retorna uma coleção usando o pool do tipo de carga"""
+        return self.get_database(workload)[name]
+    
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """Retorna métricas de checkout de conexões por tipo de carga"""
+        metrics = {}
+        for workload, listener in self._listeners.items():
+            profile = self.get_profile(workload)
+            metrics[workload] = {
+                "max_pool_size": profile.get("maxPoolSize"),
+                "min_pool_size": profile.get("minPoolSize"),
+                "wait_queue_timeout_ms": profile.get("waitQueueTimeoutMS"),
+                **listener.snapshot()
+            }
+        return {
+            "database": self.db_name,
+            "workloads": metrics
+        }
+    
+    def reset_pool_metrics(self):
+        """Zera as métricas de todos os pools"""
+        for listener in self._listeners.values():
+            listener.reset()
+    
+    def close_all(self):
+        """Fecha todos os clientes abertos"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+# Instância global
+connection_manager = ConnectionManager()
+
+def get_database(workload: str = "analytics") -> Database:
+    """Retorna o banco da aplicação para o tipo de carga"""
+    return connection_manager.get_database(workload)
+
+def get_collection(name: str, workload: str = "analytics") -> Collection:
+    """Retorna uma coleção da aplicação para o tipo de carga"""
+    return connection_manager.get_collection(name, workload)
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """Retorna métricas dos pools de conexão"""
+    return connection_manager.get_pool_metrics()
@@ -1,12 +1,21 @@
-from pymongo import MongoClient
 from pymongo.collection import Collection
+from .connection_manager import connection_manager
 
-client = MongoClient("mongodb://localhost:27017")
-db = client["api_logs_db"]
+# Pool de ingestão: escritas curtas e frequentes (POST /logs)
+client = connection_manager.get_client("ingest")
+db = connection_manager.get_database("ingest")
 logs_collection: Collection = db["logs"]
 
-# Índices recomendados
-logs_collection.create_index("timestamp")
-logs_collection.create_index("apiId")
-logs_collection.create_index("clientId")
-logs_collection.create_index("status")
+# Pool de análise: leituras longas (detecção, treinamento, feedback)
+analytics_client = connection_manager.get_client("analytics")
+analytics_db = connection_manager.get_database("analytics")
+logs_read_collection: Collection = analytics_db["logs"]
+
+# Índices recomendados (sem MongoDB disponível o import continua; as operações falham depois)
+try:
+    logs_collection.create_index("timestamp")
+    logs_collection.create_index("apiId")
+    logs_collection.create_index("clientId")
+    logs_collection.create_index("status")
+except Exception as e:
+    print(f"⚠️ Erro ao criar índices dos logs: {e}")
@@ -0,0 +1,380 @@
+"""
+Armazenamento de anomalias detectadas e rollups temporais
+Mantém contagens e somas de score pré-agregadas em buckets de 1m, 5m e 1h
+para que a timeline seja montada sem repontuar os logs
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from pymongo import ASCENDING, UpdateOne
+from .connection_manager import connection_manager
+
+# Resoluções disponíveis (em minutos) e tempo de retenção de cada uma
+ROLLUP_RESOLUTIONS = {
+    1: timedelta(days=7),
+    5: timedelta(days=30),
+    60: timedelta(days=180)
+}
+# Retenção dos documentos individuais de anomalias (detalhes da timeline)
+DETECTION_RETENTION = timedelta(days=30)
+# Chave de cobertura usada quando a detecção considera todas as APIs
+ALL_APIS = "*"
+# Os logs chegam com o timestamp do cliente e podem chegar atrasados: os
+# últimos ingest_grace_minutes antes de agora nunca são marcados como cobertos
+DEFAULT_DETECTION_STORE_CONFIG = {
+    "ingest_grace_minutes": 10
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+def floor_to_interval(timestamp: datetime, interval_minutes: int) -> datetime:
+    """
+    Arredonda um timestamp para o início do intervalo (alinhado à época)
+    
+    Funciona para qualquer intervalo, inclusive maiores que 60 minutos.
+    """
+    interval_seconds = interval_minutes * 60
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=None) - (timestamp.utcoffset() or timedelta(0))
+    seconds = int((timestamp - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % interval_seconds)
+
+def get_detection_store_config() -> Dict:
+    """Seção "detection_store" das configurações completada com os valores padrão"""
+    try:
+        from .config_manager import config_manager
+        return {**DEFAULT_DETECTION_STORE_CONFIG, **config_manager.get_config("detection_store")}
+    except Exception as e:
+        print(f"⚠️ Erro ao obter configurações do armazenamento de detecções: {e}")
+        return dict(DEFAULT_DETECTION_STORE_CONFIG)
+
+def scoring_retention(resolution: Optional[int] = None) -> timedelta:
+    """
+    Período que pode ser pontuado e registrado como coberto
+    
+    Anomalias mais antigas que a retenção das detecções não têm documento para
+    evitar contagem em dobro, então não entram nos rollups; com uma resolução,
+    vale também a retenção dos rollups dela (o que expirou não é mais lido).
+    """
+    if resolution is None:
+        return DETECTION_RETENTION
+    return min(DETECTION_RETENTION, ROLLUP_RESOLUTIONS[resolution])
+
+def pick_resolution(interval_minutes: int) -> int:
+    """Escolhe a resolução de rollup mais grossa que divide o intervalo pedido"""
+    for resolution in sorted(ROLLUP_RESOLUTIONS, reverse=True):
+        if interval_minutes % resolution == 0:
+            return resolution
+    return min(ROLLUP_RESOLUTIONS)
+
+class DetectionStore:
+    """Persiste anomalias detectadas e mantém os rollups por modelo e API"""
+    
+    def __init__(self):
+        self.db = connection_manager.get_database("analytics")
+        self.detections_collection = self.db.detected_anomalies
+        self.rollups_collection = self.db.anomaly_rollups
+        self.coverage_collection = self.db.detection_coverage
+        self._lock = threading.Lock()
+        self._create_indexes()
+    
+    def _create_indexes(self):
+        """Cria índices de consulta e de expiração (TTL)"""
+        try:
+            self.detections_collection.create_index(
+                [("model_name", ASCENDING), ("apiId", ASCENDING), ("timestamp", ASCENDING)])
+            self.detections_collection.create_index("expires_at", expireAfterSeconds=0)
+            self.rollups_collection.create_index(
+                [("model_name", ASCENDING), ("resolution", ASCENDING), ("apiId", ASCENDING), ("bucket", ASCENDING)])
+            self.rollups_collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            print(f"⚠️ Erro ao criar índices do armazenamento de detecções: {e}")
+    
+    # Geração: versão do modelo + threshold usados nas detecções armazenadas
+    
+    def _ensure_generation(self, model_name: str, model_version: str, threshold: float) -> bool:
+        """
+        Garante que os dados armazenados correspondem à versão do modelo e ao threshold
+        
+        Se o modelo foi retreinado ou o threshold mudou, as detecções, rollups e
+        coberturas antigas do modelo são descartadas.
+        
+        Returns:
+            True se os dados armazenados foram descartados
+        """
+        generation_id = f"generation:{model_name}"
+        with self._lock:
+            current = self.coverage_collection.find_one({"_id": generation_id})
+            if current and current.get("model_version") == model_version and current.get("threshold") == threshold:
+                return False
+            
+            if current:
+                print(f"🔄 Modelo {model_name} mudou (versão ou threshold); descartando rollups antigos")
+            self.detections_collection.delete_many({"model_name": model_name})
+            self.rollups_collection.delete_many({"model_name": model_name})
+            self.coverage_collection.delete_many({"model_name": model_name})
+            self.coverage_collection.replace_one(
+                {"_id": generation_id},
+                {
+                    "_id": generation_id,
+                    "model_version": model_version,
+                    "threshold": threshold,
+                    "updated_at": datetime.now()
+                },
+                upsert=True
+            )
+            return True
+    
+    # Escrita
+    
+    def record_detections(self, model_name: str, anomalies: List[Dict], model_version: str,
+                          threshold: float, apiId: str = None,
+                          window: Optional[Tuple[datetime, datetime]] = None) -> Dict:
+        """
+        Registra anomalias detectadas e atualiza os rollups
+        
+        Cada anomalia é gravada uma única vez por modelo ($setOnInsert); apenas as
+        novas incrementam os rollups, então repontuar o mesmo período não duplica
+        contagens. Anomalias mais antigas que DETECTION_RETENTION são ignoradas:
+        o documento delas expiraria logo em seguida e a próxima pontuação as
+        contaria de novo.
+        
+        Args:
+            model_name: Nome do modelo usado
+            anomalies: Anomalias no formato retornado por detect_anomalies
+            model_version: Versão do modelo (data do último treinamento completo;
+                atualizações incrementais não descartam as detecções)
+            threshold: Threshold usado na detecção
+            apiId: API analisada (None para todas)
+            window: Período (início, fim) analisado; estende a cobertura registrada
+                até no máximo agora - ingest_grace_minutes, para que logs que
+                chegam atrasados nesse trecho ainda sejam pontuados
+        
+        Returns:
+            Dict com quantidade de anomalias novas
+        """
+        self._ensure_generation(model_name, model_version, threshold)
+        
+        now = datetime.now()
+        oldest = now - DETECTION_RETENTION
+        operations = []
+        kept = []
+        for anomaly in anomalies:
+            timestamp = anomaly["timestamp"]
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.replace(tzinfo=None) - (timestamp.utcoffset() or timedelta(0))
+            if timestamp < oldest:
+                continue
+            
+            kept.append(anomaly)
+            operations.append(UpdateOne(
+                {"_id": f"{model_name}:{anomaly['requestId']}"},
+                {"$setOnInsert": {
+                    "model_name": model_name,
+                    "requestId": anomaly["requestId"],
+                    "apiId": anomaly.get("apiId"),
+                    "clientId": anomaly.get("clientId"),
+                    "ip": anomaly.get("ip"),
+                    "method": anomaly.get("method"),
+                    "path": anomaly.get("path"),
+                    "status": anomaly.get("status"),
+                    "timestamp": timestamp,
+                    "score": float(anomaly["anomaly_score"]),
+                    "description": anomaly.get("anomaly_description", ""),
+                    "detected_at": now,
+                    "expires_at": timestamp + DETECTION_RETENTION
+                }},
+                upsert=True
+            ))
+        
+        new_anomalies = []
+        if operations:
+            result = self.detections_collection.bulk_write(operations, ordered=False)
+            # Índices das operações que inseriram um documento novo
+            new_anomalies = [kept[index] for index in (result.upserted_ids or {})]
+        
+        self._update_rollups(model_name, new_anomalies)
+        
+        if window is not None:
+            grace = timedelta(minutes=get_detection_store_config()["ingest_grace_minutes"])
+            covered_start = max(window[0], oldest)
+            covered_end = min(window[1], now - grace)
+            if covered_start < covered_end:
+                self._extend_coverage(model_name, apiId, (covered_start, covered_end))
+        
+        return {"recorded": len(kept), "new": len(new_anomalies), "expired": len(anomalies) - len(kept)}
+    
+    def _update_rollups(self, model_name: str, anomalies: List[Dict]):
+        """Incrementa os rollups de todas as resoluções para as anomalias novas"""
+        increments = {}
+        for anomaly in anomalies:
+            timestamp = anomaly["timestamp"]
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            score = float(anomaly["anomaly_score"])
+            api_id = anomaly.get("apiId")
+            
+            for resolution in ROLLUP_RESOLUTIONS:
+                bucket = floor_to_interval(timestamp, resolution)
+                key = (resolution, api_id, bucket)
+                entry = increments.setdefault(key, {"count": 0, "score_sum": 0.0, "score_max": score})
+                entry["count"] += 1
+                entry["score_sum"] += score
+                entry["score_max"] = max(entry["score_max"], score)
+        
+        if not increments:
+            return
+        
+        operations = []
+        for (resolution, api_id, bucket), entry in increments.items():
+            bucket_epoch = int((bucket - _EPOCH).total_seconds())
+            operations.append(UpdateOne(
+                {"_id": f"{model_name}:{resolution}:{api_id}:{bucket_epoch}"},
+                {
+                    "$inc": {"anomaly_count": entry["count"], "score_sum": entry["score_sum"]},
+                    "$max": {"score_max": entry["score_max"]},
+                    "$setOnInsert": {
+                        "model_name": model_name,
+                        "resolution": resolution,
+                        "apiId": api_id,
+                        "bucket": bucket,
+                        "expires_at": bucket + ROLLUP_RESOLUTIONS[resolution]
+                    }
+                },
+                upsert=True
+            ))
+        self.rollups_collection.bulk_write(operations, ordered=False)
+    
+    # Cobertura: período já pontuado por (modelo, API)
+    
+    def _coverage_id(self, model_name: str, apiId: Optional[str]) -> str:
+        return f"coverage:{model_name}:{apiId or ALL_APIS}"
+    
+    def _extend_coverage(self, model_name: str, apiId: Optional[str], window: Tuple[datetime, datetime]):
+        """Estende o período coberto se ele for contíguo ao já registrado"""
+        start, end = window
+        coverage_id = self._coverage_id(model_name, apiId)
+        current = self.coverage_collection.find_one({"_id": coverage_id})
+        
+        if current and (start > current["covered_until"] or end < current["covered_from"]):
+            # Janela desconexa: a cobertura só vale para períodos contínuos
+            if end < current["covered_until"]:
+                return
+            self.coverage_collection.delete_one({"_id": coverage_id})
+        
+        self.coverage_collection.update_one(
+            {"_id": coverage_id},
+            {
+                "$min": {"covered_from": start},
+                "$max": {"covered_until": end},
+                "$set": {"model_name": model_name, "apiId": apiId or ALL_APIS}
+            },
+            upsert=True
+        )
+    
+    def get_missing_windows(self, model_name: str, model_version: str, threshold: float,
+                            apiId: Optional[str], start: datetime, end: datetime,
+                            resolution: Optional[int] = None) -> List[Tuple[datetime, datetime]]:
+        """
+        Retorna os períodos de [start, end] que ainda não foram pontuados
+        
+        Considera a retenção (ver scoring_retention): períodos mais antigos que
+        ela não contam como cobertos e também não são devolvidos, já que
+        pontuá-los não registraria nada.
+        
+        Args:
+            resolution: Resolução dos rollups que serão lidos (None quando só as
+                anomalias armazenadas são lidas)
+        """
+        self._ensure_generation(model_name, model_version, threshold)
+        
+        oldest = datetime.now() - scoring_retention(resolution)
+        start = max(start, oldest)
+        if start >= end:
+            return []
+        
+        coverage = self.coverage_collection.find_one({"_id": self._coverage_id(model_name, apiId)})
+        if not coverage:
+            return [(start, end)]
+        
+        covered_from = max(coverage["covered_from"], oldest)
+        covered_until = coverage["covered_until"]
+        
+        missing = []
+        if start < covered_from:
+            missing.append((start, min(covered_from, end)))
+        if end > covered_until:
+            missing.append((max(covered_until, start), end))
+        return [(s, e) for s, e in missing if s < e]
+    
+    # Leitura
+    
+    def get_rollups(self, model_name: str, start: datetime, end: datetime,
+                    interval_minutes: int, apiId: str = None) -> List[Dict]:
+        """
+        Agrega os rollups no intervalo pedido
+        
+        Usa a resolução mais grossa que divide o intervalo e soma os buckets
+        que caem em cada intervalo.
+        
+        Returns:
+            Lista de intervalos ordenada por timestamp
+        """
+        resolution = pick_resolution(interval_minutes)
+        query = {
+            "model_name": model_name,
+            "resolution": resolution,
+            "bucket": {"$gte": floor_to_interval(start, resolution), "$lte": end}
+        }
+        if apiId:
+            query["apiId"] = apiId
+        
+        intervals = {}
+        for rollup in self.rollups_collection.find(query):
+            interval_start = floor_to_interval(rollup["bucket"], interval_minutes)
+            entry = intervals.setdefault(interval_start, {
+                "timestamp": interval_start.isoformat(),
+                "anomaly_count": 0,
+                "total_score": 0.0,
+                "max_score": rollup["score_max"]
+            })
+            entry["anomaly_count"] += rollup["anomaly_count"]
+            entry["total_score"] += rollup["score_sum"]
+            entry["max_score"] = max(entry["max_score"], rollup["score_max"])
+        
+        timeline = []
+        for interval_start in sorted(intervals):
+            entry = intervals[interval_start]
+            if entry["anomaly_count"] <= 0:
+                continue
+            entry["avg_score"] = entry["total_score"] / entry["anomaly_count"]
+            timeline.append(entry)
+        return timeline
+    
+    def get_detection(self, model_name: str, requestId: str) -> Optional[Dict]:
+        """Retorna a anomalia armazenada de um log (None se o log não foi detectado como anomalia)"""
+        projection = {"_id": 0, "expires_at": 0, "detected_at": 0, "model_name": 0}
+        return self.detections_collection.find_one({"_id": f"{model_name}:{requestId}"}, projection)
+    
+    def set_description(self, model_name: str, requestId: str, description: str):
+        """Grava a descrição gerada sob demanda na anomalia armazenada"""
+        self.detections_collection.update_one(
+            {"_id": f"{model_name}:{requestId}"}, {"$set": {"description": description}}
+        )
+    
+    def get_detections(self, model_name: str, start: datetime, end: datetime, apiId: str = None) -> List[Dict]:
+        """Retorna as anomalias armazenadas no período (sem o _id do MongoDB)"""
+        query = {
+            "model_name": model_name,
+            "timestamp": {"$gte": start, "$lte": end}
+        }
+        if apiId:
+            query["apiId"] = apiId
+        projection = {"_id": 0, "expires_at": 0, "detected_at": 0, "model_name": 0}
+        return list(self.detections_collection.find(query, projection).sort("timestamp", ASCENDING))
+
+# Instância global
+detection_store = DetectionStore()
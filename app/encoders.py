@@ -0,0 +1,94 @@
+"""
+Codificadores de características categóricas
+Vocabulário em dicionário (O(1) por valor) aplicado em lote, persistido junto
+com os preprocessadores dos modelos
+"""
+
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+class VocabularyEncoder:
+    """
+    Codifica valores categóricos com um vocabulário fixo construído no treino
+    
+    Valores fora do vocabulário recebem unknown_value (-1) ou, se hash_buckets
+    for maior que zero, um código estável em [len(vocabulário), len + hash_buckets)
+    calculado com CRC32 (feature hashing).
+    """
+    
+    def __init__(self, hash_buckets: int = 0, unknown_value: int = -1):
+        self.hash_buckets = hash_buckets
+        self.unknown_value = unknown_value
+        self.vocabulary: Dict[str, int] = {}
+    
+    def fit(self, values: Iterable[str], base_values: Optional[Sequence[str]] = None) -> "VocabularyEncoder":
+        """
+        Constrói o vocabulário
+        
+        Args:
+            values: Valores observados no treino
+            base_values: Valores que sempre fazem parte do vocabulário (recebem os primeiros códigos)
+        """
+        self.vocabulary = {}
+        self.update(sorted(base_values or []))
+        self.update(sorted(set(values) - set(self.vocabulary)))
+        return self
+    
+    def update(self, values: Iterable[str]) -> List[str]:
+        """
+        Acrescenta valores novos ao final do vocabulário (códigos existentes não mudam)
+        
+        Returns:
+            Valores que foram acrescentados
+        """
+        added = []
+        for value in values:
+            if value not in self.vocabulary:
+                self.vocabulary[value] = len(self.vocabulary)
+                added.append(value)
+        return added
+    
+    def _fallback(self, value) -> int:
+        if self.hash_buckets > 0:
+            return len(self.vocabulary) + zlib.crc32(str(value).encode("utf-8")) % self.hash_buckets
+        return self.unknown_value
+    
+    def encode(self, value) -> int:
+        """Codifica um único valor"""
+        code = self.vocabulary.get(value)
+        return code if code is not None else self._fallback(value)
+    
+    def transform(self, values: Sequence) -> np.ndarray:
+        """
+        Codifica um lote de valores
+        
+        Cada valor distinto é procurado uma única vez no vocabulário.
+        """
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        unique_codes = np.fromiter((self.encode(value) for value in uniques), dtype=np.int64, count=len(uniques))
+        return unique_codes[codes]
+    
+    @property
+    def classes_(self) -> np.ndarray:
+        """Valores do vocabulário na ordem dos códigos (compatível com LabelEncoder)"""
+        return np.array(list(self.vocabulary), dtype=object)
+    
+    def __len__(self) -> int:
+        return len(self.vocabulary)
+    
+    @classmethod
+    def from_label_encoder(cls, label_encoder, hash_buckets: int = 0) -> "VocabularyEncoder":
+        """
+        Converte um LabelEncoder salvo por versões anteriores
+        
+        Os códigos são preservados (classes_ em ordem), então modelos antigos
+        continuam recebendo as mesmas características; valores desconhecidos
+        continuam valendo -1.
+        """
+        encoder = cls(hash_buckets=hash_buckets)
+        encoder.update(value.item() if isinstance(value, np.generic) else value
+                       for value in getattr(label_encoder, "classes_", []))
+        return encoder
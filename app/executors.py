@@ -0,0 +1,84 @@
+"""
+Executores dedicados para trabalho pesado fora do event loop
+Treinamento e retreinamento rodam em um pool de processos separado para que
+uma tarefa lenta não congele a ingestão de logs no mesmo worker
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable
+
+# Número de processos para tarefas de CPU (treinamento)
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", "1"))
+# Número de threads para I/O síncrono que ainda não tem versão assíncrona
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "8"))
+
+_lock = threading.Lock()
+_cpu_executor = None
+_io_executor = None
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    """
+    Retorna o pool de processos para tarefas de CPU
+    
+    Usa o contexto 'spawn' para que cada processo crie seus próprios clientes
+    MongoDB (clientes do pymongo não são seguros após fork).
+    """
+    global _cpu_executor
+    with _lock:
+        if _cpu_executor is None:
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=CPU_EXECUTOR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _cpu_executor
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Retorna o pool de threads para I/O bloqueante"""
+    global _io_executor
+    with _lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=IO_EXECUTOR_WORKERS,
+                thread_name_prefix="io-worker"
+            )
+        return _io_executor
+
+async def run_cpu_bound(func: Callable, *args, **kwargs) -> Any:
+    """
+    Executa uma função pesada no pool de processos sem bloquear o event loop
+    
+    A função e seus argumentos precisam ser serializáveis (funções de módulo).
+    Se o pool quebrar (ex: processo morto), ele é recriado uma vez.
+    """
+    global _cpu_executor
+    loop = asyncio.get_running_loop()
+    call = partial(func, *args, **kwargs)
+    try:
+        return await loop.run_in_executor(get_cpu_executor(), call)
+    except BrokenProcessPool:
+        print("⚠️ Pool de processos quebrado, recriando...")
+        with _lock:
+            _cpu_executor = None
+        return await loop.run_in_executor(get_cpu_executor(), call)
+
+async def run_blocking_io(func: Callable, *args, **kwargs) -> Any:
+    """Executa uma função de I/O bloqueante no pool de threads dedicado"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), partial(func, *args, **kwargs))
+
+def shutdown_executors(wait: bool = False):
+    """Encerra os executores (chamado no shutdown da aplicação)"""
+    global _cpu_executor, _io_executor
+    with _lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=wait, cancel_futures=True)
+            _cpu_executor = None
+        if _io_executor is not None:
+            _io_executor.shutdown(wait=wait, cancel_futures=True)
+            _io_executor = None
@@ -7,16 +7,88 @@ import json
 import pickle
 from datetime import datetime
 from typing import Dict, List, Optional
-from pymongo import MongoClient
-from app.db import client, db
-from app.ml_anomaly_detector import train_ml_models, detect_ml_anomalies, train_ml_models_with_collection
+from app.db import analytics_client, analytics_db
+from app.executors import run_blocking_io, run_cpu_bound
+from app.instrumentation import span, timed_operation, timing_registry
+from app.ml_anomaly_detector import train_ml_models, detect_ml_anomalies, train_ml_models_with_collection, update_ml_models
+from app.incremental import TRAINING_MODES
 from app.models import LogEntry
 
 class FeedbackSystem:
     def __init__(self):
-        self.client = client
-        self.db = db
+        self.client = analytics_client
+        self.db = analytics_db
         self.feedback_collection = self.db.feedback
+    
+    def _build_feedback_doc(self, log: Dict, log_id: str, api_id: str, feedback_type: str,
+                            user_comment: str, anomaly_score: float, features: dict) -> Dict:
+        """Monta o documento de feedback a partir do log original"""
+        return {
+            "log_id": log_id,
+            "api_id": api_id,
+            "feedback_type": feedback_type,
+            "user_comment": user_comment,
+            "anomaly_score": anomaly_score,
+            "features": features,
+            "original_log": log,
+            "timestamp": datetime.now(),
+            "processed": False  # Indica se já foi usado para retreinamento
+        }
+    
+    def _serialize_feedback(self, feedback: Dict) -> Dict:
+        """Converte ObjectId e datas de um feedback para serialização JSON"""
+        feedback["_id"] = str(feedback["_id"])
+        feedback["timestamp"] = feedback["timestamp"].isoformat()
+        
+        # Remover _id do log original para evitar problemas de serialização
+        if "original_log" in feedback and "_id" in feedback["original_log"]:
+            del feedback["original_log"]["_id"]
+        return feedback
+    
+    async def mark_feedback_async(self, feedback_type: str, log_id: str, api_id: str, user_comment: str = "",
+                                  anomaly_score: float = None, features: dict = None) -> Dict:
+        """
+        Versão assíncrona de mark_as_false_positive/mark_as_true_positive
+        (o mesmo código síncrono no pool de threads de I/O)
+        
+        Args:
+            feedback_type: 'false_positive' ou 'true_positive'
+            log_id: ID do log
+            api_id: ID da API
+            user_comment: Comentário opcional do usuário
+            anomaly_score: Score da anomalia detectada
+            features: Features da anomalia
+        """
+        mark = self.mark_as_false_positive if feedback_type == "false_positive" else self.mark_as_true_positive
+        return await run_blocking_io(mark, log_id, api_id, user_comment, anomaly_score, features)
+    
+    async def get_feedback_history_async(self, api_id: str = None, limit: int = 50) -> Dict:
+        """Versão assíncrona de get_feedback_history"""
+        return await run_blocking_io(self.get_feedback_history, api_id, limit)
+    
+    async def get_feedback_stats_async(self, api_id: str = None) -> Dict:
+        """Versão assíncrona de get_feedback_stats"""
+        return await run_blocking_io(self.get_feedback_stats, api_id)
+    
+    async def get_logs_with_feedback_async(self, api_id: str = None) -> List[str]:
+        """Versão assíncrona de get_logs_with_feedback"""
+        return await run_blocking_io(self.get_logs_with_feedback, api_id)
+    
+    async def retrain_with_feedback_async(self, api_id: str, mode: str = "full") -> Dict:
+        """
+        Executa o retreinamento no pool de processos dedicado
+        
+        O treinamento é CPU-bound; rodá-lo em outro processo evita que ele
+        bloqueie o event loop (e a ingestão) deste worker.
+        """
+        try:
+            result = await run_cpu_bound(_retrain_with_feedback_job, api_id, mode)
+            # As etapas foram medidas no processo do executor: acumulá-las aqui também
+            if isinstance(result.get("timings"), dict):
+                timing_registry.record("retrain_with_feedback", result["timings"])
+            return result
+        except Exception as e:
+            return {"error": f"Erro no retreinamento: {str(e)}"}
         
     def mark_as_false_positive(self, log_id: str, api_id: str, user_comment: str = "", anomaly_score: float = None, features: dict = None) -> Dict:
         """
@@ -39,17 +111,8 @@ class FeedbackSystem:
                 return {"error": "Log não encontrado"}
             
             # Criar registro de feedback
-            feedback = {
-                "log_id": log_id,
-                "api_id": api_id,
-                "feedback_type": "false_positive",
-                "user_comment": user_comment,
-                "anomaly_score": anomaly_score,
-                "features": features,
-                "original_log": log,
-                "timestamp": datetime.now(),
-                "processed": False  # Indica se já foi usado para retreinamento
-            }
+            feedback = self._build_feedback_doc(log, log_id, api_id, "false_positive",
+                                                user_comment, anomaly_score, features)
             
             # Salvar feedback
             result = self.feedback_collection.insert_one(feedback)
@@ -84,17 +147,8 @@ class FeedbackSystem:
                 return {"error": "Log não encontrado"}
             
             # Criar registro de feedback
-            feedback = {
-                "log_id": log_id,
-                "api_id": api_id,
-                "feedback_type": "true_positive",
-                "user_comment": user_comment,
-                "anomaly_score": anomaly_score,
-                "features": features,
-                "original_log": log,
-                "timestamp": datetime.now(),
-                "processed": False
-            }
+            feedback = self._build_feedback_doc(log, log_id, api_id, "true_positive",
+                                                user_comment, anomaly_score, features)
             
             # Salvar feedback
             result = self.feedback_collection.insert_one(feedback)
@@ -128,12 +182,7 @@ class FeedbackSystem:
             
             # Converter ObjectId para string e tratar serialização
             for feedback in feedbacks:
-                feedback["_id"] = str(feedback["_id"])
-                feedback["timestamp"] = feedback["timestamp"].isoformat()
-                
-                # Remover _id do log original para evitar problemas de serialização
-                if "original_log" in feedback and "_id" in feedback["original_log"]:
-                    del feedback["original_log"]["_id"]
+                self._serialize_feedback(feedback)
             
             return {
                 "success": True,
@@ -144,22 +193,34 @@ class FeedbackSystem:
         except Exception as e:
             return {"error": f"Erro ao buscar feedback: {str(e)}"}
     
-    def retrain_with_feedback(self, api_id: str) -> Dict:
+    def retrain_with_feedback(self, api_id: str, mode: str = "full") -> Dict:
         """
         Retreina o modelo usando feedback do usuário
         
         Args:
             api_id: ID da API para retreinar
+            mode: 'full' (retreina todos os modelos com os logs da API) ou
+                'incremental' (atualiza os modelos com os logs novos e os falsos
+                positivos, ver update_ml_models; recai no retreinamento completo
+                quando a reconstrução periódica vence)
             
         Returns:
-            Dict com status do retreinamento
+            Dict com status do retreinamento e o tempo de cada etapa em 'timings'
         """
+        if mode not in TRAINING_MODES:
+            return {"error": f"Modo '{mode}' inválido. Use: {', '.join(TRAINING_MODES)}"}
+        with timed_operation("retrain_with_feedback") as timings:
+            return self._retrain_with_feedback(api_id, mode, timings)
+    
+    def _retrain_with_feedback(self, api_id: str, mode: str, timings) -> Dict:
+        """Retreinamento medido por etapa (ver retrain_with_feedback)"""
         try:
             # Buscar feedbacks não processados
-            unprocessed_feedbacks = list(self.feedback_collection.find({
-                "api_id": api_id,
-                "processed": False
-            }))
+            with span("fetch_feedback"):
+                unprocessed_feedbacks = list(self.feedback_collection.find({
+                    "api_id": api_id,
+                    "processed": False
+                }))
             
             if not unprocessed_feedbacks:
                 return {"message": "Nenhum feedback não processado encontrado"}
@@ -167,60 +228,117 @@ class FeedbackSystem:
             # Separar falsos positivos
             false_positives = [f for f in unprocessed_feedbacks if f["feedback_type"] == "false_positive"]
             
+            full_rebuild_reason = None
+            if mode == "incremental":
+                incremental_result = self._update_with_feedback(api_id, false_positives, timings)
+                full_rebuild_reason = incremental_result.pop("full_rebuild_required", None)
+                if full_rebuild_reason is None:
+                    return incremental_result
+                print(f"🔁 Reconstrução completa: {full_rebuild_reason}")
+            
             # Obter todos os logs da API
-            all_logs = list(self.db.logs.find({"apiId": api_id}))
+            with span("fetch_logs"):
+                all_logs = list(self.db.logs.find({"apiId": api_id}))
             
             if not all_logs:
                 return {"error": "Nenhum log encontrado para a API"}
             
             # Criar conjunto de logs de treinamento
-            training_logs = []
-            
-            # Adicionar todos os logs normais
-            for log in all_logs:
-                # Remover _id para evitar duplicidade
-                if '_id' in log:
-                    del log['_id']
-                training_logs.append(log)
-            
-            # Para cada falso positivo, adicionar o log múltiplas vezes para "diluir" sua anomalia
-            # Isso faz com que o modelo aprenda que esse padrão é normal
-            for feedback in false_positives:
-                log = feedback["original_log"]
-                # Remover _id se presente
-                if '_id' in log:
-                    del log['_id']
+            with span("build_training_set"):
+                training_logs = []
                 
-                # Adicionar o log 5 vezes para dar mais peso como "normal"
-                for _ in range(5):
-                    training_logs.append(log.copy())
+                # Adicionar todos os logs normais
+                for log in all_logs:
+                    # Remover _id para evitar duplicidade
+                    if '_id' in log:
+                        del log['_id']
+                    training_logs.append(log)
                 
-                # Marcar como processado
-                self.feedback_collection.update_one(
-                    {"_id": feedback["_id"]},
-                    {"$set": {"processed": True}}
-                )
+                # Para cada falso positivo, adicionar o log múltiplas vezes para "diluir" sua anomalia
+                # Isso faz com que o modelo aprenda que esse padrão é normal
+                for feedback in false_positives:
+                    log = feedback["original_log"]
+                    # Remover _id se presente
+                    if '_id' in log:
+                        del log['_id']
+                    
+                    # Adicionar o log 5 vezes para dar mais peso como "normal"
+                    for _ in range(5):
+                        training_logs.append(log.copy())
+                    
+                    # Marcar como processado
+                    self.feedback_collection.update_one(
+                        {"_id": feedback["_id"]},
+                        {"$set": {"processed": True}}
+                    )
             
             # Salvar logs de treinamento em uma coleção permanente
             training_collection = self.db.training_logs
-            training_collection.drop()  # Limpar dados anteriores
-            if training_logs:
-                training_collection.insert_many(training_logs)
+            with span("write_training_set"):
+                training_collection.drop()  # Limpar dados anteriores
+                if training_logs:
+                    training_collection.insert_many(training_logs)
             
             # Retreinar modelo usando a coleção de treinamento
             retrain_result = train_ml_models_with_collection(apiId=api_id, hours_back=168, save_models=True)
             
-            return {
+            result = {
                 "success": True,
                 "message": f"Modelo retreinado com {len(false_positives)} falsos positivos",
+                "mode": "full",
                 "false_positives_processed": len(false_positives),
                 "total_logs_used": len(training_logs),
-                "retrain_result": retrain_result
+                "retrain_result": retrain_result,
+                "timings": timings.as_dict()
             }
+            if full_rebuild_reason:
+                result["full_rebuild_reason"] = full_rebuild_reason
+            return result
             
         except Exception as e:
             return {"error": f"Erro no retreinamento: {str(e)}"}
     
+    def _update_with_feedback(self, api_id: str, false_positives: List[Dict], timings) -> Dict:
+        """
+        Atualização incremental com os falsos positivos (ver retrain_with_feedback)
+        
+        Cada falso positivo entra 5 vezes junto com os logs novos da API, como
+        no retreinamento completo. Os feedbacks só são marcados como processados
+        se os modelos forem atualizados.
+        
+        Returns:
+            Resultado do retreinamento, ou 'full_rebuild_required' com o motivo
+        """
+        feedback_logs = []
+        for feedback in false_positives:
+            log = {key: value for key, value in feedback["original_log"].items() if key != "_id"}
+            feedback_logs.extend(LogEntry(**log) for _ in range(5))
+        
+        update_result = update_ml_models(apiId=api_id, hours_back=168, save_models=True, extra_logs=feedback_logs)
+        if "full_rebuild_required" in update_result:
+            return update_result
+        if "error" in update_result:
+            return {"error": update_result["error"]}
+        if "message" in update_result:
+            return {"message": update_result["message"], "mode": "incremental", "retrain_result": update_result}
+        
+        with span("mark_processed"):
+            for feedback in false_positives:
+                self.feedback_collection.update_one(
+                    {"_id": feedback["_id"]},
+                    {"$set": {"processed": True}}
+                )
+        
+        return {
+            "success": True,
+            "message": f"Modelo atualizado com {len(false_positives)} falsos positivos",
+            "mode": "incremental",
+            "false_positives_processed": len(false_positives),
+            "total_logs_used": update_result.get("logs_used", 0),
+            "retrain_result": update_result,
+            "timings": timings.as_dict()
+        }
+    
     def get_feedback_stats(self, api_id: str = None) -> Dict:
         """
         Obtém estatísticas de feedback
@@ -339,4 +457,8 @@ class FeedbackSystem:
             return []
 
 # Instância global
-feedback_system = FeedbackSystem() 
\ No newline at end of file
+feedback_system = FeedbackSystem()
+
+def _retrain_with_feedback_job(api_id: str, mode: str = "full") -> Dict:
+    """Ponto de entrada do retreinamento no processo do executor"""
+    return feedback_system.retrain_with_feedback(api_id, mode) 
\ No newline at end of file
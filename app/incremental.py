@@ -0,0 +1,136 @@
+"""
+Atualização incremental dos modelos treinados
+Em vez de descartar os modelos e treinar tudo de novo, uma atualização usa
+apenas os logs novos: o scaler acumula média e variância (partial_fit), o
+Isolation Forest ganha árvores treinadas nos logs novos (warm start) e o
+conjunto de referência de KNN e LOF é renovado com eles. Uma reconstrução
+completa periódica (ou quando a atualização não é possível) continua sendo
+o caminho de segurança
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from .reference_sets import build_reference_set, fit_on_reference
+
+# Configuração padrão (seção "incremental_training")
+DEFAULT_INCREMENTAL_CONFIG = {
+    "new_trees": 20,
+    "max_trees": 300,
+    "min_new_logs": 256,
+    "full_rebuild_every": 24,
+    "full_rebuild_hours": 168
+}
+TRAINING_MODES = ('full', 'incremental')
+# Modelos que podem ser atualizados sem treino completo
+INCREMENTAL_MODELS = ('iforest', 'knn', 'lof')
+
+def get_incremental_config() -> Dict:
+    """Seção "incremental_training" das configurações completada com os valores padrão"""
+    try:
+        from .config_manager import config_manager
+        return {**DEFAULT_INCREMENTAL_CONFIG, **config_manager.get_config("incremental_training")}
+    except Exception as e:
+        print(f"⚠️ Erro ao obter configurações de atualização incremental: {e}")
+        return dict(DEFAULT_INCREMENTAL_CONFIG)
+
+def update_scaler(scaler: StandardScaler, features) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Acumula as características novas na média e variância do scaler
+    
+    Returns:
+        (média, escala) anteriores, para converter o que foi treinado na escala antiga
+    """
+    previous = (scaler.mean_.copy(), scaler.scale_.copy())
+    scaler.partial_fit(features)
+    return previous
+
+def rescale(points: np.ndarray, previous: Tuple[np.ndarray, np.ndarray], scaler: StandardScaler) -> np.ndarray:
+    """Converte pontos normalizados pela escala anterior para a escala atual do scaler"""
+    mean, scale = previous
+    return (points * scale + mean - scaler.mean_) / scaler.scale_
+
+def rescale_iforest(model, previous: Tuple[np.ndarray, np.ndarray], scaler: StandardScaler):
+    """
+    Converte os limiares das árvores do Isolation Forest para a escala atual
+    
+    A normalização é afim e crescente em cada característica, então cada log
+    continua descendo pelos mesmos ramos (as árvores não precisam ser refeitas).
+    """
+    forest = getattr(model, 'detector_', model)
+    mean, scale = previous
+    for estimator, tree_features in zip(forest.estimators_, forest.estimators_features_):
+        tree = estimator.tree_
+        split = tree.children_left >= 0
+        columns = np.asarray(tree_features)[tree.feature[split]]
+        tree.threshold[split] = (tree.threshold[split] * scale[columns] + mean[columns]
+                                 - scaler.mean_[columns]) / scaler.scale_[columns]
+
+def warm_start_iforest(model, features: np.ndarray, new_trees: int, max_trees: int) -> Dict:
+    """
+    Acrescenta new_trees árvores treinadas nos logs novos ao Isolation Forest
+    
+    Acima de max_trees as árvores mais antigas são descartadas (janela
+    deslizante). O offset e o threshold_ passam a vir dos logs novos.
+    
+    Returns:
+        Dict com as árvores acrescentadas, descartadas e o total
+    """
+    forest = getattr(model, 'detector_', model)
+    forest.warm_start = True
+    forest.n_estimators = len(forest.estimators_) + new_trees
+    forest.fit(features)
+    
+    dropped = max(0, len(forest.estimators_) - max_trees)
+    if dropped:
+        forest.estimators_ = forest.estimators_[dropped:]
+        forest.estimators_features_ = forest.estimators_features_[dropped:]
+        forest._average_path_length_per_tree = forest._average_path_length_per_tree[dropped:]
+        forest._decision_path_lengths = forest._decision_path_lengths[dropped:]
+        forest.n_estimators = len(forest.estimators_)
+        # Offset recalculado só com as árvores mantidas
+        forest.offset_ = np.percentile(forest.score_samples(features), 100.0 * forest.contamination)
+    
+    # Mesmo pós-processamento do IForest.fit do PyOD
+    model.n_estimators = forest.n_estimators
+    model.decision_scores_ = -forest.decision_function(features)
+    model._process_decision_scores()
+    return {"added": new_trees, "dropped": dropped, "trees": len(forest.estimators_)}
+
+def reference_points(model) -> Tuple[np.ndarray, np.ndarray]:
+    """Pontos guardados por um KNN ou LOF do PyOD e o peso de cada um (1 sem conjunto de referência)"""
+    estimator = model.neigh_ if hasattr(model, 'neigh_') else model.detector_
+    points = np.asarray(estimator._fit_X)
+    weights = getattr(model, 'reference_weights_', None)
+    return points, np.ones(len(points)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+def refresh_reference(model, features: np.ndarray, previous: Tuple[np.ndarray, np.ndarray],
+                      scaler: StandardScaler, max_size: int, method: str, shared: Optional[Dict] = None) -> Dict:
+    """
+    Renova o conjunto de referência de um KNN ou LOF com os logs novos
+    
+    Os pontos atuais (convertidos para a escala atual, com seus pesos) e os
+    logs novos formam um único conjunto, reduzido a max_size pontos (0 = o
+    tamanho atual, para que o modelo não cresça a cada atualização).
+    
+    Args:
+        shared: Dict repassado entre os modelos de uma atualização; modelos
+            com os mesmos pontos (KNN e LOF do mesmo treino) recebem o mesmo
+            conjunto renovado, como no treino completo
+    
+    Returns:
+        Dict com o tamanho do conjunto e os logs representados (ver fit_on_reference)
+    """
+    points, weights = reference_points(model)
+    cached = (shared or {}).get((int(max_size), method))
+    if cached and np.array_equal(cached[0], points) and np.array_equal(cached[1], weights):
+        reference = cached[2]
+    else:
+        combined = np.vstack([rescale(points, previous, scaler), features])
+        combined_weights = np.concatenate([weights, np.ones(len(features))])
+        reference = build_reference_set(combined, int(max_size or len(points)), method, sample_weight=combined_weights)
+        if shared is not None:
+            shared[(int(max_size), method)] = (points, weights, reference)
+    return {"method": method, **fit_on_reference(model, *reference)}
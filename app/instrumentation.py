@@ -0,0 +1,143 @@
+"""
+Instrumentação leve por etapa (spans com relógio monotônico)
+Cada operação (detecção, treinamento, retreinamento) mede suas etapas com
+span(), devolve o detalhamento em 'timings' e acumula as durações por
+processo para o endpoint /ml/timings (e no histograma ml_stage_duration_seconds)
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .metrics import pipeline_stage_duration
+
+class Timings:
+    """Durações acumuladas por etapa de uma operação (etapas repetidas são somadas)"""
+    
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+    
+    def add(self, stage: str, seconds: float, count: int = 1):
+        """Soma a duração de uma etapa"""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + count
+    
+    def merge(self, other: "Timings"):
+        """Soma as etapas de outra operação (operações aninhadas)"""
+        for stage, seconds in other.stages.items():
+            self.add(stage, seconds, other.counts[stage])
+    
+    @property
+    def total(self) -> float:
+        """Tempo decorrido desde o início da operação"""
+        return time.perf_counter() - self.started
+    
+    def as_dict(self) -> Dict[str, float]:
+        """Segundos por etapa (na ordem de execução) e o total da operação"""
+        result = {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+        result["total"] = round(self.total, 4)
+        return result
+
+class TimingRegistry:
+    """Agregado por processo das durações de cada operação e etapa (thread-safe)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations: Dict[str, Dict] = {}
+    
+    def record(self, operation_name: str, stages: Dict[str, float]):
+        """
+        Acumula as etapas de uma operação concluída
+        
+        Aceita também o 'timings' devolvido por operações executadas em outro
+        processo (ex: retreinamento no pool de processos).
+        """
+        with self._lock:
+            operation = self._operations.setdefault(operation_name, {"calls": 0, "stages": {}})
+            operation["calls"] += 1
+            for stage, seconds in stages.items():
+                aggregate = operation["stages"].setdefault(
+                    stage, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+                )
+                aggregate["count"] += 1
+                aggregate["total_seconds"] += seconds
+                aggregate["max_seconds"] = max(aggregate["max_seconds"], seconds)
+        for stage, seconds in stages.items():
+            pipeline_stage_duration.observe(seconds, operation=operation_name, stage=stage)
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Chamadas e, por etapa, contagem, total, média e máximo em segundos"""
+        with self._lock:
+            return {
+                name: {
+                    "calls": operation["calls"],
+                    "stages": {
+                        stage: {
+                            "count": aggregate["count"],
+                            "total_seconds": round(aggregate["total_seconds"], 4),
+                            "mean_seconds": round(aggregate["total_seconds"] / aggregate["count"], 4),
+                            "max_seconds": round(aggregate["max_seconds"], 4)
+                        }
+                        for stage, aggregate in operation["stages"].items()
+                    }
+                }
+                for name, operation in self._operations.items()
+            }
+    
+    def reset(self):
+        """Zera os agregados"""
+        with self._lock:
+            self._operations.clear()
+
+# Operação em andamento no contexto atual (thread ou tarefa)
+_current: ContextVar[Optional[Timings]] = ContextVar("current_timings", default=None)
+
+@contextmanager
+def timed_operation(operation: str):
+    """
+    Mede uma operação; as chamadas a span() feitas dentro dela entram no resultado
+    
+    Operações aninhadas têm o próprio detalhamento e também somam suas etapas
+    na operação externa. Ao terminar, a operação entra no agregado do processo.
+    
+    Exemplo:
+        with timed_operation("detect") as timings:
+            with span("fetch_logs"):
+                logs = get_all_logs()
+        result["timings"] = timings.as_dict()
+    """
+    timings = Timings(operation)
+    parent = _current.get()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            parent.merge(timings)
+        timing_registry.record(operation, dict(timings.stages, total=timings.total))
+
+@contextmanager
+def span(stage: str):
+    """Mede uma etapa da operação em andamento (sem operação ativa, não registra nada)"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - start)
+
+def current_timings() -> Optional[Timings]:
+    """Operação em andamento no contexto atual"""
+    return _current.get()
+
+# Agregado global do processo
+timing_registry = TimingRegistry()
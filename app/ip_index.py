@@ -0,0 +1,282 @@
+"""
+Índice de ranges de IP (CIDR) com busca pelo prefixo mais longo
+Construído uma única vez a partir de listas de ranges, suporta IPv4 e IPv6
+e classifica lotes de IPs com operações vetorizadas
+"""
+
+import ipaddress
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .ip_parsing import factorize_ips, parse_ip, parse_ips
+
+_BITS = {4: 32, 6: 128}
+
+@lru_cache(maxsize=4096)
+def parse_network(cidr: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Converte um range CIDR em (versão, prefixo inteiro, tamanho do prefixo)
+    
+    O prefixo inteiro contém apenas os bits da rede (endereço >> bits do host).
+    Bits de host diferentes de zero são ignorados (strict=False).
+    """
+    try:
+        network = ipaddress.ip_network(cidr.strip(), strict=False)
+        host_bits = _BITS[network.version] - network.prefixlen
+        return network.version, int(network.network_address) >> host_bits, network.prefixlen
+    except (ValueError, AttributeError):
+        return None
+
+def ip_in_network(ip: str, cidr: str) -> bool:
+    """Verifica se um IP pertence a um range CIDR (ambos com parse em cache)"""
+    parsed_ip = parse_ip(ip)
+    parsed_network = parse_network(cidr)
+    if parsed_ip is None or parsed_network is None:
+        return False
+    version, value = parsed_ip
+    network_version, prefix, prefixlen = parsed_network
+    if version != network_version:
+        return False
+    return value >> (_BITS[version] - prefixlen) == prefix
+
+class IPRangeIndex:
+    """
+    Índice de ranges CIDR com busca pelo prefixo mais longo
+    
+    Cada range é guardado em uma tabela por (versão, tamanho de prefixo),
+    indexada pelo prefixo inteiro. Uma busca testa os tamanhos de prefixo
+    existentes do maior para o menor, então o custo depende do número de
+    tamanhos distintos e não do número de ranges.
+    
+    Exemplo:
+        index = IPRangeIndex({"10.0.0.0/8": "private", "10.1.0.0/16": "vpn"})
+        index.lookup("10.1.2.3")     # "vpn"
+        index.match_all("10.1.2.3")  # ["vpn", "private"]
+    """
+    
+    def __init__(self, ranges: Union[Dict[str, Any], Iterable[Tuple[str, Any]], Iterable[str]] = ()):
+        self._tables: Dict[int, Dict[int, Dict[int, Any]]] = {4: {}, 6: {}}
+        self._prefix_lengths: Dict[int, List[int]] = {4: [], 6: []}
+        self._arrays: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._values: List[Any] = []
+        self._value_cache: Optional[np.ndarray] = None
+        self._ranges: List[str] = []
+        
+        items = ranges.items() if isinstance(ranges, dict) else ranges
+        for item in items:
+            if isinstance(item, str):
+                self.add(item, True)
+            else:
+                self.add(*item)
+    
+    def add(self, cidr: str, value: Any = True):
+        """Adiciona um range ao índice (o último valor para o mesmo range prevalece)"""
+        parsed = parse_network(cidr)
+        if parsed is None:
+            raise ValueError(f"Range CIDR inválido: {cidr}")
+        version, prefix, prefixlen = parsed
+        
+        table = self._tables[version].setdefault(prefixlen, {})
+        table[prefix] = value
+        self._prefix_lengths[version] = sorted(self._tables[version], reverse=True)
+        self._ranges.append(cidr)
+        if version == 4:
+            self._arrays.pop(prefixlen, None)
+    
+    def __len__(self) -> int:
+        return sum(len(table) for tables in self._tables.values() for table in tables.values())
+    
+    @property
+    def ranges(self) -> List[str]:
+        """Ranges adicionados, na ordem de inserção"""
+        return list(self._ranges)
+    
+    def _iter_matches(self, ip: str):
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return
+        version, value = parsed
+        bits = _BITS[version]
+        tables = self._tables[version]
+        for prefixlen in self._prefix_lengths[version]:
+            match = tables[prefixlen].get(value >> (bits - prefixlen))
+            if match is not None:
+                yield match
+    
+    def lookup(self, ip: str, default: Any = None) -> Any:
+        """Retorna o valor do range mais específico que contém o IP"""
+        return next(self._iter_matches(ip), default)
+    
+    def contains(self, ip: str) -> bool:
+        """Verifica se algum range do índice contém o IP"""
+        return next(self._iter_matches(ip), None) is not None
+    
+    def match_all(self, ip: str) -> List[Any]:
+        """Retorna os valores de todos os ranges que contêm o IP (do mais específico ao mais amplo)"""
+        return list(self._iter_matches(ip))
+    
+    def _ipv4_arrays(self, prefixlen: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Chaves ordenadas e índices de valor da tabela IPv4 de um tamanho de prefixo"""
+        arrays = self._arrays.get(prefixlen)
+        if arrays is None:
+            table = self._tables[4][prefixlen]
+            keys = np.fromiter(table.keys(), dtype=np.uint64, count=len(table))
+            order = np.argsort(keys)
+            value_ids = np.empty(len(table), dtype=np.int64)
+            for position, value in enumerate(table.values()):
+                value_ids[position] = len(self._values)
+                self._values.append(value)
+            arrays = (keys[order], value_ids[order])
+            self._arrays[prefixlen] = arrays
+        return arrays
+    
+    def _value_array(self) -> np.ndarray:
+        """Valores das tabelas IPv4 como array de objetos (indexável em lote)"""
+        if self._value_cache is None or len(self._value_cache) != len(self._values):
+            self._value_cache = np.empty(len(self._values), dtype=object)
+            for position, value in enumerate(self._values):
+                self._value_cache[position] = value
+        return self._value_cache
+    
+    def lookup_many(self, ips: Sequence[str], default: Any = None) -> List[Any]:
+        """
+        Classifica um lote de IPs (prefixo mais longo)
+        
+        Cada IP distinto é resolvido uma única vez: IPv4 com busca binária
+        vetorizada por tamanho de prefixo e IPv6 pela busca em tabela.
+        """
+        # Resolver apenas os IPs distintos e expandir no final
+        codes, ips = factorize_ips(ips)
+        parsed = parse_ips(ips)
+        results = np.empty(len(ips), dtype=object)
+        results.fill(default)
+        
+        # IPv4: busca binária vetorizada em cada tamanho de prefixo
+        ipv4_positions = np.flatnonzero(parsed.version == 4)
+        if len(ipv4_positions):
+            values = parsed.low[ipv4_positions]
+            matched = np.full(len(values), -1, dtype=np.int64)
+            for prefixlen in self._prefix_lengths[4]:
+                keys, value_ids = self._ipv4_arrays(prefixlen)
+                candidates = values >> np.uint64(32 - prefixlen)
+                positions = np.searchsorted(keys, candidates)
+                positions_clipped = np.minimum(positions, len(keys) - 1)
+                hits = (positions < len(keys)) & (keys[positions_clipped] == candidates) & (matched < 0)
+                matched[hits] = value_ids[positions_clipped[hits]]
+            found = matched >= 0
+            results[ipv4_positions[found]] = self._value_array()[matched[found]]
+        
+        # IPv6: busca em tabela
+        for position in np.flatnonzero(parsed.version == 6):
+            results[position] = self.lookup(ips[position], default)
+        
+        return results[codes].tolist()
+
+# Ranges privados (RFC 1918 e ULA IPv6)
+PRIVATE_RANGES = ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "fc00::/7"]
+
+# Tipos de rede por range (o mais específico prevalece)
+NETWORK_TYPE_RANGES = {
+    "10.0.0.0/8": "private",
+    "172.16.0.0/12": "private",
+    "192.168.0.0/16": "private",
+    "127.0.0.0/8": "loopback",
+    "169.254.0.0/16": "link_local",
+    "224.0.0.0/4": "multicast",
+    "fc00::/7": "private",
+    "::1/128": "loopback",
+    "fe80::/10": "link_local",
+    "ff00::/8": "multicast"
+}
+
+# Ranges conhecidos de VPNs, proxies, DNS públicos etc.
+SUSPICIOUS_RANGES = [
+    "1.1.1.0/24",  # Cloudflare DNS
+    "8.8.8.0/24",  # Google DNS
+    "208.67.222.0/24",  # OpenDNS
+    "185.228.168.0/24",  # CleanBrowsing
+    "176.103.130.0/24",  # AdGuard
+]
+
+# Ranges de uso especial (IANA) e as propriedades que cada um indica
+# Equivalente às propriedades is_private/is_loopback/... do módulo ipaddress
+SPECIAL_PURPOSE_RANGES = [
+    ("0.0.0.0/8", "is_private"),
+    ("0.0.0.0/32", "is_unspecified"),
+    ("10.0.0.0/8", "is_private"),
+    ("127.0.0.0/8", "is_private"),
+    ("127.0.0.0/8", "is_loopback"),
+    ("169.254.0.0/16", "is_private"),
+    ("172.16.0.0/12", "is_private"),
+    ("192.0.0.0/29", "is_private"),
+    ("192.0.0.170/31", "is_private"),
+    ("192.0.2.0/24", "is_private"),
+    ("192.168.0.0/16", "is_private"),
+    ("198.18.0.0/15", "is_private"),
+    ("198.51.100.0/24", "is_private"),
+    ("203.0.113.0/24", "is_private"),
+    ("224.0.0.0/4", "is_multicast"),
+    ("240.0.0.0/4", "is_private"),
+    ("240.0.0.0/4", "is_reserved"),
+    ("255.255.255.255/32", "is_private"),
+    ("::/128", "is_private"),
+    ("::/128", "is_unspecified"),
+    ("::1/128", "is_private"),
+    ("::1/128", "is_loopback"),
+    ("100::/64", "is_private"),
+    ("2001::/23", "is_private"),
+    ("2001:2::/48", "is_private"),
+    ("2001:db8::/32", "is_private"),
+    ("2001:10::/28", "is_private"),
+    ("fc00::/7", "is_private"),
+    ("fe80::/10", "is_private"),
+    ("ff00::/8", "is_multicast"),
+    ("::/8", "is_reserved"),
+    ("100::/8", "is_reserved"),
+    ("200::/7", "is_reserved"),
+    ("400::/6", "is_reserved"),
+    ("800::/5", "is_reserved"),
+    ("1000::/4", "is_reserved"),
+    ("4000::/3", "is_reserved"),
+    ("6000::/3", "is_reserved"),
+    ("8000::/3", "is_reserved"),
+    ("a000::/3", "is_reserved"),
+    ("c000::/3", "is_reserved"),
+    ("e000::/4", "is_reserved"),
+    ("f000::/5", "is_reserved"),
+    ("f800::/6", "is_reserved"),
+    ("fe00::/9", "is_reserved"),
+]
+
+def _build_flag_index(ranges: List[Tuple[str, str]]) -> IPRangeIndex:
+    """Agrupa as propriedades por range (um mesmo range pode ter várias)"""
+    flags_by_range: Dict[str, frozenset] = {}
+    for cidr, flag in ranges:
+        flags_by_range[cidr] = flags_by_range.get(cidr, frozenset()) | {flag}
+    return IPRangeIndex(flags_by_range)
+
+# Índices compartilhados
+private_index = IPRangeIndex(PRIVATE_RANGES)
+network_type_index = IPRangeIndex(NETWORK_TYPE_RANGES)
+suspicious_index = IPRangeIndex(SUSPICIOUS_RANGES)
+special_purpose_index = _build_flag_index(SPECIAL_PURPOSE_RANGES)
+
+def get_special_purpose_flags(ip: str) -> frozenset:
+    """
+    Retorna a união das propriedades de todos os ranges especiais que contêm o IP
+    
+    IPv4 mapeado em IPv6 (::ffff:a.b.c.d) recebe também as propriedades do
+    próprio IPv4, como em ipaddress.is_private (::ffff:10.0.0.1 é privado).
+    """
+    addresses = [ip]
+    parsed = parse_ip(ip)
+    if parsed is not None and parsed[0] == 6 and parsed[1] >> 32 == 0xFFFF:
+        addresses.append(str(ipaddress.IPv4Address(parsed[1] & 0xFFFFFFFF)))
+    
+    flags = frozenset()
+    for address in addresses:
+        for range_flags in special_purpose_index.match_all(address):
+            flags |= range_flags
+    return flags
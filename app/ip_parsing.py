@@ -0,0 +1,93 @@
+"""
+Conversão de IPs (IPv4 e IPv6) para inteiros em lote
+Compartilhada pela extração de características, descrições e índice de ranges;
+endereços repetidos são convertidos uma única vez (cache)
+"""
+
+import ipaddress
+from functools import lru_cache
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+_LOW_MASK = (1 << 64) - 1
+_IPV4_MAPPED_PREFIX = 0xFFFF
+
+class ParsedIPs(NamedTuple):
+    """IPs convertidos em arrays paralelos"""
+    version: np.ndarray  # int8: 4, 6 ou 0 (inválido)
+    high: np.ndarray  # uint64: bits 127..64 do endereço (0 para IPv4)
+    low: np.ndarray  # uint64: bits 63..0 do endereço (o próprio IPv4)
+
+@lru_cache(maxsize=262144)
+def parse_ip(ip: str) -> Optional[Tuple[int, int]]:
+    """
+    Converte um IP em (versão, inteiro)
+    
+    Returns:
+        Tupla (4 ou 6, valor inteiro) ou None se o IP for inválido
+    """
+    try:
+        ip_obj = ipaddress.ip_address(ip.strip())
+        return ip_obj.version, int(ip_obj)
+    except (ValueError, AttributeError):
+        return None
+
+def ip_to_numeric(ip: str) -> int:
+    """
+    Valor numérico de um IP usado como característica dos modelos
+    
+    IPv4 usa o endereço inteiro; IPv6 usa os 32 bits mais altos (prefixo de
+    roteamento), mantendo a mesma escala do IPv4. IPv4 mapeado em IPv6
+    (::ffff:a.b.c.d) vale o próprio IPv4. IPs inválidos valem 0.
+    """
+    parsed = parse_ip(ip)
+    if parsed is None:
+        return 0
+    version, value = parsed
+    if version == 4 or value >> 32 == _IPV4_MAPPED_PREFIX:
+        return value & 0xFFFFFFFF
+    return value >> 96
+
+def factorize_ips(ips: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Códigos de cada IP no array de IPs distintos (na ordem de aparição)"""
+    codes, uniques = pd.factorize(pd.Series(ips, dtype=object), use_na_sentinel=False)
+    return codes, np.asarray(uniques, dtype=object)
+
+def parse_ips(ips: Sequence[str]) -> ParsedIPs:
+    """
+    Converte um lote de IPs em arrays de versão e valor (128 bits em duas partes)
+    
+    Apenas os IPs distintos passam pelo parser; o resultado é expandido para
+    o tamanho do lote por indexação.
+    """
+    codes, uniques = factorize_ips(ips)
+    
+    versions = np.zeros(len(uniques), dtype=np.int8)
+    high = np.zeros(len(uniques), dtype=np.uint64)
+    low = np.zeros(len(uniques), dtype=np.uint64)
+    for position, ip in enumerate(uniques):
+        parsed = parse_ip(ip) if isinstance(ip, str) else None
+        if parsed is None:
+            continue
+        version, value = parsed
+        versions[position] = version
+        high[position] = value >> 64
+        low[position] = value & _LOW_MASK
+    
+    return ParsedIPs(versions[codes], high[codes], low[codes])
+
+def ips_to_numeric(ips: Sequence[str]) -> np.ndarray:
+    """
+    Versão em lote de ip_to_numeric
+    
+    Returns:
+        Array int64 com o valor numérico de cada IP
+    """
+    parsed = parse_ips(ips)
+    ipv4_mapped = (parsed.version == 6) & (parsed.high == 0) & ((parsed.low >> np.uint64(32)) == _IPV4_MAPPED_PREFIX)
+    numeric = np.where(parsed.version == 6, parsed.high >> np.uint64(32), parsed.low)
+    numeric[ipv4_mapped] = parsed.low[ipv4_mapped] & np.uint64(0xFFFFFFFF)
+    numeric[parsed.version == 0] = 0
+    return numeric.astype(np.int64)
@@ -0,0 +1,386 @@
+"""
+Perfis incrementais de IP por cliente
+Mantém, para cada (API, cliente), os IPs conhecidos com primeira/última
+ocorrência e contadores de atividade por hora, atualizados na ingestão
+(acumulados em memória e gravados em lote)
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from .connection_manager import connection_manager
+
+# Paths considerados sensíveis na análise de atividade suspeita
+SENSITIVE_PATHS = ["/admin", "/login", "/auth", "/config", "/debug", "/test"]
+# Retenção dos contadores de atividade por hora
+ACTIVITY_RETENTION = timedelta(days=30)
+# Tamanho dos lotes de escrita (bulk_write)
+WRITE_BATCH_SIZE = 1000
+# IPs guardados por perfil; acima disso os vistos há mais tempo são descartados
+# (mantém o documento longe do limite de 16MB do MongoDB)
+MAX_IPS_PER_PROFILE = 500
+# Logs acumulados em memória antes de gravar (ou a cada FLUSH_INTERVAL_SECONDS)
+FLUSH_MAX_LOGS = 500
+FLUSH_INTERVAL_SECONDS = 1.0
+
+def _ip_key(ip: str) -> str:
+    """Converte um IP em nome de campo válido (sem pontos)"""
+    return ip.replace(".", "_")
+
+def _hour_of(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def is_sensitive_path(path: str) -> bool:
+    """Verifica se o path contém algum trecho sensível"""
+    path = path.lower()
+    return any(sensitive in path for sensitive in SENSITIVE_PATHS)
+
+class IPProfileStore:
+    """Armazena perfis de IP e atividade horária por cliente"""
+    
+    def __init__(self):
+        # Escritas acontecem na ingestão; leituras usam o pool de análise
+        ingest_db = connection_manager.get_database("ingest")
+        analytics_db = connection_manager.get_database("analytics")
+        self.profiles_collection = ingest_db.client_ip_profiles
+        self.activity_collection = ingest_db.client_activity_hourly
+        self.profiles_read_collection = analytics_db.client_ip_profiles
+        self.activity_read_collection = analytics_db.client_activity_hourly
+        
+        # Atualizações acumuladas desde a última gravação
+        self._lock = threading.Lock()
+        self._pending_profiles, self._pending_activity, self._pending_logs = {}, {}, 0
+        # Serializa gravações e a limpeza feita pela reconstrução
+        self._write_lock = threading.Lock()
+        # Reconstrução em andamento: (apiId ou None, _id limite dos logs varridos)
+        self._rebuild_boundary: Optional[Tuple[Optional[str], ObjectId]] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._create_indexes()
+    
+    def _create_indexes(self):
+        """Cria índices únicos por cliente/hora e de expiração (TTL)"""
+        try:
+            self.profiles_collection.create_index(
+                [("apiId", ASCENDING), ("clientId", ASCENDING)], unique=True)
+            self.profiles_collection.create_index([("apiId", ASCENDING), ("last_seen", ASCENDING)])
+            self.activity_collection.create_index(
+                [("apiId", ASCENDING), ("clientId", ASCENDING), ("hour", ASCENDING)], unique=True)
+            self.activity_collection.create_index([("hour", ASCENDING)])
+            self.activity_collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            print(f"⚠️ Erro ao criar índices dos perfis de IP: {e}")
+    
+    def _build_updates(self, aggregated_profiles: Dict, aggregated_activity: Dict) -> tuple:
+        """Monta os pares (filtro, update) de upsert a partir dos acumulados por cliente e por hora"""
+        profile_ops = []
+        for (api_id, client_id), profile in aggregated_profiles.items():
+            update = {
+                "$min": {"first_seen": profile["first_seen"]},
+                "$max": {"last_seen": profile["last_seen"]},
+                "$inc": {"total_requests": profile["requests"]},
+                "$set": {}
+            }
+            ips = profile["ips"].items()
+            if len(profile["ips"]) > MAX_IPS_PER_PROFILE:
+                ips = sorted(ips, key=lambda item: item[1]["last_seen"], reverse=True)[:MAX_IPS_PER_PROFILE]
+            for ip, ip_stats in ips:
+                prefix = f"ips.{_ip_key(ip)}"
+                update["$min"][f"{prefix}.first_seen"] = ip_stats["first_seen"]
+                update["$max"][f"{prefix}.last_seen"] = ip_stats["last_seen"]
+                update["$inc"][f"{prefix}.count"] = ip_stats["count"]
+                update["$set"][f"{prefix}.ip"] = ip
+            profile_ops.append(({"apiId": api_id, "clientId": client_id}, update))
+        
+        activity_ops = []
+        for (api_id, client_id, hour), activity in aggregated_activity.items():
+            update = {
+                "$inc": {
+                    "requests": activity["requests"],
+                    "errors": activity["errors"],
+                    "sensitive": activity["sensitive"]
+                },
+                "$setOnInsert": {"expires_at": hour + ACTIVITY_RETENTION}
+            }
+            if activity["sensitive_paths"]:
+                update["$addToSet"] = {"sensitive_paths": {"$each": sorted(activity["sensitive_paths"])}}
+            activity_ops.append(({"apiId": api_id, "clientId": client_id, "hour": hour}, update))
+        
+        return profile_ops, activity_ops
+    
+    def _aggregate(self, logs, profiles: Dict, activity: Dict):
+        """Acumula logs (dicts) nos perfis e contadores horários em memória"""
+        for log in logs:
+            api_id, client_id, ip = log["apiId"], log["clientId"], log["ip"]
+            timestamp = log["timestamp"]
+            
+            profile = profiles.get((api_id, client_id))
+            if profile is None:
+                profile = profiles[(api_id, client_id)] = {
+                    "first_seen": timestamp, "last_seen": timestamp, "requests": 0, "ips": {}
+                }
+            profile["first_seen"] = min(profile["first_seen"], timestamp)
+            profile["last_seen"] = max(profile["last_seen"], timestamp)
+            profile["requests"] += 1
+            
+            ip_stats = profile["ips"].get(ip)
+            if ip_stats is None:
+                ip_stats = profile["ips"][ip] = {"first_seen": timestamp, "last_seen": timestamp, "count": 0}
+            ip_stats["first_seen"] = min(ip_stats["first_seen"], timestamp)
+            ip_stats["last_seen"] = max(ip_stats["last_seen"], timestamp)
+            ip_stats["count"] += 1
+            
+            key = (api_id, client_id, _hour_of(timestamp))
+            hour_stats = activity.get(key)
+            if hour_stats is None:
+                hour_stats = activity[key] = {"requests": 0, "errors": 0, "sensitive": 0, "sensitive_paths": set()}
+            hour_stats["requests"] += 1
+            if log["status"] >= 400:
+                hour_stats["errors"] += 1
+            if is_sensitive_path(log["path"]):
+                hour_stats["sensitive"] += 1
+                hour_stats["sensitive_paths"].add(log["path"])
+    
+    def record_log(self, log: Dict):
+        """
+        Acumula um log recém-ingerido para o perfil do cliente
+        
+        As atualizações são agrupadas em memória e gravadas em lote a cada
+        FLUSH_INTERVAL_SECONDS ou FLUSH_MAX_LOGS logs, em vez de dois upserts
+        por log.
+        
+        Args:
+            log: Documento do log (com timestamp já convertido para datetime)
+        """
+        with self._lock:
+            if self._scanned_by_rebuild(log):
+                return
+            self._aggregate([log], self._pending_profiles, self._pending_activity)
+            self._pending_logs += 1
+            flush_now = self._pending_logs >= FLUSH_MAX_LOGS
+        
+        if flush_now:
+            self.flush()
+        else:
+            self._ensure_flusher()
+    
+    def _scanned_by_rebuild(self, log: Dict) -> bool:
+        """Verifica se o log será contado pela reconstrução em andamento"""
+        if self._rebuild_boundary is None or "_id" not in log:
+            return False
+        api_id, boundary = self._rebuild_boundary
+        return (api_id is None or log["apiId"] == api_id) and log["_id"] < boundary
+    
+    def _ensure_flusher(self):
+        """Inicia a thread de gravação periódica (sem efeito se já estiver rodando)"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._flush_loop, name="ip-profiles-flush", daemon=True)
+            self._flusher.start()
+    
+    def _flush_loop(self):
+        while not self._stop.wait(FLUSH_INTERVAL_SECONDS):
+            self.flush()
+    
+    def stop(self, timeout: float = 5.0):
+        """Encerra a thread de gravação e grava o que estiver acumulado"""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout)
+        self._flusher = None
+        self.flush()
+    
+    def flush(self) -> int:
+        """
+        Grava em lote as atualizações acumuladas
+        
+        Returns:
+            Quantidade de logs gravados
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._pending_logs:
+                    return 0
+                profiles, activity, logs = self._pending_profiles, self._pending_activity, self._pending_logs
+                self._pending_profiles, self._pending_activity, self._pending_logs = {}, {}, 0
+            try:
+                self._write(profiles, activity)
+                return logs
+            except Exception as e:
+                print(f"⚠️ Erro ao gravar perfis de IP ({logs} logs): {e}")
+                return 0
+    
+    def _drop_pending(self, apiId: Optional[str]):
+        """Descarta os acumulados de uma API (todas se None); chamar com self._lock"""
+        if apiId is None:
+            self._pending_profiles, self._pending_activity, self._pending_logs = {}, {}, 0
+            return
+        self._pending_profiles = {key: value for key, value in self._pending_profiles.items() if key[0] != apiId}
+        self._pending_activity = {key: value for key, value in self._pending_activity.items() if key[0] != apiId}
+        self._pending_logs = sum(profile["requests"] for profile in self._pending_profiles.values())
+    
+    def _write(self, profiles: Dict, activity: Dict):
+        """Grava os acumulados com bulk_write e limita os IPs dos perfis alterados"""
+        profile_ops, activity_ops = self._build_updates(profiles, activity)
+        profile_ops = [UpdateOne(match, update, upsert=True) for match, update in profile_ops]
+        activity_ops = [UpdateOne(match, update, upsert=True) for match, update in activity_ops]
+        for start in range(0, len(profile_ops), WRITE_BATCH_SIZE):
+            self.profiles_collection.bulk_write(profile_ops[start:start + WRITE_BATCH_SIZE], ordered=False)
+        for start in range(0, len(activity_ops), WRITE_BATCH_SIZE):
+            self.activity_collection.bulk_write(activity_ops[start:start + WRITE_BATCH_SIZE], ordered=False)
+        self._prune_ips(profiles.keys())
+    
+    def _prune_ips(self, profile_keys: Iterable[Tuple[str, str]]):
+        """
+        Descarta os IPs vistos há mais tempo dos perfis acima de MAX_IPS_PER_PROFILE
+        
+        Um IP descartado que voltar a aparecer é tratado como IP novo do cliente.
+        """
+        keys = list(profile_keys)
+        oversized = {"$expr": {"$gt": [
+            {"$size": {"$objectToArray": {"$ifNull": ["$ips", {}]}}}, MAX_IPS_PER_PROFILE
+        ]}}
+        for start in range(0, len(keys), WRITE_BATCH_SIZE):
+            query = {
+                "$or": [{"apiId": api_id, "clientId": client_id} for api_id, client_id in keys[start:start + WRITE_BATCH_SIZE]],
+                **oversized
+            }
+            for profile in self.profiles_collection.find(query, {"ips": 1}):
+                ranked = sorted(profile["ips"].items(), key=lambda item: item[1]["last_seen"], reverse=True)
+                stale = [key for key, _ in ranked[MAX_IPS_PER_PROFILE:]]
+                self.profiles_collection.update_one(
+                    {"_id": profile["_id"]},
+                    {"$unset": {f"ips.{key}": "" for key in stale}, "$inc": {"pruned_ips": len(stale)}}
+                )
+    
+    def rebuild(self, apiId: str = None) -> Dict:
+        """
+        Reconstrói os perfis a partir dos logs armazenados
+        
+        Usado para popular os perfis de logs ingeridos antes da existência
+        deste armazenamento ou após limpeza manual. A ingestão continua durante
+        a varredura: logs com _id anterior ao limite (próximo segundo) são
+        contados pela varredura e ignorados por record_log, os demais apenas
+        pela ingestão (vale para a ingestão deste processo).
+        
+        Args:
+            apiId: ID da API (None para todas)
+        """
+        try:
+            from .db import logs_read_collection
+            
+            query = {"apiId": apiId} if apiId else {}
+            boundary_time = (datetime.now(timezone.utc) + timedelta(seconds=1)).replace(microsecond=0)
+            boundary = ObjectId.from_datetime(boundary_time)
+            
+            with self._write_lock:
+                with self._lock:
+                    self._rebuild_boundary = (apiId, boundary)
+                    self._drop_pending(apiId)
+                self.profiles_collection.delete_many(query)
+                self.activity_collection.delete_many(query)
+            
+            # Aguardar que os logs anteriores ao limite terminem de ser gravados
+            time.sleep(max(0.0, (boundary_time - datetime.now(timezone.utc)).total_seconds()) + FLUSH_INTERVAL_SECONDS)
+            
+            projection = {"_id": 0, "apiId": 1, "clientId": 1, "ip": 1, "status": 1, "path": 1, "timestamp": 1}
+            profiles, activity = {}, {}
+            logs_processed = 0
+            for log in logs_read_collection.find({**query, "_id": {"$lt": boundary}}, projection):
+                self._aggregate([log], profiles, activity)
+                logs_processed += 1
+            
+            with self._write_lock:
+                self._write(profiles, activity)
+            
+            return {
+                "success": True,
+                "logs_processed": logs_processed,
+                "profiles": len(profiles),
+                "activity_buckets": len(activity)
+            }
+        except Exception as e:
+            return {"error": f"Erro ao reconstruir perfis de IP: {str(e)}"}
+        finally:
+            with self._lock:
+                self._rebuild_boundary = None
+    
+    def clear(self):
+        """Remove todos os perfis e contadores"""
+        with self._lock:
+            self._drop_pending(None)
+        self.profiles_collection.delete_many({})
+        self.activity_collection.delete_many({})
+    
+    def count_clients(self, apiId: str = None) -> int:
+        """Conta clientes distintos com perfil"""
+        self.flush()
+        if apiId:
+            return self.profiles_read_collection.count_documents({"apiId": apiId})
+        return len(self.profiles_read_collection.distinct("clientId"))
+    
+    def get_active_profiles(self, cutoff_time: datetime, apiId: str = None) -> Dict[str, Dict]:
+        """
+        Retorna os perfis dos clientes ativos desde cutoff_time
+        
+        Sem apiId, os perfis do mesmo cliente em APIs diferentes são combinados.
+        
+        Returns:
+            Dict clientId -> {ip: {first_seen, last_seen, count}}
+        """
+        self.flush()
+        query = {"last_seen": {"$gte": cutoff_time}}
+        if apiId:
+            query["apiId"] = apiId
+        
+        clients = defaultdict(dict)
+        for profile in self.profiles_read_collection.find(query, {"_id": 0, "clientId": 1, "ips": 1}):
+            known_ips = clients[profile["clientId"]]
+            for ip_stats in profile.get("ips", {}).values():
+                ip = ip_stats["ip"]
+                if ip in known_ips:
+                    merged = known_ips[ip]
+                    merged["first_seen"] = min(merged["first_seen"], ip_stats["first_seen"])
+                    merged["last_seen"] = max(merged["last_seen"], ip_stats["last_seen"])
+                    merged["count"] += ip_stats["count"]
+                else:
+                    known_ips[ip] = {
+                        "first_seen": ip_stats["first_seen"],
+                        "last_seen": ip_stats["last_seen"],
+                        "count": ip_stats["count"]
+                    }
+        return dict(clients)
+    
+    def get_recent_activity(self, cutoff_time: datetime, apiId: str = None) -> Dict[str, Dict]:
+        """
+        Soma os contadores horários desde a hora de cutoff_time
+        
+        Returns:
+            Dict clientId -> {requests, errors, sensitive, sensitive_paths}
+        """
+        self.flush()
+        query = {"hour": {"$gte": _hour_of(cutoff_time)}}
+        if apiId:
+            query["apiId"] = apiId
+        
+        activity = {}
+        for bucket in self.activity_read_collection.find(query, {"_id": 0}):
+            totals = activity.setdefault(bucket["clientId"], {
+                "requests": 0, "errors": 0, "sensitive": 0, "sensitive_paths": set()
+            })
+            totals["requests"] += bucket.get("requests", 0)
+            totals["errors"] += bucket.get("errors", 0)
+            totals["sensitive"] += bucket.get("sensitive", 0)
+            totals["sensitive_paths"].update(bucket.get("sensitive_paths", []))
+        return activity
+
+# Instância global
+ip_profile_store = IPProfileStore()
@@ -0,0 +1,71 @@
+"""
+Cache LRU em memória (thread-safe) para resultados caros de recalcular
+Usado para memorizar descrições de anomalias por (requestId, modelo, versão)
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from .metrics import cache_requests
+
+class LRUMemo:
+    """
+    Dicionário limitado que descarta o item usado há mais tempo
+    
+    Exemplo:
+        memo = LRUMemo(maxsize=1000)
+        memo.put(("req_1", "iforest", "v1"), "descrição")
+        memo.get(("req_1", "iforest", "v1"))  # "descrição"
+    """
+    
+    def __init__(self, maxsize: int = 10000, name: Optional[str] = None):
+        self.maxsize = maxsize
+        # Nome do cache nas métricas (cache_requests_total); sem nome, não é exportado
+        self.name = name
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor memorizado (e o marca como usado recentemente)"""
+        with self._lock:
+            hit = key in self._items
+            if hit:
+                self._items.move_to_end(key)
+                self.hits += 1
+                value = self._items[key]
+            else:
+                self.misses += 1
+                value = default
+        if self.name:
+            cache_requests.inc(cache=self.name, result="hit" if hit else "miss")
+        return value
+    
+    def put(self, key: Hashable, value: Any):
+        """Memoriza um valor, descartando o mais antigo se o limite for atingido"""
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+    
+    def clear(self):
+        """Remove todos os itens"""
+        with self._lock:
+            self._items.clear()
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Tamanho, acertos e taxa de acerto do cache"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None
+        }
@@ -0,0 +1,237 @@
+"""
+Métricas no formato texto do Prometheus (sem dependências externas)
+Contadores, gauges e histogramas com labels, registrados em um registro
+global exposto por GET /metrics
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Buckets padrão de latência (segundos), os mesmos do cliente oficial do Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+# Buckets das etapas do pipeline (treinamentos chegam a minutos)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    """Base das métricas: nome, ajuda, labels e séries por combinação de labels"""
+    
+    type_name = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Labels de {self.name} devem ser {self.labelnames}, recebido {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def clear(self):
+        """Remove todas as séries"""
+        with self._lock:
+            self._series.clear()
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        """Bloco da métrica no formato texto (HELP, TYPE e amostras)"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """Contador monotônico"""
+    
+    type_name = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Contadores sem labels são exportados desde o início (valor 0)
+        if not self.labelnames:
+            self._series[()] = 0
+    
+    def inc(self, amount: float = 1, **labels):
+        """Soma ao contador da combinação de labels"""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in self._series.items()]
+
+class Gauge(_Metric):
+    """Valor instantâneo (pode subir e descer)"""
+    
+    type_name = "gauge"
+    
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in self._series.items()]
+
+class Histogram(_Metric):
+    """Histograma cumulativo (buckets, soma e contagem por combinação de labels)"""
+    
+    type_name = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        """Registra uma observação"""
+        key = self._key(labels)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Contagens por bucket (não cumulativas) + overflow, soma
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+    
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+    
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Registro das métricas do processo
+    
+    Coletores são funções chamadas antes de cada exportação para atualizar
+    gauges que refletem estado (modelos carregados, caches, memória).
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+    
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica já registrada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def add_collector(self, collector: Callable[[], None]):
+        """Registra uma função executada antes de cada exportação"""
+        self._collectors.append(collector)
+    
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+    
+    def render(self) -> str:
+        """Todas as métricas no formato texto do Prometheus (versão 0.0.4)"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Erro em coletor de métricas: {e}")
+        return "\n".join(metric.render() for metric in list(self._metrics.values())) + "\n"
+
+def process_resident_memory_bytes() -> Optional[int]:
+    """Memória residente do processo (Linux: /proc/self/statm), None se indisponível"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+# Registro global e métricas compartilhadas
+metrics_registry = MetricsRegistry()
+
+http_request_duration = metrics_registry.histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota",
+    ["method", "route", "status"]
+)
+pipeline_stage_duration = metrics_registry.histogram(
+    "ml_stage_duration_seconds", "Duração das etapas das operações de ML (ver /ml/timings)",
+    ["operation", "stage"], buckets=STAGE_BUCKETS
+)
+logs_ingested = metrics_registry.counter("logs_ingested_total", "Logs recebidos e gravados")
+logs_ingest_failures = metrics_registry.counter("logs_ingest_failures_total", "Logs que falharam na gravação")
+logs_scored = metrics_registry.counter("ml_logs_scored_total", "Logs avaliados pelos modelos", ["model"])
+anomalies_found = metrics_registry.counter("ml_anomalies_found_total", "Anomalias encontradas", ["model"])
+cache_requests = metrics_registry.counter(
+    "cache_requests_total", "Consultas aos caches por resultado (hit/miss)", ["cache", "result"]
+)
+cache_entries = metrics_registry.gauge("cache_entries", "Itens em cada cache", ["cache"])
+models_available = metrics_registry.gauge("ml_models_available", "Modelos treinados disponíveis em disco")
+model_size = metrics_registry.gauge(
+    "ml_model_size_bytes", "Tamanho serializado de cada modelo treinado (aproxima a memória ao carregar)", ["model"]
+)
+process_memory = metrics_registry.gauge("process_resident_memory_bytes", "Memória residente do processo")
+
+def _collect_process_memory():
+    resident = process_resident_memory_bytes()
+    if resident is not None:
+        process_memory.set(resident)
+
+metrics_registry.add_collector(_collect_process_memory)
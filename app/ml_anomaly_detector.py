@@ -6,8 +6,10 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import Counter, defaultdict
 import json
+import os
+from urllib.parse import quote
 
 # PyOD imports
 from pyod.models.iforest import IForest
@@ -19,12 +21,89 @@ from pyod.models.auto_encoder import AutoEncoder
 from pyod.utils.utility import standardizer
 
 # Scikit-learn imports
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import StandardScaler
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 from .models import LogEntry
-from .storage import get_logs_by_api, get_all_logs
-from .model_storage import save_trained_models, load_trained_model, get_available_models
+from .approx_ocsvm import ApproxOCSVM
+from .flat_iforest import FlatIForest
+from .encoders import VocabularyEncoder
+from .storage import get_logs_by_api, get_all_logs, get_log_by_request_id, iter_logs
+from .model_storage import save_trained_models, load_trained_model, get_available_models, get_model_metadata
+from .memo import LRUMemo
+from .instrumentation import span, timed_operation
+from .metrics import (anomalies_found, cache_entries, cache_requests, logs_scored, metrics_registry, model_size,
+                      models_available)
+from .detection_store import floor_to_interval, pick_resolution
+from .ip_index import (IPRangeIndex, PRIVATE_RANGES, ip_in_network, network_type_index, private_index,
+                       suspicious_index)
+from .ip_parsing import ip_to_numeric, ips_to_numeric, parse_ip
+from .reference_sets import build_reference_set, fit_on_reference, get_reference_config
+from .sampling import StratifiedReservoirSampler, get_sampling_config
+from .incremental import (DEFAULT_INCREMENTAL_CONFIG, INCREMENTAL_MODELS, TRAINING_MODES, get_incremental_config,
+                          refresh_reference, rescale_iforest, update_scaler, warm_start_iforest)
+
+# Ranges privados indexados pelo próprio CIDR (para contar IPs por range)
+private_range_index = IPRangeIndex({cidr: cidr for cidr in PRIVATE_RANGES})
+
+# Campos categóricos codificados por vocabulário
+CATEGORICAL_FIELDS = ['method', 'clientId']
+# Valores sempre presentes no vocabulário (mantêm os códigos dos modelos antigos)
+CATEGORICAL_BASE_VALUES = {
+    'method': ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS']
+}
+# Características na ordem das colunas de extract_features (entrada dos modelos)
+FEATURE_NAMES = [
+    'hour', 'day_of_week', 'minute', 'status_code', 'method_encoded', 'path_length', 'path_depth',
+    'ip_numeric', 'client_id_encoded', 'is_api_path', 'is_admin_path', 'is_auth_path', 'is_error',
+    'is_server_error', 'is_client_error', 'is_success', 'is_redirect'
+]
+# Pré-filtros baratos da detecção em cascata
+CASCADE_PREFILTERS = ('zscore', 'iforest')
+# Nome do modo que combina os scores de todos os modelos do treinamento
+ENSEMBLE_MODEL = 'ensemble'
+# Modelos do treino completo (ml_detection.training_models); o OCSVM exato,
+# quadrático no número de logs, só é treinado se incluído na configuração
+DEFAULT_TRAINING_MODELS = ['iforest', 'lof', 'knn', 'ocsvm_approx', 'cblof']
+# Logs de treino pontuados para calibrar o threshold do ensemble quando os
+# modelos foram treinados em conjuntos diferentes (ver reference_sets)
+ENSEMBLE_CALIBRATION_ROWS = 10000
+# Lotes de até N logs pontuados pelo Isolation Forest em arrays planos (0 = sempre pelo PyOD);
+# acima disso o percurso compilado do sklearn é equivalente (ver tests/benchmark_flat_iforest.py)
+FLAT_IFOREST_MAX_ROWS = int(os.getenv("FLAT_IFOREST_MAX_ROWS", "5000"))
+# Buckets de hashing para valores fora do vocabulário (0 = valor -1)
+UNSEEN_HASH_BUCKETS = int(os.getenv("UNSEEN_HASH_BUCKETS", "0"))
+
+# Descrições geradas, por (requestId, modelo, versão do modelo)
+description_memo = LRUMemo(maxsize=int(os.getenv("DESCRIPTION_MEMO_SIZE", "10000")), name="descriptions")
+
+def get_model_version(metadata: Dict) -> str:
+    """Versão de um modelo a partir dos metadados (data do treinamento)"""
+    return str(metadata.get('trained_at') or metadata.get('saved_at') or "")
+
+def get_detection_generation(metadata: Dict) -> str:
+    """
+    Versão usada pelo armazenamento de detecções (ver detection_store)
+    
+    Atualizações incrementais mantêm a data do treinamento completo de origem,
+    então detecções, rollups e coberturas já gravados continuam valendo; só um
+    treinamento completo os descarta.
+    """
+    return str((metadata.get('incremental') or {}).get('base_trained_at') or get_model_version(metadata))
+
+def get_ensemble_metadata() -> Optional[Dict]:
+    """Metadados do último treinamento salvo com normalização de scores (base do modo ensemble)"""
+    trainings = [
+        model['metadata'] for model in get_available_models()
+        if model['metadata'].get('score_normalization')
+    ]
+    if not trainings:
+        return None
+    return max(trainings, key=get_model_version)
+
+def description_url(requestId: str, model_name: str) -> str:
+    """Caminho do endpoint que gera a descrição de uma anomalia sob demanda"""
+    return f"/ml/anomalies/{quote(str(requestId), safe='')}/description?model_name={model_name}"
 
 class MLAnomalyDetector:
     """Detector de anomalias usando machine learning"""
@@ -35,138 +114,178 @@ class MLAnomalyDetector:
             'lof': LOF(contamination=0.1),
             'knn': KNN(contamination=0.1),
             'ocsvm': OCSVM(contamination=0.1),
+            'ocsvm_approx': ApproxOCSVM(contamination=0.1, random_state=42),
             'cblof': CBLOF(contamination=0.1, random_state=42)
         }
         self.scaler = StandardScaler()
         self.label_encoders = {}
+        self.vocabulary_encoders = {}
         self.tfidf_vectorizer = TfidfVectorizer(max_features=50, stop_words='english')
         self.is_fitted = False
         self.current_model_name = None
-        
-    def extract_features(self, logs: List[LogEntry]) -> pd.DataFrame:
+        self.model_metadata = {}
+        # Modo ensemble: média e desvio dos scores de treino de cada modelo
+        self.score_normalization = {}
+        self.ensemble_threshold = None
+        # Isolation Forests exportados para arrays planos: nome -> (modelo de origem, FlatIForest)
+        self._flat_models = {}
+        
+    def extract_features(self, logs) -> pd.DataFrame:
         """
-        Extrai características dos logs para análise de anomalias com otimizações de performance
+        Extrai características dos logs para análise de anomalias de forma vetorizada
         
         Características extraídas:
         - Temporais: hora, dia da semana, minuto
         - Requisição: status code, método HTTP, tamanho do path
-        - IP: conversão numérica do IP
+        - IP: conversão numérica do IP (IPv4 e IPv6, ver ip_parsing)
         - Cliente: ID codificado
         - Path: flags para APIs, admin, auth
         - Status: flags para erros, sucessos, redirecionamentos
+        
+        Args:
+            logs: Lista de LogEntry ou DataFrame com as colunas dos logs
         """
-        if not logs:
+        if logs is None or len(logs) == 0:
             return pd.DataFrame()
         
-        # Otimização: Usar listas para construção mais rápida
+        logs_df = self._logs_to_frame(logs)
+        
+        # Características temporais (no fuso de cada timestamp)
+        try:
+            timestamps = pd.to_datetime(logs_df['timestamp'])
+            hours = timestamps.dt.hour.to_numpy()
+            days_of_week = timestamps.dt.weekday.to_numpy()
+            minutes = timestamps.dt.minute.to_numpy()
+        except (ValueError, TypeError, AttributeError):
+            # Fusos horários misturados: extrair campo a campo
+            raw_timestamps = logs_df['timestamp'].tolist()
+            hours = np.array([t.hour for t in raw_timestamps])
+            days_of_week = np.array([t.weekday() for t in raw_timestamps])
+            minutes = np.array([t.minute for t in raw_timestamps])
+        
+        status_codes = logs_df['status'].to_numpy(dtype=np.int64)
+        paths = logs_df['path'].astype(str)
+        paths_lower = paths.str.lower()
+        
+        # Codificação categórica pelo vocabulário do treino (em lote)
+        method_encoded = self._get_vocabulary_encoder('method', logs_df['method']).transform(logs_df['method'])
+        client_id_encoded = self._get_vocabulary_encoder('clientId', logs_df['clientId']).transform(logs_df['clientId'])
+        
+        # Características de status
+        is_server_error = status_codes >= 500
+        is_client_error = (status_codes >= 400) & (status_codes < 500)
+        is_success = (status_codes >= 200) & (status_codes < 300)
+        is_redirect = (status_codes >= 300) & (status_codes < 400)
+        
+        # Ajustar peso dos erros de servidor (não são anomalias do cliente):
+        # tratados como sucesso e não considerados erro
         features_data = {
-            'hour': [],
-            'day_of_week': [],
-            'minute': [],
-            'status_code': [],
-            'method_encoded': [],
-            'path_length': [],
-            'path_depth': [],
-            'ip_numeric': [],
-            'client_id_encoded': [],
-            'is_api_path': [],
-            'is_admin_path': [],
-            'is_auth_path': [],
-            'is_error': [],
-            'is_server_error': [],
-            'is_client_error': [],
-            'is_success': [],
-            'is_redirect': []
+            'hour': hours.astype(np.int64),
+            'day_of_week': days_of_week.astype(np.int64),
+            'minute': minutes.astype(np.int64),
+            'status_code': np.where(is_server_error, 200, status_codes),
+            'method_encoded': method_encoded,
+            'path_length': paths.str.len().to_numpy(dtype=np.int64),
+            'path_depth': paths.str.count('/').to_numpy(dtype=np.int64),
+            'ip_numeric': ips_to_numeric(logs_df['ip'].tolist()),
+            'client_id_encoded': client_id_encoded,
+            'is_api_path': paths.str.contains('/api/', regex=False).to_numpy(dtype=np.int64),
+            'is_admin_path': paths.str.contains('/admin', regex=False).to_numpy(dtype=np.int64),
+            'is_auth_path': paths_lower.str.contains('/login|/auth|/token', regex=True).to_numpy(dtype=np.int64),
+            'is_error': ((status_codes >= 400) & ~is_server_error).astype(np.int64),
+            'is_server_error': is_server_error.astype(np.int64),
+            'is_client_error': is_client_error.astype(np.int64),
+            'is_success': is_success.astype(np.int64),
+            'is_redirect': is_redirect.astype(np.int64)
         }
         
-        # Cache para codificação de métodos
-        method_cache = {}
+        return pd.DataFrame(features_data)
+    
+    def extract_feature_rows(self, logs: List[LogEntry]) -> np.ndarray:
+        """
+        Mesmas características de extract_features, calculadas log a log sem pandas
         
-        # Processar logs em lote
-        for log in logs:
-            # Características temporais
-            features_data['hour'].append(log.timestamp.hour)
-            features_data['day_of_week'].append(log.timestamp.weekday())
-            features_data['minute'].append(log.timestamp.minute)
-            
-            # Características da requisição
-            status_code = log.status
-            features_data['status_code'].append(status_code)
-            
-            # Otimização: Cache para codificação de métodos
-            if log.method not in method_cache:
-                method_cache[log.method] = self._encode_categorical('method', log.method)
-            features_data['method_encoded'].append(method_cache[log.method])
-            
-            # Características do path
-            path_length = len(log.path)
-            path_depth = log.path.count('/')
-            features_data['path_length'].append(path_length)
-            features_data['path_depth'].append(path_depth)
-            
-            # Características do IP (otimizada)
-            ip_parts = log.ip.split('.')
-            ip_numeric = sum(int(part) * (256 ** (3-i)) for i, part in enumerate(ip_parts))
-            features_data['ip_numeric'].append(ip_numeric)
-            
-            # Características do cliente
-            client_id_encoded = self._encode_categorical('clientId', log.clientId)
-            features_data['client_id_encoded'].append(client_id_encoded)
-            
-            # Características do path (otimizadas com operações booleanas)
-            path_lower = log.path.lower()
-            features_data['is_api_path'].append(1 if '/api/' in log.path else 0)
-            features_data['is_admin_path'].append(1 if '/admin' in log.path else 0)
-            features_data['is_auth_path'].append(1 if any(x in path_lower for x in ['/login', '/auth', '/token']) else 0)
-            
-            # Características de status (otimizadas)
-            is_server_error = 1 if status_code >= 500 else 0
-            is_client_error = 1 if 400 <= status_code < 500 else 0
-            is_success = 1 if 200 <= status_code < 300 else 0
-            is_redirect = 1 if 300 <= status_code < 400 else 0
-            
-            # Ajustar peso dos erros de servidor (não são anomalias do cliente)
-            if is_server_error:
-                # Para erros de servidor, usar valores mais próximos do normal
-                features_data['status_code'][-1] = 200  # Tratar como se fosse sucesso
-                is_error = 0  # Não considerar como erro para análise de anomalia
-            else:
-                is_error = 1 if status_code >= 400 else 0
-            
-            features_data['is_error'].append(is_error)
-            features_data['is_server_error'].append(is_server_error)
-            features_data['is_client_error'].append(is_client_error)
-            features_data['is_success'].append(is_success)
-            features_data['is_redirect'].append(is_redirect)
+        Para poucos logs (pontuação de uma requisição) o custo fixo do pandas
+        domina; aqui cada linha custa alguns microssegundos. A ordem das colunas
+        é a de FEATURE_NAMES, a mesma do DataFrame de extract_features.
+        """
+        method_encoder = self._get_vocabulary_encoder('method', [log.method for log in logs])
+        client_encoder = self._get_vocabulary_encoder('clientId', [log.clientId for log in logs])
         
-        # Criar DataFrame de forma otimizada
-        df = pd.DataFrame(features_data)
-        return df
+        rows = []
+        for log in logs:
+            status = int(log.status)
+            path = str(log.path)
+            path_lower = path.lower()
+            is_server_error = status >= 500
+            rows.append((
+                log.timestamp.hour,
+                log.timestamp.weekday(),
+                log.timestamp.minute,
+                200 if is_server_error else status,
+                method_encoder.encode(log.method),
+                len(path),
+                path.count('/'),
+                ip_to_numeric(log.ip),
+                client_encoder.encode(log.clientId),
+                int('/api/' in path),
+                int('/admin' in path),
+                int('/login' in path_lower or '/auth' in path_lower or '/token' in path_lower),
+                int(status >= 400 and not is_server_error),
+                int(is_server_error),
+                int(400 <= status < 500),
+                int(200 <= status < 300),
+                int(300 <= status < 400)
+            ))
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURE_NAMES))
+    
+    def _logs_to_frame(self, logs) -> pd.DataFrame:
+        """Converte a lista de LogEntry em DataFrame (DataFrames são usados como estão)"""
+        if isinstance(logs, pd.DataFrame):
+            return logs
+        return pd.DataFrame({
+            'timestamp': [log.timestamp for log in logs],
+            'status': [log.status for log in logs],
+            'method': [log.method for log in logs],
+            'path': [log.path for log in logs],
+            'ip': [log.ip for log in logs],
+            'clientId': [log.clientId for log in logs]
+        })
+    
+    def fit_vocabularies(self, logs_df: pd.DataFrame):
+        """Constrói os vocabulários de método e cliente a partir dos logs de treino"""
+        self.vocabulary_encoders = {
+            field: VocabularyEncoder(hash_buckets=UNSEEN_HASH_BUCKETS).fit(
+                logs_df[field], base_values=CATEGORICAL_BASE_VALUES.get(field)
+            )
+            for field in CATEGORICAL_FIELDS
+        }
+    
+    def _get_vocabulary_encoder(self, field: str, values) -> VocabularyEncoder:
+        """Retorna o vocabulário do campo (construído com os valores do lote se ainda não existir)"""
+        if field not in self.vocabulary_encoders:
+            self.vocabulary_encoders[field] = VocabularyEncoder(hash_buckets=UNSEEN_HASH_BUCKETS).fit(
+                values, base_values=CATEGORICAL_BASE_VALUES.get(field)
+            )
+        return self.vocabulary_encoders[field]
     
     def _encode_categorical(self, field: str, value: str) -> int:
-        """Codifica valores categóricos usando LabelEncoder"""
-        if field not in self.label_encoders:
-            self.label_encoders[field] = LabelEncoder()
-            # Inicializar com valores conhecidos
-            if field == 'method':
-                known_values = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS']
-            else:
-                known_values = [value]
-            self.label_encoders[field].fit(known_values)
-        
-        try:
-            return self.label_encoders[field].transform([value])[0]
-        except ValueError:
-            # Se o valor não foi visto antes, retornar -1
-            return -1
+        """Codifica um único valor categórico pelo vocabulário (-1 se desconhecido)"""
+        return self._get_vocabulary_encoder(field, [value]).encode(value)
     
-    def train_models(self, logs: List[LogEntry], save_models: bool = True) -> Dict:
+    def train_models(self, logs: List[LogEntry], save_models: bool = True, reference_config: Dict = None,
+                     model_names: List[str] = None) -> Dict:
         """
         Treina os modelos de detecção de anomalias
         
         Args:
             logs: Lista de logs para treinamento
             save_models: Se deve salvar os modelos treinados
+            reference_config: Conjuntos de referência dos modelos de vizinhança
+                ({"max_size", "method", "models"}, ver reference_sets); None ou
+                max_size 0 treina todos os modelos com todos os logs
+            model_names: Modelos a treinar (padrão: DEFAULT_TRAINING_MODELS); os
+                demais saem do detector e são informados em 'models_skipped'
         
         Returns:
             Dict com resultados do treinamento
@@ -174,27 +293,67 @@ class MLAnomalyDetector:
         if len(logs) < 10:
             return {"error": "Poucos dados para treinar (mínimo 10 logs)"}
         
+        with timed_operation("train_models") as timings:
+            return self._train_models(logs, save_models, reference_config or {},
+                                      model_names or DEFAULT_TRAINING_MODELS, timings)
+    
+    def _train_models(self, logs: List[LogEntry], save_models: bool, reference_config: Dict,
+                      model_names: List[str], timings) -> Dict:
+        """Treinamento medido por etapa (ver train_models)"""
         try:
-            # Extrair características
-            features_df = self.extract_features(logs)
+            # Modelos fora da lista não são treinados nem salvos
+            models_skipped = [name for name in self.models if name not in model_names]
+            if models_skipped:
+                print(f"⏭️ Modelos não treinados (fora de training_models): {', '.join(models_skipped)}")
+                self.models = {name: model for name, model in self.models.items() if name in model_names}
+            if not self.models:
+                return {"error": f"Nenhum dos modelos pedidos está disponível: {', '.join(model_names)}"}
+            
+            # Construir vocabulários e extrair características
+            with span("vocabularies"):
+                logs_df = self._logs_to_frame(logs)
+                self.fit_vocabularies(logs_df)
+            with span("extract_features"):
+                features_df = self.extract_features(logs_df)
             
             if features_df.empty:
                 return {"error": "Não foi possível extrair características dos logs"}
             
             # Normalizar características
-            features_scaled = self.scaler.fit_transform(features_df)
-            
-            # Treinar modelos
+            with span("scaling"):
+                features_scaled = self.scaler.fit_transform(features_df)
+            
+            # Treinar modelos (KNN e LOF no conjunto de referência, se configurado)
+            reference_max_size = int(reference_config.get("max_size") or 0)
+            reference_models = reference_config.get("models") or []
+            reference_method = reference_config.get("method", "stratified")
+            reference = None
             results = {}
+            reference_sets = {}
             for name, model in self.models.items():
                 try:
-                    model.fit(features_scaled)
+                    if reference_max_size and name in reference_models and len(features_scaled) > reference_max_size:
+                        # Um único conjunto, compartilhado pelos modelos de vizinhança
+                        if reference is None:
+                            with span("reference_set"):
+                                reference = build_reference_set(features_scaled, reference_max_size, reference_method)
+                        with span(f"fit.{name}"):
+                            reference_sets[name] = {"method": reference_method, **fit_on_reference(model, *reference)}
+                    else:
+                        with span(f"fit.{name}"):
+                            model.fit(features_scaled)
                     results[name] = "treinado"
                 except Exception as e:
                     results[name] = f"erro: {str(e)}"
             
             self.is_fitted = True
             
+            # Normalização dos scores de cada modelo (modo ensemble)
+            with span("score_normalization"):
+                self._fit_score_normalization(
+                    [name for name, status in results.items() if status == "treinado"], features_scaled
+                )
+            
             # Preparar metadados
             metadata = {
                 "trained_at": datetime.now().isoformat(),
@@ -202,6 +361,11 @@ class MLAnomalyDetector:
                 "samples_count": len(features_df),
                 "feature_names": list(features_df.columns),
                 "models_trained": results,
+                "models_skipped": models_skipped,
+                "vocabulary_sizes": {field: len(encoder) for field, encoder in self.vocabulary_encoders.items()},
+                "score_normalization": self.score_normalization,
+                "ensemble_threshold": self.ensemble_threshold,
+                "reference_sets": reference_sets,
                 "feature_stats": {
                     "mean": features_df.mean().to_dict(),
                     "std": features_df.std().to_dict(),
@@ -212,36 +376,83 @@ class MLAnomalyDetector:
             
             # Salvar modelos se solicitado
             if save_models:
-                save_results = save_trained_models(
-                    models=self.models,
-                    scaler=self.scaler,
-                    label_encoders=self.label_encoders,
-                    metadata=metadata
-                )
+                with span("save_models"):
+                    save_results = save_trained_models(
+                        models=self.models,
+                        scaler=self.scaler,
+                        label_encoders=self.label_encoders,
+                        metadata=metadata,
+                        vocabulary_encoders=self.vocabulary_encoders
+                    )
                 metadata["save_results"] = save_results
             
             return {
                 "status": "sucesso",
                 "models_trained": results,
+                "models_skipped": models_skipped,
                 "features_count": len(features_df.columns),
                 "samples_count": len(features_df),
                 "feature_names": list(features_df.columns),
-                "metadata": metadata
+                "metadata": metadata,
+                "timings": timings.as_dict()
             }
             
         except Exception as e:
             return {"error": f"Erro no treinamento: {str(e)}"}
     
+    def _fit_score_normalization(self, model_names: List[str], features_scaled: np.ndarray):
+        """
+        Guarda média e desvio dos scores de treino de cada modelo e o threshold do ensemble
+        
+        Os scores dos modelos estão em escalas diferentes (ex: distância do KNN
+        e profundidade do Isolation Forest); padronizados pelos scores do
+        treino podem ser combinados. O threshold do ensemble é o percentil
+        (1 - contamination) do score combinado no treino, o mesmo critério do
+        threshold_ de cada modelo.
+        """
+        self.score_normalization = {}
+        self.ensemble_threshold = None
+        for name in model_names:
+            training_scores = np.asarray(self.models[name].decision_scores_, dtype=np.float64)
+            # Modelos treinados no conjunto de referência: cada ponto vale os logs que representa
+            weights = getattr(self.models[name], 'reference_weights_', None)
+            mean = float(np.average(training_scores, weights=weights))
+            std = float(np.sqrt(np.average((training_scores - mean) ** 2, weights=weights)))
+            self.score_normalization[name] = {"mean": mean, "std": std if std > 0 else 1.0}
+        if not self.score_normalization:
+            return
+        
+        if len({len(self.models[name].decision_scores_) for name in self.score_normalization}) == 1:
+            model_scores = {name: self.models[name].decision_scores_ for name in self.score_normalization}
+        else:
+            # Scores de treino de conjuntos diferentes: pontuar uma amostra comum dos logs de treino
+            rng = np.random.default_rng(42)
+            rows = rng.choice(len(features_scaled), size=min(ENSEMBLE_CALIBRATION_ROWS, len(features_scaled)),
+                              replace=False)
+            model_scores = {
+                name: self.models[name].decision_function(features_scaled[rows]) for name in self.score_normalization
+            }
+        combined, _ = self.combine_scores({
+            name: (model_scores[name] - params["mean"]) / params["std"]
+            for name, params in self.score_normalization.items()
+        })
+        contamination = np.mean([self.models[name].contamination for name in self.score_normalization])
+        self.ensemble_threshold = float(np.percentile(combined, 100 * (1 - contamination)))
+    
     def load_trained_model(self, model_name: str) -> bool:
         """
         Carrega um modelo treinado salvo
         
         Args:
-            model_name: Nome do modelo a carregar
+            model_name: Nome do modelo a carregar ('ensemble' carrega todos os
+                modelos do último treinamento, ver load_ensemble)
         
         Returns:
             True se carregado com sucesso
         """
+        if model_name == ENSEMBLE_MODEL:
+            return self.load_ensemble()
+        
         try:
             model_data = load_trained_model(model_name)
             if not model_data:
@@ -251,6 +462,8 @@ class MLAnomalyDetector:
             self.models[model_name] = model_data['model']
             self.scaler = model_data['scaler']
             self.label_encoders = model_data['label_encoders']
+            self.vocabulary_encoders = model_data['vocabulary_encoders']
+            self.model_metadata = model_data.get('metadata', {})
             self.is_fitted = True
             self.current_model_name = model_name
             
@@ -261,6 +474,216 @@ class MLAnomalyDetector:
             print(f"❌ Erro ao carregar modelo {model_name}: {e}")
             return False
     
+    def load_ensemble(self) -> bool:
+        """
+        Carrega os modelos salvos do último treinamento para o modo ensemble
+        
+        Os modelos compartilham os preprocessadores desse treinamento; modelos
+        salvos por outro treinamento (ex: importados depois) ficam de fora.
+        
+        Returns:
+            True se ao menos um modelo foi carregado
+        """
+        try:
+            metadata = get_ensemble_metadata()
+            if metadata is None:
+                print("❌ Nenhum treinamento com normalização de scores encontrado. Treine os modelos novamente.")
+                return False
+            
+            version = get_model_version(metadata)
+            members = []
+            for model_name in metadata['score_normalization']:
+                model_data = load_trained_model(model_name)
+                if not model_data or get_model_version(model_data.get('metadata', {})) != version:
+                    continue
+                self.models[model_name] = model_data['model']
+                if not members:
+                    self.scaler = model_data['scaler']
+                    self.label_encoders = model_data['label_encoders']
+                    self.vocabulary_encoders = model_data['vocabulary_encoders']
+                members.append(model_name)
+            
+            if not members:
+                print("❌ Nenhum modelo do último treinamento encontrado para o ensemble")
+                return False
+            if len(members) < len(metadata['score_normalization']):
+                print("⚠️ Ensemble sem parte dos modelos do treinamento; threshold do treino mantido")
+            
+            self.model_metadata = metadata
+            self.score_normalization = {name: metadata['score_normalization'][name] for name in members}
+            self.ensemble_threshold = metadata.get('ensemble_threshold')
+            self.is_fitted = True
+            self.current_model_name = ENSEMBLE_MODEL
+            
+            print(f"✅ Ensemble carregado com os modelos: {', '.join(members)}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Erro ao carregar ensemble: {e}")
+            return False
+    
+    def load_incremental_base(self) -> List[str]:
+        """
+        Carrega os modelos salvos que podem ser atualizados (iforest, knn e lof)
+        
+        Apenas os modelos do treinamento mais recente são carregados, pois
+        compartilham o scaler e os vocabulários que a atualização continua.
+        
+        Returns:
+            Nomes dos modelos carregados (vazio se não há modelos salvos)
+        """
+        loaded = {}
+        for model_name in INCREMENTAL_MODELS:
+            model_data = load_trained_model(model_name)
+            if model_data:
+                loaded[model_name] = model_data
+        if not loaded:
+            return []
+        
+        version = max(get_model_version(model_data.get('metadata', {})) for model_data in loaded.values())
+        members = [name for name, model_data in loaded.items()
+                   if get_model_version(model_data.get('metadata', {})) == version]
+        base = loaded[members[0]]
+        self.models = {name: loaded[name]['model'] for name in members}
+        self.scaler = base['scaler']
+        self.label_encoders = base['label_encoders']
+        self.vocabulary_encoders = base['vocabulary_encoders']
+        self.model_metadata = base.get('metadata', {})
+        self.is_fitted = True
+        return members
+    
+    def update_models(self, logs: List[LogEntry], save_models: bool = True, incremental_config: Dict = None,
+                      reference_config: Dict = None) -> Dict:
+        """
+        Atualiza os modelos carregados (ver load_incremental_base) com logs novos
+        
+        O scaler acumula a média e a variância dos logs novos e o que já foi
+        treinado é convertido para a nova escala; o Isolation Forest ganha
+        new_trees árvores treinadas nos logs novos (até max_trees) e KNN e LOF
+        renovam o conjunto de referência. Os vocabulários não mudam: valores
+        novos de método e cliente só entram na próxima reconstrução completa.
+        
+        Args:
+            logs: Logs novos desde o último treinamento ou atualização
+            save_models: Se deve salvar os modelos atualizados
+            incremental_config: Seção "incremental_training" (ver incremental)
+            reference_config: Seção "reference_sets" (max_size dos modelos de
+                vizinhança; 0 mantém o tamanho atual do conjunto)
+        
+        Returns:
+            Dict com resultados da atualização
+        """
+        if not self.is_fitted or not self.models:
+            return {"error": "Nenhum modelo carregado para atualizar"}
+        if len(logs) < 10:
+            return {"error": "Poucos dados para atualizar (mínimo 10 logs)"}
+        
+        with timed_operation("update_models") as timings:
+            return self._update_models(logs, save_models, {**DEFAULT_INCREMENTAL_CONFIG, **(incremental_config or {})},
+                                       reference_config or {}, timings)
+    
+    def _update_models(self, logs: List[LogEntry], save_models: bool, incremental_config: Dict,
+                       reference_config: Dict, timings) -> Dict:
+        """Atualização medida por etapa (ver update_models)"""
+        try:
+            with span("extract_features"):
+                features_df = self.extract_features(self._logs_to_frame(logs))
+            
+            if features_df.empty:
+                return {"error": "Não foi possível extrair características dos logs"}
+            
+            # Média e variância acumuladas; a escala anterior converte o que já foi treinado
+            with span("scaling"):
+                previous = update_scaler(self.scaler, features_df)
+                features_scaled = self.scaler.transform(features_df)
+            
+            results = {}
+            updates = {}
+            reference_sets = dict(self.model_metadata.get("reference_sets") or {})
+            shared_references = {}
+            for name, model in self.models.items():
+                try:
+                    with span(f"update.{name}"):
+                        if name == 'iforest':
+                            rescale_iforest(model, previous, self.scaler)
+                            updates[name] = warm_start_iforest(model, features_scaled,
+                                                               int(incremental_config["new_trees"]),
+                                                               int(incremental_config["max_trees"]))
+                        else:
+                            max_size = reference_config.get("max_size") if name in (reference_config.get("models") or []) else 0
+                            reference_sets[name] = updates[name] = refresh_reference(
+                                model, features_scaled, previous, self.scaler, int(max_size or 0),
+                                reference_config.get("method", "stratified"), shared=shared_references
+                            )
+                    results[name] = "atualizado"
+                except Exception as e:
+                    results[name] = f"erro: {str(e)}"
+            
+            # Modelos com erro ficam como estavam no disco (com o scaler anterior)
+            updated = [name for name, status in results.items() if status == "atualizado"]
+            if not updated:
+                return {"error": f"Nenhum modelo atualizado: {results}"}
+            self._flat_models = {}
+            
+            with span("score_normalization"):
+                self._fit_score_normalization(updated, features_scaled)
+            
+            # Metadados do treinamento anterior com a nova versão e o histórico de atualizações
+            previous_metadata = self.model_metadata
+            incremental = previous_metadata.get("incremental") or {}
+            stats = previous_metadata.get("feature_stats") or {}
+            columns = list(features_df.columns)
+            metadata = {
+                **previous_metadata,
+                "trained_at": datetime.now().isoformat(),
+                "samples_count": int(previous_metadata.get("samples_count", 0)) + len(features_df),
+                "models_trained": results,
+                "score_normalization": self.score_normalization,
+                "ensemble_threshold": self.ensemble_threshold,
+                "reference_sets": reference_sets,
+                "feature_stats": {
+                    "mean": dict(zip(columns, self.scaler.mean_.tolist())),
+                    "std": dict(zip(columns, self.scaler.scale_.tolist())),
+                    "min": {column: min(float(value), stats.get("min", {}).get(column, float(value)))
+                            for column, value in features_df.min().items()},
+                    "max": {column: max(float(value), stats.get("max", {}).get(column, float(value)))
+                            for column, value in features_df.max().items()}
+                },
+                "incremental": {
+                    "base_trained_at": incremental.get("base_trained_at") or get_model_version(previous_metadata),
+                    "updates": int(incremental.get("updates", 0)) + 1,
+                    "new_samples": len(features_df),
+                    "models": updates
+                }
+            }
+            self.model_metadata = metadata
+            
+            if save_models:
+                with span("save_models"):
+                    save_results = save_trained_models(
+                        models={name: self.models[name] for name in updated},
+                        scaler=self.scaler,
+                        label_encoders=self.label_encoders,
+                        metadata=metadata,
+                        vocabulary_encoders=self.vocabulary_encoders
+                    )
+                metadata["save_results"] = save_results
+            
+            return {
+                "status": "sucesso",
+                "mode": "incremental",
+                "models_trained": results,
+                "updates": updates,
+                "features_count": len(columns),
+                "samples_count": len(features_df),
+                "feature_names": columns,
+                "metadata": metadata,
+                "timings": timings.as_dict()
+            }
+            
+        except Exception as e:
+            return {"error": f"Erro na atualização: {str(e)}"}
+    
     def _analyze_ip_changes(self, current_log: LogEntry, all_logs: List[LogEntry], hours_back: int = 24) -> List[str]:
         """
         Analisa mudanças de IP considerando ranges CIDR e padrões por cliente
@@ -295,11 +718,7 @@ class MLAnomalyDetector:
             
             # Verificar se o IP atual está dentro dos ranges conhecidos do cliente
             if client_ip_patterns['known_ranges']:
-                ip_in_known_range = False
-                for cidr_range in client_ip_patterns['known_ranges']:
-                    if self._ip_in_cidr_range(current_ip, cidr_range):
-                        ip_in_known_range = True
-                        break
+                ip_in_known_range = IPRangeIndex(client_ip_patterns['known_ranges']).contains(current_ip)
                 
                 if not ip_in_known_range:
                     ip_changes.append(f"IP fora dos ranges conhecidos do cliente ({current_ip})")
@@ -405,42 +824,28 @@ class MLAnomalyDetector:
             if not ip_list:
                 return []
             
-            # Ordenar IPs
-            sorted_ips = sorted(ip_list, key=lambda x: [int(i) for i in x.split('.')])
-            
-            # Tentar identificar ranges comuns
+            unique_ips = [ip for ip in dict.fromkeys(ip_list) if parse_ip(ip) is not None]
             ranges = []
             
-            # Verificar ranges privados comuns
-            private_ranges = [
-                "10.0.0.0/8",
-                "172.16.0.0/12", 
-                "192.168.0.0/16"
-            ]
+            # Verificar ranges privados comuns (um único lote no índice)
+            private_counts = Counter(
+                cidr for cidr in private_range_index.lookup_many(unique_ips) if cidr is not None
+            )
+            ranges.extend(cidr for cidr, count in private_counts.items() if count >= 2)  # Pelo menos 2 IPs no range
+            
+            # Agrupar IPs públicos por prefixo (simulando ASN): /8 para IPv4, /16 para IPv6
+            public_groups = Counter()
+            for ip, is_private in zip(unique_ips, private_index.lookup_many(unique_ips, False)):
+                if is_private:
+                    continue
+                version, value = parse_ip(ip)
+                if version == 4:
+                    public_groups[f"{value >> 24}.0.0.0/8"] += 1
+                else:
+                    public_groups[f"{value >> 112:x}::/16"] += 1
             
-            for cidr in private_ranges:
-                ips_in_range = [ip for ip in sorted_ips if self._ip_in_cidr_range(ip, cidr)]
-                if len(ips_in_range) >= 2:  # Pelo menos 2 IPs no range
-                    ranges.append(cidr)
-            
-            # Verificar ranges públicos por subnets
-            public_ips = [ip for ip in sorted_ips if not self._is_private_ip(ip)]
-            
-            if public_ips:
-                # Agrupar por primeiros octetos (simulando ASN)
-                first_octet_groups = {}
-                for ip in public_ips:
-                    first_octet = ip.split('.')[0]
-                    if first_octet not in first_octet_groups:
-                        first_octet_groups[first_octet] = []
-                    first_octet_groups[first_octet].append(ip)
-                
-                # Criar ranges para grupos com múltiplos IPs
-                for first_octet, ips in first_octet_groups.items():
-                    if len(ips) >= 2:
-                        # Tentar criar um range /8 para o primeiro octeto
-                        range_cidr = f"{first_octet}.0.0.0/8"
-                        ranges.append(range_cidr)
+            # Criar ranges para grupos com múltiplos IPs
+            ranges.extend(cidr for cidr, count in public_groups.items() if count >= 2)
             
             return list(set(ranges))
             
@@ -453,31 +858,13 @@ class MLAnomalyDetector:
         Verifica se um IP está dentro de um range CIDR
         
         Args:
-            ip: IP para verificar
+            ip: IP para verificar (IPv4 ou IPv6)
             cidr: Range CIDR (ex: "192.168.1.0/24")
         
         Returns:
             True se o IP está no range
         """
-        try:
-            ip_parts = [int(x) for x in ip.split('.')]
-            cidr_parts = cidr.split('/')
-            cidr_ip = [int(x) for x in cidr_parts[0].split('.')]
-            mask = int(cidr_parts[1])
-            
-            # Calcular máscara de rede
-            mask_bits = (0xFFFFFFFF << (32 - mask)) & 0xFFFFFFFF
-            
-            # Converter IPs para inteiros
-            ip_int = (ip_parts[0] << 24) + (ip_parts[1] << 16) + (ip_parts[2] << 8) + ip_parts[3]
-            cidr_int = (cidr_ip[0] << 24) + (cidr_ip[1] << 16) + (cidr_ip[2] << 8) + cidr_ip[3]
-            
-            # Verificar se está no range
-            return (ip_int & mask_bits) == (cidr_int & mask_bits)
-            
-        except Exception as e:
-            print(f"Erro ao verificar IP em range CIDR: {e}")
-            return False
+        return ip_in_network(ip, cidr)
     
     def _is_private_ip(self, ip: str) -> bool:
         """
@@ -489,22 +876,7 @@ class MLAnomalyDetector:
         Returns:
             True se o IP é privado
         """
-        try:
-            parts = [int(x) for x in ip.split('.')]
-            
-            # Ranges privados
-            if parts[0] == 10:
-                return True
-            elif parts[0] == 172 and 16 <= parts[1] <= 31:
-                return True
-            elif parts[0] == 192 and parts[1] == 168:
-                return True
-            
-            return False
-            
-        except Exception as e:
-            print(f"Erro ao verificar IP privado: {e}")
-            return False
+        return private_index.contains(ip)
     
     def _get_network_type(self, ip: str) -> str:
         """
@@ -516,19 +888,9 @@ class MLAnomalyDetector:
         Returns:
             String com o tipo de rede
         """
-        try:
-            if self._is_private_ip(ip):
-                return "private"
-            elif ip.startswith("127."):
-                return "loopback"
-            elif ip.startswith("169.254."):
-                return "link_local"
-            elif ip.startswith("224.") or ip.startswith("225.") or ip.startswith("226.") or ip.startswith("227.") or ip.startswith("228.") or ip.startswith("229.") or ip.startswith("230.") or ip.startswith("231.") or ip.startswith("232.") or ip.startswith("233.") or ip.startswith("234.") or ip.startswith("235.") or ip.startswith("236.") or ip.startswith("237.") or ip.startswith("238.") or ip.startswith("239."):
-                return "multicast"
-            else:
-                return "public"
-        except:
+        if parse_ip(ip) is None:
             return "unknown"
+        return network_type_index.lookup(ip, "public")
     
     def _identify_asn_ranges(self, ip_list: List[str]) -> List[str]:
         """
@@ -544,10 +906,11 @@ class MLAnomalyDetector:
             asn_ranges = set()
             
             for ip in ip_list:
-                if not self._is_private_ip(ip):
-                    # Simular identificação de ASN baseado no primeiro octeto
-                    first_octet = ip.split('.')[0]
-                    asn_ranges.add(f"ASN_{first_octet}")
+                parsed = parse_ip(ip)
+                if parsed is not None and not self._is_private_ip(ip):
+                    # Simular identificação de ASN baseado no primeiro octeto (IPv6: primeiro hexteto)
+                    version, value = parsed
+                    asn_ranges.add(f"ASN_{value >> 24}" if version == 4 else f"ASN_{value >> 112:x}")
             
             return list(asn_ranges)
             
@@ -599,38 +962,10 @@ class MLAnomalyDetector:
             ip: IP para verificação
         
         Returns:
-            True se o IP está em range suspeito
+            True se o IP está em range suspeito (VPNs, proxies, DNS públicos)
         """
-        try:
-            # Ranges conhecidos de VPNs, proxies, etc.
-            suspicious_ranges = [
-                "1.1.1.0/24",  # Cloudflare DNS
-                "8.8.8.0/24",  # Google DNS
-                "208.67.222.0/24",  # OpenDNS
-                "185.228.168.0/24",  # CleanBrowsing
-                "176.103.130.0/24",  # AdGuard
-            ]
-            
-            for cidr in suspicious_ranges:
-                if self._ip_in_cidr_range(ip, cidr):
-                    return True
-            
-            # Verificar IPs de datacenters conhecidos
-            datacenter_patterns = [
-                "aws", "amazon", "google", "azure", "cloudflare", "digitalocean",
-                "linode", "vultr", "ovh", "hetzner", "rackspace"
-            ]
-            
-            # Simular verificação de datacenter (em produção, usar API de geolocalização)
-            # Por enquanto, apenas verificar ranges específicos
-            if self._is_private_ip(ip):
-                return False  # IPs privados geralmente não são suspeitos
-            
-            return False
-            
-        except Exception as e:
-            print(f"Erro ao verificar range suspeito: {e}")
-            return False
+        # Em produção, complementar com API de geolocalização/datacenters
+        return suspicious_index.contains(ip)
     
     def generate_anomaly_description(self, features: dict, score: float, model_name: str = 'iforest', 
                                    current_log: LogEntry = None, all_logs: List[LogEntry] = None) -> str:
@@ -681,110 +1016,307 @@ class MLAnomalyDetector:
             print(f"Erro ao gerar descrição ML: {e}")
             return f"Anomalia detectada pelo modelo {model_name} (Score: {score:.3f})"
     
-    def detect_anomalies(self, logs: List[LogEntry], model_name: str = 'iforest', threshold: float = None) -> Dict:
+    def _describe_anomalies(self, anomalies: List[Dict], model_name: str, logs: List[LogEntry]):
+        """
+        Preenche 'anomaly_description' das anomalias em uma única passada
+        
+        Descrições já memorizadas para a versão atual do modelo são reaproveitadas;
+        as novas entram no memo usado por /ml/anomalies/{requestId}/description.
+        """
+        try:
+            from .anomaly_description_ml import description_ml
+            
+            version = self.model_version
+            pending = []
+            for anomaly in anomalies:
+                cached = description_memo.get((anomaly["requestId"], model_name, version))
+                if cached is not None:
+                    anomaly["anomaly_description"] = cached["description"]
+                else:
+                    pending.append(anomaly)
+            if not pending:
+                return
+            
+            context = description_ml.build_context([
+                {'ip': log.ip, 'clientId': log.clientId, 'apiId': log.apiId, 'method': log.method}
+                for log in logs
+            ])
+            for anomaly, described in zip(pending, description_ml.generate_ml_descriptions(pending, context)):
+                anomaly["anomaly_description"] = described["description"]
+                description_memo.put((anomaly["requestId"], model_name, version), described)
+                
+        except Exception as e:
+            # Fallback em caso de erro
+            print(f"Erro ao gerar descrições ML: {e}")
+            for anomaly in anomalies:
+                anomaly.setdefault(
+                    "anomaly_description",
+                    f"Anomalia detectada pelo modelo {model_name} (Score: {anomaly['anomaly_score']:.3f})"
+                )
+    
+    @property
+    def model_version(self) -> str:
+        """Versão do modelo carregado (data do treinamento)"""
+        return get_model_version(self.model_metadata)
+    
+    @property
+    def detection_generation(self) -> str:
+        """Versão das detecções armazenadas (data do último treinamento completo)"""
+        return get_detection_generation(self.model_metadata)
+    
+    def has_model(self, model_name: str) -> bool:
+        """Se o modelo (ou o ensemble) pode pontuar logs neste detector"""
+        if model_name == ENSEMBLE_MODEL:
+            return bool(self.score_normalization)
+        return model_name in self.models
+    
+    def decision_scores(self, features_scaled: np.ndarray, model_name: str) -> np.ndarray:
+        """
+        Scores brutos do modelo (maior = mais anômalo)
+        
+        Lotes pequenos do Isolation Forest são pontuados pelos arrays planos
+        (mesmos scores do decision_function, sem o custo fixo por árvore).
+        """
+        model = self.models[model_name]
+        if isinstance(model, IForest) and len(features_scaled) <= FLAT_IFOREST_MAX_ROWS:
+            source, flat = self._flat_models.get(model_name, (None, None))
+            if source is not model:
+                flat = FlatIForest.from_model(model)
+                self._flat_models[model_name] = (model, flat)
+            return flat.decision_function(features_scaled)
+        return model.decision_function(features_scaled)
+    
+    def ensemble_scores(self, features_scaled: np.ndarray) -> Dict[str, np.ndarray]:
+        """Score padronizado (pelos scores do treino) de cada modelo do ensemble"""
+        if not self.score_normalization:
+            raise ValueError("Ensemble indisponível: treine os modelos novamente para gerar a normalização dos scores")
+        return {
+            name: (self.decision_scores(features_scaled, name) - params["mean"]) / params["std"]
+            for name, params in self.score_normalization.items()
+        }
+    
+    def combine_scores(self, model_scores: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Score do ensemble (média dos scores padronizados) e rótulos pelo threshold do ensemble"""
+        combined = np.mean(np.vstack(list(model_scores.values())), axis=0)
+        if self.ensemble_threshold is None:
+            return combined, np.zeros(len(combined), dtype=bool)
+        return combined, combined > self.ensemble_threshold
+    
+    def score(self, features_scaled: np.ndarray, model_name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores e rótulos do modelo para características já normalizadas
+        
+        O rótulo usa o mesmo critério de model.predict (score acima do
+        threshold_ do treino), sem calcular os scores uma segunda vez.
+        Com model_name='ensemble' todos os modelos pontuam as mesmas
+        características e os scores padronizados são combinados.
+        """
+        if model_name == ENSEMBLE_MODEL:
+            return self.combine_scores(self.ensemble_scores(features_scaled))
+        anomaly_scores = self.decision_scores(features_scaled, model_name)
+        return anomaly_scores, anomaly_scores > self.models[model_name].threshold_
+    
+    def prefilter_scores(self, prefilter: str, logs: List[LogEntry], features_df: pd.DataFrame,
+                         features_scaled: np.ndarray) -> np.ndarray:
+        """
+        Score barato usado para escolher os candidatos da cascata (maior = mais suspeito)
+        
+        Args:
+            prefilter: 'zscore' (distância média, em desvios padrão, das
+                estatísticas do treino em feature_stats) ou 'iforest' (modelo
+                Isolation Forest treinado)
+        """
+        if prefilter == 'zscore':
+            stats = self.model_metadata.get('feature_stats') or {}
+            if stats.get('mean') and stats.get('std'):
+                mean = np.array([stats['mean'].get(column, 0.0) for column in features_df.columns], dtype=np.float64)
+                std = np.array([stats['std'].get(column) or 1.0 for column in features_df.columns], dtype=np.float64)
+                std[~np.isfinite(std) | (std == 0)] = 1.0
+                z_scores = (features_df.to_numpy(dtype=np.float64) - mean) / std
+            else:
+                # Modelos antigos sem feature_stats: o scaler do treino também é um z-score
+                z_scores = np.asarray(features_scaled, dtype=np.float64)
+            return np.sqrt(np.mean(z_scores ** 2, axis=1))
+        
+        if prefilter == 'iforest':
+            from .model_cache import model_cache
+            prefilter_detector = model_cache.get('iforest')
+            if prefilter_detector is None:
+                raise ValueError("Modelo iforest não encontrado para o pré-filtro. Treine os modelos ou use cascade=zscore")
+            if prefilter_detector.model_version != self.model_version:
+                # Treinado em outro momento: usar os próprios preprocessadores
+                features_scaled = prefilter_detector.scaler.transform(prefilter_detector.extract_features(logs))
+            return prefilter_detector.decision_scores(features_scaled, 'iforest')
+        
+        raise ValueError(f"Pré-filtro '{prefilter}' inválido. Use: {', '.join(CASCADE_PREFILTERS)}")
+    
+    def detect_anomalies(self, logs: List[LogEntry], model_name: str = 'iforest', threshold: float = None,
+                         include_descriptions: bool = False, cascade: str = None,
+                         cascade_top_percent: float = 20.0) -> Dict:
         """
         Detecta anomalias usando o modelo especificado
         
         Args:
             logs: Lista de logs para análise
-            model_name: Nome do modelo a usar
+            model_name: Nome do modelo a usar ('ensemble' combina todos os
+                modelos em uma passada; o score é a média dos scores
+                padronizados e cada log traz 'model_scores')
             threshold: Score mínimo para considerar como anomalia (opcional)
+            include_descriptions: Gerar as descrições agora; caso contrário cada
+                anomalia traz apenas 'description_url' para gerar sob demanda
+            cascade: Pré-filtro barato ('zscore' ou 'iforest'); apenas os
+                cascade_top_percent% mais suspeitos passam pelo modelo, os
+                demais são considerados normais (None = todos os logs no modelo)
+            cascade_top_percent: Percentual de logs enviados ao modelo na cascata
         
         Returns:
-            Dict com anomalias detectadas
+            Dict com anomalias detectadas (e 'cascade' com os logs vistos por etapa)
         """
         if not self.is_fitted:
             return {"error": "Modelos não foram treinados. Execute train_models primeiro."}
         
-        if model_name not in self.models:
+        if not self.has_model(model_name):
             return {"error": f"Modelo '{model_name}' não encontrado"}
         
+        if cascade is not None:
+            if cascade not in CASCADE_PREFILTERS:
+                return {"error": f"Pré-filtro '{cascade}' inválido. Use: {', '.join(CASCADE_PREFILTERS)}"}
+            if cascade == model_name:
+                return {"error": f"O pré-filtro e o modelo da cascata não podem ser o mesmo ({model_name})"}
+            if not 0 < cascade_top_percent <= 100:
+                return {"error": "cascade_top_percent deve estar entre 0 e 100"}
+        
         try:
             # Extrair características
-            features_df = self.extract_features(logs)
+            with span("extract_features"):
+                features_df = self.extract_features(logs)
             
             if features_df.empty:
                 return {"error": "Não foi possível extrair características dos logs"}
             
             # Normalizar características
-            features_scaled = self.scaler.transform(features_df)
+            with span("scaling"):
+                features_scaled = self.scaler.transform(features_df)
+            
+            # Cascata: o pré-filtro pontua todos, o modelo apenas os candidatos
+            indices = np.arange(len(logs))
+            candidate_features = features_scaled
+            if cascade is not None:
+                with span("prefilter"):
+                    prefilter_scores = self.prefilter_scores(cascade, logs, features_df, features_scaled)
+                    candidates = max(1, int(np.ceil(len(logs) * cascade_top_percent / 100)))
+                    if candidates < len(logs):
+                        indices = np.sort(np.argpartition(-prefilter_scores, candidates - 1)[:candidates])
+                        candidate_features = features_scaled[indices]
             
             # Detectar anomalias
-            model = self.models[model_name]
-            anomaly_scores = model.decision_function(features_scaled)
-            anomaly_labels = model.predict(features_scaled)
-            
-            # Organizar resultados
-            anomalies = []
-            normal_logs = []
-            
-            for i, (log, score, is_anomaly) in enumerate(zip(logs, anomaly_scores, anomaly_labels)):
-                log_info = {
-                    "index": i,
-                    "requestId": log.requestId,
-                    "clientId": log.clientId,
-                    "ip": log.ip,
-                    "apiId": log.apiId,
-                    "method": log.method,
-                    "path": log.path,
-                    "status": log.status,
-                    "timestamp": log.timestamp.isoformat(),
-                    "anomaly_score": float(score),
-                    "is_anomaly": bool(is_anomaly),
-                    "features": features_df.iloc[i].to_dict()
-                }
-                
-                if is_anomaly:
-                    # Gerar descrição da anomalia
-                    log_info["anomaly_description"] = self.generate_anomaly_description(
-                        features_df.iloc[i].to_dict(), 
-                        float(score), 
-                        model_name,
-                        log,
-                        logs
-                    )
-                    anomalies.append(log_info)
+            model_scores = None
+            with span("decision_function"):
+                if model_name == ENSEMBLE_MODEL:
+                    model_scores = self.ensemble_scores(candidate_features)
+                    anomaly_scores, anomaly_labels = self.combine_scores(model_scores)
                 else:
-                    normal_logs.append(log_info)
-            
-            # Aplicar threshold de score se fornecido
-            if threshold is not None:
-                anomalies = [a for a in anomalies if a["anomaly_score"] >= threshold]
-            
-            # Calcular estatísticas
-            total_logs = len(logs)
-            anomalies_detected = len(anomalies)
-            anomaly_rate = (anomalies_detected / total_logs * 100) if total_logs > 0 else 0
-            
-            # Estatísticas dos scores
-            if anomaly_scores.size > 0:
-                score_stats = {
-                    "min": float(np.min(anomaly_scores)),
-                    "max": float(np.max(anomaly_scores)),
-                    "mean": float(np.mean(anomaly_scores)),
-                    "std": float(np.std(anomaly_scores)),
-                    "median": float(np.median(anomaly_scores))
+                    anomaly_scores, anomaly_labels = self.score(candidate_features, model_name)
+            
+            with span("build_results"):
+                result = self._build_detection_result(
+                    logs, features_df, indices, anomaly_scores, anomaly_labels, model_name, threshold, model_scores
+                )
+            
+            logs_scored.inc(len(indices), model=model_name)
+            anomalies_found.inc(result["anomalies_detected"], model=model_name)
+            
+            if cascade is not None:
+                result["cascade"] = {
+                    "prefilter": cascade,
+                    "top_percent": cascade_top_percent,
+                    "stages": {"prefilter": len(logs), model_name: len(indices)},
+                    "logs_skipped": len(logs) - len(indices)
                 }
-            else:
-                score_stats = {"min": 0, "max": 0, "mean": 0, "std": 0, "median": 0}
-            
-            # Organizar resultado final
-            result = {
-                "model_used": model_name,
-                "logs_analyzed": total_logs,
-                "anomalies_detected": anomalies_detected,
-                "anomaly_rate": round(anomaly_rate, 2),
-                "score_statistics": score_stats,
-                "anomalies": anomalies,
-                "normal_logs": normal_logs,
-                "threshold_used": threshold
-            }
+            if model_scores is not None:
+                result["ensemble"] = {"models": list(model_scores), "ensemble_threshold": self.ensemble_threshold}
+            
+            # Descrições apenas quando pedidas (em lote, com os logs analisados como contexto)
+            if include_descriptions and result["anomalies"]:
+                with span("descriptions"):
+                    self._describe_anomalies(result["anomalies"], model_name, logs)
             
             return result
             
         except Exception as e:
             return {"error": f"Erro na detecção: {str(e)}"}
     
+    def _build_detection_result(self, logs: List[LogEntry], features_df: pd.DataFrame, indices: np.ndarray,
+                                anomaly_scores: np.ndarray, anomaly_labels: np.ndarray, model_name: str,
+                                threshold: Optional[float], model_scores: Dict[str, np.ndarray] = None) -> Dict:
+        """
+        Organiza os scores do modelo no resultado da detecção
+        
+        Args:
+            indices: Posição em logs de cada score (todos os logs, ou os candidatos da cascata)
+            model_scores: Scores padronizados de cada modelo (modo ensemble)
+        """
+        anomalies = []
+        normal_logs = []
+        
+        for position, (i, score, is_anomaly) in enumerate(zip(indices, anomaly_scores, anomaly_labels)):
+            log = logs[i]
+            log_info = {
+                "index": int(i),
+                "requestId": log.requestId,
+                "clientId": log.clientId,
+                "ip": log.ip,
+                "apiId": log.apiId,
+                "method": log.method,
+                "path": log.path,
+                "status": log.status,
+                "timestamp": log.timestamp.isoformat(),
+                "anomaly_score": float(score),
+                "is_anomaly": bool(is_anomaly),
+                "features": features_df.iloc[i].to_dict()
+            }
+            if model_scores is not None:
+                log_info["model_scores"] = {name: float(scores[position]) for name, scores in model_scores.items()}
+            
+            if is_anomaly:
+                log_info["description_url"] = description_url(log.requestId, model_name)
+                anomalies.append(log_info)
+            else:
+                normal_logs.append(log_info)
+        
+        # Aplicar threshold de score se fornecido
+        if threshold is not None:
+            anomalies = [a for a in anomalies if a["anomaly_score"] >= threshold]
+        
+        # Calcular estatísticas
+        total_logs = len(logs)
+        anomalies_detected = len(anomalies)
+        anomaly_rate = (anomalies_detected / total_logs * 100) if total_logs > 0 else 0
+        
+        # Estatísticas dos scores
+        if anomaly_scores.size > 0:
+            score_stats = {
+                "min": float(np.min(anomaly_scores)),
+                "max": float(np.max(anomaly_scores)),
+                "mean": float(np.mean(anomaly_scores)),
+                "std": float(np.std(anomaly_scores)),
+                "median": float(np.median(anomaly_scores))
+            }
+        else:
+            score_stats = {"min": 0, "max": 0, "mean": 0, "std": 0, "median": 0}
+        
+        # Organizar resultado final
+        return {
+            "model_used": model_name,
+            "logs_analyzed": total_logs,
+            "anomalies_detected": anomalies_detected,
+            "anomaly_rate": round(anomaly_rate, 2),
+            "score_statistics": score_stats,
+            "anomalies": anomalies,
+            "normal_logs": normal_logs,
+            "threshold_used": threshold
+        }
+    
     def compare_models(self, logs: List[LogEntry]) -> Dict:
         """
         Compara diferentes modelos de detecção de anomalias
@@ -834,12 +1366,18 @@ def train_ml_models_with_collection(apiId: str = None, hours_back: int = 24, sav
     Returns:
         Dict com resultados do treinamento
     """
+    with timed_operation("train_ml_models_with_collection") as timings:
+        return _train_ml_models_with_collection(save_models, timings)
+
+def _train_ml_models_with_collection(save_models: bool, timings) -> Dict:
+    """Treinamento com a coleção de treinamento medido por etapa (ver train_ml_models_with_collection)"""
     try:
-        from .db import db
+        from .db import analytics_db
         
         # Verificar se existe coleção de treinamento
-        training_collection = db.training_logs
-        training_docs = list(training_collection.find())
+        training_collection = analytics_db.training_logs
+        with span("fetch_logs"):
+            training_docs = list(training_collection.find())
         
         if not training_docs:
             return {"error": "Nenhum log de treinamento encontrado. Execute o retreinamento primeiro."}
@@ -861,62 +1399,187 @@ def train_ml_models_with_collection(apiId: str = None, hours_back: int = 24, sav
         
         # Treinar modelos
         detector = MLAnomalyDetector()
-        result = detector.train_models(logs, save_models)
+        result = detector.train_models(logs, save_models, reference_config=get_reference_config(),
+                                     model_names=_get_training_models())
         
         if "error" not in result:
             result["logs_used"] = len(logs)
             result["training_source"] = "feedback_enhanced"
             result["message"] = f"Modelo treinado com {len(logs)} logs (incluindo feedback)"
+            result["timings"] = timings.as_dict()
         
         return result
         
     except Exception as e:
         return {"error": f"Erro no treinamento com coleção: {str(e)}"}
 
-def train_ml_models(apiId: str = None, hours_back: int = 24, save_models: bool = True) -> Dict:
+def _fetch_training_logs(apiId: Optional[str], cutoff_time: datetime) -> Tuple[List[LogEntry], Optional[Dict]]:
+    """
+    Logs a partir de cutoff_time, amostrados em uma passada pelo cursor se a
+    seção "training_sampling" estiver habilitada
+    
+    Returns:
+        (logs, resumo da amostragem ou None sem amostragem)
+    """
+    sampling_config = get_sampling_config()
+    if not sampling_config.get("enabled"):
+        return list(iter_logs(apiId=apiId, cutoff_time=cutoff_time)), None
+    
+    sampler = StratifiedReservoirSampler(
+        max_logs=int(sampling_config["max_logs"]),
+        max_per_stratum=int(sampling_config["max_per_stratum"]),
+        strata=sampling_config.get("strata")
+    )
+    sampler.extend(iter_logs(apiId=apiId, cutoff_time=cutoff_time))
+    sampling = sampler.summary()
+    print(f"🎲 Amostragem: {sampling['logs_kept']} de {sampling['logs_seen']} logs "
+          f"({sampling['strata']} estratos, {sampling['strata_capped']} limitados)")
+    return sampler.sample(), sampling
+
+def train_ml_models(apiId: str = None, hours_back: int = 24, save_models: bool = True, mode: str = 'full') -> Dict:
     """
     Treina modelos ML com logs de uma API específica ou todos
     
+    Com a seção "training_sampling" habilitada (padrão), os logs do período
+    passam por uma amostragem estratificada (apiId, clientId e classe do
+    status) em uma passada pelo cursor, limitada a max_logs.
+    
     Args:
         apiId: ID da API (None para todas)
         hours_back: Horas para trás para buscar logs
         save_models: Se deve salvar os modelos treinados
+        mode: 'full' (treina todos os modelos do zero) ou 'incremental'
+            (atualiza iforest, knn e lof com os logs novos, ver
+            update_ml_models; recai no treino completo quando necessário)
     
     Returns:
-        Dict com resultados do treinamento
+        Dict com resultados do treinamento (e o resumo da amostragem em 'sampling')
     """
+    if mode not in TRAINING_MODES:
+        return {"error": f"Modo '{mode}' inválido. Use: {', '.join(TRAINING_MODES)}"}
+    
+    full_rebuild_reason = None
+    if mode == 'incremental':
+        result = update_ml_models(apiId=apiId, hours_back=hours_back, save_models=save_models)
+        full_rebuild_reason = result.get("full_rebuild_required")
+        if full_rebuild_reason is None:
+            return result
+        print(f"🔁 Reconstrução completa: {full_rebuild_reason}")
+    
+    with timed_operation("train_ml_models") as timings:
+        result = _train_ml_models(apiId, hours_back, save_models, timings)
+    if "error" not in result:
+        result["mode"] = "full"
+        if full_rebuild_reason:
+            result["full_rebuild_reason"] = full_rebuild_reason
+    return result
+
+def _train_ml_models(apiId: Optional[str], hours_back: int, save_models: bool, timings) -> Dict:
+    """Treinamento medido por etapa (ver train_ml_models)"""
     try:
-        # Obter logs
-        if apiId:
-            logs = get_logs_by_api(apiId)
-        else:
-            logs = get_all_logs()
-        
-        if not logs:
-            return {"error": "Nenhum log encontrado"}
-        
-        # Filtrar logs recentes
+        # Obter logs recentes (amostrados em uma passada pelo cursor, se habilitado)
         cutoff_time = datetime.now() - timedelta(hours=hours_back)
-        recent_logs = [log for log in logs if log.timestamp >= cutoff_time]
+        with span("fetch_logs"):
+            recent_logs, sampling = _fetch_training_logs(apiId, cutoff_time)
         
         if not recent_logs:
             return {"error": f"Nenhum log encontrado nas últimas {hours_back} horas"}
         
         # Treinar modelos
         detector = MLAnomalyDetector()
-        result = detector.train_models(recent_logs, save_models)
+        result = detector.train_models(recent_logs, save_models, reference_config=get_reference_config(),
+                                     model_names=_get_training_models())
         
         if "error" not in result:
             result["logs_used"] = len(recent_logs)
             result["time_range"] = f"Últimas {hours_back} horas"
+            if sampling is not None:
+                result["sampling"] = sampling
+            result["timings"] = timings.as_dict()
         
         return result
         
     except Exception as e:
         return {"error": f"Erro no treinamento: {str(e)}"}
 
+def update_ml_models(apiId: str = None, hours_back: int = 24, save_models: bool = True,
+                     extra_logs: Optional[List[LogEntry]] = None) -> Dict:
+    """
+    Atualiza os modelos salvos com os logs recebidos desde o último treinamento
+    
+    Apenas iforest, knn e lof são atualizados (ver MLAnomalyDetector.update_models);
+    os demais continuam com o último treino completo. Quando a atualização não
+    é possível ou a reconstrução periódica venceu (seção "incremental_training":
+    full_rebuild_every atualizações ou full_rebuild_hours horas), nada é
+    alterado e o resultado traz o motivo em 'full_rebuild_required'.
+    
+    Args:
+        apiId: ID da API (None para todas)
+        hours_back: Limite de horas para trás dos logs novos
+        save_models: Se deve salvar os modelos atualizados
+        extra_logs: Logs acrescentados aos novos (ex: falsos positivos do feedback)
+    
+    Returns:
+        Dict com resultados da atualização, 'message' se há poucos logs novos
+        ou 'full_rebuild_required'
+    """
+    with timed_operation("update_ml_models") as timings:
+        return _update_ml_models(apiId, hours_back, save_models, extra_logs or [], timings)
+
+def _update_ml_models(apiId: Optional[str], hours_back: int, save_models: bool, extra_logs: List[LogEntry],
+                      timings) -> Dict:
+    """Atualização medida por etapa (ver update_ml_models)"""
+    try:
+        config = get_incremental_config()
+        detector = MLAnomalyDetector()
+        with span("load_models"):
+            members = detector.load_incremental_base()
+        if not members:
+            return {"full_rebuild_required": "nenhum modelo salvo para atualizar"}
+        
+        metadata = detector.model_metadata
+        if not metadata.get("trained_at"):
+            return {"full_rebuild_required": "modelos salvos sem data de treinamento"}
+        incremental = metadata.get("incremental") or {}
+        last_trained = datetime.fromisoformat(metadata["trained_at"])
+        base_trained = datetime.fromisoformat(incremental.get("base_trained_at") or metadata["trained_at"])
+        if int(incremental.get("updates", 0)) >= int(config["full_rebuild_every"]):
+            return {"full_rebuild_required": f"{incremental['updates']} atualizações desde o último treino completo"}
+        if datetime.now() - base_trained >= timedelta(hours=float(config["full_rebuild_hours"])):
+            return {"full_rebuild_required": f"último treino completo há mais de {config['full_rebuild_hours']} horas"}
+        
+        # Logs novos desde a última versão dos modelos (no máximo hours_back horas)
+        cutoff_time = max(last_trained, datetime.now() - timedelta(hours=hours_back))
+        with span("fetch_logs"):
+            new_logs, sampling = _fetch_training_logs(apiId, cutoff_time)
+        new_logs = new_logs + list(extra_logs)
+        
+        min_new_logs = int(config["min_new_logs"])
+        if len(new_logs) < min_new_logs:
+            return {
+                "message": f"Apenas {len(new_logs)} logs novos desde {cutoff_time.isoformat()} (mínimo {min_new_logs})",
+                "mode": "incremental",
+                "new_logs": len(new_logs)
+            }
+        
+        result = detector.update_models(new_logs, save_models, incremental_config=config,
+                                        reference_config=get_reference_config())
+        if "error" not in result:
+            result["logs_used"] = len(new_logs)
+            result["time_range"] = f"Desde {cutoff_time.isoformat()}"
+            # Demais modelos salvos continuam com o último treino completo (e fora do ensemble)
+            result["models_kept"] = [model['name'] for model in get_available_models() if model['name'] not in members]
+            if sampling is not None:
+                result["sampling"] = sampling
+            result["timings"] = timings.as_dict()
+        return result
+        
+    except Exception as e:
+        return {"error": f"Erro na atualização: {str(e)}"}
+
 def detect_ml_anomalies(apiId: str = None, model_name: str = 'iforest', hours_back: int = 24, threshold: float = None, 
-                       batch_size: int = 10000, use_cache: bool = True) -> Dict:
+                       batch_size: int = 10000, use_cache: bool = True, include_descriptions: bool = False,
+                       cascade: str = None, cascade_top_percent: float = 20.0) -> Dict:
     """
     Detecta anomalias usando ML com otimizações de performance
     
@@ -927,15 +1590,31 @@ def detect_ml_anomalies(apiId: str = None, model_name: str = 'iforest', hours_ba
         threshold: Score mínimo para considerar como anomalia (opcional)
         batch_size: Tamanho do lote para processamento (padrão: 10000)
         use_cache: Se deve usar cache para otimização (padrão: True)
+        include_descriptions: Gerar as descrições das anomalias (padrão: False, sob demanda
+            via /ml/anomalies/{requestId}/description)
+        cascade: Pré-filtro barato ('zscore' ou 'iforest') que escolhe os logs
+            enviados ao modelo (padrão: None, todos os logs passam pelo modelo)
+        cascade_top_percent: Percentual mais suspeito do pré-filtro enviado ao modelo (padrão: 20)
     
     Returns:
-        Dict com anomalias detectadas
+        Dict com anomalias detectadas, o tempo de cada etapa em 'timings' e,
+        na cascata, os logs vistos por etapa em 'cascade'
     """
+    with timed_operation("detect_ml_anomalies") as timings:
+        return _detect_ml_anomalies(apiId, model_name, hours_back, threshold, batch_size, use_cache,
+                                    include_descriptions, cascade, cascade_top_percent, timings)
+
+def _detect_ml_anomalies(apiId: Optional[str], model_name: str, hours_back: int, threshold: Optional[float],
+                         batch_size: int, use_cache: bool, include_descriptions: bool, cascade: Optional[str],
+                         cascade_top_percent: float, timings) -> Dict:
+    """Detecção medida por etapa (ver detect_ml_anomalies)"""
     import time
     start_time = time.time()
     
     try:
         # Obter threshold das configurações se não fornecido
+        # Só detecções com o threshold configurado alimentam os rollups da timeline
+        threshold_from_config = threshold is None
         if threshold is None:
             try:
                 from .config_manager import config_manager
@@ -947,22 +1626,26 @@ def detect_ml_anomalies(apiId: str = None, model_name: str = 'iforest', hours_ba
                 threshold = 0.12  # Valor padrão
         
         # Cache para otimização
-        cache_key = f"{apiId}_{hours_back}_{model_name}_{threshold}"
+        cache_key = f"{apiId}_{hours_back}_{model_name}_{threshold}_{include_descriptions}_{cascade}_{cascade_top_percent}"
         if use_cache and hasattr(detect_ml_anomalies, '_cache') and cache_key in detect_ml_anomalies._cache:
             cached_result = detect_ml_anomalies._cache[cache_key]
             if time.time() - cached_result['timestamp'] < 300:  # Cache válido por 5 minutos
                 print(f"⚡ Usando cache para {cache_key}")
+                cache_requests.inc(cache="detection", result="hit")
                 return cached_result['data']
+        if use_cache:
+            cache_requests.inc(cache="detection", result="miss")
         
         # Otimização 1: Filtro temporal otimizado no banco
         print(f"📊 Buscando logs das últimas {hours_back} horas...")
         cutoff_time = datetime.now() - timedelta(hours=hours_back)
         
         # Obter logs com filtro temporal otimizado
-        if apiId:
-            logs = get_logs_by_api(apiId, cutoff_time=cutoff_time)
-        else:
-            logs = get_all_logs(cutoff_time=cutoff_time)
+        with span("fetch_logs"):
+            if apiId:
+                logs = get_logs_by_api(apiId, cutoff_time=cutoff_time)
+            else:
+                logs = get_all_logs(cutoff_time=cutoff_time)
         
         if not logs:
             return {"error": f"Nenhum log encontrado nas últimas {hours_back} horas"}
@@ -971,16 +1654,17 @@ def detect_ml_anomalies(apiId: str = None, model_name: str = 'iforest', hours_ba
         
         # Otimização 2: Filtrar falsos positivos de forma otimizada
         from .feedback_system import feedback_system
-        processed_false_positives = feedback_system.get_processed_false_positives(apiId)
-        
-        if processed_false_positives:
-            # Usar set para busca O(1) em vez de lista O(n)
-            false_positives_set = set(processed_false_positives)
-            filtered_logs = [log for log in logs if log.requestId not in false_positives_set]
-            print(f"🔍 Filtrando {len(processed_false_positives)} falsos positivos. Restaram {len(filtered_logs)} logs.")
-        else:
-            filtered_logs = logs
-            print(f"✅ Nenhum falso positivo processado encontrado.")
+        with span("fp_filter"):
+            processed_false_positives = feedback_system.get_processed_false_positives(apiId)
+            
+            if processed_false_positives:
+                # Usar set para busca O(1) em vez de lista O(n)
+                false_positives_set = set(processed_false_positives)
+                filtered_logs = [log for log in logs if log.requestId not in false_positives_set]
+                print(f"🔍 Filtrando {len(processed_false_positives)} falsos positivos. Restaram {len(filtered_logs)} logs.")
+            else:
+                filtered_logs = logs
+                print(f"✅ Nenhum falso positivo processado encontrado.")
         
         if not filtered_logs:
             return {
@@ -993,19 +1677,24 @@ def detect_ml_anomalies(apiId: str = None, model_name: str = 'iforest', hours_ba
         # Otimização 3: Carregar modelo uma vez e reutilizar
         detector = MLAnomalyDetector()
         
-        if not detector.load_trained_model(model_name):
+        with span("load_model"):
+            model_loaded = detector.load_trained_model(model_name)
+        if not model_loaded:
             return {"error": f"Modelo {model_name} não encontrado. Execute o treinamento primeiro via endpoint /ml/train"}
         
-        if model_name not in detector.models:
+        if not detector.has_model(model_name):
             return {"error": f"Modelo {model_name} não está disponível. Modelos disponíveis: {list(detector.models.keys())}"}
         
         # Otimização 4: Processamento em lotes para grandes volumes
         if len(filtered_logs) > batch_size:
             print(f"🔄 Processando {len(filtered_logs)} logs em lotes de {batch_size}...")
-            result = _process_logs_in_batches(detector, filtered_logs, model_name, threshold, batch_size)
+            result = _process_logs_in_batches(detector, filtered_logs, model_name, threshold, batch_size,
+                                              include_descriptions, cascade, cascade_top_percent)
         else:
             # Processamento normal para volumes menores
-            result = detector.detect_anomalies(filtered_logs, model_name, threshold=threshold)
+            result = detector.detect_anomalies(filtered_logs, model_name, threshold=threshold,
+                                               include_descriptions=include_descriptions, cascade=cascade,
+                                               cascade_top_percent=cascade_top_percent)
         
         if "error" not in result:
             result["logs_analyzed"] = len(filtered_logs)
@@ -1016,6 +1705,14 @@ def detect_ml_anomalies(apiId: str = None, model_name: str = 'iforest', hours_ba
             result["threshold_used"] = threshold
             result["processing_time"] = round(time.time() - start_time, 2)
             result["logs_per_second"] = round(len(filtered_logs) / (time.time() - start_time), 2) if (time.time() - start_time) > 0 else 0
+            
+            # Na cascata parte dos logs não passa pelo modelo: não alimenta os rollups
+            if threshold_from_config and cascade is None:
+                with span("record_detections"):
+                    _record_detections(detector, model_name, result["anomalies"], threshold,
+                                       apiId, (cutoff_time, datetime.now()))
+            
+            result["timings"] = timings.as_dict()
         
         # Salvar no cache
         if use_cache:
@@ -1037,16 +1734,247 @@ def detect_ml_anomalies(apiId: str = None, model_name: str = 'iforest', hours_ba
     except Exception as e:
         return {"error": f"Erro na detecção: {str(e)}"}
 
-def _process_logs_in_batches(detector, logs: List[LogEntry], model_name: str, threshold: float, batch_size: int) -> Dict:
+def _record_detections(detector, model_name: str, anomalies: List[Dict], threshold: float,
+                       apiId: str = None, window: Tuple[datetime, datetime] = None) -> Dict:
+    """
+    Registra anomalias no armazenamento de detecções (rollups da timeline)
+    
+    Falhas aqui não devem derrubar a detecção, apenas são reportadas.
+    """
+    try:
+        from .detection_store import detection_store
+        return detection_store.record_detections(
+            model_name, anomalies, detector.detection_generation, threshold, apiId=apiId, window=window
+        )
+    except Exception as e:
+        print(f"⚠️ Erro ao registrar detecções nos rollups: {e}")
+        return {"error": str(e)}
+
+def _get_training_models() -> List[str]:
+    """Modelos do treino completo das configurações (ml_detection.training_models)"""
+    try:
+        from .config_manager import config_manager
+        ml_config = config_manager.get_config("ml_detection")
+        return list(ml_config.get("training_models") or DEFAULT_TRAINING_MODELS)
+    except Exception as e:
+        print(f"⚠️ Erro ao obter modelos de treinamento das configurações: {e}")
+        return list(DEFAULT_TRAINING_MODELS)
+
+def _get_configured_threshold(verbose: bool = True) -> float:
+    """
+    Threshold das configurações (o mesmo usado para gravar as detecções armazenadas)
+    
+    Args:
+        verbose: Imprimir o threshold usado (desligado em caminhos por lote/requisição)
+    """
+    try:
+        from .config_manager import config_manager
+        ml_config = config_manager.get_config("ml_detection")
+        threshold = ml_config.get("threshold", 0.12)
+        if verbose:
+            print(f"🔧 Usando threshold das configurações: {threshold}")
+        return threshold
+    except Exception as e:
+        print(f"⚠️ Erro ao obter threshold das configurações: {e}")
+        return 0.12  # Valor padrão
+
+def _score_missing_windows(detector, model_name: str, threshold: float, apiId: Optional[str],
+                           start: datetime, end: datetime, resolution: Optional[int] = None) -> Dict:
+    """
+    Pontua os períodos de [start, end] ainda não cobertos pelo armazenamento de detecções
+    
+    As anomalias encontradas (e a cobertura dos períodos) são gravadas no
+    armazenamento, então chamadas seguintes não repontuam os mesmos logs.
+    
+    Args:
+        resolution: Resolução dos rollups que serão lidos em seguida (a cobertura
+            respeita a retenção dela)
+    
+    Returns:
+        Dict com logs_scored e windows_scored, ou o erro da detecção
+    """
+    from .detection_store import detection_store
+    
+    missing_windows = detection_store.get_missing_windows(
+        model_name, detector.detection_generation, threshold, apiId, start, end, resolution=resolution
+    )
+    if not missing_windows:
+        print("✅ Período inteiro coberto pelas detecções armazenadas")
+        return {"logs_scored": 0, "windows_scored": 0}
+    
+    from .feedback_system import feedback_system
+    false_positives_set = set(feedback_system.get_processed_false_positives(apiId))
+    
+    logs_scored = 0
+    for window_start, window_end in missing_windows:
+        if apiId:
+            logs = get_logs_by_api(apiId, cutoff_time=window_start, end_time=window_end)
+        else:
+            logs = get_all_logs(cutoff_time=window_start, end_time=window_end)
+        
+        # Remover falsos positivos já processados
+        logs = [log for log in logs if log.requestId not in false_positives_set]
+        
+        anomalies = []
+        if logs:
+            result = detector.detect_anomalies(logs, model_name, threshold=threshold)
+            if "error" in result:
+                return result
+            anomalies = result.get("anomalies", [])
+            logs_scored += len(logs)
+        
+        detection_store.record_detections(
+            model_name, anomalies, detector.detection_generation, threshold,
+            apiId=apiId, window=(window_start, window_end)
+        )
+    
+    print(f"📊 {logs_scored} logs pontuados em {len(missing_windows)} período(s) sem detecções armazenadas")
+    return {"logs_scored": logs_scored, "windows_scored": len(missing_windows)}
+
+def get_stored_anomalies(apiId: str = None, model_name: str = 'iforest', hours_back: int = 24) -> Dict:
+    """
+    Anomalias do período lidas do armazenamento de detecções
+    
+    Usa o threshold das configurações e a versão atual do modelo; apenas os
+    períodos que ainda não foram pontuados são analisados antes da leitura.
+    
+    Args:
+        apiId: ID da API (None para todas)
+        model_name: Nome do modelo a usar
+        hours_back: Horas para trás
+    
+    Returns:
+        Dict com as anomalias armazenadas (score em 'score')
+    """
+    try:
+        from .detection_store import detection_store
+        
+        threshold = _get_configured_threshold()
+        
+        detector = MLAnomalyDetector()
+        if not detector.load_trained_model(model_name):
+            return {"error": f"Modelo {model_name} não encontrado. Treine o modelo primeiro."}
+        
+        now = datetime.now()
+        cutoff_time = now - timedelta(hours=hours_back)
+        
+        scoring = _score_missing_windows(detector, model_name, threshold, apiId, cutoff_time, now)
+        if "error" in scoring:
+            return scoring
+        
+        anomalies = detection_store.get_detections(model_name, cutoff_time, now, apiId)
+        for anomaly in anomalies:
+            anomaly["description_url"] = description_url(anomaly["requestId"], model_name)
+        return {
+            "anomalies": anomalies,
+            "total_anomalies": len(anomalies),
+            "logs_scored": scoring["logs_scored"],
+            "model_used": model_name,
+            "threshold_used": threshold,
+            "time_range": f"Últimas {hours_back} horas"
+        }
+        
+    except Exception as e:
+        return {"error": f"Erro ao ler detecções armazenadas: {str(e)}"}
+
+def get_anomaly_description(requestId: str, model_name: str = 'iforest') -> Dict:
+    """
+    Gera (ou devolve do memo) a descrição de uma anomalia sob demanda
+    
+    O score vem da anomalia armazenada ou, se o log ainda não foi detectado,
+    da pontuação do próprio log pelo modelo. As frequências de contexto vêm do
+    snapshot em cache das descrições. O resultado é memorizado por
+    (requestId, modelo, versão do modelo).
+    
+    Args:
+        requestId: ID do log
+        model_name: Modelo cuja detecção será descrita
+    
+    Returns:
+        Dict com description, anomaly_type, severity, cluster e cached
+    """
+    try:
+        from .anomaly_description_ml import description_ml
+        from .detection_store import detection_store
+        
+        metadata = get_ensemble_metadata() if model_name == ENSEMBLE_MODEL else get_model_metadata(model_name)
+        if metadata is None:
+            return {"error": f"Modelo {model_name} não encontrado. Treine o modelo primeiro."}
+        version = get_model_version(metadata)
+        memo_key = (requestId, model_name, version)
+        
+        cached = description_memo.get(memo_key)
+        if cached is not None:
+            return {**cached, "model_used": model_name, "cached": True}
+        
+        log = get_log_by_request_id(requestId)
+        if log is None:
+            return {"error": f"Log {requestId} não encontrado"}
+        
+        # Score: anomalia armazenada ou pontuação do log
+        stored = detection_store.get_detection(model_name, requestId)
+        if stored is not None:
+            score = stored["score"]
+        else:
+            detector = MLAnomalyDetector()
+            if not detector.load_trained_model(model_name):
+                return {"error": f"Modelo {model_name} não encontrado. Treine o modelo primeiro."}
+            result = detector.detect_anomalies([log], model_name)
+            if "error" in result:
+                return result
+            score = (result["anomalies"] + result["normal_logs"])[0]["anomaly_score"]
+        
+        log_dict = {
+            'requestId': log.requestId,
+            'clientId': log.clientId,
+            'ip': log.ip,
+            'apiId': log.apiId,
+            'method': log.method,
+            'path': log.path,
+            'status': log.status,
+            'timestamp': log.timestamp.isoformat(),
+            'score': score
+        }
+        described = description_ml.generate_ml_descriptions(
+            [log_dict], description_ml.get_context_snapshot()
+        )[0]
+        described["anomaly_score"] = float(score)
+        description_memo.put(memo_key, described)
+        
+        if stored is not None:
+            detection_store.set_description(model_name, requestId, described["description"])
+        
+        return {**described, "model_used": model_name, "cached": False}
+        
+    except Exception as e:
+        return {"error": f"Erro ao gerar descrição: {str(e)}"}
+
+def _process_logs_in_batches(detector, logs: List[LogEntry], model_name: str, threshold: float, batch_size: int,
+                             include_descriptions: bool = False, cascade: str = None,
+                             cascade_top_percent: float = 20.0) -> Dict:
     """
     Processa logs em lotes para otimizar performance com grandes volumes
+    
+    As etapas de cada lote (extract_features, scaling, decision_function...)
+    são somadas em 'timings'. Na cascata, cada lote envia ao modelo os seus
+    cascade_top_percent% mais suspeitos.
     """
+    with timed_operation("process_logs_in_batches") as timings:
+        return _process_batches(detector, logs, model_name, threshold, batch_size, include_descriptions,
+                                cascade, cascade_top_percent, timings)
+
+def _process_batches(detector, logs: List[LogEntry], model_name: str, threshold: float, batch_size: int,
+                     include_descriptions: bool, cascade: Optional[str], cascade_top_percent: float,
+                     timings) -> Dict:
+    """Processamento em lotes medido por etapa (ver _process_logs_in_batches)"""
     import time
     start_time = time.time()
     
     all_anomalies = []
     all_normal_logs = []
     total_anomaly_scores = []
+    cascade_stages = {}
+    ensemble = None
     
     # Dividir logs em lotes
     batches = [logs[i:i + batch_size] for i in range(0, len(logs), batch_size)]
@@ -1058,7 +1986,9 @@ def _process_logs_in_batches(detector, logs: List[LogEntry], model_name: str, th
         print(f"  Lote {i+1}/{len(batches)}: {len(batch)} logs")
         
         # Processar lote
-        batch_result = detector.detect_anomalies(batch, model_name, threshold=threshold)
+        batch_result = detector.detect_anomalies(batch, model_name, threshold=threshold,
+                                                 include_descriptions=include_descriptions, cascade=cascade,
+                                                 cascade_top_percent=cascade_top_percent)
         
         if "error" in batch_result:
             return batch_result
@@ -1066,6 +1996,9 @@ def _process_logs_in_batches(detector, logs: List[LogEntry], model_name: str, th
         # Acumular resultados
         all_anomalies.extend(batch_result.get("anomalies", []))
         all_normal_logs.extend(batch_result.get("normal_logs", []))
+        for stage, stage_logs in batch_result.get("cascade", {}).get("stages", {}).items():
+            cascade_stages[stage] = cascade_stages.get(stage, 0) + stage_logs
+        ensemble = batch_result.get("ensemble", ensemble)
         
         # Acumular scores para estatísticas
         for anomaly in batch_result.get("anomalies", []):
@@ -1080,18 +2013,19 @@ def _process_logs_in_batches(detector, logs: List[LogEntry], model_name: str, th
     anomaly_rate = (anomalies_detected / total_logs * 100) if total_logs > 0 else 0
     
     # Estatísticas dos scores
-    if total_anomaly_scores:
-        score_stats = {
-            "min": float(min(total_anomaly_scores)),
-            "max": float(max(total_anomaly_scores)),
-            "mean": float(sum(total_anomaly_scores) / len(total_anomaly_scores)),
-            "std": float((sum((x - sum(total_anomaly_scores) / len(total_anomaly_scores)) ** 2 for x in total_anomaly_scores) / len(total_anomaly_scores)) ** 0.5),
-            "median": float(sorted(total_anomaly_scores)[len(total_anomaly_scores) // 2])
-        }
-    else:
-        score_stats = {"min": 0, "max": 0, "mean": 0, "std": 0, "median": 0}
+    with span("batch_statistics"):
+        if total_anomaly_scores:
+            score_stats = {
+                "min": float(min(total_anomaly_scores)),
+                "max": float(max(total_anomaly_scores)),
+                "mean": float(sum(total_anomaly_scores) / len(total_anomaly_scores)),
+                "std": float((sum((x - sum(total_anomaly_scores) / len(total_anomaly_scores)) ** 2 for x in total_anomaly_scores) / len(total_anomaly_scores)) ** 0.5),
+                "median": float(sorted(total_anomaly_scores)[len(total_anomaly_scores) // 2])
+            }
+        else:
+            score_stats = {"min": 0, "max": 0, "mean": 0, "std": 0, "median": 0}
     
-    return {
+    result = {
         "model_used": model_name,
         "logs_analyzed": total_logs,
         "anomalies_detected": anomalies_detected,
@@ -1102,8 +2036,19 @@ def _process_logs_in_batches(detector, logs: List[LogEntry], model_name: str, th
         "threshold_used": threshold,
         "processing_time": round(time.time() - start_time, 2),
         "batch_processing": True,
-        "batches_processed": len(batches)
+        "batches_processed": len(batches),
+        "timings": timings.as_dict()
     }
+    if cascade is not None:
+        result["cascade"] = {
+            "prefilter": cascade,
+            "top_percent": cascade_top_percent,
+            "stages": cascade_stages,
+            "logs_skipped": cascade_stages.get("prefilter", 0) - cascade_stages.get(model_name, 0)
+        }
+    if ensemble is not None:
+        result["ensemble"] = ensemble
+    return result
 
 def compare_ml_models(apiId: str = None, hours_back: int = 24) -> Dict:
     """
@@ -1169,7 +2114,7 @@ def compare_ml_models(apiId: str = None, hours_back: int = 24) -> Dict:
         
         # Tentar carregar todos os modelos treinados
         models_loaded = []
-        for model_name in ['iforest', 'lof', 'ocsvm']:
+        for model_name in ['iforest', 'lof', 'ocsvm_approx']:
             if detector.load_trained_model(model_name):
                 models_loaded.append(model_name)
         
@@ -1213,123 +2158,71 @@ def get_anomalies_timeline_data(apiId: str = None, model_name: str = 'iforest',
     """
     Gera dados temporais de anomalias para gráficos
     
+    Os dados vêm dos rollups pré-agregados (1m/5m/1h) mantidos pelo armazenamento
+    de detecções. Apenas os períodos ainda não pontuados pela versão atual do
+    modelo são analisados; o restante é respondido sem repontuar os logs.
+    
     Args:
         apiId: ID da API (None para todas)
         model_name: Nome do modelo a usar
         hours_back: Horas para trás para buscar logs
-        interval_minutes: Intervalo em minutos para agrupar dados
+        interval_minutes: Intervalo em minutos para agrupar dados (qualquer valor positivo)
     
     Returns:
         Dict com dados temporais de anomalias
     """
     try:
-        from .storage import get_logs_by_api, get_all_logs
+        from .detection_store import ROLLUP_RESOLUTIONS, detection_store
         
-        # Obter threshold das configurações
-        threshold = None
-        try:
-            from .config_manager import config_manager
-            ml_config = config_manager.get_config("ml_detection")
-            threshold = ml_config.get("threshold", 0.12)
-            print(f"🔧 Timeline usando threshold das configurações: {threshold}")
-        except Exception as e:
-            print(f"⚠️ Erro ao obter threshold das configurações: {e}")
-            threshold = 0.12  # Valor padrão
-        
-        # Obter logs
-        if apiId:
-            logs = get_logs_by_api(apiId)
-        else:
-            logs = get_all_logs()
-        
-        if not logs:
-            return {"error": "Nenhum log encontrado"}
-        
-        # Filtrar logs recentes
-        cutoff_time = datetime.now() - timedelta(hours=hours_back)
-        recent_logs = [log for log in logs if log.timestamp >= cutoff_time]
-        
-        if not recent_logs:
-            return {"error": f"Nenhum log encontrado nas últimas {hours_back} horas"}
-        
-        # Filtrar logs que já foram marcados com feedback
-        from .feedback_system import feedback_system
-        processed_false_positives = feedback_system.get_processed_false_positives(apiId)
-        
-        if processed_false_positives:
-            # Filtrar apenas logs que foram marcados como falsos positivos E processados
-            filtered_logs = [log for log in recent_logs if log.requestId not in processed_false_positives]
-            print(f"Timeline: Filtrando {len(processed_false_positives)} falsos positivos processados. Restaram {len(filtered_logs)} logs para análise.")
-        else:
-            filtered_logs = recent_logs
-            print(f"Timeline: Nenhum falso positivo processado encontrado. Analisando todos os {len(filtered_logs)} logs.")
+        if interval_minutes <= 0:
+            return {"error": "interval_minutes deve ser maior que zero"}
         
-        if not filtered_logs:
-            return {
-                "error": "Todos os logs recentes foram marcados como falsos positivos processados",
-                "total_logs": len(recent_logs),
-                "processed_false_positives": len(processed_false_positives),
-                "logs_available": 0
-            }
+        threshold = _get_configured_threshold()
         
-        # Carregar modelo treinado
+        # Carregar modelo treinado (a versão define quais rollups são válidos)
         detector = MLAnomalyDetector()
         if not detector.load_trained_model(model_name):
             return {"error": f"Modelo {model_name} não encontrado. Treine o modelo primeiro."}
         
-        # Detectar anomalias com threshold
-        result = detector.detect_anomalies(filtered_logs, model_name, threshold=threshold)
-        if "error" in result:
-            return result
-        
-        anomalies = result.get("anomalies", [])
-        
-        # Agrupar anomalias por intervalos de tempo
-        timeline_data = {}
+        now = datetime.now()
+        cutoff_time = now - timedelta(hours=hours_back)
+        resolution = pick_resolution(interval_minutes)
+        
+        # Antes da retenção da resolução escolhida os rollups já expiraram
+        data_available_from = now - ROLLUP_RESOLUTIONS[resolution]
+        if cutoff_time < data_available_from:
+            print(f"⚠️ Rollups de {resolution}m só cobrem desde {data_available_from.isoformat()}; "
+                  f"use um intervalo múltiplo de 5 ou 60 minutos para períodos mais longos")
+        
+        # Pontuar apenas os períodos que ainda não estão nos rollups
+        scoring = _score_missing_windows(detector, model_name, threshold, apiId, cutoff_time, now, resolution)
+        if "error" in scoring:
+            return scoring
+        logs_scored = scoring["logs_scored"]
+        
+        # Montar a timeline a partir dos rollups
+        timeline_list = detection_store.get_rollups(model_name, cutoff_time, now, interval_minutes, apiId)
+        
+        # Detalhes das anomalias de cada intervalo
+        intervals_by_key = {item["timestamp"]: item for item in timeline_list}
+        for item in timeline_list:
+            item["anomalies"] = []
+        for detection in detection_store.get_detections(model_name, cutoff_time, now, apiId):
+            key = floor_to_interval(detection["timestamp"], interval_minutes).isoformat()
+            if key in intervals_by_key:
+                intervals_by_key[key]["anomalies"].append({
+                    "requestId": detection["requestId"],
+                    "clientId": detection.get("clientId"),
+                    "ip": detection.get("ip"),
+                    "method": detection.get("method"),
+                    "path": detection.get("path"),
+                    "status": detection.get("status"),
+                    "score": detection["score"],
+                    "description": detection.get("description", ""),
+                    "description_url": description_url(detection["requestId"], model_name)
+                })
         
-        for anomaly in anomalies:
-            # Converter timestamp para datetime se necessário
-            if isinstance(anomaly["timestamp"], str):
-                timestamp = datetime.fromisoformat(anomaly["timestamp"].replace('Z', '+00:00'))
-            else:
-                timestamp = anomaly["timestamp"]
-            
-            # Arredondar para o intervalo especificado
-            interval_seconds = interval_minutes * 60
-            rounded_timestamp = timestamp.replace(
-                second=0, 
-                microsecond=0
-            ).replace(
-                minute=(timestamp.minute // interval_minutes) * interval_minutes
-            )
-            
-            time_key = rounded_timestamp.isoformat()
-            
-            if time_key not in timeline_data:
-                timeline_data[time_key] = {
-                    "timestamp": time_key,
-                    "anomaly_count": 0,
-                    "avg_score": 0.0,
-                    "total_score": 0.0,
-                    "anomalies": []
-                }
-            
-            timeline_data[time_key]["anomaly_count"] += 1
-            timeline_data[time_key]["total_score"] += anomaly["anomaly_score"]
-            timeline_data[time_key]["avg_score"] = timeline_data[time_key]["total_score"] / timeline_data[time_key]["anomaly_count"]
-            timeline_data[time_key]["anomalies"].append({
-                "requestId": anomaly["requestId"],
-                "clientId": anomaly["clientId"],
-                "ip": anomaly["ip"],
-                "method": anomaly["method"],
-                "path": anomaly["path"],
-                "status": anomaly["status"],
-                "score": anomaly["anomaly_score"],
-                "description": anomaly.get("anomaly_description", "")
-            })
-        
-        # Converter para lista ordenada por timestamp
-        timeline_list = sorted(timeline_data.values(), key=lambda x: x["timestamp"])
+        total_anomalies = sum(item["anomaly_count"] for item in timeline_list)
         
         # Gerar dados para gráfico
         chart_data = {
@@ -1355,20 +2248,38 @@ def get_anomalies_timeline_data(apiId: str = None, model_name: str = 'iforest',
         return {
             "status": "success",
             "model_used": model_name,
-            "total_anomalies": len(anomalies),
+            "total_anomalies": total_anomalies,
             "time_interval_minutes": interval_minutes,
+            "rollup_resolution_minutes": resolution,
+            "data_available_from": max(cutoff_time, data_available_from).isoformat(),
             "hours_back": hours_back,
             "threshold_used": threshold,
+            "logs_scored": logs_scored,
             "timeline_data": timeline_list,
             "chart_data": chart_data,
             "summary": {
                 "total_intervals": len(timeline_list),
                 "max_anomalies_per_interval": max([item["anomaly_count"] for item in timeline_list]) if timeline_list else 0,
-                "avg_anomalies_per_interval": sum([item["anomaly_count"] for item in timeline_list]) / len(timeline_list) if timeline_list else 0,
+                "avg_anomalies_per_interval": total_anomalies / len(timeline_list) if timeline_list else 0,
                 "max_score": max([item["avg_score"] for item in timeline_list]) if timeline_list else 0,
                 "avg_score": sum([item["avg_score"] for item in timeline_list]) / len(timeline_list) if timeline_list else 0
             }
         }
         
     except Exception as e:
-        return {"error": f"Erro ao gerar dados temporais: {str(e)}"} 
\ No newline at end of file
+        return {"error": f"Erro ao gerar dados temporais: {str(e)}"}
+
+def _collect_ml_metrics():
+    """Atualiza os gauges de modelos treinados e caches antes de cada exportação de /metrics"""
+    from .model_storage import model_storage
+    cache_entries.set(len(description_memo), cache="descriptions")
+    cache_entries.set(len(getattr(detect_ml_anomalies, '_cache', {})), cache="detection")
+    available = get_available_models()
+    models_available.set(len(available))
+    model_size.clear()
+    for model in available:
+        model_path = model_storage.models_dir / model['filename']
+        if model_path.exists():
+            model_size.set(model_path.stat().st_size, model=model['name'])
+
+metrics_registry.add_collector(_collect_ml_metrics)
@@ -0,0 +1,111 @@
+"""
+Cache em processo dos modelos treinados já carregados
+Evita desserializar o modelo e os preprocessadores a cada lote pontuado;
+um modelo é recarregado quando seus arquivos em disco mudam (novo treinamento
+ou importação)
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import metrics_registry
+
+models_loaded = metrics_registry.gauge("ml_models_loaded", "Modelos carregados em memória no cache de modelos")
+
+class ModelCache:
+    """
+    Detectores carregados por nome de modelo (thread-safe)
+    
+    Exemplo:
+        detector = model_cache.get("iforest")
+        if detector:
+            result = detector.detect_anomalies(logs, "iforest")
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # model_name -> (assinatura dos arquivos, detector)
+        self._detectors: Dict[str, Tuple[Tuple, object]] = {}
+        # model_name -> assinatura dos arquivos que falharam ao carregar
+        self._failed: Dict[str, Tuple] = {}
+    
+    def _signature(self, model_name: str) -> Optional[Tuple]:
+        """mtime e tamanho dos arquivos do modelo (None se o modelo não existe)"""
+        from .model_storage import model_storage
+        from .ml_anomaly_detector import ENSEMBLE_MODEL
+        if model_name == ENSEMBLE_MODEL:
+            # O ensemble muda quando qualquer modelo é retreinado ou importado
+            signatures = tuple(
+                (name, signature) for name, signature in
+                ((name, self._signature(name)) for name in model_storage.model_files) if signature
+            )
+            return signatures or None
+        if model_name not in model_storage.model_files:
+            return None
+        paths = [
+            model_storage.models_dir / model_storage.model_files[model_name],
+            model_storage.models_dir / f"{model_name}_{model_storage.preprocessor_file}",
+            model_storage.models_dir / f"{model_name}_{model_storage.metadata_file}"
+        ]
+        try:
+            return tuple((stat.st_mtime_ns, stat.st_size) for stat in (path.stat() for path in paths))
+        except OSError:
+            return None
+    
+    def get(self, model_name: str):
+        """
+        Detector com o modelo carregado, recarregando se os arquivos mudaram
+        
+        Se a recarga falhar, o detector carregado anteriormente continua sendo
+        usado e os mesmos arquivos não são carregados de novo a cada chamada.
+        
+        Returns:
+            MLAnomalyDetector pronto para detect_anomalies, ou None se o
+            modelo não foi treinado
+        """
+        signature = self._signature(model_name)
+        if signature is None:
+            self.invalidate(model_name)
+            return None
+        
+        with self._lock:
+            cached = self._detectors.get(model_name)
+            if cached and cached[0] == signature:
+                return cached[1]
+            if self._failed.get(model_name) == signature:
+                return cached[1] if cached else None
+            
+            from .ml_anomaly_detector import MLAnomalyDetector
+            detector = MLAnomalyDetector()
+            if not detector.load_trained_model(model_name):
+                self._failed[model_name] = signature
+                if cached:
+                    print(f"⚠️ Falha ao recarregar o modelo {model_name}; mantendo a versão já carregada")
+                    return cached[1]
+                return None
+            self._failed.pop(model_name, None)
+            self._detectors[model_name] = (signature, detector)
+            return detector
+    
+    def invalidate(self, model_name: str = None):
+        """Descarta um modelo (ou todos) do cache"""
+        with self._lock:
+            if model_name is None:
+                self._detectors.clear()
+                self._failed.clear()
+            else:
+                self._detectors.pop(model_name, None)
+                self._failed.pop(model_name, None)
+    
+    def loaded_models(self) -> List[str]:
+        """Nomes dos modelos carregados"""
+        with self._lock:
+            return list(self._detectors)
+
+# Instância global
+model_cache = ModelCache()
+
+def _collect_loaded_models():
+    models_loaded.set(len(model_cache.loaded_models()))
+
+metrics_registry.add_collector(_collect_loaded_models)
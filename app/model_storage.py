@@ -5,6 +5,7 @@ Módulo para gerenciar armazenamento e externalização de modelos treinados
 import pickle
 import json
 import os
+import tempfile
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 import numpy as np
@@ -14,12 +15,15 @@ from pathlib import Path
 # Scikit-learn imports
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 
+from .encoders import VocabularyEncoder
+
 # PyOD imports
 from pyod.models.iforest import IForest
 from pyod.models.lof import LOF
 from pyod.models.cblof import CBLOF
 from pyod.models.knn import KNN
 from pyod.models.ocsvm import OCSVM
+from .approx_ocsvm import ApproxOCSVM
 
 class ModelStorage:
     """Gerencia o armazenamento e carregamento de modelos treinados"""
@@ -34,14 +38,28 @@ class ModelStorage:
             'lof': 'lof_model.pkl',
             'knn': 'knn_model.pkl',
             'ocsvm': 'ocsvm_model.pkl',
+            'ocsvm_approx': 'ocsvm_approx_model.pkl',
             'cblof': 'cblof_model.pkl'
         }
         
         self.preprocessor_file = 'preprocessors.pkl'
         self.metadata_file = 'model_metadata.json'
     
+    def _write_temp(self, path: Path, write, mode: str = 'wb') -> str:
+        """Grava o conteúdo em um arquivo temporário ao lado de path e retorna o caminho dele"""
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode) as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return temp_path
+    
     def save_model(self, model_name: str, model, scaler: StandardScaler, 
-                   label_encoders: Dict, metadata: Dict) -> bool:
+                   label_encoders: Dict, metadata: Dict, vocabulary_encoders: Dict = None) -> bool:
         """
         Salva um modelo treinado com seus preprocessadores
         
@@ -49,35 +67,47 @@ class ModelStorage:
             model_name: Nome do modelo (iforest, lof, etc.)
             model: Modelo PyOD treinado
             scaler: StandardScaler treinado
-            label_encoders: Dicionário de LabelEncoders
+            label_encoders: Dicionário de LabelEncoders (legado)
             metadata: Metadados do treinamento
+            vocabulary_encoders: Dicionário de VocabularyEncoders por campo
+        
+        Os arquivos são gravados em temporários e só então substituem os atuais
+        (os.replace), então quem carrega o modelo durante o salvamento nunca lê
+        um arquivo pela metade.
         """
+        temp_files = []
         try:
-            # Salvar modelo
             model_path = self.models_dir / self.model_files[model_name]
-            with open(model_path, 'wb') as f:
-                pickle.dump(model, f)
-            
-            # Salvar preprocessadores
             preprocessor_path = self.models_dir / f"{model_name}_{self.preprocessor_file}"
+            metadata_path = self.models_dir / f"{model_name}_{self.metadata_file}"
             preprocessors = {
                 'scaler': scaler,
-                'label_encoders': label_encoders
+                'label_encoders': label_encoders,
+                'vocabulary_encoders': vocabulary_encoders or {}
             }
-            with open(preprocessor_path, 'wb') as f:
-                pickle.dump(preprocessors, f)
-            
-            # Salvar metadados
-            metadata_path = self.models_dir / f"{model_name}_{self.metadata_file}"
             metadata['saved_at'] = datetime.now().isoformat()
             metadata['model_name'] = model_name
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2, default=str)
+            
+            # Gravar modelo, preprocessadores e metadados (metadados por último)
+            temp_files.append((self._write_temp(model_path, lambda f: pickle.dump(model, f)), model_path))
+            temp_files.append((self._write_temp(preprocessor_path, lambda f: pickle.dump(preprocessors, f)), preprocessor_path))
+            temp_files.append((self._write_temp(
+                metadata_path, lambda f: json.dump(metadata, f, indent=2, default=str), mode='w'
+            ), metadata_path))
+            
+            while temp_files:
+                temp_path, path = temp_files.pop(0)
+                os.replace(temp_path, path)
             
             print(f"✅ Modelo {model_name} salvo com sucesso!")
             return True
             
         except Exception as e:
+            for temp_path, _ in temp_files:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
             print(f"❌ Erro ao salvar modelo {model_name}: {e}")
             return False
     
@@ -86,7 +116,8 @@ class ModelStorage:
         Carrega um modelo treinado
         
         Returns:
-            Dict com 'model', 'scaler', 'label_encoders', 'metadata' ou None se erro
+            Dict com 'model', 'scaler', 'label_encoders', 'vocabulary_encoders',
+            'metadata' ou None se erro
         """
         try:
             # Carregar modelo
@@ -112,6 +143,7 @@ class ModelStorage:
                 'model': model,
                 'scaler': preprocessors['scaler'],
                 'label_encoders': preprocessors['label_encoders'],
+                'vocabulary_encoders': self._get_vocabulary_encoders(preprocessors),
                 'metadata': metadata
             }
             
@@ -119,6 +151,32 @@ class ModelStorage:
             print(f"❌ Erro ao carregar modelo {model_name}: {e}")
             return None
     
+    def load_metadata(self, model_name: str) -> Optional[Dict]:
+        """Carrega apenas os metadados de um modelo (sem desserializar o modelo)"""
+        try:
+            metadata_path = self.models_dir / f"{model_name}_{self.metadata_file}"
+            if not metadata_path.exists():
+                return None
+            with open(metadata_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"❌ Erro ao carregar metadados do modelo {model_name}: {e}")
+            return None
+    
+    def _get_vocabulary_encoders(self, preprocessors: Dict) -> Dict:
+        """
+        Retorna os vocabulários salvos ou converte os LabelEncoders de modelos antigos
+        
+        A conversão preserva os códigos usados no treino do modelo antigo.
+        """
+        vocabulary_encoders = preprocessors.get('vocabulary_encoders')
+        if vocabulary_encoders:
+            return vocabulary_encoders
+        return {
+            field: VocabularyEncoder.from_label_encoder(label_encoder)
+            for field, label_encoder in preprocessors.get('label_encoders', {}).items()
+        }
+    
     def list_available_models(self) -> List[Dict]:
         """Lista todos os modelos disponíveis"""
         available_models = []
@@ -183,6 +241,7 @@ class ModelStorage:
                 'model': model_data['model'],
                 'scaler': model_data['scaler'],
                 'label_encoders': model_data['label_encoders'],
+                'vocabulary_encoders': model_data['vocabulary_encoders'],
                 'metadata': model_data['metadata']
             }
             
@@ -216,7 +275,8 @@ class ModelStorage:
                 model=import_package['model'],
                 scaler=import_package['scaler'],
                 label_encoders=import_package['label_encoders'],
-                metadata=import_package['metadata']
+                metadata=import_package['metadata'],
+                vocabulary_encoders=import_package.get('vocabulary_encoders')
             )
             
             if success:
@@ -232,15 +292,16 @@ class ModelStorage:
 model_storage = ModelStorage()
 
 def save_trained_models(models: Dict, scaler: StandardScaler, 
-                       label_encoders: Dict, metadata: Dict) -> Dict:
+                       label_encoders: Dict, metadata: Dict, vocabulary_encoders: Dict = None) -> Dict:
     """
     Salva todos os modelos treinados
     
     Args:
         models: Dicionário com modelos treinados
         scaler: StandardScaler treinado
-        label_encoders: Dicionário de LabelEncoders
+        label_encoders: Dicionário de LabelEncoders (legado)
         metadata: Metadados do treinamento
+        vocabulary_encoders: Dicionário de VocabularyEncoders por campo
     
     Returns:
         Dict com status de salvamento de cada modelo
@@ -254,7 +315,8 @@ def save_trained_models(models: Dict, scaler: StandardScaler,
                 model=model,
                 scaler=scaler,
                 label_encoders=label_encoders,
-                metadata=metadata
+                metadata=metadata,
+                vocabulary_encoders=vocabulary_encoders
             )
             results[model_name] = "salvo" if success else "erro"
         else:
@@ -274,6 +336,10 @@ def load_trained_model(model_name: str) -> Optional[Dict]:
     """
     return model_storage.load_model(model_name)
 
+def get_model_metadata(model_name: str) -> Optional[Dict]:
+    """Retorna os metadados de um modelo treinado (None se não existir)"""
+    return model_storage.load_metadata(model_name)
+
 def get_available_models() -> List[Dict]:
     """Retorna lista de modelos disponíveis"""
     return model_storage.list_available_models()
@@ -0,0 +1,131 @@
+"""
+Conjuntos de referência compactos (coresets) para os modelos de vizinhança
+KNN e LOF guardam toda a matriz de treino e pontuam buscando vizinhos nela;
+com um conjunto de referência de tamanho máximo configurável (amostra
+estratificada ou centróides do k-means, com pesos) o tamanho do modelo e a
+latência da pontuação não crescem com o histórico de treino
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+# Configuração padrão (seção "reference_sets"); max_size 0 = treino com todos os logs.
+# O LOF fica fora da lista padrão: a densidade local medida em uma amostra é
+# outra, e ele mantém só 25-40% das anomalias do treino completo (KNN: ~75%)
+DEFAULT_REFERENCE_CONFIG = {
+    "max_size": 0,
+    "method": "stratified",
+    "models": ["knn"]
+}
+REFERENCE_METHODS = ('stratified', 'kmeans')
+# Pontos de referência por estrato na amostragem estratificada
+POINTS_PER_STRATUM = 20
+MAX_STRATA = 64
+
+def get_reference_config() -> Dict:
+    """Seção "reference_sets" das configurações completada com os valores padrão"""
+    try:
+        from .config_manager import config_manager
+        return {**DEFAULT_REFERENCE_CONFIG, **config_manager.get_config("reference_sets")}
+    except Exception as e:
+        print(f"⚠️ Erro ao obter configurações dos conjuntos de referência: {e}")
+        return dict(DEFAULT_REFERENCE_CONFIG)
+
+def stratified_sample(features: np.ndarray, max_size: int, random_state: int = 42,
+                      sample_weight: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Amostra estratificada pelos grupos do k-means (logs reais como referência)
+    
+    Cada estrato recebe vagas proporcionais ao seu tamanho, com ao menos uma,
+    para que padrões raros do treino continuem representados. Com
+    sample_weight (ex: pontos de um conjunto anterior), o tamanho de um
+    estrato é a soma dos pesos e pontos mais pesados têm mais chance de
+    serem escolhidos.
+    
+    Returns:
+        (pontos de referência, peso de cada ponto = logs que ele representa)
+    """
+    rng = np.random.default_rng(random_state)
+    n_strata = int(min(MAX_STRATA, max(1, max_size // POINTS_PER_STRATUM), len(features)))
+    strata = MiniBatchKMeans(n_clusters=n_strata, n_init=1, random_state=random_state).fit_predict(
+        features, sample_weight=sample_weight
+    )
+    counts = np.bincount(strata, weights=sample_weight, minlength=n_strata)
+    total = len(features) if sample_weight is None else sample_weight.sum()
+    
+    present = np.flatnonzero(counts)
+    quotas = np.maximum(1, np.floor(counts[present] * (max_size - len(present)) / total).astype(int))
+    
+    indices, weights = [], []
+    for stratum, quota in zip(present, quotas):
+        members = np.flatnonzero(strata == stratum)
+        probabilities = None if sample_weight is None else sample_weight[members] / counts[stratum]
+        size = min(quota, len(members) if probabilities is None else np.count_nonzero(probabilities))
+        chosen = rng.choice(members, size=size, replace=False, p=probabilities)
+        indices.append(chosen)
+        weights.append(np.full(len(chosen), counts[stratum] / len(chosen)))
+    indices = np.concatenate(indices)
+    return features[indices], np.concatenate(weights)
+
+def kmeans_centroids(features: np.ndarray, max_size: int, random_state: int = 42,
+                     sample_weight: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Centróides do k-means como referência, com o número de logs de cada grupo como peso
+    
+    Returns:
+        (centróides dos grupos não vazios, logs em cada grupo, ou soma de sample_weight)
+    """
+    n_clusters = int(min(max_size, len(features)))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=1, batch_size=max(1024, 3 * n_clusters),
+                             random_state=random_state).fit(features, sample_weight=sample_weight)
+    counts = np.bincount(kmeans.labels_, weights=sample_weight, minlength=n_clusters)
+    present = counts > 0
+    return kmeans.cluster_centers_[present], counts[present].astype(np.float64)
+
+def build_reference_set(features: np.ndarray, max_size: int, method: str = 'stratified',
+                        random_state: int = 42, sample_weight: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Conjunto de referência com no máximo max_size pontos
+    
+    Args:
+        features: Características normalizadas do treino
+        max_size: Tamanho máximo do conjunto
+        method: 'stratified' (amostra de logs reais) ou 'kmeans' (centróides)
+        sample_weight: Logs representados por cada linha (None = 1 por linha)
+    
+    Returns:
+        (pontos de referência, pesos que somam o número de logs de treino)
+    """
+    if method not in REFERENCE_METHODS:
+        raise ValueError(f"Método '{method}' inválido. Use: {', '.join(REFERENCE_METHODS)}")
+    if len(features) <= max_size:
+        return features, np.ones(len(features)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    if method == 'kmeans':
+        return kmeans_centroids(features, max_size, random_state, sample_weight)
+    return stratified_sample(features, max_size, random_state, sample_weight)
+
+def weighted_percentile(values: np.ndarray, weights: np.ndarray, percentile: float) -> float:
+    """Percentil de values em que cada valor conta weights vezes"""
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    position = np.searchsorted(cumulative, percentile / 100 * cumulative[-1])
+    return float(values[order][min(position, len(values) - 1)])
+
+def fit_on_reference(model, reference: np.ndarray, weights: np.ndarray) -> Dict:
+    """
+    Treina um modelo PyOD no conjunto de referência (ver build_reference_set)
+    
+    O threshold_ do modelo é recalculado com os pesos, para que a contaminação
+    continue se referindo aos logs de treino e não aos pontos de referência;
+    os pesos ficam em model.reference_weights_.
+    
+    Returns:
+        Dict com o tamanho do conjunto e os logs representados
+    """
+    model.fit(reference)
+    model.reference_weights_ = weights
+    model.threshold_ = weighted_percentile(model.decision_scores_, weights, 100 * (1 - model.contamination))
+    model.labels_ = (model.decision_scores_ > model.threshold_).astype(int)
+    return {"size": len(reference), "source_rows": int(round(weights.sum()))}
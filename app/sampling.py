@@ -0,0 +1,117 @@
+"""
+Amostragem estratificada dos logs de treino (reservoir sampling)
+Em uma única passada pelo cursor do MongoDB, mantém uma amostra uniforme
+limitada de cada estrato (apiId, clientId e classe do status), para que o
+custo do treino não dependa do volume e um cliente ruidoso não domine os dados
+"""
+
+import random
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import LogEntry
+
+# Configuração padrão (seção "training_sampling")
+DEFAULT_SAMPLING_CONFIG = {
+    "enabled": True,
+    "max_logs": 100000,
+    "max_per_stratum": 10000,
+    "strata": ["apiId", "clientId", "status_class"]
+}
+
+def get_sampling_config() -> Dict:
+    """Seção "training_sampling" das configurações completada com os valores padrão"""
+    try:
+        from .config_manager import config_manager
+        return {**DEFAULT_SAMPLING_CONFIG, **config_manager.get_config("training_sampling")}
+    except Exception as e:
+        print(f"⚠️ Erro ao obter configurações de amostragem: {e}")
+        return dict(DEFAULT_SAMPLING_CONFIG)
+
+def status_class(status: int) -> str:
+    """Classe do status HTTP (ex: 404 -> '4xx')"""
+    return f"{int(status) // 100}xx"
+
+def stratum_key(log: LogEntry, fields: List[str]) -> Tuple:
+    """Estrato de um log pelos campos configurados ('status_class' é derivado do status)"""
+    return tuple(status_class(log.status) if field == "status_class" else getattr(log, field) for field in fields)
+
+class StratifiedReservoirSampler:
+    """
+    Amostra uniforme por estrato, limitada no total, em uma passada
+    
+    Cada estrato guarda até max_per_stratum logs (algoritmo R: o n-ésimo log
+    do estrato substitui um dos guardados com probabilidade cap/n). Quando
+    surgem estratos demais para max_logs, o limite por estrato cai para
+    max_logs / estratos e os reservatórios maiores descartam logs ao acaso
+    (o que os mantém uniformes). Com mais estratos que max_logs, cada
+    estrato fica com um log.
+    
+    Exemplo:
+        sampler = StratifiedReservoirSampler(max_logs=100000, max_per_stratum=10000)
+        sampler.extend(iter_logs(cutoff_time=cutoff))
+        logs = sampler.sample()
+    """
+    
+    def __init__(self, max_logs: int, max_per_stratum: int, strata: Optional[List[str]] = None, seed: int = 42):
+        self.max_logs = max_logs
+        self.max_per_stratum = max_per_stratum
+        self.strata = list(strata or DEFAULT_SAMPLING_CONFIG["strata"])
+        self._random = random.Random(seed)
+        self._reservoirs: Dict[Tuple, List[LogEntry]] = {}
+        self._seen: Counter = Counter()
+        self._kept = 0
+        self._cap = max_per_stratum
+    
+    def add(self, log: LogEntry):
+        """Considera um log para a amostra"""
+        key = stratum_key(log, self.strata)
+        self._seen[key] += 1
+        reservoir = self._reservoirs.get(key)
+        if reservoir is None:
+            reservoir = self._reservoirs[key] = []
+            self._cap = min(self.max_per_stratum, max(1, self.max_logs // len(self._reservoirs)))
+        
+        if len(reservoir) < self._cap:
+            reservoir.append(log)
+            self._kept += 1
+            # Com mais estratos que max_logs (limite 1) não há o que descartar
+            if self._kept > max(self.max_logs, len(self._reservoirs)):
+                self._trim()
+        else:
+            position = self._random.randrange(self._seen[key])
+            if position < len(reservoir):
+                reservoir[position] = log
+    
+    def extend(self, logs: Iterable[LogEntry]):
+        """Considera todos os logs de um iterável (ex: cursor de iter_logs)"""
+        for log in logs:
+            self.add(log)
+    
+    def _trim(self):
+        """Descarta ao acaso o excesso dos reservatórios acima do limite atual por estrato"""
+        for reservoir in self._reservoirs.values():
+            if len(reservoir) > self._cap:
+                self._random.shuffle(reservoir)
+                self._kept -= len(reservoir) - self._cap
+                del reservoir[self._cap:]
+    
+    def sample(self) -> List[LogEntry]:
+        """Logs amostrados (agrupados por estrato)"""
+        return [log for reservoir in self._reservoirs.values() for log in reservoir]
+    
+    def summary(self) -> Dict:
+        """Logs vistos e guardados, estratos e os estratos que foram limitados"""
+        capped = [
+            {"stratum": dict(zip(self.strata, key)), "seen": self._seen[key], "kept": len(reservoir)}
+            for key, reservoir in self._reservoirs.items() if len(reservoir) < self._seen[key]
+        ]
+        capped.sort(key=lambda stratum: stratum["seen"], reverse=True)
+        return {
+            "logs_seen": sum(self._seen.values()),
+            "logs_kept": self._kept,
+            "strata": len(self._reservoirs),
+            "max_per_stratum": self._cap,
+            "strata_capped": len(capped),
+            "largest_capped": capped[:10]
+        }
@@ -0,0 +1,135 @@
+"""
+Pontuação de poucos logs por requisição (uso inline, ex: no gateway da API)
+Usa o modelo mantido em memória pelo model_cache, características calculadas
+sem pandas e a normalização do scaler em numpy; não acessa o MongoDB nem
+grava detecções
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .models import LogEntry
+from .metrics import anomalies_found, logs_scored, metrics_registry
+
+# Buckets de latência abaixo de 1ms (o histograma padrão começa em 5ms)
+SCORE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.00075, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+# Modelos carregados e aquecidos na inicialização do servidor
+WARM_MODELS = [name for name in os.getenv("WARM_MODELS", "iforest").split(",") if name]
+
+score_model_duration = metrics_registry.histogram(
+    "ml_score_model_seconds", "Tempo de modelo por chamada de /ml/score (características, normalização e score)",
+    ["model"], buckets=SCORE_BUCKETS
+)
+
+def scale_rows(scaler, rows: np.ndarray) -> np.ndarray:
+    """
+    Mesmo resultado de scaler.transform para um StandardScaler já treinado
+    
+    Evita as validações do sklearn (nomes de colunas, tipos), que custam mais
+    que a própria conta para uma ou poucas linhas.
+    """
+    if getattr(scaler, "with_mean", True) and getattr(scaler, "mean_", None) is not None:
+        rows = rows - scaler.mean_
+    if getattr(scaler, "with_std", True) and getattr(scaler, "scale_", None) is not None:
+        rows = rows / scaler.scale_
+    return rows
+
+def _score_rows(detector, model_name: str, logs: List[LogEntry]):
+    """Scores, rótulos do modelo e segundos gastos (características, normalização e score)"""
+    start = time.perf_counter()
+    features = scale_rows(detector.scaler, detector.extract_feature_rows(logs))
+    scores, labels = detector.score(features, model_name)
+    return scores, labels, time.perf_counter() - start
+
+def score_logs(logs: List[LogEntry], model_name: str = 'iforest', threshold: float = None) -> Dict:
+    """
+    Pontua logs com o modelo já carregado
+    
+    Args:
+        logs: Um ou poucos logs (ex: a requisição atual no gateway)
+        model_name: Nome do modelo a usar
+        threshold: Score mínimo para considerar anomalia (padrão: configurado)
+    
+    Returns:
+        Dict com o score e a decisão de cada log e o tempo de modelo em ms
+    """
+    from .model_cache import model_cache
+    from .ml_anomaly_detector import _get_configured_threshold
+    
+    if not logs:
+        return {"error": "Nenhum log informado"}
+    
+    detector = model_cache.get(model_name)
+    if detector is None:
+        return {"error": f"Modelo {model_name} não encontrado. Execute o treinamento primeiro via endpoint /ml/train"}
+    if not detector.has_model(model_name):
+        return {"error": f"Modelo '{model_name}' não encontrado"}
+    
+    if threshold is None:
+        threshold = _get_configured_threshold(verbose=False)
+    
+    try:
+        scores, labels, elapsed = _score_rows(detector, model_name, logs)
+    except Exception as e:
+        return {"error": f"Erro na pontuação: {str(e)}"}
+    
+    results = [
+        {
+            "requestId": log.requestId,
+            "anomaly_score": float(score),
+            "is_anomaly": bool(label and score >= threshold)
+        }
+        for log, score, label in zip(logs, scores, labels)
+    ]
+    anomalies = sum(result["is_anomaly"] for result in results)
+    
+    score_model_duration.observe(elapsed, model=model_name)
+    logs_scored.inc(len(logs), model=model_name)
+    anomalies_found.inc(anomalies, model=model_name)
+    
+    return {
+        "model_used": model_name,
+        "model_version": detector.model_version,
+        "threshold_used": threshold,
+        "logs_scored": len(logs),
+        "anomalies_detected": anomalies,
+        "results": results,
+        "model_time_ms": round(elapsed * 1000, 4)
+    }
+
+def warm_up(model_names: Optional[List[str]] = None) -> Dict[str, bool]:
+    """
+    Carrega os modelos no model_cache e faz uma pontuação de aquecimento
+    
+    A primeira chamada de cada modelo paga a desserialização e inicializações
+    preguiçosas; aqui isso acontece antes da primeira requisição real (sem
+    contar nas métricas de logs pontuados).
+    
+    Returns:
+        Dict modelo -> True se ficou pronto
+    """
+    from .model_cache import model_cache
+    
+    sample = LogEntry(
+        requestId="warmup", clientId="warmup", ip="127.0.0.1", apiId="warmup",
+        path="/api/warmup", method="GET", status=200, timestamp=datetime.now()
+    )
+    status = {}
+    for model_name in model_names or WARM_MODELS:
+        detector = model_cache.get(model_name)
+        status[model_name] = False
+        if detector is None or not detector.has_model(model_name):
+            print(f"⚠️ Modelo {model_name} não aquecido: modelo não treinado")
+            continue
+        try:
+            _score_rows(detector, model_name, [sample])
+            _, _, elapsed = _score_rows(detector, model_name, [sample])
+            status[model_name] = True
+            print(f"🔥 Modelo {model_name} aquecido para /ml/score ({elapsed * 1000:.3f}ms)")
+        except Exception as e:
+            print(f"⚠️ Modelo {model_name} não aquecido: {e}")
+    return status
@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 from .models import LogEntry
-from .db import logs_collection
+from .db import logs_collection, logs_read_collection
+from .ip_profiles import ip_profile_store
 from datetime import datetime
 import json
 from dateutil.parser import parse
@@ -12,26 +13,37 @@ def add_log(log: LogEntry):
     if isinstance(log_dict["timestamp"], str):
         log_dict["timestamp"] = parse(log_dict["timestamp"])
     logs_collection.insert_one(log_dict)
+    
+    # Atualizar o perfil de IPs do cliente (falhas não impedem a ingestão)
+    try:
+        ip_profile_store.record_log(log_dict)
+    except Exception as e:
+        print(f"⚠️ Erro ao atualizar perfil de IP: {e}")
 
 def insert_log(log: LogEntry):
     """Alias para add_log - mantém compatibilidade com scripts de teste"""
     add_log(log)
 
-def get_all_logs(cutoff_time: Optional[datetime] = None, limit: Optional[int] = None) -> List[LogEntry]:
+def get_all_logs(cutoff_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: Optional[int] = None) -> List[LogEntry]:
     """
     Busca todos os logs com filtros opcionais
     
     Args:
         cutoff_time: Filtrar logs a partir desta data/hora
+        end_time: Filtrar logs até esta data/hora (exclusivo)
         limit: Limite máximo de logs a retornar
     """
     # Construir query otimizada
     query = {}
-    if cutoff_time:
-        query["timestamp"] = {"$gte": cutoff_time}
+    if cutoff_time or end_time:
+        query["timestamp"] = {}
+        if cutoff_time:
+            query["timestamp"]["$gte"] = cutoff_time
+        if end_time:
+            query["timestamp"]["$lt"] = end_time
     
     # Usar cursor com limite se especificado
-    cursor = logs_collection.find(query)
+    cursor = logs_read_collection.find(query)
     if limit:
         cursor = cursor.limit(limit)
     
@@ -49,22 +61,27 @@ def get_all_logs(cutoff_time: Optional[datetime] = None, limit: Optional[int] =
     
     return logs
 
-def get_logs_by_api(apiId: str, cutoff_time: Optional[datetime] = None, limit: Optional[int] = None) -> List[LogEntry]:
+def get_logs_by_api(apiId: str, cutoff_time: Optional[datetime] = None, end_time: Optional[datetime] = None, limit: Optional[int] = None) -> List[LogEntry]:
     """
     Busca logs de uma API específica com filtros opcionais
     
     Args:
         apiId: ID da API
         cutoff_time: Filtrar logs a partir desta data/hora
+        end_time: Filtrar logs até esta data/hora (exclusivo)
         limit: Limite máximo de logs a retornar
     """
     # Construir query otimizada
     query = {"apiId": apiId}
-    if cutoff_time:
-        query["timestamp"] = {"$gte": cutoff_time}
+    if cutoff_time or end_time:
+        query["timestamp"] = {}
+        if cutoff_time:
+            query["timestamp"]["$gte"] = cutoff_time
+        if end_time:
+            query["timestamp"]["$lt"] = end_time
     
     # Usar cursor com limite se especificado
-    cursor = logs_collection.find(query)
+    cursor = logs_read_collection.find(query)
     if limit:
         cursor = cursor.limit(limit)
     
@@ -82,6 +99,61 @@ def get_logs_by_api(apiId: str, cutoff_time: Optional[datetime] = None, limit: O
     
     return logs
 
+def iter_logs(apiId: Optional[str] = None, cutoff_time: Optional[datetime] = None,
+              end_time: Optional[datetime] = None, batch_size: int = 5000) -> Iterator[LogEntry]:
+    """
+    Percorre os logs com um cursor, um de cada vez (sem carregar todos na memória)
+    
+    Args:
+        apiId: ID da API (None para todas)
+        cutoff_time: Filtrar logs a partir desta data/hora
+        end_time: Filtrar logs até esta data/hora (exclusivo)
+        batch_size: Documentos trazidos do MongoDB por ida ao banco
+    """
+    query = {}
+    if apiId:
+        query["apiId"] = apiId
+    if cutoff_time or end_time:
+        query["timestamp"] = {}
+        if cutoff_time:
+            query["timestamp"]["$gte"] = cutoff_time
+        if end_time:
+            query["timestamp"]["$lt"] = end_time
+    
+    for doc in logs_read_collection.find(query, {"_id": 0}).batch_size(batch_size):
+        try:
+            yield LogEntry(**doc)
+        except Exception as e:
+            print(f"Erro ao processar log: {e}")
+
+def sample_logs(size: int, cutoff_time: Optional[datetime] = None) -> List[LogEntry]:
+    """
+    Amostra aleatória de logs feita no banco ($sample)
+    
+    Apenas os logs sorteados trafegam, então o custo não depende do total.
+    
+    Args:
+        size: Quantidade de logs da amostra
+        cutoff_time: Considerar apenas logs a partir desta data/hora
+    """
+    pipeline = []
+    if cutoff_time:
+        pipeline.append({"$match": {"timestamp": {"$gte": cutoff_time}}})
+    pipeline += [{"$sample": {"size": size}}, {"$project": {"_id": 0}}]
+    
+    logs = []
+    for doc in logs_read_collection.aggregate(pipeline, allowDiskUse=True):
+        try:
+            logs.append(LogEntry(**doc))
+        except Exception as e:
+            print(f"Erro ao processar log: {e}")
+    return logs
+
+def get_log_by_request_id(requestId: str) -> Optional[LogEntry]:
+    """Busca um log pelo requestId (None se não existir)"""
+    doc = logs_read_collection.find_one({"requestId": requestId}, {"_id": 0})
+    return LogEntry(**doc) if doc else None
+
 def get_logs_count(apiId: Optional[str] = None, cutoff_time: Optional[datetime] = None) -> int:
     """
     Conta logs com filtros opcionais (mais rápido que buscar todos)
@@ -96,9 +168,42 @@ def get_logs_count(apiId: Optional[str] = None, cutoff_time: Optional[datetime]
     if cutoff_time:
         query["timestamp"] = {"$gte": cutoff_time}
     
-    return logs_collection.count_documents(query)
+    return logs_read_collection.count_documents(query)
+
+def get_field_counts(fields: List[str], cutoff_time: Optional[datetime] = None) -> Dict:
+    """
+    Conta os logs por valor de cada campo com agregações no banco
+    
+    Apenas as contagens trafegam (um documento por valor distinto), então o
+    custo não depende de carregar os logs na aplicação.
+    
+    Args:
+        fields: Campos a contar (ex: ['ip', 'clientId'])
+        cutoff_time: Considerar apenas logs a partir desta data/hora
+    
+    Returns:
+        Dict com 'total' e 'counts' ({campo: {valor: contagem}})
+    """
+    match = {"timestamp": {"$gte": cutoff_time}} if cutoff_time else {}
+    
+    counts = {}
+    for field in fields:
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+        ]
+        counts[field] = {
+            doc["_id"]: doc["count"]
+            for doc in logs_read_collection.aggregate(pipeline, allowDiskUse=True)
+        }
+    
+    return {
+        "total": logs_read_collection.count_documents(match),
+        "counts": counts
+    }
 
 def clear_logs():
     """Limpa todos os logs (útil para testes)"""
     logs_collection.delete_many({})
+    ip_profile_store.clear()
     print("Logs limpos com sucesso!") 
\ No newline at end of file
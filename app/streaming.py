@@ -0,0 +1,297 @@
+"""
+Pontuação em tempo real na ingestão e feed de anomalias (Server-Sent Events)
+Logs aceitos por POST /logs entram em uma fila; uma thread os pontua em
+micro-lotes com o modelo carregado (ver model_cache), grava as anomalias no
+armazenamento de detecções e as publica para os assinantes de GET /ml/stream
+"""
+
+import asyncio
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .models import LogEntry
+from .instrumentation import span, timed_operation
+from .metrics import metrics_registry
+
+stream_queue_size = metrics_registry.gauge("ml_stream_queue_size", "Logs aguardando pontuação em tempo real")
+stream_dropped = metrics_registry.counter(
+    "ml_stream_dropped_total", "Logs ou eventos descartados pelo streaming (fila cheia)", ["reason"]
+)
+stream_subscribers = metrics_registry.gauge("ml_stream_subscribers", "Assinantes conectados ao feed de anomalias")
+
+# Configuração padrão (seção "streaming")
+DEFAULT_STREAMING_CONFIG = {
+    "enabled": False,
+    "model_name": "iforest",
+    "batch_size": 500,
+    "flush_interval_ms": 500,
+    "max_queue": 100000
+}
+# Eventos pendentes por assinante antes de descartar (cliente lento)
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Intervalo dos comentários keepalive do SSE (segundos)
+KEEPALIVE_SECONDS = 15
+
+def get_streaming_config() -> Dict:
+    """Seção "streaming" das configurações completada com os valores padrão"""
+    try:
+        from .config_manager import config_manager
+        return {**DEFAULT_STREAMING_CONFIG, **config_manager.get_config("streaming")}
+    except Exception as e:
+        print(f"⚠️ Erro ao obter configurações de streaming: {e}")
+        return dict(DEFAULT_STREAMING_CONFIG)
+
+def format_sse(data: Dict, event: str = "anomaly") -> str:
+    """Mensagem no formato Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+class Subscription:
+    """Assinante do feed: fila no event loop da conexão e filtro opcional por API"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, apiId: Optional[str] = None):
+        self.loop = loop
+        self.apiId = apiId
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    
+    def deliver(self, event: Dict):
+        """Enfileira um evento (executado no event loop do assinante)"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            stream_dropped.inc(reason="slow_subscriber")
+
+class AnomalyBroadcaster:
+    """
+    Distribui as anomalias pontuadas aos assinantes conectados
+    
+    publish() pode ser chamado de qualquer thread; cada evento é entregue no
+    event loop da conexão do assinante.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: List[Subscription] = []
+    
+    def subscribe(self, apiId: Optional[str] = None) -> Subscription:
+        """Nova assinatura (chamar de dentro do event loop)"""
+        subscription = Subscription(asyncio.get_running_loop(), apiId)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            stream_subscribers.set(len(self._subscriptions))
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            stream_subscribers.set(len(self._subscriptions))
+    
+    def publish(self, events: List[Dict]) -> int:
+        """Entrega os eventos aos assinantes (respeitando o filtro por API)"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        delivered = 0
+        for subscription in subscriptions:
+            for event in events:
+                if subscription.apiId and event.get("apiId") != subscription.apiId:
+                    continue
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                    delivered += 1
+                except RuntimeError:
+                    # Event loop encerrado: a conexão já foi fechada
+                    self.unsubscribe(subscription)
+                    break
+        return delivered
+    
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+    
+    async def events(self, subscription: Subscription,
+                     is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[str]:
+        """
+        Mensagens SSE da assinatura até o cliente desconectar
+        
+        Envia 'retry' para o EventSource reconectar sozinho e um comentário
+        keepalive periódico para manter proxies com a conexão aberta.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            while not await is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=KEEPALIVE_SECONDS)
+                    yield format_sse(event)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+class StreamScorer:
+    """
+    Pontua os logs ingeridos em micro-lotes em uma thread dedicada
+    
+    Um lote é pontuado quando atinge batch_size logs ou quando o log mais
+    antigo espera flush_interval_ms. Com a fila cheia (max_queue), novos logs
+    não são pontuados em tempo real (a ingestão nunca bloqueia); eles continuam
+    cobertos pela detecção sob demanda.
+    """
+    
+    def __init__(self, broadcaster: AnomalyBroadcaster):
+        self.broadcaster = broadcaster
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.batches_scored = 0
+        self.logs_scored = 0
+        self.anomalies_published = 0
+        self.last_batch_at = None
+        self.last_error = None
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> bool:
+        """Inicia a thread de pontuação (sem efeito se já estiver rodando)"""
+        with self._lock:
+            if self.running:
+                return False
+            settings = get_streaming_config()
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=int(settings["max_queue"]))
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stream-scorer", daemon=True)
+            self._thread.start()
+        print(f"📡 Pontuação em tempo real iniciada (modelo {settings['model_name']})")
+        return True
+    
+    def stop(self, timeout: float = 5.0):
+        """Pontua o que estiver na fila e encerra a thread"""
+        with self._lock:
+            thread = self._thread
+            self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+    
+    def submit(self, log: LogEntry) -> bool:
+        """
+        Enfileira um log recém-ingerido (não bloqueia)
+        
+        Returns:
+            True se o log foi enfileirado para pontuação
+        """
+        if not get_streaming_config()["enabled"]:
+            return False
+        if not self.running:
+            self.start()
+        try:
+            self._queue.put_nowait(log)
+            return True
+        except queue.Full:
+            stream_dropped.inc(reason="queue_full")
+            return False
+    
+    def _next_batch(self, batch_size: int, flush_interval: float) -> List[LogEntry]:
+        """Aguarda o primeiro log e junta os seguintes até batch_size ou flush_interval"""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            settings = get_streaming_config()
+            batch = self._next_batch(int(settings["batch_size"]), settings["flush_interval_ms"] / 1000)
+            if batch:
+                try:
+                    self.score_batch(batch, settings["model_name"])
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"⚠️ Erro na pontuação em tempo real: {e}")
+    
+    def score_batch(self, logs: List[LogEntry], model_name: str) -> Dict:
+        """
+        Pontua um micro-lote, grava as anomalias e publica os eventos
+        
+        Returns:
+            Dict com logs pontuados e anomalias publicadas, ou o erro
+        """
+        from .model_cache import model_cache
+        from .ml_anomaly_detector import _get_configured_threshold, _record_detections
+        
+        with timed_operation("stream_batch") as timings:
+            with span("load_model"):
+                detector = model_cache.get(model_name)
+            if detector is None:
+                stream_dropped.inc(len(logs), reason="model_unavailable")
+                self.last_error = f"Modelo {model_name} não encontrado"
+                return {"error": self.last_error}
+            
+            threshold = _get_configured_threshold(verbose=False)
+            result = detector.detect_anomalies(logs, model_name, threshold=threshold)
+            if "error" in result:
+                self.last_error = result["error"]
+                return result
+            
+            anomalies = result["anomalies"]
+            if anomalies:
+                with span("record_detections"):
+                    _record_detections(detector, model_name, anomalies, threshold)
+                with span("publish"):
+                    self.broadcaster.publish([self._event(anomaly, model_name) for anomaly in anomalies])
+        
+        self.batches_scored += 1
+        self.logs_scored += len(logs)
+        self.anomalies_published += len(anomalies)
+        self.last_batch_at = datetime.now()
+        return {"logs_scored": len(logs), "anomalies": len(anomalies), "timings": timings.as_dict()}
+    
+    @staticmethod
+    def _event(anomaly: Dict, model_name: str) -> Dict:
+        """Evento compacto do feed (sem as características)"""
+        event = {key: anomaly.get(key) for key in (
+            "requestId", "apiId", "clientId", "ip", "method", "path", "status",
+            "timestamp", "anomaly_score", "description_url"
+        )}
+        event["model_name"] = model_name
+        return event
+    
+    def status(self) -> Dict:
+        """Estado da pontuação em tempo real"""
+        settings = get_streaming_config()
+        return {
+            **settings,
+            "running": self.running,
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "batches_scored": self.batches_scored,
+            "logs_scored": self.logs_scored,
+            "anomalies_published": self.anomalies_published,
+            "last_batch_at": self.last_batch_at.isoformat() if self.last_batch_at else None,
+            "last_error": self.last_error,
+            "subscribers": self.broadcaster.subscriber_count()
+        }
+
+# Instâncias globais
+stream_broadcaster = AnomalyBroadcaster()
+stream_scorer = StreamScorer(stream_broadcaster)
+
+def _collect_stream_metrics():
+    stream_queue_size.set(stream_scorer._queue.qsize() if stream_scorer._queue else 0)
+
+metrics_registry.add_collector(_collect_stream_metrics)
@@ -0,0 +1,236 @@
+"""
+Gerador vetorizado de tráfego sintético para testes e benchmarks
+Produz logs normais (clientes, IPs por cliente, mistura de paths/métodos/status)
+com padrões de ataque injetados, em DataFrame (até dezenas de milhões de linhas)
+ou como lista de LogEntry
+"""
+
+import ipaddress
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .models import LogEntry
+
+# Mistura padrão de paths, métodos e status (valor: peso relativo)
+DEFAULT_PATH_MIX = {
+    "/api/users": 0.25,
+    "/api/products": 0.25,
+    "/api/orders": 0.2,
+    "/api/search": 0.15,
+    "/api/categories": 0.1,
+    "/health": 0.05
+}
+DEFAULT_METHOD_MIX = {"GET": 0.7, "POST": 0.2, "PUT": 0.07, "DELETE": 0.03}
+DEFAULT_STATUS_MIX = {200: 0.85, 201: 0.06, 304: 0.03, 400: 0.03, 404: 0.03}
+DEFAULT_IP_RANGES = ["10.0.0.0/16", "192.168.0.0/16", "172.16.0.0/12", "200.150.0.0/16"]
+
+# Padrões de ataque disponíveis
+ATTACK_TYPES = ["ip_rotation", "admin_scan", "auth_bruteforce", "error_burst", "off_hours"]
+ADMIN_SCAN_PATHS = ["/admin", "/admin/users", "/admin/config", "/.env", "/wp-admin", "/admin/backup"]
+
+class TrafficProfile:
+    """
+    Parâmetros do tráfego sintético
+    
+    Args:
+        clients: Número de clientes (volume segue uma distribuição de Zipf)
+        apis: Número de APIs (cada cliente usa principalmente uma)
+        ips_per_client: IPs fixos de cada cliente
+        ip_ranges: Ranges CIDR de onde saem os IPs dos clientes
+        ipv6_ratio: Fração dos clientes com IPs IPv6 (2001:db8::/32)
+        path_mix / method_mix / status_mix: Pesos de cada valor
+        business_hours_ratio: Fração das requisições normais entre 8h e 18h
+        attack_ratio: Fração das linhas substituídas por ataques
+        attacks: Tipos de ataque injetados (divididos igualmente)
+        seed: Semente do gerador aleatório
+    """
+    
+    def __init__(self, clients: int = 50, apis: int = 5, ips_per_client: int = 3,
+                 ip_ranges: Sequence[str] = DEFAULT_IP_RANGES, ipv6_ratio: float = 0.0,
+                 path_mix: Dict[str, float] = DEFAULT_PATH_MIX,
+                 method_mix: Dict[str, float] = DEFAULT_METHOD_MIX,
+                 status_mix: Dict[int, float] = DEFAULT_STATUS_MIX,
+                 business_hours_ratio: float = 0.8, attack_ratio: float = 0.02,
+                 attacks: Sequence[str] = ATTACK_TYPES, seed: int = 42):
+        unknown = set(attacks) - set(ATTACK_TYPES)
+        if unknown:
+            raise ValueError(f"Tipos de ataque desconhecidos: {sorted(unknown)}")
+        self.clients = clients
+        self.apis = apis
+        self.ips_per_client = ips_per_client
+        self.ip_ranges = list(ip_ranges)
+        self.ipv6_ratio = ipv6_ratio
+        self.path_mix = dict(path_mix)
+        self.method_mix = dict(method_mix)
+        self.status_mix = dict(status_mix)
+        self.business_hours_ratio = business_hours_ratio
+        self.attack_ratio = attack_ratio
+        self.attacks = list(attacks)
+        self.seed = seed
+
+def _weighted_choice(rng: np.random.Generator, mix: Dict, size: int) -> pd.Categorical:
+    """Sorteia valores de acordo com os pesos (resultado categórico, sem cópias de strings)"""
+    values = list(mix)
+    weights = np.array([mix[value] for value in values], dtype=np.float64)
+    codes = rng.choice(len(values), size=size, p=weights / weights.sum())
+    return pd.Categorical.from_codes(codes, categories=values)
+
+def _ipv4_strings(values: np.ndarray) -> pd.Series:
+    """Converte inteiros de 32 bits em IPs no formato a.b.c.d (em lote)"""
+    values = values.astype(np.uint32)
+    octets = [pd.Series((values >> np.uint32(shift)) & np.uint32(0xFF)).astype(str) for shift in (24, 16, 8, 0)]
+    return octets[0] + "." + octets[1] + "." + octets[2] + "." + octets[3]
+
+def _client_ips(rng: np.random.Generator, profile: TrafficProfile) -> np.ndarray:
+    """IPs fixos de cada cliente, matriz (clientes, ips_por_cliente)"""
+    networks = [ipaddress.ip_network(cidr, strict=False) for cidr in profile.ip_ranges]
+    ipv6_network = ipaddress.ip_network("2001:db8::/32")
+    total = profile.clients * profile.ips_per_client
+    
+    ips = np.empty(total, dtype=object)
+    is_ipv6_client = rng.random(profile.clients) < profile.ipv6_ratio
+    network_ids = rng.integers(0, len(networks), size=total)
+    for position in range(total):
+        if is_ipv6_client[position // profile.ips_per_client]:
+            offset = int(rng.integers(1, 2 ** 63))
+            ips[position] = str(ipv6_network.network_address + offset)
+        else:
+            network = networks[network_ids[position]]
+            offset = int(rng.integers(1, max(network.num_addresses - 1, 2)))
+            ips[position] = str(network.network_address + offset)
+    return ips.reshape(profile.clients, profile.ips_per_client)
+
+def _timestamps(rng: np.random.Generator, size: int, end_time: datetime, span_hours: float,
+                business_hours_ratio: float) -> np.ndarray:
+    """Timestamps no período, com a fração pedida em horário comercial (8h-18h)"""
+    span_days = max(int(np.ceil(span_hours / 24)), 1)
+    day_starts = pd.Timestamp(end_time).normalize() - pd.to_timedelta(rng.integers(0, span_days, size=size), unit="D")
+    in_business = rng.random(size) < business_hours_ratio
+    seconds = np.where(
+        in_business,
+        rng.integers(8 * 3600, 18 * 3600, size=size),
+        rng.integers(0, 24 * 3600, size=size)
+    )
+    timestamps = (day_starts + pd.to_timedelta(seconds, unit="s")).to_numpy().copy()
+    
+    # Manter tudo dentro de [end_time - span_hours, end_time]
+    start = np.datetime64(end_time - timedelta(hours=span_hours))
+    end = np.datetime64(end_time)
+    out_of_range = (timestamps < start) | (timestamps > end)
+    span_seconds = int(span_hours * 3600)
+    timestamps[out_of_range] = end - rng.integers(0, span_seconds, size=int(out_of_range.sum())).astype("timedelta64[s]")
+    return timestamps
+
+def _inject_attacks(rng: np.random.Generator, frame: pd.DataFrame, profile: TrafficProfile,
+                    end_time: datetime) -> pd.DataFrame:
+    """Substitui uma fração das linhas por padrões de ataque (coluna attack_type)"""
+    count = len(frame)
+    attack_count = int(count * profile.attack_ratio)
+    attack_type = np.full(count, "", dtype=object)
+    if attack_count == 0 or not profile.attacks:
+        frame["attack_type"] = attack_type
+        return frame
+    
+    positions = rng.choice(count, size=attack_count, replace=False)
+    groups = np.array_split(positions, len(profile.attacks))
+    
+    for kind, rows in zip(profile.attacks, groups):
+        if len(rows) == 0:
+            continue
+        attack_type[rows] = kind
+        
+        if kind == "ip_rotation":
+            # Um cliente usando IPs públicos aleatórios a cada requisição
+            frame.loc[rows, "clientId"] = "attacker_rotation"
+            frame.loc[rows, "ip"] = _ipv4_strings(rng.integers(0x0B000000, 0xDF000000, size=len(rows))).to_numpy()
+        elif kind == "admin_scan":
+            # Varredura de paths administrativos com acesso negado
+            frame.loc[rows, "clientId"] = "attacker_scan"
+            frame.loc[rows, "ip"] = "203.0.113.66"
+            frame.loc[rows, "path"] = rng.choice(ADMIN_SCAN_PATHS, size=len(rows))
+            frame.loc[rows, "status"] = rng.choice([403, 404], size=len(rows))
+        elif kind == "auth_bruteforce":
+            # Tentativas de login falhas a partir de um único IP
+            frame.loc[rows, "ip"] = "198.51.100.23"
+            frame.loc[rows, "path"] = "/auth/login"
+            frame.loc[rows, "method"] = "POST"
+            frame.loc[rows, "status"] = 401
+        elif kind == "error_burst":
+            # Rajada de erros de servidor concentrada em 5 minutos
+            burst_end = np.datetime64(end_time - timedelta(hours=1))
+            frame.loc[rows, "status"] = rng.choice([500, 502, 503], size=len(rows))
+            frame.loc[rows, "timestamp"] = burst_end - rng.integers(0, 300, size=len(rows)).astype("timedelta64[s]")
+        elif kind == "off_hours":
+            # Acessos de madrugada (2h-5h) a partir de IPs externos
+            day_starts = frame.loc[rows, "timestamp"].dt.normalize()
+            night = day_starts + pd.to_timedelta(rng.integers(2 * 3600, 5 * 3600, size=len(rows)), unit="s")
+            night = night.where(night >= frame["timestamp"].min(), night + pd.Timedelta(days=1))
+            frame.loc[rows, "timestamp"] = night.clip(upper=pd.Timestamp(end_time))
+            frame.loc[rows, "ip"] = _ipv4_strings(rng.integers(0xC8000000, 0xC8FFFFFF, size=len(rows))).to_numpy()
+    
+    frame["attack_type"] = attack_type
+    return frame
+
+def generate_logs_frame(count: int, profile: Optional[TrafficProfile] = None,
+                        end_time: Optional[datetime] = None, span_hours: float = 24,
+                        request_prefix: str = "syn") -> pd.DataFrame:
+    """
+    Gera logs sintéticos em DataFrame (colunas de LogEntry + attack_type)
+    
+    Todas as colunas são geradas com operações vetorizadas; 10 milhões de
+    linhas cabem em alguns segundos. attack_type é vazio para tráfego normal.
+    
+    Args:
+        count: Número de logs
+        profile: Parâmetros do tráfego (padrão: TrafficProfile())
+        end_time: Fim do período (padrão: agora)
+        span_hours: Duração do período em horas
+        request_prefix: Prefixo dos requestIds
+    """
+    profile = profile or TrafficProfile()
+    end_time = end_time or datetime.now()
+    rng = np.random.default_rng(profile.seed)
+    
+    # Clientes com volume em distribuição de Zipf e uma API principal cada
+    client_weights = 1.0 / np.arange(1, profile.clients + 1)
+    client_ids = rng.choice(profile.clients, size=count, p=client_weights / client_weights.sum())
+    client_names = [f"client_{i:04d}" for i in range(profile.clients)]
+    home_api = rng.integers(0, profile.apis, size=profile.clients)
+    other_api = rng.integers(0, profile.apis, size=count)
+    api_ids = np.where(rng.random(count) < 0.9, home_api[client_ids], other_api)
+    
+    # Cada requisição usa um dos IPs fixos do cliente
+    client_ips = _client_ips(rng, profile)
+    ip_slots = rng.integers(0, profile.ips_per_client, size=count)
+    ip_codes = client_ids * profile.ips_per_client + ip_slots
+    
+    frame = pd.DataFrame({
+        "requestId": request_prefix + "_" + pd.Series(np.arange(count)).astype(str),
+        "clientId": pd.Categorical.from_codes(client_ids, categories=client_names).astype(object),
+        "ip": client_ips.ravel()[ip_codes],
+        "apiId": pd.Categorical.from_codes(api_ids, categories=[f"api_{i:02d}" for i in range(profile.apis)]).astype(object),
+        "path": _weighted_choice(rng, profile.path_mix, count).astype(object),
+        "method": _weighted_choice(rng, profile.method_mix, count).astype(object),
+        "status": np.asarray(_weighted_choice(rng, profile.status_mix, count)).astype(np.int64),
+        "timestamp": _timestamps(rng, count, end_time, span_hours, profile.business_hours_ratio)
+    })
+    
+    return _inject_attacks(rng, frame, profile, end_time)
+
+def generate_logs(count: int, profile: Optional[TrafficProfile] = None,
+                  end_time: Optional[datetime] = None, span_hours: float = 24,
+                  request_prefix: str = "syn") -> List[LogEntry]:
+    """
+    Gera logs sintéticos como LogEntry (para o armazenamento e a API)
+    
+    Mesmos parâmetros de generate_logs_frame; o tipo de ataque não faz parte
+    de LogEntry e é descartado.
+    """
+    frame = generate_logs_frame(count, profile, end_time, span_hours, request_prefix)
+    records = frame.drop(columns=["attack_type"]).to_dict("records")
+    for record in records:
+        record["timestamp"] = record["timestamp"].to_pydatetime()
+    return [LogEntry(**record) for record in records]
@@ -1,14 +1,23 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, validator
-from typing import Optional, Any
+from typing import Optional, Any, List
+import time
 from app.models import LogEntry
 from app.storage import add_log, clear_logs
 from app.analyzer import basic_stats, detect_anomalies, error_rate_by_minute, detect_ip_anomalies
-from app.ml_anomaly_detector import train_ml_models, detect_ml_anomalies, compare_ml_models, get_anomalies_timeline_data
+from app.ml_anomaly_detector import train_ml_models, detect_ml_anomalies, compare_ml_models, get_anomalies_timeline_data, get_anomaly_description
 from app.model_storage import get_available_models, export_trained_model, import_trained_model
 from app.feedback_system import feedback_system
 from app.config_manager import config_manager
+from app.connection_manager import get_pool_metrics
+from app.executors import shutdown_executors
+from app.ip_profiles import ip_profile_store
+from app.instrumentation import timing_registry
+from app.metrics import http_request_duration, logs_ingest_failures, logs_ingested, metrics_registry
+from app.streaming import get_streaming_config, stream_broadcaster, stream_scorer
+from app.scoring import score_logs, warm_up
 
 app = FastAPI()
 
@@ -21,6 +30,38 @@ app.add_middleware(
     allow_headers=["*"],  # Permite todos os headers
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Latência de cada requisição por rota (o template, ex: /stats/{apiId}) para /metrics"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
+
+@app.on_event("startup")
+async def startup():
+    """Aquece os modelos de /ml/score e inicia a pontuação em tempo real se habilitada"""
+    warm_up()
+    if get_streaming_config()["enabled"]:
+        stream_scorer.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Encerra a pontuação em tempo real, a gravação dos perfis de IP e os executores"""
+    stream_scorer.stop()
+    ip_profile_store.stop()
+    shutdown_executors()
+
 # Modelos Pydantic para as requisições
 class ExportModelRequest(BaseModel):
     export_path: Optional[str] = None
@@ -49,6 +90,7 @@ class FeedbackRequest(BaseModel):
 
 class RetrainRequest(BaseModel):
     api_id: str
+    mode: str = "full"
 
 # Modelos Pydantic para configurações
 class ConfigUpdateRequest(BaseModel):
@@ -63,12 +105,27 @@ class ConfigSectionUpdateRequest(BaseModel):
 class ConfigResetRequest(BaseModel):
     section: Optional[str] = None
 
+# Modelo Pydantic para descrições em lote
+class DescriptionBatchRequest(BaseModel):
+    anomalies: List[dict]
+    context: str = "snapshot"
+
+# Modelo Pydantic para pontuação por requisição
+class ScoreRequest(BaseModel):
+    logs: List[LogEntry]
+    model_name: str = 'iforest'
+    threshold: Optional[float] = None
+
 @app.post("/logs")
 def receive_log(log: LogEntry):
     try:
         add_log(log)
+        logs_ingested.inc()
+        # Pontuação em tempo real (micro-lotes em segundo plano, não bloqueia)
+        stream_scorer.submit(log)
         return {"message": "Log received", "status": "success"}
     except Exception as e:
+        logs_ingest_failures.inc()
         return {"message": f"Error: {str(e)}", "status": "error"}
 
 @app.get("/stats/{apiId}")
@@ -105,27 +162,113 @@ def get_ip_anomalies(apiId: str = None, hours_back: int = 24):
     except Exception as e:
         return {"error": str(e)}
 
+@app.post("/ip-profiles/rebuild")
+def rebuild_ip_profiles(apiId: str = None):
+    """
+    Reconstrói os perfis de IP por cliente a partir dos logs armazenados
+    Necessário apenas para logs ingeridos antes dos perfis existirem
+    """
+    try:
+        result = ip_profile_store.rebuild(apiId=apiId)
+        if "error" in result:
+            raise HTTPException(status_code=500, detail=result["error"])
+        return {"status": "success", **result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/ml/train")
-def train_ml_anomaly_models(apiId: str = None, hours_back: int = 24):
+def train_ml_anomaly_models(apiId: str = None, hours_back: int = 24, mode: str = 'full'):
     """
     Treina modelos de machine learning para detecção de anomalias
+    
+    Com mode=incremental, iforest, knn e lof são atualizados apenas com os logs
+    recebidos desde o último treinamento (seção incremental_training); quando a
+    reconstrução periódica vence ou não há modelos salvos, o treino é completo
+    e 'full_rebuild_reason' informa o motivo.
     """
     try:
-        return train_ml_models(apiId=apiId, hours_back=hours_back)
+        return train_ml_models(apiId=apiId, hours_back=hours_back, mode=mode)
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/ml/detect")
-def detect_ml_anomalies_endpoint(apiId: str = None, model_name: str = 'iforest', hours_back: int = 24):
+def detect_ml_anomalies_endpoint(apiId: str = None, model_name: str = 'iforest', hours_back: int = 24,
+                                 include_descriptions: bool = False, cascade: Optional[str] = None,
+                                 cascade_top_percent: float = 20.0):
     """
     Detecta anomalias usando machine learning
-    Modelos disponíveis: iforest, lof, knn, ocsvm, cblof
+    Modelos disponíveis: iforest, lof, knn, ocsvm, ocsvm_approx, cblof e ensemble (todos os
+    modelos do último treinamento em uma passada; o score é a média dos scores
+    padronizados e cada log traz 'model_scores')
+    
+    Por padrão as descrições não são geradas: cada anomalia traz 'description_url'
+    (/ml/anomalies/{requestId}/description). Use include_descriptions=true para
+    gerá-las na detecção.
+    
+    Com cascade=zscore (ou iforest), um pré-filtro barato pontua todos os logs e
+    apenas os cascade_top_percent% mais suspeitos passam pelo modelo escolhido
+    (útil para knn, lof e ocsvm); 'cascade' informa os logs vistos por etapa.
+    """
+    try:
+        return detect_ml_anomalies(apiId=apiId, model_name=model_name, hours_back=hours_back,
+                                   include_descriptions=include_descriptions, cascade=cascade,
+                                   cascade_top_percent=cascade_top_percent)
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.post("/ml/score")
+def score_ml_logs(request: ScoreRequest):
+    """
+    Pontua um ou poucos logs com o modelo mantido em memória (uso inline no gateway)
+    
+    Não consulta o MongoDB nem grava detecções; devolve o score e a decisão de
+    cada log e o tempo de modelo (model_time_ms).
+    """
+    try:
+        return score_logs(request.logs, model_name=request.model_name, threshold=request.threshold)
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/ml/anomalies/{requestId:path}/description")
+def get_anomaly_description_endpoint(requestId: str, model_name: str = 'iforest'):
+    """
+    Gera a descrição de uma anomalia sob demanda
+    Descrições já geradas para a mesma versão do modelo vêm do cache
     """
     try:
-        return detect_ml_anomalies(apiId=apiId, model_name=model_name, hours_back=hours_back)
+        return get_anomaly_description(requestId, model_name=model_name)
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/ml/stream")
+async def stream_ml_anomalies(request: Request, apiId: Optional[str] = None):
+    """
+    Feed de anomalias em tempo real (Server-Sent Events)
+    
+    Cada log ingerido é pontuado pelo modelo da seção "streaming" das
+    configurações; as anomalias chegam como eventos 'anomaly'. Use
+    EventSource no navegador em vez de consultar /ml/detect periodicamente.
+    """
+    subscription = stream_broadcaster.subscribe(apiId)
+    return StreamingResponse(
+        stream_broadcaster.events(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/ml/stream/status")
+def get_ml_stream_status():
+    """Estado da pontuação em tempo real (fila, lotes, anomalias publicadas, assinantes)"""
+    try:
+        return {
+            "status": "success",
+            **stream_scorer.status()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/ml/compare")
 def compare_ml_models_endpoint(apiId: str = None, hours_back: int = 24):
     """
@@ -213,7 +356,8 @@ def import_ml_model(request: ImportModelRequest):
 @app.post("/feedback/false-positive")
 async def mark_false_positive(feedback: FeedbackRequest):
     """Marca uma anomalia como falso positivo"""
-    result = feedback_system.mark_as_false_positive(
+    result = await feedback_system.mark_feedback_async(
+        "false_positive",
         feedback.log_id, 
         feedback.api_id, 
         feedback.user_comment,
@@ -227,7 +371,8 @@ async def mark_false_positive(feedback: FeedbackRequest):
 @app.post("/feedback/true-positive")
 async def mark_true_positive(feedback: FeedbackRequest):
     """Marca uma anomalia como verdadeiro positivo"""
-    result = feedback_system.mark_as_true_positive(
+    result = await feedback_system.mark_feedback_async(
+        "true_positive",
         feedback.log_id, 
         feedback.api_id, 
         feedback.user_comment,
@@ -241,15 +386,20 @@ async def mark_true_positive(feedback: FeedbackRequest):
 @app.get("/feedback/history")
 async def get_feedback_history(api_id: Optional[str] = None, limit: int = 50):
     """Obtém histórico de feedback"""
-    result = feedback_system.get_feedback_history(api_id, limit)
+    result = await feedback_system.get_feedback_history_async(api_id, limit)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
 @app.post("/feedback/retrain")
 async def retrain_with_feedback(request: RetrainRequest):
-    """Retreina o modelo usando feedback do usuário"""
-    result = feedback_system.retrain_with_feedback(request.api_id)
+    """
+    Retreina o modelo usando feedback do usuário
+    O treinamento roda no pool de processos dedicado para não bloquear o worker
+    Com mode=incremental, os falsos positivos entram em uma atualização incremental
+    (ver /ml/train) em vez de um retreinamento completo
+    """
+    result = await feedback_system.retrain_with_feedback_async(request.api_id, request.mode)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
@@ -257,7 +407,7 @@ async def retrain_with_feedback(request: RetrainRequest):
 @app.get("/feedback/stats")
 async def get_feedback_stats(api_id: Optional[str] = None):
     """Obtém estatísticas de feedback"""
-    result = feedback_system.get_feedback_stats(api_id)
+    result = await feedback_system.get_feedback_stats_async(api_id)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
@@ -266,7 +416,7 @@ async def get_feedback_stats(api_id: Optional[str] = None):
 async def get_logs_with_feedback(api_id: Optional[str] = None):
     """Obtém logs que já foram marcados com feedback"""
     try:
-        logs = feedback_system.get_logs_with_feedback(api_id)
+        logs = await feedback_system.get_logs_with_feedback_async(api_id)
         return {
             "status": "success",
             "logs_with_feedback": logs,
@@ -280,7 +430,7 @@ async def get_logs_with_feedback(api_id: Optional[str] = None):
 async def get_config(section: Optional[str] = None):
     """Obtém configurações do sistema"""
     try:
-        config = config_manager.get_config(section)
+        config = await config_manager.get_config_async(section)
         return {
             "status": "success",
             "config": config
@@ -292,7 +442,7 @@ async def get_config(section: Optional[str] = None):
 async def update_config(request: ConfigUpdateRequest):
     """Atualiza uma configuração específica"""
     try:
-        result = config_manager.update_config(request.section, request.key, request.value)
+        result = await config_manager.update_config_async(request.section, request.key, request.value)
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         return result
@@ -303,7 +453,7 @@ async def update_config(request: ConfigUpdateRequest):
 async def update_config_section(request: ConfigSectionUpdateRequest):
     """Atualiza uma seção inteira de configurações"""
     try:
-        result = config_manager.update_section(request.section, request.config)
+        result = await config_manager.update_section_async(request.section, request.config)
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         return result
@@ -314,7 +464,7 @@ async def update_config_section(request: ConfigSectionUpdateRequest):
 async def reset_config(request: ConfigResetRequest):
     """Reseta configurações para valores padrão"""
     try:
-        result = config_manager.reset_to_default(request.section)
+        result = await config_manager.reset_to_default_async(request.section)
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         return result
@@ -325,92 +475,118 @@ async def reset_config(request: ConfigResetRequest):
 async def get_config_history(limit: int = 10):
     """Obtém histórico de alterações de configuração"""
     try:
-        result = config_manager.get_config_history(limit)
+        result = await config_manager.get_config_history_async(limit)
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Endpoints de infraestrutura
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Métricas no formato texto do Prometheus: latência por rota, etapas do
+    pipeline de ML, logs ingeridos/avaliados, anomalias, caches e modelos
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/db/pool-metrics")
+def get_db_pool_metrics():
+    """Obtém métricas dos pools de conexão do MongoDB (checkouts e tempo de espera)"""
+    try:
+        return {
+            "status": "success",
+            **get_pool_metrics()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/ml/timings")
+def get_ml_timings(reset: bool = False):
+    """
+    Tempo acumulado por etapa das operações de ML neste processo
+    (detecção, treinamento e retreinamento: chamadas, total, média e máximo)
+    """
+    try:
+        operations = timing_registry.snapshot()
+        if reset:
+            timing_registry.reset()
+        return {
+            "status": "success",
+            "operations": operations
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Endpoints para ML de descrições de anomalias
 @app.post("/ml/descriptions/train")
-async def train_description_model():
-    """Treina o modelo de ML para geração de descrições"""
+def train_description_model(max_samples: Optional[int] = None):
+    """
+    Treina o modelo de ML para geração de descrições
+    
+    As frequências são contadas no banco e apenas a amostra do ajuste é buscada.
+    
+    - **max_samples**: Logs usados no ajuste (amostra aleatória; padrão: descriptions.training_max_samples)
+    """
     try:
         from app.anomaly_description_ml import description_ml
-        from app.storage import get_all_logs
-        
-        # Obtém logs para treinamento
-        logs = get_all_logs()
-        if not logs:
-            return {"error": "Nenhum log encontrado para treinamento"}
-        
-        # Converte para formato compatível
-        training_data = []
-        for log in logs:
-            training_data.append({
-                'requestId': log.requestId,
-                'clientId': log.clientId,
-                'ip': log.ip,
-                'apiId': log.apiId,
-                'method': log.method,
-                'path': log.path,
-                'status': log.status,
-                'timestamp': log.timestamp.isoformat()
-            })
         
-        # Treina modelo
-        success = description_ml.train_description_model(training_data)
+        result = description_ml.train_from_storage(max_samples=max_samples)
+        if "error" in result:
+            return result
         
-        if success:
-            return {
-                "message": "Modelo de descrições treinado com sucesso",
-                "logs_used": len(training_data),
-                "models_saved": ["scaler", "pca", "cluster"]
-            }
-        else:
-            return {"error": "Erro ao treinar modelo de descrições"}
+        return {
+            "message": "Modelo de descrições treinado com sucesso",
+            **result,
+            "models_saved": ["scaler", "pca", "cluster"]
+        }
             
     except Exception as e:
         return {"error": f"Erro no treinamento: {str(e)}"}
 
 @app.get("/ml/descriptions/analyze")
-async def analyze_anomaly_patterns():
-    """Analisa padrões entre anomalias detectadas"""
+def analyze_anomaly_patterns(
+    apiId: Optional[str] = None,
+    model_name: str = "iforest",
+    hours_back: int = 24,
+    source: str = "stored"
+):
+    """
+    Analisa padrões entre anomalias detectadas
+    
+    - **apiId**: ID da API (opcional)
+    - **model_name**: Modelo cujas detecções serão analisadas
+    - **hours_back**: Horas para trás (padrão: 24)
+    - **source**: 'stored' lê as detecções armazenadas (pontuando só os períodos
+      ainda não cobertos); 'detect' executa uma nova detecção completa
+    """
     try:
         from app.anomaly_description_ml import description_ml
-        from app.ml_anomaly_detector import detect_ml_anomalies
+        from app.ml_anomaly_detector import detect_ml_anomalies, get_stored_anomalies
+        
+        if source not in ("stored", "detect"):
+            return {"error": "source deve ser 'stored' ou 'detect'"}
         
-        # Detecta anomalias
-        detection_result = detect_ml_anomalies(hours_back=24)
+        # Obtém as anomalias do armazenamento ou de uma nova detecção
+        if source == "stored":
+            detection_result = get_stored_anomalies(apiId=apiId, model_name=model_name, hours_back=hours_back)
+        else:
+            detection_result = detect_ml_anomalies(apiId=apiId, model_name=model_name, hours_back=hours_back)
         
         if "error" in detection_result:
             return {"error": f"Erro na detecção: {detection_result['error']}"}
         
         anomalies = detection_result.get("anomalies", [])
         if not anomalies:
-            return {"message": "Nenhuma anomalia encontrada para análise"}
+            return {"message": "Nenhuma anomalia encontrada para análise", "source": source}
         
-        # Converte anomalias para formato compatível
-        anomalies_data = []
-        for anomaly in anomalies:
-            anomalies_data.append({
-                'requestId': anomaly.get('requestId', ''),
-                'clientId': anomaly.get('clientId', ''),
-                'ip': anomaly.get('ip', ''),
-                'apiId': anomaly.get('apiId', ''),
-                'method': anomaly.get('method', ''),
-                'path': anomaly.get('path', ''),
-                'status': anomaly.get('status', 0),
-                'timestamp': anomaly.get('timestamp', datetime.now().isoformat()),
-                'anomaly_score': anomaly.get('anomaly_score', 0)
-            })
-        
-        # Analisa padrões
-        pattern_analysis = description_ml.analyze_patterns(anomalies_data)
+        # Analisa padrões (tabela colunar agregada por tipo)
+        pattern_analysis = description_ml.analyze_patterns(anomalies)
         
         return {
             "total_anomalies": len(anomalies),
+            "source": source,
             "pattern_analysis": pattern_analysis,
             "summary": {
                 "types_detected": list(pattern_analysis.keys()),
@@ -421,12 +597,64 @@ async def analyze_anomaly_patterns():
     except Exception as e:
         return {"error": f"Erro na análise: {str(e)}"}
 
+@app.post("/ml/descriptions/batch")
+def generate_batch_descriptions(request: DescriptionBatchRequest):
+    """
+    Gera descrições para várias anomalias de uma vez
+    
+    Tipo, severidade e detalhes são calculados em lote; quando o modelo de
+    descrições foi treinado (/ml/descriptions/train), cada anomalia também
+    recebe o cluster atribuído pelo KMeans.
+    
+    - **anomalies**: Lista de anomalias com os campos do log e 'score' (ou 'anomaly_score')
+    - **context**: 'snapshot' usa as frequências da janela configurada;
+      'batch' usa as frequências entre as próprias anomalias
+    """
+    try:
+        import time
+        from app.anomaly_description_ml import description_ml
+        
+        start_time = time.time()
+        
+        if request.context not in ("snapshot", "batch"):
+            return {"error": "context deve ser 'snapshot' ou 'batch'"}
+        if not request.anomalies:
+            return {"descriptions": [], "total": 0}
+        
+        # Valida dados de entrada
+        required_fields = ['ip', 'clientId', 'apiId', 'method', 'path', 'status', 'timestamp']
+        for position, anomaly in enumerate(request.anomalies):
+            missing = [field for field in required_fields if field not in anomaly]
+            if 'score' not in anomaly and 'anomaly_score' not in anomaly:
+                missing.append('score')
+            if missing:
+                return {"error": f"Anomalia {position}: campos obrigatórios ausentes: {', '.join(missing)}"}
+        
+        context = description_ml.get_context_snapshot() if request.context == "snapshot" else None
+        descriptions = description_ml.generate_ml_descriptions(request.anomalies, context)
+        
+        return {
+            "descriptions": descriptions,
+            "total": len(descriptions),
+            "context": request.context,
+            "cluster_model_used": bool(descriptions) and descriptions[0]["cluster"] is not None,
+            "processing_time": round(time.time() - start_time, 3)
+        }
+        
+    except Exception as e:
+        return {"error": f"Erro na geração em lote: {str(e)}"}
+
 @app.post("/ml/descriptions/generate")
-async def generate_custom_description(request: dict):
-    """Gera descrição personalizada para um log específico"""
+def generate_custom_description(request: dict):
+    """
+    Gera descrição personalizada para um log específico
+    
+    As frequências de contexto vêm de um snapshot em cache das últimas
+    `descriptions.context_window_hours` horas, atualizado a cada
+    `descriptions.context_refresh_seconds` segundos.
+    """
     try:
         from app.anomaly_description_ml import description_ml
-        from app.storage import get_all_logs
         
         # Valida dados de entrada
         required_fields = ['requestId', 'clientId', 'ip', 'apiId', 'method', 'path', 'status', 'timestamp', 'score']
@@ -434,26 +662,14 @@ async def generate_custom_description(request: dict):
             if field not in request:
                 return {"error": f"Campo obrigatório ausente: {field}"}
         
-        # Obtém contexto de logs
-        all_logs = get_all_logs()
-        all_logs_dict = []
-        for log in all_logs:
-            all_logs_dict.append({
-                'requestId': log.requestId,
-                'clientId': log.clientId,
-                'ip': log.ip,
-                'apiId': log.apiId,
-                'method': log.method,
-                'path': log.path,
-                'status': log.status,
-                'timestamp': log.timestamp.isoformat()
-            })
+        # Contexto de frequências (snapshot em cache)
+        context = description_ml.get_context_snapshot()
         
         # Gera descrição
-        description = description_ml.generate_ml_description(request, request['score'], all_logs_dict)
+        description = description_ml.generate_ml_description(request, request['score'], context)
         
         # Extrai features para análise adicional
-        features = description_ml.extract_contextual_features(request, all_logs_dict)
+        features = description_ml.extract_contextual_features(request, context)
         anomaly_type = description_ml.classify_anomaly_type(features, request['score'])
         severity = description_ml.determine_severity(request['score'], features)
         
@@ -463,6 +679,11 @@ async def generate_custom_description(request: dict):
                 "anomaly_type": anomaly_type,
                 "severity": severity,
                 "features": features
+            },
+            "context": {
+                "window_hours": context.window_hours,
+                "logs_in_window": context.total,
+                "built_at": context.built_at.isoformat() if context.built_at else None
             }
         }
         
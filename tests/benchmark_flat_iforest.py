@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark do Isolation Forest em arrays planos (app/flat_iforest.py)
+Compara o decision_function do PyOD com o FlatIForest em lotes de 1 a 100 mil
+logs, confere se os scores são iguais e grava o resultado em JSON para
+comparar entre commits (o ponto de troca orienta FLAT_IFOREST_MAX_ROWS)
+
+Configuração por variáveis de ambiente:
+    BENCHMARK_BATCH_SIZES: tamanhos de lote, separados por vírgula (padrão: 1,10,100,1000,10000,100000)
+    BENCHMARK_FIT_ROWS: logs sintéticos usados no treino (padrão 20000)
+    BENCHMARK_OUTPUT: arquivo de saída (padrão benchmark_results/flat_iforest_<commit>.json)
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+import json
+import platform
+import time
+from datetime import datetime
+import numpy as np
+from pyod.models.iforest import IForest
+from app.flat_iforest import FlatIForest
+from app.ml_anomaly_detector import MLAnomalyDetector
+from app.synthetic_logs import TrafficProfile, generate_logs_frame
+from benchmark_pipeline import git_commit
+from benchmark_scoring import percentiles
+
+# Configuração
+BATCH_SIZES = [int(size) for size in os.getenv("BENCHMARK_BATCH_SIZES", "1,10,100,1000,10000,100000").split(",") if size]
+FIT_ROWS = int(os.getenv("BENCHMARK_FIT_ROWS", "20000"))
+# Logs pontuados por tamanho de lote (mais repetições nos lotes pequenos)
+ROWS_PER_SIZE = 200000
+
+def measure(function, calls: int) -> dict:
+    """Executa function calls vezes (após aquecimento) e devolve os percentis"""
+    function()
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+def scoring_rows(detector: MLAnomalyDetector, rows: int) -> np.ndarray:
+    """Características normalizadas de logs novos (repetidas até rows linhas)"""
+    features = detector.scaler.transform(detector.extract_features(
+        generate_logs_frame(min(rows, 50000), TrafficProfile(seed=7))
+    ))
+    return np.resize(features, (rows, features.shape[1]))
+
+def main():
+    """Função principal"""
+    print("🚀 BENCHMARK DO ISOLATION FOREST EM ARRAYS PLANOS")
+    print("=" * 50)
+    
+    print(f"\n🎯 Treinando Isolation Forest com {FIT_ROWS} logs...")
+    detector = MLAnomalyDetector()
+    model = IForest(contamination=0.1, random_state=42)
+    model.fit(detector.scaler.fit_transform(detector.extract_features(generate_logs_frame(FIT_ROWS, TrafficProfile()))))
+    
+    start = time.perf_counter()
+    flat = FlatIForest.from_model(model)
+    export_ms = (time.perf_counter() - start) * 1000
+    print(f"   - Exportação: {flat.n_nodes} nós, profundidade {flat.max_depth}, {export_ms:.1f}ms")
+    
+    features = scoring_rows(detector, max(BATCH_SIZES))
+    results = {}
+    print("\n⚡ Pontuação por tamanho de lote...")
+    for size in BATCH_SIZES:
+        batch = features[:size]
+        max_difference = float(np.max(np.abs(model.decision_function(batch) - flat.decision_function(batch))))
+        calls = max(3, min(2000, ROWS_PER_SIZE // size))
+        pyod = measure(lambda: model.decision_function(batch), calls)
+        flat_result = measure(lambda: flat.decision_function(batch), calls)
+        speedup = pyod["p50_ms"] / flat_result["p50_ms"] if flat_result["p50_ms"] else 0
+        results[str(size)] = {
+            "pyod": pyod,
+            "flat": flat_result,
+            "speedup_p50": round(speedup, 2),
+            "max_abs_difference": max_difference
+        }
+        print(f"   - {size:>6} logs: PyOD p50 {pyod['p50_ms']}ms | planos p50 {flat_result['p50_ms']}ms "
+              f"({speedup:.1f}x) | diferença máxima {max_difference:.1e}")
+    
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "parameters": {"batch_sizes": BATCH_SIZES, "fit_rows": FIT_ROWS},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "export": {"nodes": flat.n_nodes, "max_depth": flat.max_depth, "export_ms": round(export_ms, 2)},
+        "batch_sizes": results
+    }
+    
+    output = os.getenv("BENCHMARK_OUTPUT") or os.path.join(parent_dir, "benchmark_results", f"flat_iforest_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    
+    print("\n" + "=" * 50)
+    same = all(size_result["max_abs_difference"] < 1e-9 for size_result in results.values())
+    print(f"   {'✅' if same else '❌'} Scores iguais ao decision_function do PyOD")
+    faster = [size for size, size_result in results.items() if size_result["speedup_p50"] > 1]
+    print(f"   📈 Arrays planos mais rápidos nos lotes: {', '.join(faster) or 'nenhum'}")
+    print(f"   📄 Resultado: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Benchmark do pipeline de detecção com tráfego sintético
+Mede separadamente a geração dos logs, extract_features, a normalização,
+o fit e o score de cada modelo PyOD, a geração de descrições e as leituras
+do armazenamento, e grava o resultado em JSON para comparar entre commits
+
+Configuração por variáveis de ambiente:
+    BENCHMARK_ROWS: logs gerados (padrão 100000, até 10 milhões)
+    BENCHMARK_FIT_ROWS: amostra usada no fit dos modelos (padrão 20000)
+    BENCHMARK_MODELS: modelos medidos, separados por vírgula (padrão: todos)
+    BENCHMARK_STORAGE_ROWS: logs inseridos no MongoDB para medir leituras (0 = pular)
+    BENCHMARK_OUTPUT: arquivo de saída (padrão benchmark_results/pipeline_<commit>.json)
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyod
+import sklearn
+from app.synthetic_logs import TrafficProfile, generate_logs, generate_logs_frame
+from app.ml_anomaly_detector import MLAnomalyDetector
+from app.anomaly_description_ml import AnomalyDescriptionML, FrequencyContext, FREQUENCY_FIELDS
+
+ROWS = int(os.getenv("BENCHMARK_ROWS", "100000"))
+FIT_ROWS = int(os.getenv("BENCHMARK_FIT_ROWS", "20000"))
+MODELS = [name for name in os.getenv("BENCHMARK_MODELS", "").split(",") if name]
+STORAGE_ROWS = int(os.getenv("BENCHMARK_STORAGE_ROWS", "20000"))
+BENCHMARK_API_ID = "benchmark_pipeline"
+
+def git_commit() -> str:
+    """Commit atual (com sufixo -dirty se houver alterações locais)"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=parent_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=parent_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+class StageTimer:
+    """Acumula a duração de cada etapa do benchmark"""
+    
+    def __init__(self):
+        self.stages = {}
+    
+    def run(self, name: str, rows, function, *args, **kwargs):
+        """
+        Executa a etapa, registra segundos e linhas/s e retorna o resultado
+        
+        rows pode ser uma função que calcula as linhas a partir do resultado
+        (leituras, em que a quantidade só é conhecida depois da consulta).
+        """
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if callable(rows):
+            rows = rows(result)
+        self.stages[name] = {
+            "seconds": round(elapsed, 4),
+            "rows": rows,
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None
+        }
+        print(f"   - {name}: {elapsed:.3f}s ({rows} linhas)")
+        return result
+
+def benchmark_features(timer: StageTimer, logs_df: pd.DataFrame, detector: MLAnomalyDetector):
+    """Extração de características e normalização"""
+    print("\n🧮 Características...")
+    timer.run("fit_vocabularies", len(logs_df), detector.fit_vocabularies, logs_df)
+    features_df = timer.run("extract_features", len(logs_df), detector.extract_features, logs_df)
+    timer.run("scaler_fit", len(features_df), detector.scaler.fit, features_df)
+    return timer.run("scaler_transform", len(features_df), detector.scaler.transform, features_df)
+
+def benchmark_models(timer: StageTimer, features_scaled: np.ndarray, detector: MLAnomalyDetector) -> dict:
+    """Fit (em amostra) e score (em todas as linhas) de cada modelo"""
+    print("\n🤖 Modelos...")
+    rng = np.random.default_rng(42)
+    fit_rows = min(FIT_ROWS, len(features_scaled))
+    fit_sample = features_scaled[rng.choice(len(features_scaled), size=fit_rows, replace=False)]
+    
+    scores = {}
+    for name, model in detector.models.items():
+        if MODELS and name not in MODELS:
+            continue
+        try:
+            timer.run(f"model.{name}.fit", fit_rows, model.fit, fit_sample)
+            scores[name] = timer.run(f"model.{name}.score", len(features_scaled),
+                                     model.decision_function, features_scaled)
+        except Exception as e:
+            print(f"   ❌ {name}: {e}")
+            timer.stages[f"model.{name}"] = {"error": str(e)}
+    return scores
+
+def benchmark_descriptions(timer: StageTimer, logs_df: pd.DataFrame, scores: dict):
+    """Contexto de frequências e descrições em lote das anomalias (10% com maior score)"""
+    print("\n📝 Descrições...")
+    description_ml = AnomalyDescriptionML()
+    
+    def build_context():
+        counts = {field: logs_df[field].value_counts().to_dict() for field in FREQUENCY_FIELDS}
+        return FrequencyContext.from_counts(len(logs_df), counts)
+    
+    context = timer.run("descriptions.context", len(logs_df), build_context)
+    
+    model_scores = scores.get('iforest', next(iter(scores.values()), None))
+    if model_scores is None:
+        model_scores = np.zeros(len(logs_df))
+    anomaly_count = max(len(logs_df) // 10, 1)
+    top = np.argsort(model_scores)[::-1][:anomaly_count]
+    anomalies_df = logs_df.iloc[top].drop(columns=["attack_type"]).reset_index(drop=True)
+    anomalies_df["timestamp"] = anomalies_df["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    anomalies_df["score"] = model_scores[top]
+    
+    timer.run("descriptions.feature_frame", len(anomalies_df), description_ml.build_feature_frame, anomalies_df, context)
+    timer.run("descriptions.generate", len(anomalies_df), description_ml.generate_ml_descriptions, anomalies_df, context)
+
+def benchmark_storage(timer: StageTimer) -> bool:
+    """Leituras do MongoDB com logs sintéticos de uma API reservada (removidos no final)"""
+    print("\n🗄️ Armazenamento...")
+    if STORAGE_ROWS <= 0:
+        print("   - Pulado (BENCHMARK_STORAGE_ROWS=0)")
+        return False
+    
+    try:
+        from app.db import logs_collection
+        from app.storage import get_logs_by_api, get_field_counts
+        
+        logs = generate_logs(STORAGE_ROWS, TrafficProfile(apis=1, seed=7), request_prefix="bench")
+        documents = [dict(log.dict(), apiId=BENCHMARK_API_ID) for log in logs]
+        logs_collection.delete_many({"apiId": BENCHMARK_API_ID})
+        timer.run("storage.insert", len(documents), logs_collection.insert_many, documents, ordered=False)
+        try:
+            timer.run("storage.get_logs_by_api", len, get_logs_by_api, BENCHMARK_API_ID)
+            timer.run("storage.get_field_counts", lambda counts: counts["total"], get_field_counts, list(FREQUENCY_FIELDS))
+        finally:
+            logs_collection.delete_many({"apiId": BENCHMARK_API_ID})
+        return True
+    except Exception as e:
+        print(f"   ⚠️ Armazenamento indisponível: {e}")
+        timer.stages["storage"] = {"skipped": str(e)}
+        return False
+
+def main():
+    """Função principal"""
+    print("🚀 BENCHMARK DO PIPELINE")
+    print("=" * 50)
+    print(f"   - Logs: {ROWS}, amostra de fit: {FIT_ROWS}")
+    
+    timer = StageTimer()
+    
+    print("\n🏭 Gerando tráfego sintético...")
+    logs_df = timer.run("generate_logs", ROWS, generate_logs_frame, ROWS, TrafficProfile())
+    
+    detector = MLAnomalyDetector()
+    features_scaled = benchmark_features(timer, logs_df, detector)
+    scores = benchmark_models(timer, features_scaled, detector)
+    benchmark_descriptions(timer, logs_df, scores)
+    benchmark_storage(timer)
+    
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "parameters": {"rows": ROWS, "fit_rows": min(FIT_ROWS, ROWS), "storage_rows": STORAGE_ROWS,
+                       "models": MODELS or list(detector.models)},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "pyod": pyod.__version__
+        },
+        "stages": timer.stages
+    }
+    
+    output = os.getenv("BENCHMARK_OUTPUT") or os.path.join(parent_dir, "benchmark_results", f"pipeline_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    
+    failed = [name for name, stage in timer.stages.items() if "error" in stage]
+    print("\n" + "=" * 50)
+    print(f"   {'✅' if not failed else '❌'} {len(timer.stages) - len(failed)} etapas medidas, {len(failed)} com erro")
+    print(f"   📄 Resultado: {output}")
+
+if __name__ == "__main__":
+    main()
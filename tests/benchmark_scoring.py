@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark da pontuação por requisição (/ml/score)
+Mede a distribuição (p50, p95, p99, máximo) do tempo de modelo por chamada
+com um modelo treinado em memória e, se o servidor estiver no ar, a latência
+HTTP de POST /ml/score; compara com o caminho em lote (detect_anomalies) e
+grava o resultado em JSON para comparar entre commits
+
+Configuração por variáveis de ambiente:
+    BENCHMARK_REQUESTS: chamadas medidas por modelo (padrão 5000)
+    BENCHMARK_BATCH: logs por chamada (padrão 1)
+    BENCHMARK_FIT_ROWS: logs sintéticos usados no treino (padrão 20000)
+    BENCHMARK_MODELS: modelos medidos, separados por vírgula (padrão: iforest)
+    BENCHMARK_HTTP: medir também o servidor em API_BASE (padrão 1)
+    BENCHMARK_OUTPUT: arquivo de saída (padrão benchmark_results/scoring_<commit>.json)
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+import json
+import platform
+import time
+from datetime import datetime
+import numpy as np
+import requests
+from app.synthetic_logs import TrafficProfile, generate_logs, generate_logs_frame
+from app.ml_anomaly_detector import MLAnomalyDetector
+from app.scoring import _score_rows
+from benchmark_pipeline import git_commit
+
+# Configuração
+API_BASE = "http://localhost:8000"
+REQUESTS = int(os.getenv("BENCHMARK_REQUESTS", "5000"))
+BATCH = int(os.getenv("BENCHMARK_BATCH", "1"))
+FIT_ROWS = int(os.getenv("BENCHMARK_FIT_ROWS", "20000"))
+MODELS = [name for name in os.getenv("BENCHMARK_MODELS", "iforest").split(",") if name]
+HTTP = os.getenv("BENCHMARK_HTTP", "1") == "1"
+# Chamadas do caminho em lote (bem mais lento) usadas na comparação
+BATCH_PATH_REQUESTS = 200
+
+def percentiles(samples_ms: list) -> dict:
+    """p50, p95, p99, média e máximo em milissegundos"""
+    values = np.asarray(samples_ms)
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 4),
+        "p95_ms": round(float(np.percentile(values, 95)), 4),
+        "p99_ms": round(float(np.percentile(values, 99)), 4),
+        "mean_ms": round(float(values.mean()), 4),
+        "max_ms": round(float(values.max()), 4)
+    }
+
+def measure(function, calls: int) -> dict:
+    """Executa function calls vezes (após aquecimento) e devolve os percentis"""
+    for _ in range(min(50, calls)):
+        function()
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+def benchmark_model_time(detector: MLAnomalyDetector, model_name: str, request_logs: list) -> dict:
+    """Tempo de modelo do caminho de /ml/score comparado ao detect_anomalies"""
+    batches = [request_logs[i:i + BATCH] for i in range(0, len(request_logs), BATCH)]
+    position = {"score": 0, "batch": 0}
+    
+    def next_batch(key):
+        batch = batches[position[key] % len(batches)]
+        position[key] += 1
+        return batch
+    
+    score = measure(lambda: _score_rows(detector, model_name, next_batch("score")), REQUESTS)
+    batch_path = measure(lambda: detector.detect_anomalies(next_batch("batch"), model_name), BATCH_PATH_REQUESTS)
+    print(f"   - {model_name} /ml/score: p50 {score['p50_ms']}ms | p99 {score['p99_ms']}ms")
+    print(f"   - {model_name} detect_anomalies: p50 {batch_path['p50_ms']}ms | p99 {batch_path['p99_ms']}ms")
+    return {"score_path": score, "detect_anomalies": batch_path}
+
+def benchmark_http(model_name: str, request_logs: list) -> dict:
+    """Latência de ponta a ponta de POST /ml/score e o model_time_ms informado pelo servidor"""
+    payloads = [
+        {"logs": [json.loads(log.json()) for log in request_logs[i:i + BATCH]], "model_name": model_name}
+        for i in range(0, min(len(request_logs), REQUESTS * BATCH), BATCH)
+    ]
+    session = requests.Session()
+    latencies, model_times = [], []
+    for payload in payloads:
+        start = time.perf_counter()
+        result = session.post(f"{API_BASE}/ml/score", json=payload).json()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if "error" in result:
+            print(f"   ❌ {model_name}: {result['error']}")
+            return {"error": result["error"]}
+        model_times.append(result["model_time_ms"])
+    http = {"latency": percentiles(latencies), "model_time": percentiles(model_times)}
+    print(f"   - {model_name} HTTP: p50 {http['latency']['p50_ms']}ms | p99 {http['latency']['p99_ms']}ms "
+          f"(modelo p99 {http['model_time']['p99_ms']}ms)")
+    return http
+
+def main():
+    """Função principal"""
+    print("🚀 BENCHMARK DA PONTUAÇÃO POR REQUISIÇÃO")
+    print("=" * 50)
+    print(f"   - Chamadas: {REQUESTS}, logs por chamada: {BATCH}, treino: {FIT_ROWS} logs")
+    
+    print("\n🎯 Treinando modelos em memória...")
+    detector = MLAnomalyDetector()
+    detector.models = {name: model for name, model in detector.models.items() if name in MODELS}
+    training = detector.train_models(generate_logs_frame(FIT_ROWS, TrafficProfile()), save_models=False)
+    if "error" in training:
+        print(f"   ❌ {training['error']}")
+        return
+    request_logs = generate_logs(REQUESTS * BATCH, TrafficProfile(seed=7), request_prefix="score")
+    
+    print("\n⚡ Tempo de modelo...")
+    results = {name: benchmark_model_time(detector, name, request_logs) for name in detector.models}
+    
+    if HTTP:
+        print("\n🌐 Servidor...")
+        try:
+            requests.get(f"{API_BASE}/metrics", timeout=2)
+            for name in detector.models:
+                results[name]["http"] = benchmark_http(name, request_logs)
+        except requests.RequestException as e:
+            print(f"   ⚠️ Servidor indisponível, pulando: {e}")
+    
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "parameters": {"requests": REQUESTS, "batch": BATCH, "fit_rows": FIT_ROWS, "models": MODELS},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "models": results
+    }
+    
+    output = os.getenv("BENCHMARK_OUTPUT") or os.path.join(parent_dir, "benchmark_results", f"scoring_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    
+    print("\n" + "=" * 50)
+    for name, model_result in results.items():
+        p99 = model_result["score_path"]["p99_ms"]
+        print(f"   {'✅' if p99 < 1 else '⚠️'} {name}: p99 do tempo de modelo {p99}ms (meta < 1ms)")
+    print(f"   📄 Resultado: {output}")
+
+if __name__ == "__main__":
+    main()
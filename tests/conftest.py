@@ -0,0 +1,14 @@
+"""
+Configuração do pytest para os scripts de teste
+Os scripts indicam falha retornando False (ver main() de cada um); sem este
+hook o pytest consideraria esses testes aprovados
+"""
+
+import pytest
+
+def pytest_pyfunc_call(pyfuncitem):
+    """Executa o teste e falha se ele retornar False"""
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    if pyfuncitem.obj(**arguments) is False:
+        pytest.fail(f"{pyfuncitem.name} retornou False")
+    return True
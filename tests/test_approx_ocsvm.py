@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Script para testar o One-Class SVM aproximado (ocsvm_approx)
+Compara com o OCSVM do PyOD em tempo de treino, tempo de pontuação e
+anomalias detectadas, verifica se o modelo treinado no detector pode ser
+salvo e pontuado como os demais e se o OCSVM exato só é treinado quando pedido
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import pickle
+import time
+from functools import lru_cache
+import numpy as np
+from pyod.models.ocsvm import OCSVM
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import SGDOneClassSVM
+from app.approx_ocsvm import ApproxOCSVM
+from app.ml_anomaly_detector import MLAnomalyDetector
+from app.synthetic_logs import TrafficProfile, generate_logs, generate_logs_frame
+
+# Configuração
+TRAIN_ROWS = 10000
+
+@lru_cache(maxsize=1)
+def scaled_features():
+    """Características normalizadas de treino e de logs novos (geradas uma vez e compartilhadas entre os testes)"""
+    detector = MLAnomalyDetector()
+    train = detector.scaler.fit_transform(detector.extract_features(generate_logs_frame(TRAIN_ROWS, TrafficProfile())))
+    test = detector.scaler.transform(detector.extract_features(generate_logs(3000, TrafficProfile(seed=7))))
+    return train, test
+
+def test_matches_pipeline():
+    """Testa se os pesos combinados dão o mesmo score que Nystroem + SGDOneClassSVM"""
+    print("🧮 Testando equivalência com o pipeline Nystroem + SGD...")
+    
+    train, test = scaled_features()
+    model = ApproxOCSVM(random_state=42).fit(train)
+    nystroem = Nystroem(kernel='rbf', gamma=1 / train.shape[1], n_components=100, random_state=42).fit(train)
+    linear = SGDOneClassSVM(nu=0.5, max_iter=50, tol=None, random_state=42).fit(nystroem.transform(train))
+    same = np.allclose(model.decision_function(test), -linear.decision_function(nystroem.transform(test)))
+    print(f"   - Scores iguais: {same}")
+    return same
+
+def test_compare_with_ocsvm():
+    """Compara treino, pontuação e anomalias com o OCSVM exato"""
+    print("\n⚖️ Comparando com o OCSVM...")
+    
+    train, test = scaled_features()
+    models = {"ocsvm": OCSVM(contamination=0.1), "ocsvm_approx": ApproxOCSVM(contamination=0.1, random_state=42)}
+    labels = {}
+    fit_times = {}
+    for name, model in models.items():
+        start = time.perf_counter()
+        model.fit(train)
+        fit_times[name] = time.perf_counter() - start
+        start = time.perf_counter()
+        labels[name] = model.predict(test)
+        score_time = time.perf_counter() - start
+        print(f"   - {name}: treino {fit_times[name]:.2f}s, pontuação {score_time * 1000:.1f}ms, "
+              f"taxa {labels[name].mean():.1%}")
+    
+    overlap = (labels["ocsvm"] & labels["ocsvm_approx"]).sum() / max(1, labels["ocsvm"].sum())
+    print(f"   - {overlap:.0%} das anomalias do OCSVM")
+    return fit_times["ocsvm_approx"] < fit_times["ocsvm"] and overlap > 0.7
+
+def test_detector_integration():
+    """Testa treino, detecção e serialização pelo MLAnomalyDetector"""
+    print("\n🔌 Testando integração com o detector...")
+    
+    detector = MLAnomalyDetector()
+    detector.models = {"ocsvm_approx": detector.models["ocsvm_approx"]}
+    training = detector.train_models(generate_logs_frame(3000, TrafficProfile()), save_models=False)
+    logs = generate_logs(500, TrafficProfile(seed=7))
+    result = detector.detect_anomalies(logs, "ocsvm_approx")
+    if "error" in training or "error" in result:
+        print(f"   ❌ Erro: {training.get('error') or result.get('error')}")
+        return False
+    
+    restored = pickle.loads(pickle.dumps(detector.models["ocsvm_approx"]))
+    features = detector.scaler.transform(detector.extract_features(logs))
+    same = np.allclose(restored.decision_function(features), detector.models["ocsvm_approx"].decision_function(features))
+    print(f"   - Anomalias: {result['anomalies_detected']} de {len(logs)}")
+    print(f"   - Modelo serializado: {len(pickle.dumps(restored)) // 1024}KB, scores iguais: {same}")
+    return same
+
+def test_exact_ocsvm_opt_in():
+    """Testa se o OCSVM exato fica fora do treino padrão e é treinado quando pedido"""
+    print("\n⏭️ Testando OCSVM exato opcional...")
+    
+    logs = generate_logs_frame(2000, TrafficProfile())
+    detector = MLAnomalyDetector()
+    default = detector.train_models(logs, save_models=False)
+    skipped = "ocsvm" in default.get("models_skipped", []) and not detector.has_model("ocsvm")
+    print(f"   - Treino padrão: treinados {sorted(default.get('models_trained', {}))}, "
+          f"ignorados {default.get('models_skipped')}")
+    
+    detector = MLAnomalyDetector()
+    opt_in = detector.train_models(logs, save_models=False, model_names=["ocsvm"])
+    trained = opt_in.get("models_trained") == {"ocsvm": "treinado"} and detector.has_model("ocsvm")
+    print(f"   - Com model_names=['ocsvm']: treinados {opt_in.get('models_trained')}")
+    return skipped and trained
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DO ONE-CLASS SVM APROXIMADO")
+    print("=" * 50)
+    
+    results = {
+        "Equivalência com o pipeline": test_matches_pipeline(),
+        "Comparação com o OCSVM": test_compare_with_ocsvm(),
+        "Integração com o detector": test_detector_integration(),
+        "OCSVM exato opcional": test_exact_ocsvm_opt_in()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Script para testar se o retreinamento não bloqueia outros endpoints
+Dispara /feedback/retrain e, enquanto ele roda, mede a latência de POST /logs
+e GET /config no mesmo worker
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import requests
+import threading
+import time
+from datetime import datetime
+
+# Configuração
+API_BASE = "http://localhost:8000"
+API_ID = "test_async_endpoints"
+
+def send_logs(count: int = 200):
+    """Envia logs de base para o retreinamento"""
+    print(f"📤 Enviando {count} logs de base...")
+    for i in range(count):
+        requests.post(f"{API_BASE}/logs", json={
+            "requestId": f"async_base_{i}",
+            "clientId": f"client_{i % 5}",
+            "ip": f"10.0.0.{i % 50 + 1}",
+            "apiId": API_ID,
+            "path": "/api/users",
+            "method": "GET",
+            "status": 200,
+            "timestamp": datetime.now().isoformat()
+        })
+
+def mark_false_positive():
+    """Marca um log como falso positivo para que o retreinamento tenha trabalho"""
+    response = requests.post(f"{API_BASE}/feedback/false-positive", json={
+        "log_id": "async_base_0",
+        "api_id": API_ID,
+        "user_comment": "teste de endpoints assíncronos"
+    })
+    return response.status_code == 200
+
+def measure_latency(url: str, method: str = "get", payload: dict = None, samples: int = 20):
+    """Mede a latência de um endpoint em milissegundos"""
+    latencies = []
+    for i in range(samples):
+        start = time.time()
+        if method == "post":
+            body = dict(payload)
+            body["requestId"] = f"{payload['requestId']}_{i}"
+            requests.post(url, json=body)
+        else:
+            requests.get(url)
+        latencies.append((time.time() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50": round(latencies[len(latencies) // 2], 1),
+        "max": round(latencies[-1], 1)
+    }
+
+def test_retrain_does_not_block():
+    """Testa se a ingestão continua respondendo durante o retreinamento"""
+    print("\n🔄 Disparando retreinamento em paralelo...")
+    
+    retrain_result = {}
+    
+    def run_retrain():
+        start = time.time()
+        response = requests.post(f"{API_BASE}/feedback/retrain", json={"api_id": API_ID})
+        retrain_result["status_code"] = response.status_code
+        retrain_result["duration"] = time.time() - start
+    
+    thread = threading.Thread(target=run_retrain)
+    thread.start()
+    time.sleep(0.5)
+    
+    log_payload = {
+        "requestId": "async_during_retrain",
+        "clientId": "client_0",
+        "ip": "10.0.0.1",
+        "apiId": API_ID,
+        "path": "/api/users",
+        "method": "GET",
+        "status": 200,
+        "timestamp": datetime.now().isoformat()
+    }
+    ingest_latency = measure_latency(f"{API_BASE}/logs", "post", log_payload)
+    config_latency = measure_latency(f"{API_BASE}/config")
+    retrain_running = thread.is_alive()
+    
+    thread.join()
+    
+    print(f"   - POST /logs durante retreinamento: p50={ingest_latency['p50']}ms, max={ingest_latency['max']}ms")
+    print(f"   - GET /config durante retreinamento: p50={config_latency['p50']}ms, max={config_latency['max']}ms")
+    print(f"   - Retreinamento: status {retrain_result.get('status_code')} em {retrain_result.get('duration', 0):.1f}s")
+    
+    if not retrain_running:
+        print("   ⚠️ O retreinamento terminou antes das medições; aumente o volume de logs")
+    
+    # Nenhuma requisição deveria esperar o retreinamento terminar
+    return ingest_latency["max"] < 1000 and config_latency["max"] < 1000
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DE ENDPOINTS ASSÍNCRONOS")
+    print("=" * 50)
+    
+    try:
+        requests.get(f"{API_BASE}/config")
+    except Exception as e:
+        print(f"❌ Backend não está rodando: {e}")
+        return
+    
+    send_logs()
+    if not mark_false_positive():
+        print("❌ Falha ao registrar falso positivo")
+        return
+    
+    if test_retrain_does_not_block():
+        print("\n✅ Ingestão e configurações não foram bloqueadas pelo retreinamento!")
+    else:
+        print("\n❌ Endpoints ficaram lentos durante o retreinamento")
+
+if __name__ == "__main__":
+    main()
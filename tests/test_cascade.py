@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Script para testar a detecção em cascata (pré-filtro barato + modelo pesado)
+Verifica localmente se apenas os candidatos do pré-filtro passam pelo modelo,
+com os mesmos scores da detecção completa, e no servidor se /ml/detect
+informa os logs vistos por etapa
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import requests
+from app.ml_anomaly_detector import MLAnomalyDetector
+from app.synthetic_logs import TrafficProfile, generate_logs, generate_logs_frame
+
+# Configuração
+API_BASE = "http://localhost:8000"
+
+def test_local_cascade():
+    """Testa a cascata zscore -> knn em um detector treinado em memória"""
+    print("🪜 Testando cascata local...")
+    
+    detector = MLAnomalyDetector()
+    detector.models = {"knn": detector.models["knn"]}
+    training = detector.train_models(generate_logs_frame(3000, TrafficProfile()), save_models=False)
+    detector.model_metadata = training["metadata"]
+    logs = generate_logs(2000, TrafficProfile(seed=7))
+    
+    full = detector.detect_anomalies(logs, "knn")
+    cascade = detector.detect_anomalies(logs, "knn", cascade="zscore", cascade_top_percent=20)
+    if "error" in full or "error" in cascade:
+        print(f"   ❌ Erro: {full.get('error') or cascade.get('error')}")
+        return False
+    
+    full_scores = {item["requestId"]: item["anomaly_score"] for item in full["anomalies"] + full["normal_logs"]}
+    cascade_items = cascade["anomalies"] + cascade["normal_logs"]
+    same_scores = all(abs(full_scores[item["requestId"]] - item["anomaly_score"]) < 1e-9 for item in cascade_items)
+    full_ids = {item["requestId"] for item in full["anomalies"]}
+    cascade_ids = {item["requestId"] for item in cascade["anomalies"]}
+    
+    print(f"   - Etapas: {cascade['cascade']['stages']}")
+    print(f"   - Anomalias: {len(cascade_ids)} de {len(full_ids)} da detecção completa")
+    return (cascade["cascade"]["stages"] == {"prefilter": 2000, "knn": 400}
+            and len(cascade_items) == 400 and same_scores and cascade_ids <= full_ids)
+
+def test_server_cascade():
+    """Testa /ml/detect com cascade=zscore"""
+    print("\n🔍 Testando cascata no servidor...")
+    
+    full = requests.get(f"{API_BASE}/ml/detect", params={"model_name": "knn"}).json()
+    cascade = requests.get(f"{API_BASE}/ml/detect", params={
+        "model_name": "knn", "cascade": "zscore", "cascade_top_percent": 20
+    }).json()
+    if "error" in full or "error" in cascade:
+        print(f"   ❌ Erro: {full.get('error') or cascade.get('error')}")
+        return False
+    
+    stages = cascade["cascade"]["stages"]
+    print(f"   - Completa: {full['anomalies_detected']} anomalias, modelo {full['timings'].get('decision_function')}s")
+    print(f"   - Cascata: {cascade['anomalies_detected']} anomalias, modelo {cascade['timings'].get('decision_function')}s")
+    print(f"   - Logs por etapa: {stages}")
+    return stages["prefilter"] == cascade["logs_analyzed"] and stages["knn"] < stages["prefilter"]
+
+def test_invalid_prefilter():
+    """Testa o erro para um pré-filtro inválido"""
+    print("\n🚫 Testando pré-filtro inválido...")
+    
+    result = requests.get(f"{API_BASE}/ml/detect", params={"model_name": "knn", "cascade": "inexistente"}).json()
+    print(f"   - Resposta: {result}")
+    return "error" in result
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DA DETECÇÃO EM CASCATA")
+    print("=" * 50)
+    
+    results = {
+        "Cascata local": test_local_cascade(),
+        "Cascata no servidor": test_server_cascade(),
+        "Pré-filtro inválido": test_invalid_prefilter()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
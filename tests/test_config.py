@@ -114,6 +114,38 @@ def test_reset_section():
         print(f"❌ Erro no reset de seção: {e}")
         return False
 
+def test_config_cache_revision():
+    """Testa se o cache de configurações é atualizado após uma escrita"""
+    print("\n🗃️ Testando cache e revisão das configurações...")
+    
+    try:
+        history = requests.get(f"{API_BASE}/config/history").json()
+        revision_before = history["history"][0].get("revision", 0)
+        
+        requests.post(f"{API_BASE}/config/update", json={
+            "section": "ml_detection",
+            "key": "threshold",
+            "value": 0.16
+        })
+        
+        # A leitura logo após a escrita deve refletir o novo valor
+        config = requests.get(f"{API_BASE}/config", params={"section": "ml_detection"}).json()
+        threshold = config.get("config", {}).get("threshold")
+        
+        history = requests.get(f"{API_BASE}/config/history").json()
+        revision_after = history["history"][0].get("revision", 0)
+        
+        if threshold == 0.16 and revision_after > revision_before:
+            print("✅ Cache atualizado após escrita!")
+            print(f"   - Revisão: {revision_before} -> {revision_after}")
+            return True
+        else:
+            print(f"❌ Cache desatualizado: threshold={threshold}, revisão {revision_before} -> {revision_after}")
+            return False
+    except Exception as e:
+        print(f"❌ Erro no teste de cache: {e}")
+        return False
+
 def test_detection_with_config():
     """Testa detecção usando configurações salvas"""
     print("\n🔍 Testando detecção com configurações...")
@@ -174,7 +206,12 @@ def main():
             print("❌ Falha no reset de seção")
             return
         
-        # 5. Testar detecção com configurações
+        # 5. Testar cache de configurações
+        if not test_config_cache_revision():
+            print("❌ Falha no cache de configurações")
+            return
+        
+        # 6. Testar detecção com configurações
         if not test_detection_with_config():
             print("❌ Falha na detecção com configurações")
             return
@@ -187,6 +224,7 @@ def main():
         print("   - ✅ Atualização de threshold")
         print("   - ✅ Atualização de seção")
         print("   - ✅ Reset de seção")
+        print("   - ✅ Cache de configurações")
         print("   - ✅ Detecção com configurações")
         print("\n🎉 Sistema de configurações funcionando perfeitamente!")
         
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Script para testar o pool de conexões compartilhado do MongoDB
+Verifica se todos os módulos usam o mesmo banco e os mesmos clientes
+e se as métricas de checkout estão sendo coletadas
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from datetime import datetime
+from app.connection_manager import connection_manager, get_pool_metrics
+from app.models import LogEntry
+from app.storage import add_log, get_logs_count
+
+def test_shared_clients():
+    """Testa se os módulos reutilizam os clientes do gerenciador"""
+    print("🔌 Testando compartilhamento de clientes...")
+    
+    from app import db
+    from app.config_manager import config_manager
+    from app.feedback_system import feedback_system
+    
+    checks = {
+        "db.client (ingest)": db.client is connection_manager.get_client("ingest"),
+        "db.analytics_client": db.analytics_client is connection_manager.get_client("analytics"),
+        "config_manager.client": config_manager.client is connection_manager.get_client("analytics"),
+        "feedback_system.client": feedback_system.client is connection_manager.get_client("analytics"),
+    }
+    
+    names = {
+        "logs": db.db.name,
+        "config": config_manager.db.name,
+        "feedback": feedback_system.db.name,
+    }
+    
+    for name, ok in checks.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    print(f"   📚 Bancos usados: {names}")
+    
+    return all(checks.values()) and len(set(names.values())) == 1
+
+def test_pool_metrics():
+    """Testa se as métricas de checkout são atualizadas"""
+    print("\n📈 Testando métricas do pool...")
+    
+    connection_manager.reset_pool_metrics()
+    
+    for i in range(20):
+        add_log(LogEntry(
+            requestId=f"pool_test_{i}",
+            clientId="pool_client",
+            ip="10.0.0.1",
+            apiId="pool_test_api",
+            path="/api/pool",
+            method="GET",
+            status=200,
+            timestamp=datetime.now()
+        ))
+    get_logs_count(apiId="pool_test_api")
+    
+    metrics = get_pool_metrics()["workloads"]
+    for workload, data in metrics.items():
+        print(f"   - {workload}: {data['checkouts']} checkouts, "
+              f"espera média {data['wait_avg_ms']}ms, máxima {data['wait_max_ms']}ms")
+    
+    return metrics.get("ingest", {}).get("checkouts", 0) >= 20
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DO POOL DE CONEXÕES")
+    print("=" * 50)
+    
+    results = {
+        "Clientes compartilhados": test_shared_clients(),
+        "Métricas do pool": test_pool_metrics()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Script para testar o snapshot de contexto de /ml/descriptions/generate
+Verifica se a resposta informa a janela usada e mede a latência da geração
+de descrições com o snapshot em cache
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import requests
+import time
+from datetime import datetime
+
+# Configuração
+API_BASE = "http://localhost:8000"
+API_ID = "test_description_context"
+
+def build_request(index: int) -> dict:
+    """Monta o log a ser descrito"""
+    return {
+        "requestId": f"context_{index}",
+        "clientId": "client_context",
+        "ip": "8.8.8.8",
+        "apiId": API_ID,
+        "method": "DELETE",
+        "path": "/admin/users/1",
+        "status": 500,
+        "timestamp": datetime.now().isoformat(),
+        "score": 0.7
+    }
+
+def test_context_info():
+    """Testa se a resposta traz a janela e o tamanho do snapshot"""
+    print("🧭 Testando informações do contexto...")
+    
+    config = requests.get(f"{API_BASE}/config", params={"section": "descriptions"}).json()
+    print(f"   - Configuração: {config}")
+    
+    response = requests.post(f"{API_BASE}/ml/descriptions/generate", json=build_request(0))
+    if response.status_code != 200 or "error" in response.json():
+        print(f"   ❌ Erro: {response.text}")
+        return False
+    
+    context = response.json().get("context", {})
+    print(f"   - Janela: {context.get('window_hours')}h, logs: {context.get('logs_in_window')}, "
+          f"construído em: {context.get('built_at')}")
+    return context.get("window_hours") is not None and context.get("built_at") is not None
+
+def test_generation_latency(requests_count: int = 50):
+    """Mede a latência da geração com o snapshot em cache"""
+    print(f"\n⚡ Medindo {requests_count} gerações de descrição...")
+    
+    latencies = []
+    for i in range(requests_count):
+        start = time.time()
+        response = requests.post(f"{API_BASE}/ml/descriptions/generate", json=build_request(i))
+        latencies.append((time.time() - start) * 1000)
+        if response.status_code != 200:
+            print(f"   ❌ Erro: {response.text}")
+            return False
+    
+    latencies.sort()
+    print(f"   - Mediana: {latencies[len(latencies) // 2]:.1f}ms, máxima: {latencies[-1]:.1f}ms")
+    return True
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DO SNAPSHOT DE CONTEXTO DAS DESCRIÇÕES")
+    print("=" * 50)
+    
+    results = {
+        "Informações do contexto": test_context_info(),
+        "Latência da geração": test_generation_latency()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
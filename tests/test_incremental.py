@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Script para testar a atualização incremental dos modelos
+Verifica a conversão das árvores do Isolation Forest para a nova escala, o
+limite de árvores do warm start, a renovação do conjunto de referência, se
+as detecções armazenadas sobrevivem a uma atualização e compara uma
+atualização com o retreinamento completo (tempo e anomalias)
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import time
+import numpy as np
+from pyod.models.iforest import IForest
+from pyod.models.knn import KNN
+from sklearn.preprocessing import StandardScaler
+from app.incremental import INCREMENTAL_MODELS, refresh_reference, rescale_iforest, update_scaler, warm_start_iforest
+from app.ml_anomaly_detector import MLAnomalyDetector
+from app.synthetic_logs import TrafficProfile, generate_logs
+
+# Configuração
+TRAIN_ROWS = 20000
+NEW_ROWS = 3000
+
+def test_rescale_iforest():
+    """Testa se as árvores convertidas dão os mesmos scores na nova escala"""
+    print("📐 Testando conversão de escala do Isolation Forest...")
+    
+    rng = np.random.default_rng(0)
+    raw = rng.normal(loc=[10, 200, 0.5], scale=[2, 50, 0.1], size=(5000, 3))
+    new_raw = rng.normal(loc=[12, 260, 0.5], scale=[3, 40, 0.2], size=(2000, 3))
+    scaler = StandardScaler().fit(raw)
+    model = IForest(random_state=42).fit(scaler.transform(raw))
+    before = model.decision_function(scaler.transform(new_raw))
+    
+    previous = update_scaler(scaler, new_raw)
+    rescale_iforest(model, previous, scaler)
+    after = model.decision_function(scaler.transform(new_raw))
+    max_difference = float(np.max(np.abs(before - after)))
+    print(f"   - Média da 2ª característica: {previous[0][1]:.1f} -> {scaler.mean_[1]:.1f}")
+    print(f"   - Diferença máxima dos scores: {max_difference:.1e}")
+    return max_difference < 1e-3
+
+def test_warm_start_limit():
+    """Testa o acréscimo de árvores e o descarte das mais antigas"""
+    print("\n🌲 Testando warm start do Isolation Forest...")
+    
+    rng = np.random.default_rng(1)
+    model = IForest(n_estimators=100, random_state=42).fit(rng.normal(size=(3000, 4)))
+    first = warm_start_iforest(model, rng.normal(size=(1000, 4)), new_trees=20, max_trees=130)
+    second = warm_start_iforest(model, rng.normal(size=(1000, 4)), new_trees=20, max_trees=130)
+    rate = model.predict(rng.normal(size=(1000, 4))).mean()
+    print(f"   - 1ª atualização: {first}")
+    print(f"   - 2ª atualização: {second}")
+    print(f"   - Taxa de anomalias em dados novos: {rate:.1%}")
+    return (first == {"added": 20, "dropped": 0, "trees": 120}
+            and second == {"added": 20, "dropped": 10, "trees": 130}
+            and abs(rate - 0.1) < 0.05)
+
+def test_reference_refresh():
+    """Testa o tamanho e os pesos do conjunto de referência renovado"""
+    print("\n📦 Testando renovação do conjunto de referência...")
+    
+    rng = np.random.default_rng(2)
+    raw = rng.normal(size=(4000, 4))
+    scaler = StandardScaler().fit(raw)
+    model = KNN(contamination=0.1).fit(scaler.transform(raw))
+    new_raw = rng.normal(loc=0.5, size=(1000, 4))
+    previous = update_scaler(scaler, new_raw)
+    
+    reference = refresh_reference(model, scaler.transform(new_raw), previous, scaler, 0, "stratified")
+    print(f"   - {reference['size']} pontos representando {reference['source_rows']} logs")
+    return reference["size"] <= len(raw) and reference["source_rows"] == len(raw) + len(new_raw)
+
+def train_detector(logs, model_names=INCREMENTAL_MODELS):
+    """Treina os modelos em memória"""
+    detector = MLAnomalyDetector()
+    detector.models = {name: detector.models[name] for name in model_names}
+    result = detector.train_models(logs, save_models=False)
+    detector.model_metadata = result.get("metadata", {})
+    return detector
+
+def test_detection_generation():
+    """Testa se a atualização mantém a versão das detecções armazenadas e o treino completo a troca"""
+    print("\n🗂️ Testando versão das detecções armazenadas...")
+    
+    history = generate_logs(5000, TrafficProfile())
+    detector = train_detector(history, ["iforest"])
+    base = detector.detection_generation
+    time.sleep(0.01)
+    update = detector.update_models(generate_logs(1000, TrafficProfile(seed=3), request_prefix="novo"), save_models=False)
+    if "error" in update:
+        print(f"   ❌ Erro: {update['error']}")
+        return False
+    updated = detector.detection_generation
+    rebuilt = train_detector(history, ["iforest"]).detection_generation
+    
+    print(f"   - Versão do modelo: {base} -> {detector.model_version}")
+    print(f"   - Versão das detecções após a atualização: {updated}")
+    print(f"   - Versão das detecções após treino completo: {rebuilt}")
+    return updated == base and detector.model_version != base and rebuilt != base
+
+def test_update_vs_full():
+    """Compara uma atualização incremental com o retreinamento completo (todos os modelos, como em /ml/train)"""
+    print("\n⚖️ Comparando atualização incremental e retreinamento completo...")
+    
+    history = generate_logs(TRAIN_ROWS, TrafficProfile())
+    new_logs = generate_logs(NEW_ROWS, TrafficProfile(seed=3), request_prefix="novo")
+    evaluation = generate_logs(3000, TrafficProfile(seed=7), request_prefix="avaliacao")
+    
+    detector = train_detector(history)
+    start = time.perf_counter()
+    update = detector.update_models(new_logs, save_models=False)
+    update_time = time.perf_counter() - start
+    if "error" in update:
+        print(f"   ❌ Erro: {update['error']}")
+        return False
+    
+    start = time.perf_counter()
+    full = train_detector(history + new_logs, list(MLAnomalyDetector().models))
+    full_time = time.perf_counter() - start
+    
+    ok = update_time < full_time
+    print(f"   - Atualização: {update_time:.2f}s | completo: {full_time:.2f}s ({full_time / update_time:.1f}x)")
+    for name in INCREMENTAL_MODELS:
+        updated = detector.detect_anomalies(evaluation, name)
+        rebuilt = full.detect_anomalies(evaluation, name)
+        updated_ids = {anomaly["requestId"] for anomaly in updated["anomalies"]}
+        rebuilt_ids = {anomaly["requestId"] for anomaly in rebuilt["anomalies"]}
+        overlap = len(updated_ids & rebuilt_ids) / max(1, len(rebuilt_ids))
+        print(f"   - {name}: {len(updated_ids)} anomalias (completo: {len(rebuilt_ids)}), {overlap:.0%} em comum")
+        ok = ok and overlap > 0.5
+    return ok
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DA ATUALIZAÇÃO INCREMENTAL")
+    print("=" * 50)
+    
+    results = {
+        "Conversão de escala do Isolation Forest": test_rescale_iforest(),
+        "Limite de árvores do warm start": test_warm_start_limit(),
+        "Renovação do conjunto de referência": test_reference_refresh(),
+        "Detecções mantidas na atualização": test_detection_generation(),
+        "Atualização x retreinamento completo": test_update_vs_full()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Script para testar o índice de ranges de IP (prefixo mais longo)
+Compara os resultados com o módulo ipaddress e mede a classificação em lote
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import ipaddress
+import random
+import time
+from app.ip_index import IPRangeIndex, get_special_purpose_flags
+
+def random_ips(count: int, ipv6_ratio: float = 0.1) -> list:
+    """Gera IPs aleatórios (IPv4 e IPv6) com repetição"""
+    distinct = []
+    for _ in range(max(count // 20, 1)):
+        if random.random() < ipv6_ratio:
+            distinct.append(str(ipaddress.IPv6Address(random.getrandbits(128))))
+        else:
+            distinct.append(str(ipaddress.IPv4Address(random.getrandbits(32))))
+    return [random.choice(distinct) for _ in range(count)]
+
+def test_longest_prefix():
+    """Testa a busca pelo prefixo mais longo contra uma busca linear"""
+    print("🌳 Testando prefixo mais longo...")
+    
+    ranges = {}
+    for _ in range(2000):
+        prefixlen = random.choice([8, 12, 16, 20, 24, 28])
+        network = ipaddress.IPv4Network((random.getrandbits(32), prefixlen), strict=False)
+        ranges[str(network)] = str(network)
+    ranges["2001:db8::/32"] = "2001:db8::/32"
+    index = IPRangeIndex(ranges)
+    networks = [ipaddress.ip_network(cidr) for cidr in ranges]
+    
+    ips = random_ips(5000)
+    ips += [str(network.network_address + 1) for network in networks[:500]]
+    
+    errors = 0
+    for ip, found in zip(ips, index.lookup_many(ips)):
+        ip_obj = ipaddress.ip_address(ip)
+        matches = [n for n in networks if n.version == ip_obj.version and ip_obj in n]
+        expected = str(max(matches, key=lambda n: n.prefixlen)) if matches else None
+        if found != expected:
+            errors += 1
+    
+    print(f"   - {len(ips)} IPs, {len(ranges)} ranges, {errors} divergências")
+    return errors == 0
+
+def test_special_purpose_flags():
+    """Testa as propriedades de risco contra o módulo ipaddress"""
+    print("\n🏷️ Testando propriedades de ranges especiais...")
+    
+    flags = ["is_private", "is_loopback", "is_multicast", "is_reserved", "is_unspecified"]
+    ips = random_ips(20000, ipv6_ratio=0.3) + ["127.0.0.1", "::1", "::", "0.0.0.0", "fe80::1", "224.0.0.1"]
+    
+    errors = 0
+    for ip in ips:
+        ip_obj = ipaddress.ip_address(ip)
+        expected = {flag for flag in flags if getattr(ip_obj, flag)}
+        if expected != set(get_special_purpose_flags(ip)):
+            errors += 1
+    
+    # IPv4 mapeado em IPv6 mantém as propriedades do IPv4
+    mapped = {"::ffff:10.0.0.1": True, "::ffff:192.168.1.1": True, "::ffff:8.8.8.8": False}
+    for ip, is_private in mapped.items():
+        found = "is_private" in get_special_purpose_flags(ip)
+        if found != is_private or found != ipaddress.ip_address(ip).is_private:
+            print(f"   ❌ {ip}: is_private={found}, esperado {is_private}")
+            errors += 1
+    
+    print(f"   - {len(ips) + len(mapped)} IPs, {errors} divergências")
+    return errors == 0
+
+def test_batch_performance():
+    """Mede a classificação em lote de muitos IPs"""
+    print("\n⚡ Medindo classificação em lote...")
+    
+    ranges = [str(ipaddress.IPv4Network((random.getrandbits(32), 24), strict=False)) for _ in range(5000)]
+    index = IPRangeIndex(ranges)
+    ips = random_ips(1_000_000, ipv6_ratio=0.0)
+    
+    start = time.time()
+    results = index.lookup_many(ips, False)
+    elapsed = time.time() - start
+    
+    print(f"   - {len(ips)} IPs contra {len(ranges)} ranges em {elapsed:.2f}s "
+          f"({sum(1 for r in results if r)} dentro de algum range)")
+    return True
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DO ÍNDICE DE RANGES DE IP")
+    print("=" * 50)
+    
+    results = {
+        "Prefixo mais longo": test_longest_prefix(),
+        "Propriedades especiais": test_special_purpose_flags(),
+        "Desempenho em lote": test_batch_performance()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
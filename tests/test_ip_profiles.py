@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Script para testar os perfis de IP por cliente usados por /ip-anomalies
+Verifica se a detecção de IPs novos usa o histórico do cliente, se a
+reconstrução dos perfis produz o mesmo resultado da atualização incremental e
+se o número de IPs guardados por perfil fica limitado
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import requests
+import time
+from datetime import datetime, timedelta
+
+# Configuração
+API_BASE = "http://localhost:8000"
+API_ID = "test_ip_profiles"
+
+def send_log(request_id: str, client_id: str, ip: str, timestamp: datetime, path: str = "/api/users", status: int = 200):
+    """Envia um log para a API"""
+    requests.post(f"{API_BASE}/logs", json={
+        "requestId": request_id,
+        "clientId": client_id,
+        "ip": ip,
+        "apiId": API_ID,
+        "path": path,
+        "method": "GET",
+        "status": status,
+        "timestamp": timestamp.isoformat()
+    })
+
+def send_logs():
+    """Envia histórico antigo e atividade recente com IPs novos"""
+    now = datetime.now()
+    suffix = int(now.timestamp())
+    print("📤 Enviando histórico (48h atrás) e atividade recente...")
+    
+    for i in range(10):
+        send_log(f"profile_old_{suffix}_{i}", "profile_client", "10.10.0.1", now - timedelta(hours=48))
+    
+    for i in range(10):
+        send_log(f"profile_new_{suffix}_{i}", "profile_client", f"10.10.{i % 3}.1",
+                 now - timedelta(minutes=i), path="/admin" if i % 2 else "/api/users",
+                 status=500 if i % 3 == 0 else 200)
+
+def get_ip_anomalies() -> dict:
+    response = requests.get(f"{API_BASE}/ip-anomalies", params={"apiId": API_ID, "hours_back": 24})
+    return response.json()
+
+def test_new_ips():
+    """Testa se apenas IPs vistos pela primeira vez no período são novos"""
+    print("\n🆕 Testando detecção de IPs novos...")
+    
+    start = time.time()
+    data = get_ip_anomalies()
+    elapsed = (time.time() - start) * 1000
+    
+    new_ips = data.get("new_ips", {}).get("profile_client", {})
+    print(f"   - IPs novos: {new_ips.get('new_ips')}")
+    print(f"   - IPs conhecidos: {new_ips.get('known_ips')}")
+    print(f"   - Atividade suspeita: {list(data.get('suspicious_activity', {}).get('profile_client', {}).keys())}")
+    print(f"   - Tempo de resposta: {elapsed:.1f}ms")
+    
+    return (sorted(new_ips.get("new_ips", [])) == ["10.10.1.1", "10.10.2.1"]
+            and new_ips.get("known_ips") == ["10.10.0.1"])
+
+def test_rebuild():
+    """Testa se a reconstrução gera o mesmo resultado da atualização incremental"""
+    print("\n🔁 Testando reconstrução dos perfis...")
+    
+    before = get_ip_anomalies()
+    result = requests.post(f"{API_BASE}/ip-profiles/rebuild", params={"apiId": API_ID}).json()
+    after = get_ip_anomalies()
+    
+    print(f"   - Logs processados: {result.get('logs_processed')}, perfis: {result.get('profiles')}")
+    return before["summary"] == after["summary"]
+
+def test_ip_limit():
+    """Testa se o perfil guarda no máximo MAX_IPS_PER_PROFILE IPs (os mais recentes)"""
+    print("\n📏 Testando limite de IPs por perfil...")
+    
+    from app.ip_profiles import MAX_IPS_PER_PROFILE, ip_profile_store
+    
+    api_id = f"{API_ID}_limit"
+    now = datetime.now()
+    total = MAX_IPS_PER_PROFILE + 200
+    for i in range(total):
+        ip_profile_store.record_log({
+            "apiId": api_id, "clientId": "limit_client", "ip": f"10.20.{i // 250}.{i % 250}",
+            "path": "/api/users", "status": 200, "timestamp": now - timedelta(seconds=total - i)
+        })
+    ip_profile_store.flush()
+    
+    known_ips = ip_profile_store.get_active_profiles(now - timedelta(hours=1), api_id).get("limit_client", {})
+    print(f"   - {len(known_ips)} IPs guardados de {total} vistos")
+    newest = f"10.20.{(total - 1) // 250}.{(total - 1) % 250}"
+    return len(known_ips) == MAX_IPS_PER_PROFILE and newest in known_ips
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DOS PERFIS DE IP")
+    print("=" * 50)
+    
+    try:
+        requests.get(f"{API_BASE}/config")
+    except Exception as e:
+        print(f"❌ Backend não está rodando: {e}")
+        return
+    
+    send_logs()
+    
+    results = {
+        "IPs novos": test_new_ips(),
+        "Reconstrução": test_rebuild(),
+        "Limite de IPs por perfil": test_ip_limit()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Script para testar as descrições de anomalias sob demanda
+Verifica se /ml/detect devolve apenas o link da descrição, se o endpoint
+de descrição funciona e se a segunda chamada vem do cache
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import requests
+import time
+
+# Configuração
+API_BASE = "http://localhost:8000"
+
+def detect_without_descriptions():
+    """Detecção padrão; retorna a primeira anomalia se ela traz description_url em vez da descrição"""
+    print("🔍 Testando detecção sem descrições...")
+    
+    start = time.time()
+    result = requests.get(f"{API_BASE}/ml/detect").json()
+    elapsed = time.time() - start
+    
+    if "error" in result:
+        print(f"   ❌ Erro: {result['error']}")
+        return None
+    
+    anomalies = result.get("anomalies", [])
+    print(f"   - {len(anomalies)} anomalias em {elapsed:.2f}s")
+    if not anomalies:
+        print("   ⚠️ Nenhuma anomalia detectada")
+        return None
+    
+    first = anomalies[0]
+    print(f"   - description_url: {first.get('description_url')}")
+    if "anomaly_description" in first or not first.get("description_url"):
+        return None
+    return first
+
+def test_detect_without_descriptions():
+    """Testa se a detecção padrão traz description_url em vez da descrição"""
+    return detect_without_descriptions() is not None
+
+def test_description_endpoint(anomaly: dict = None):
+    """Testa a geração sob demanda e o cache (sem anomalia, usa a primeira da detecção padrão)"""
+    if anomaly is None:
+        anomaly = detect_without_descriptions()
+        if anomaly is None:
+            return False
+    print("\n📝 Testando descrição sob demanda...")
+    
+    url = f"{API_BASE}{anomaly['description_url']}"
+    
+    start = time.time()
+    first = requests.get(url).json()
+    first_ms = (time.time() - start) * 1000
+    
+    start = time.time()
+    second = requests.get(url).json()
+    second_ms = (time.time() - start) * 1000
+    
+    if "error" in first:
+        print(f"   ❌ Erro: {first['error']}")
+        return False
+    
+    print(f"   - Descrição: {first['description']}")
+    print(f"   - Primeira chamada: {first_ms:.1f}ms, segunda: {second_ms:.1f}ms (cached={second.get('cached')})")
+    return second.get("cached") is True and second["description"] == first["description"]
+
+def test_detect_with_descriptions():
+    """Testa se include_descriptions=true mantém o comportamento antigo"""
+    print("\n📚 Testando detecção com descrições...")
+    
+    result = requests.get(f"{API_BASE}/ml/detect", params={"include_descriptions": True}).json()
+    anomalies = result.get("anomalies", [])
+    described = sum(1 for anomaly in anomalies if anomaly.get("anomaly_description"))
+    print(f"   - {described}/{len(anomalies)} anomalias com descrição")
+    return described == len(anomalies)
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DAS DESCRIÇÕES SOB DEMANDA")
+    print("=" * 50)
+    
+    anomaly = detect_without_descriptions()
+    results = {
+        "Detecção sem descrições": anomaly is not None,
+        "Descrição sob demanda": test_description_endpoint(anomaly) if anomaly else False,
+        "Detecção com descrições": test_detect_with_descriptions()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
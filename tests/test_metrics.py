@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Script para testar o endpoint /metrics (formato texto do Prometheus)
+Verifica o formato dos histogramas localmente e se as requisições a /logs
+e /ml/detect aparecem nas métricas do servidor
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import requests
+from datetime import datetime
+from app.metrics import MetricsRegistry
+
+# Configuração
+API_BASE = "http://localhost:8000"
+
+def parse_samples(text: str) -> dict:
+    """Converte o texto exportado em {nome{labels}: valor}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+def test_histogram_format():
+    """Testa buckets cumulativos, soma e contagem de um histograma"""
+    print("📏 Testando formato dos histogramas...")
+    
+    registry = MetricsRegistry()
+    histogram = registry.histogram("teste_segundos", "Teste", ["rota"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, rota="/logs")
+    
+    samples = parse_samples(registry.render())
+    expected = {
+        'teste_segundos_bucket{rota="/logs",le="0.1"}': 1,
+        'teste_segundos_bucket{rota="/logs",le="1"}': 3,
+        'teste_segundos_bucket{rota="/logs",le="+Inf"}': 4,
+        'teste_segundos_count{rota="/logs"}': 4,
+        'teste_segundos_sum{rota="/logs"}': 4.05
+    }
+    for name, value in expected.items():
+        print(f"   - {name}: {samples.get(name)}")
+    return all(abs(samples.get(name, -1) - value) < 1e-9 for name, value in expected.items())
+
+def test_server_metrics():
+    """Testa se /logs e /ml/detect aparecem em /metrics"""
+    print("\n📊 Testando /metrics do servidor...")
+    
+    before = parse_samples(requests.get(f"{API_BASE}/metrics").text)
+    requests.post(f"{API_BASE}/logs", json={
+        "requestId": f"metrics_{datetime.now().timestamp()}",
+        "clientId": "metrics_client",
+        "ip": "10.0.0.1",
+        "apiId": "metrics_test",
+        "path": "/api/users",
+        "method": "GET",
+        "status": 200,
+        "timestamp": datetime.now().isoformat()
+    })
+    requests.get(f"{API_BASE}/ml/detect")
+    response = requests.get(f"{API_BASE}/metrics")
+    after = parse_samples(response.text)
+    
+    ingested = after.get("logs_ingested_total", 0) - before.get("logs_ingested_total", 0)
+    logs_route = 'http_request_duration_seconds_count{method="POST",route="/logs",status="200"}'
+    detect_routes = [name for name in after if name.startswith("http_request_duration_seconds_count")
+                     and 'route="/ml/detect"' in name]
+    print(f"   - Content-Type: {response.headers.get('content-type')}")
+    print(f"   - Logs ingeridos: +{ingested:.0f}")
+    print(f"   - Requisições /logs: {after.get(logs_route)}")
+    print(f"   - Séries de /ml/detect: {detect_routes}")
+    return ingested == 1 and logs_route in after and bool(detect_routes)
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DAS MÉTRICAS")
+    print("=" * 50)
+    
+    results = {
+        "Formato dos histogramas": test_histogram_format(),
+        "Métricas do servidor": test_server_metrics()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -187,7 +187,7 @@ def show_detailed_anomalies():
     print("\n🔍 ANALISANDO ANOMALIAS DETECTADAS")
     print("=" * 50)
     
-    models = ['iforest', 'lof', 'knn', 'ocsvm', 'cblof']
+    models = ['iforest', 'lof', 'knn', 'ocsvm_approx', 'cblof']
     
     for model in models:
         print(f"\n🧪 MODELO: {model.upper()}")
@@ -183,7 +183,7 @@ def test_ml_detection():
     
     print("\n🔍 Testando detecção de anomalias com ML...")
     
-    models = ['iforest', 'lof', 'knn', 'ocsvm', 'cblof']
+    models = ['iforest', 'lof', 'knn', 'ocsvm_approx', 'cblof']
     
     for model in models:
         try:
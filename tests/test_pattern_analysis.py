@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Script para testar a análise de padrões de anomalias em tabela colunar
+Compara a classificação em lote com a classificação anomalia a anomalia,
+confere os valores mais comuns e mede a análise com muitas anomalias
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from app.anomaly_description_ml import AnomalyDescriptionML
+
+def generate_anomalies(count: int, stored: bool = False) -> list:
+    """Gera anomalias no formato da detecção ou do armazenamento de detecções"""
+    now = datetime.now()
+    anomalies = []
+    for i in range(count):
+        timestamp = now - timedelta(minutes=random.randint(0, 1440))
+        anomaly = {
+            'requestId': f"pattern_{i}",
+            'clientId': f"client_{random.randint(0, 200)}",
+            'ip': random.choice(["10.0.0.1", "8.8.8.8", "2001:db8::1", f"200.1.2.{i % 300}"]),
+            'apiId': random.choice(["api_a", "api_b"]),
+            'method': random.choice(["GET", "POST", "DELETE"]),
+            'path': random.choice(["/api/users", "/admin/users/1", "/auth/login", "/"]),
+            'status': random.choice([200, 404, 500]),
+        }
+        if stored:
+            anomaly.update({'timestamp': timestamp, 'score': random.random()})
+        else:
+            anomaly.update({'timestamp': timestamp.isoformat(), 'anomaly_score': random.random()})
+        anomalies.append(anomaly)
+    return anomalies
+
+def test_matches_per_anomaly():
+    """Testa se a análise colunar bate com a classificação anomalia a anomalia"""
+    print("🧮 Comparando análise colunar com classificação individual...")
+    
+    description_ml = AnomalyDescriptionML()
+    anomalies = generate_anomalies(2000)
+    context = description_ml.build_context(anomalies)
+    
+    groups = {}
+    for anomaly in anomalies:
+        features = description_ml.extract_contextual_features(anomaly, context)
+        anomaly_type = description_ml.classify_anomaly_type(features, anomaly['anomaly_score'])
+        groups.setdefault(anomaly_type, []).append(anomaly)
+    
+    analysis = description_ml.analyze_patterns(anomalies)
+    errors = 0
+    for anomaly_type, group in groups.items():
+        expected_ips = [list(item) for item in Counter(a['ip'] for a in group).most_common(3)]
+        result = analysis.get(anomaly_type, {})
+        if result.get('count') != len(group) or [list(item) for item in result.get('common_ips', [])] != expected_ips:
+            errors += 1
+    
+    print(f"   - Tipos: {list(analysis.keys())}, {errors} divergências")
+    return errors == 0 and list(analysis.keys()) == list(groups.keys())
+
+def test_stored_detections():
+    """Testa a análise de detecções lidas do armazenamento (score em 'score')"""
+    print("\n💾 Testando análise de detecções armazenadas...")
+    
+    analysis = AnomalyDescriptionML().analyze_patterns(generate_anomalies(500, stored=True))
+    total = sum(group['count'] for group in analysis.values())
+    print(f"   - {total} anomalias em {len(analysis)} tipos")
+    return total == 500 and all(group['avg_score'] > 0 for group in analysis.values())
+
+def test_performance():
+    """Mede a análise com muitas anomalias"""
+    print("\n⚡ Medindo análise de padrões...")
+    
+    anomalies = generate_anomalies(200000)
+    start = time.time()
+    AnomalyDescriptionML().analyze_patterns(anomalies)
+    elapsed = time.time() - start
+    
+    print(f"   - {len(anomalies)} anomalias em {elapsed:.2f}s")
+    return True
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DA ANÁLISE DE PADRÕES")
+    print("=" * 50)
+    
+    results = {
+        "Análise colunar": test_matches_per_anomaly(),
+        "Detecções armazenadas": test_stored_detections(),
+        "Desempenho": test_performance()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Script para testar os conjuntos de referência (coresets) de KNN e LOF
+Verifica o tamanho e os pesos dos conjuntos e compara modelos treinados com
+todos os logs e com max_size (tamanho do pickle, latência e anomalias em
+comum com o treino completo)
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import pickle
+import time
+import numpy as np
+from app.ml_anomaly_detector import MLAnomalyDetector
+from app.reference_sets import build_reference_set, REFERENCE_METHODS
+from app.synthetic_logs import TrafficProfile, generate_logs, generate_logs_frame
+
+# Configuração
+TRAIN_ROWS = 20000
+MAX_SIZE = 2000
+# Fração mínima das anomalias do treino completo mantida pelo modelo limitado
+# (LOF documentado com perda de precisão, fora da lista padrão)
+MIN_OVERLAP = {"knn": 0.6, "lof": 0.15}
+
+def test_reference_set_sizes():
+    """Testa o tamanho máximo e os pesos de cada método"""
+    print("📦 Testando conjuntos de referência...")
+    
+    features = np.random.default_rng(0).normal(size=(TRAIN_ROWS, 5))
+    ok = True
+    for method in REFERENCE_METHODS:
+        reference, weights = build_reference_set(features, MAX_SIZE, method)
+        print(f"   - {method}: {len(reference)} pontos, pesos somam {weights.sum():.0f}")
+        ok = ok and len(reference) <= MAX_SIZE and len(reference) == len(weights) and np.isclose(weights.sum(), TRAIN_ROWS)
+    small, small_weights = build_reference_set(features[:100], MAX_SIZE)
+    return ok and len(small) == 100 and np.all(small_weights == 1)
+
+def train(reference_config):
+    """Treina KNN e LOF em memória"""
+    detector = MLAnomalyDetector()
+    detector.models = {name: detector.models[name] for name in ("knn", "lof")}
+    training = detector.train_models(generate_logs_frame(TRAIN_ROWS, TrafficProfile()), save_models=False,
+                                     reference_config=reference_config)
+    return detector, training
+
+def test_bounded_models():
+    """Compara o treino completo com o treino no conjunto de referência"""
+    print("\n📏 Comparando treino completo e conjunto de referência...")
+    
+    full, _ = train(None)
+    bounded, training = train({"max_size": MAX_SIZE, "method": "stratified", "models": ["knn", "lof"]})
+    print(f"   - Conjuntos: {training['metadata']['reference_sets']}")
+    logs = generate_logs(3000, TrafficProfile(seed=7))
+    
+    ok = set(training["metadata"]["reference_sets"]) == {"knn", "lof"}
+    for name in ("knn", "lof"):
+        sizes, times, anomalies = [], [], []
+        for detector in (full, bounded):
+            sizes.append(len(pickle.dumps(detector.models[name])) // 1024)
+            start = time.perf_counter()
+            result = detector.detect_anomalies(logs, name)
+            times.append(time.perf_counter() - start)
+            anomalies.append({anomaly["requestId"] for anomaly in result["anomalies"]})
+        overlap = len(anomalies[0] & anomalies[1]) / max(1, len(anomalies[0]))
+        rate = len(anomalies[1]) / len(logs)
+        print(f"   - {name}: {sizes[0]}KB -> {sizes[1]}KB, {times[0]:.2f}s -> {times[1]:.2f}s, "
+              f"taxa {rate:.1%}, {overlap:.0%} das anomalias do treino completo")
+        ok = ok and sizes[1] < sizes[0] and 0.02 < rate < 0.3 and overlap >= MIN_OVERLAP[name]
+    return ok
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DOS CONJUNTOS DE REFERÊNCIA")
+    print("=" * 50)
+    
+    results = {
+        "Tamanho e pesos": test_reference_set_sizes(),
+        "Modelos limitados": test_bounded_models()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Script para testar a amostragem estratificada dos logs de treino
+Verifica o limite total e por estrato, a uniformidade dos reservatórios e se
+um cliente ruidoso deixa de dominar a amostra usada no treino
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from collections import Counter
+from datetime import datetime, timedelta
+from app.models import LogEntry
+from app.sampling import StratifiedReservoirSampler, status_class
+
+# Configuração
+MAX_LOGS = 2000
+MAX_PER_STRATUM = 500
+
+def make_log(index: int, client_id: str, status: int = 200) -> LogEntry:
+    """Log mínimo de um cliente (o índice fica no requestId)"""
+    return LogEntry(
+        timestamp=datetime.now() - timedelta(seconds=index),
+        apiId="api-teste",
+        clientId=client_id,
+        path="/teste",
+        method="GET",
+        status=status,
+        ip="10.0.0.1",
+        requestId=f"{client_id}-{index}"
+    )
+
+def test_noisy_client():
+    """Testa se um cliente ruidoso fica limitado e os demais ficam inteiros"""
+    print("📢 Testando cliente ruidoso...")
+    
+    sampler = StratifiedReservoirSampler(MAX_LOGS, MAX_PER_STRATUM)
+    sampler.extend(make_log(i, "ruidoso") for i in range(50000))
+    for client in range(3):
+        sampler.extend(make_log(i, f"cliente-{client}") for i in range(200))
+    
+    kept = Counter(log.clientId for log in sampler.sample())
+    summary = sampler.summary()
+    print(f"   - Guardados: {dict(kept)}")
+    print(f"   - {summary['logs_kept']} de {summary['logs_seen']} logs, {summary['strata_capped']} estrato(s) limitado(s)")
+    return (kept["ruidoso"] == MAX_PER_STRATUM
+            and all(kept[f"cliente-{client}"] == 200 for client in range(3))
+            and summary["strata_capped"] == 1)
+
+def test_total_limit():
+    """Testa o limite total com mais estratos do que cabem em max_per_stratum"""
+    print("\n📏 Testando limite total...")
+    
+    sampler = StratifiedReservoirSampler(MAX_LOGS, MAX_PER_STRATUM)
+    for client in range(40):
+        sampler.extend(make_log(i, f"cliente-{client}") for i in range(300))
+    
+    kept = Counter(log.clientId for log in sampler.sample())
+    print(f"   - {sum(kept.values())} logs em {len(kept)} estratos (limite por estrato: {sampler.summary()['max_per_stratum']})")
+    
+    tiny = StratifiedReservoirSampler(max_logs=10, max_per_stratum=MAX_PER_STRATUM)
+    tiny.extend(make_log(0, f"cliente-{client}") for client in range(50))
+    print(f"   - Mais estratos que max_logs: {len(tiny.sample())} logs em {tiny.summary()['strata']} estratos")
+    return sum(kept.values()) <= MAX_LOGS and len(kept) == 40 and len(tiny.sample()) == 50
+
+def test_uniformity():
+    """Testa se o reservatório de um estrato é uma amostra uniforme do cursor"""
+    print("\n🎲 Testando uniformidade...")
+    
+    total = 20000
+    sampler = StratifiedReservoirSampler(MAX_LOGS, MAX_PER_STRATUM)
+    sampler.extend(make_log(i, "cliente") for i in range(total))
+    positions = [int(log.requestId.split("-")[-1]) for log in sampler.sample()]
+    
+    # Quartos do cursor devem ter ~25% da amostra cada
+    quarters = Counter(position * 4 // total for position in positions)
+    shares = [quarters[quarter] / len(positions) for quarter in range(4)]
+    print(f"   - Fração por quarto do cursor: {', '.join(f'{share:.0%}' for share in shares)}")
+    return all(abs(share - 0.25) < 0.06 for share in shares)
+
+def test_status_classes():
+    """Testa se classes de status raras continuam representadas"""
+    print("\n🚦 Testando classes de status...")
+    
+    sampler = StratifiedReservoirSampler(MAX_LOGS, MAX_PER_STRATUM)
+    sampler.extend(make_log(i, "cliente", 500 if i % 1000 == 0 else 200) for i in range(30000))
+    classes = Counter(status_class(log.status) for log in sampler.sample())
+    print(f"   - Classes na amostra: {dict(classes)}")
+    return classes["5xx"] == 30 and classes["2xx"] == MAX_PER_STRATUM
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DA AMOSTRAGEM DO TREINO")
+    print("=" * 50)
+    
+    results = {
+        "Cliente ruidoso limitado": test_noisy_client(),
+        "Limite total": test_total_limit(),
+        "Uniformidade do reservatório": test_uniformity(),
+        "Classes de status raras": test_status_classes()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Script para testar a pontuação por requisição (POST /ml/score)
+Verifica localmente se as características calculadas log a log são iguais
+às de extract_features e, no servidor, se /ml/score devolve o mesmo score
+que a detecção em lote
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import json
+import numpy as np
+import requests
+from datetime import datetime, timedelta, timezone
+from app.models import LogEntry
+from app.ml_anomaly_detector import MLAnomalyDetector, FEATURE_NAMES
+from app.synthetic_logs import TrafficProfile, generate_logs
+
+# Configuração
+API_BASE = "http://localhost:8000"
+
+def test_feature_rows():
+    """Testa se extract_feature_rows reproduz extract_features"""
+    print("🧮 Testando características log a log...")
+    
+    logs = generate_logs(1000, TrafficProfile(ipv6_ratio=0.3))
+    detector = MLAnomalyDetector()
+    detector.fit_vocabularies(detector._logs_to_frame(logs[:500]))
+    logs.append(LogEntry(requestId="tz", clientId="cliente_novo", ip="::ffff:1.2.3.4", apiId="api",
+                         path="/Auth/token", method="CUSTOM", status=503,
+                         timestamp=datetime.now(timezone(timedelta(hours=-3)))))
+    logs.append(LogEntry(requestId="invalido", clientId="cliente_novo", ip="ip_invalido", apiId="api",
+                         path="", method="GET", status=302, timestamp=datetime.now()))
+    
+    batch = detector.extract_features(logs)
+    rows = detector.extract_feature_rows(logs)
+    single = detector.extract_feature_rows(logs[-1:])
+    print(f"   - Colunas iguais: {list(batch.columns) == FEATURE_NAMES}")
+    print(f"   - Valores iguais: {np.array_equal(batch.to_numpy(dtype=float), rows)}")
+    return (list(batch.columns) == FEATURE_NAMES and np.array_equal(batch.to_numpy(dtype=float), rows)
+            and np.array_equal(single[0], rows[-1]))
+
+def test_score_endpoint():
+    """Testa /ml/score com um log e com alguns logs"""
+    print("\n⚡ Testando /ml/score...")
+    
+    logs = [json.loads(log.json()) for log in generate_logs(5, end_time=datetime.now(), request_prefix="score")]
+    single = requests.post(f"{API_BASE}/ml/score", json={"logs": logs[:1]}).json()
+    several = requests.post(f"{API_BASE}/ml/score", json={"logs": logs, "model_name": "iforest"}).json()
+    if "error" in single or "error" in several:
+        print(f"   ❌ Erro: {single.get('error') or several.get('error')}")
+        return False
+    
+    print(f"   - 1 log: score {single['results'][0]['anomaly_score']:.4f}, modelo {single['model_time_ms']}ms")
+    print(f"   - {several['logs_scored']} logs: {several['anomalies_detected']} anomalias, modelo {several['model_time_ms']}ms")
+    return (len(several["results"]) == 5
+            and abs(single["results"][0]["anomaly_score"] - several["results"][0]["anomaly_score"]) < 1e-9)
+
+def test_unknown_model():
+    """Testa o erro para um modelo inexistente"""
+    print("\n🚫 Testando modelo inexistente...")
+    
+    log = json.loads(generate_logs(1)[0].json())
+    result = requests.post(f"{API_BASE}/ml/score", json={"logs": [log], "model_name": "inexistente"}).json()
+    print(f"   - Resposta: {result}")
+    return "error" in result
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DA PONTUAÇÃO POR REQUISIÇÃO")
+    print("=" * 50)
+    
+    results = {
+        "Características log a log": test_feature_rows(),
+        "Endpoint /ml/score": test_score_endpoint(),
+        "Modelo inexistente": test_unknown_model()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Script para testar a pontuação em tempo real na ingestão
+Verifica localmente a entrega de eventos aos assinantes (com filtro por API)
+e a recarga do modelo em cache quando os arquivos mudam e, no servidor, se logs enviados a /logs são pontuados em micro-lotes e
+chegam pelo feed SSE de /ml/stream
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import asyncio
+import json
+import tempfile
+import threading
+import time
+import requests
+from datetime import datetime
+from pathlib import Path
+from app.streaming import AnomalyBroadcaster, format_sse
+
+# Configuração
+API_BASE = "http://localhost:8000"
+
+def test_broadcaster():
+    """Testa a publicação de outra thread e o filtro por API"""
+    print("📡 Testando distribuição de eventos...")
+    
+    async def scenario():
+        broadcaster = AnomalyBroadcaster()
+        all_apis = broadcaster.subscribe()
+        only_orders = broadcaster.subscribe("orders")
+        events = [{"requestId": "a", "apiId": "orders"}, {"requestId": "b", "apiId": "users"}]
+        publisher = threading.Thread(target=broadcaster.publish, args=(events,))
+        publisher.start()
+        publisher.join()
+        await asyncio.sleep(0.05)
+        received_all = [all_apis.queue.get_nowait()["requestId"] for _ in range(all_apis.queue.qsize())]
+        received_orders = [only_orders.queue.get_nowait()["requestId"] for _ in range(only_orders.queue.qsize())]
+        broadcaster.unsubscribe(all_apis)
+        return received_all, received_orders, broadcaster.subscriber_count()
+    
+    received_all, received_orders, remaining = asyncio.run(scenario())
+    message = format_sse({"requestId": "a"})
+    print(f"   - Todas as APIs: {received_all}")
+    print(f"   - Apenas 'orders': {received_orders}")
+    print(f"   - Mensagem SSE: {message!r}")
+    return (received_all == ["a", "b"] and received_orders == ["a"] and remaining == 1
+            and message == 'event: anomaly\ndata: {"requestId": "a"}\n\n')
+
+def test_model_reload():
+    """Testa se uma recarga com falha mantém o modelo carregado e se um novo salvamento é recarregado"""
+    print("\n♻️ Testando recarga do modelo em cache...")
+    
+    from app.ml_anomaly_detector import MLAnomalyDetector
+    from app.model_cache import ModelCache
+    from app.model_storage import model_storage
+    from app.synthetic_logs import TrafficProfile, generate_logs
+    
+    models_dir = model_storage.models_dir
+    model_storage.models_dir = Path(tempfile.mkdtemp())
+    load_trained_model = MLAnomalyDetector.load_trained_model
+    loads = []
+    
+    def counting_load(detector, model_name):
+        loads.append(model_name)
+        return load_trained_model(detector, model_name)
+    
+    try:
+        MLAnomalyDetector.load_trained_model = counting_load
+        trainer = MLAnomalyDetector()
+        trainer.models = {"iforest": trainer.models["iforest"]}
+        logs = generate_logs(2000, TrafficProfile())
+        trainer.train_models(logs)
+        
+        cache = ModelCache()
+        first = cache.get("iforest")
+        
+        # Arquivo do modelo corrompido (ex: cópia manual interrompida)
+        model_path = model_storage.models_dir / model_storage.model_files["iforest"]
+        model_path.write_bytes(b"corrompido")
+        kept = cache.get("iforest")
+        loads_after_failure = len(loads)
+        cache.get("iforest")
+        retried = len(loads) > loads_after_failure
+        
+        trainer.train_models(logs)
+        reloaded = cache.get("iforest")
+        leftovers = [path.name for path in model_storage.models_dir.iterdir() if path.name.endswith(".tmp")]
+        
+        print(f"   - Após falha: {'mesmo detector' if kept is first else 'detector perdido'}, "
+              f"nova tentativa a cada chamada: {retried}")
+        print(f"   - Após novo salvamento: {'recarregado' if reloaded not in (None, first) else 'não recarregado'}")
+        print(f"   - Temporários restantes: {leftovers}")
+        return first is not None and kept is first and not retried and reloaded not in (None, first) and not leftovers
+    finally:
+        MLAnomalyDetector.load_trained_model = load_trained_model
+        model_storage.models_dir = models_dir
+
+def listen_stream(events: list, stop: threading.Event):
+    """Lê eventos 'anomaly' do feed até stop ser sinalizado"""
+    try:
+        with requests.get(f"{API_BASE}/ml/stream", stream=True, timeout=30) as response:
+            event_name = None
+            for line in response.iter_lines(decode_unicode=True):
+                if stop.is_set():
+                    break
+                if line.startswith("event: "):
+                    event_name = line[len("event: "):]
+                elif line.startswith("data: ") and event_name == "anomaly":
+                    events.append(json.loads(line[len("data: "):]))
+    except requests.RequestException as e:
+        print(f"   ⚠️ Feed encerrado: {e}")
+
+def test_stream_scoring():
+    """Testa a pontuação dos logs ingeridos e o feed SSE"""
+    print("\n⚡ Testando pontuação em tempo real no servidor...")
+    
+    config = requests.get(f"{API_BASE}/config", params={"section": "streaming"}).json()
+    print(f"   - Configuração atual: {config}")
+    requests.post(f"{API_BASE}/config/section", json={
+        "section": "streaming",
+        "config": {"enabled": True, "model_name": "iforest", "batch_size": 50,
+                   "flush_interval_ms": 200, "max_queue": 100000}
+    })
+    
+    events, stop = [], threading.Event()
+    listener = threading.Thread(target=listen_stream, args=(events, stop), daemon=True)
+    listener.start()
+    time.sleep(0.5)
+    
+    before = requests.get(f"{API_BASE}/ml/stream/status").json()
+    for i in range(20):
+        requests.post(f"{API_BASE}/logs", json={
+            "requestId": f"stream_{datetime.now().timestamp()}_{i}",
+            "clientId": f"stream_client_{i % 3}",
+            "ip": f"203.0.113.{i}" if i % 5 == 0 else "10.0.0.1",
+            "apiId": "stream_test",
+            "path": "/admin/users" if i % 5 == 0 else "/api/users",
+            "method": "DELETE" if i % 5 == 0 else "GET",
+            "status": 403 if i % 5 == 0 else 200,
+            "timestamp": datetime.now().isoformat()
+        })
+    time.sleep(2)
+    stop.set()
+    after = requests.get(f"{API_BASE}/ml/stream/status").json()
+    
+    scored = after.get("logs_scored", 0) - before.get("logs_scored", 0)
+    print(f"   - Logs pontuados: {scored}")
+    print(f"   - Lotes: {after.get('batches_scored')} | Assinantes: {after.get('subscribers')}")
+    print(f"   - Anomalias recebidas pelo feed: {len(events)}")
+    if after.get("last_error"):
+        print(f"   ⚠️ Último erro: {after['last_error']}")
+    for event in events[:3]:
+        print(f"     • {event['requestId']} score={event['anomaly_score']:.3f}")
+    
+    published = after.get("anomalies_published", 0) - before.get("anomalies_published", 0)
+    return scored == 20 and len(events) == published
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DA PONTUAÇÃO EM TEMPO REAL")
+    print("=" * 50)
+    
+    results = {
+        "Distribuição de eventos": test_broadcaster(),
+        "Recarga do modelo em cache": test_model_reload(),
+        "Pontuação na ingestão": test_stream_scoring()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -22,7 +22,7 @@ from app.models import LogEntry
 from app.storage import insert_log, clear_logs, get_all_logs
 from app.ml_anomaly_detector import train_ml_models, detect_ml_anomalies
 from app.feedback_system import feedback_system
-from pymongo import MongoClient
+from app.connection_manager import get_database
 
 # Configuração
 API_BASE = "http://localhost:8000"
@@ -36,8 +36,7 @@ def clear_all_data():
         clear_logs()
         print("   ✅ Logs limpos")
         
-        client = MongoClient('mongodb://localhost:27017/')
-        db = client['api_logs']
+        db = get_database()
         db.feedback.delete_many({})
         print("   ✅ Feedback limpo")
         
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Script para testar o codificador de vocabulário (método e clientId)
+Verifica códigos estáveis, valores desconhecidos, hashing e a conversão
+de LabelEncoders de modelos antigos
+"""
+
+import sys
+import os
+# Adicionar o diretório pai ao path de forma mais robusta
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import random
+import time
+from sklearn.preprocessing import LabelEncoder
+from app.encoders import VocabularyEncoder
+
+def test_stable_codes():
+    """Testa se os códigos do treino não mudam e valores novos valem -1"""
+    print("🔤 Testando códigos do vocabulário...")
+    
+    encoder = VocabularyEncoder().fit(["client_b", "client_a", "client_b"], base_values=["GET"])
+    codes = encoder.transform(["GET", "client_a", "client_b", "client_novo"]).tolist()
+    print(f"   - Vocabulário: {encoder.vocabulary}")
+    print(f"   - Códigos: {codes}")
+    
+    added = encoder.update(["client_c"])
+    unchanged = encoder.transform(["GET", "client_a", "client_b"]).tolist() == codes[:3]
+    return codes == [0, 1, 2, -1] and added == ["client_c"] and unchanged
+
+def test_hash_buckets():
+    """Testa o hashing de valores fora do vocabulário"""
+    print("\n#️⃣ Testando hashing de valores desconhecidos...")
+    
+    encoder = VocabularyEncoder(hash_buckets=16).fit(["a", "b"])
+    first = encoder.transform(["x", "y", "x"]).tolist()
+    second = VocabularyEncoder(hash_buckets=16).fit(["a", "b"]).transform(["x", "y"]).tolist()
+    print(f"   - Códigos: {first}")
+    return first[0] == first[2] == second[0] and all(2 <= code < 18 for code in first)
+
+def test_label_encoder_conversion():
+    """Testa se modelos antigos mantêm os mesmos códigos"""
+    print("\n🔁 Testando conversão de LabelEncoder...")
+    
+    values = ["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"]
+    label_encoder = LabelEncoder().fit(values)
+    encoder = VocabularyEncoder.from_label_encoder(label_encoder)
+    
+    expected = label_encoder.transform(values).tolist()
+    converted = encoder.transform(values).tolist()
+    print(f"   - LabelEncoder: {expected}")
+    print(f"   - Vocabulário: {converted}")
+    return expected == converted and encoder.encode("TRACE") == -1
+
+def test_batch_performance():
+    """Compara a codificação de muitos logs com muitos clientes com o LabelEncoder"""
+    print("\n⚡ Medindo codificação em lote...")
+    
+    clients = [f"client_{i}" for i in range(50000)]
+    encoder = VocabularyEncoder().fit(clients)
+    label_encoder = LabelEncoder().fit(clients)
+    values = [random.choice(clients) for _ in range(1_000_000)]
+    
+    start = time.time()
+    codes = encoder.transform(values)
+    elapsed = time.time() - start
+    
+    start = time.time()
+    expected = label_encoder.transform(values)
+    label_elapsed = time.time() - start
+    
+    print(f"   - {len(values)} valores ({len(clients)} clientes) em {elapsed:.2f}s "
+          f"(LabelEncoder: {label_elapsed:.2f}s)")
+    return bool((codes == expected).all()) and elapsed < label_elapsed
+
+def main():
+    """Função principal"""
+    print("🚀 TESTE DO CODIFICADOR DE VOCABULÁRIO")
+    print("=" * 50)
+    
+    results = {
+        "Códigos estáveis": test_stable_codes(),
+        "Hashing": test_hash_buckets(),
+        "Conversão de LabelEncoder": test_label_encoder_conversion(),
+        "Desempenho em lote": test_batch_performance()
+    }
+    
+    print("\n" + "=" * 50)
+    for name, ok in results.items():
+        print(f"   {'✅' if ok else '❌'} {name}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)